@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 # import dj_database_url
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -65,6 +66,7 @@ INSTALLED_APPS = [
     "accounting",
     "rest_framework",
     "rest_framework_simplejwt",
+    "django_filters",
     "corsheaders",
 ]
 
@@ -239,6 +241,29 @@ ROLEPERMISSIONS_MODULE = 'users.roles'
 # Custom settings
 # Add any custom settings here
 
+# Cache settings
+# تقارير المحاسبة تُخزن في cache مشترك بين العمليات (ملفات افتراضيًا) حتى يستفيد كل worker من
+# نتائج غيره، ورقم الإصدار نفسه في قاعدة البيانات (accounting/report_cache.py). REPORT_CACHE_BACKEND=locmem للتطوير.
+REPORT_CACHE_BACKEND = os.environ.get('REPORT_CACHE_BACKEND', 'file')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'reports': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'accounting-reports',
+    } if REPORT_CACHE_BACKEND == 'locmem' else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('REPORT_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'acc_report_cache')),
+    },
+}
+ACCOUNTING_REPORT_CACHE = 'reports'
+ACCOUNTING_REPORT_CACHE_TIMEOUT = int(os.environ.get('ACCOUNTING_REPORT_CACHE_TIMEOUT', 300))
+
+# ذاكرة البحث بالباركود داخل كل عملية (products/lookup.py)
+PRODUCT_LOOKUP_CACHE_SIZE = int(os.environ.get('PRODUCT_LOOKUP_CACHE_SIZE', 4096))
+PRODUCT_LOOKUP_VERSION_TTL = 1
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_HEADERS = [
@@ -251,7 +276,10 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'if-none-match',
 ]
+# مطلوب لمزامنة كتالوج المنتجات (products/catalog.py)
+CORS_EXPOSE_HEADERS = ['etag']
 
 # REST Framework settings
 REST_FRAMEWORK = {
@@ -263,6 +291,14 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
+    # الترقيم اختياري (?limit=&offset=)، انظر core/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.StandardPagination',
+    'PAGE_SIZE': 50,
+    'DEFAULT_FILTER_BACKENDS': [
+        'django_filters.rest_framework.DjangoFilterBackend',
+        'core.filters.IndexedSearchFilter',
+        'rest_framework.filters.OrderingFilter',
+    ],
 }
 
 from datetime import timedelta
@@ -2,7 +2,9 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Account, JournalEntry, JournalItem, CostCenter, FinancialPeriod, FixedAsset
+from django.db.models import Prefetch
+from core.filters import DateRangeFilterSet
+from .models import Account, JournalEntry, JournalItem, CostCenter, FinancialPeriod, FixedAsset, AccountPeriodBalance
 from .serializers import (
     AccountSerializer, 
     JournalEntrySerializer, 
@@ -12,6 +14,36 @@ from .serializers import (
     FixedAssetSerializer
 )
 from .reports import AccountingReports
+from . import report_cache
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+import csv
+
+
+class _Echo:
+    """كائن يشبه الملف يعيد ما يُكتب فيه، لاستخدام csv.writer مع الاستجابة المتدفقة"""
+    def write(self, value):
+        return value
+
+
+def _stream_ledger_csv(rows):
+    writer = csv.writer(_Echo())
+    yield '\ufeff'
+    yield writer.writerow(['id', 'date', 'entry_number', 'description', 'memo', 'debit', 'credit', 'balance'])
+    for row in rows:
+        yield writer.writerow([row['id'], row['date'].isoformat(), row['entry_number'], row['description'],
+                               row['memo'], row['debit'], row['credit'], row['balance']])
+
+
+def _stream_ledger_json(account, opening_balance, rows):
+    encoder = JSONEncoder(ensure_ascii=False)
+    balance = opening_balance
+    yield '{"account": %s, "opening_balance": %s, "data": [' % (
+        encoder.encode(AccountSerializer(account).data), encoder.encode(opening_balance))
+    for index, row in enumerate(rows):
+        balance = row['balance']
+        yield (',' if index else '') + encoder.encode(row)
+    yield '], "closing_balance": %s}' % encoder.encode(balance)
 
 class AccountingReportViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
@@ -114,6 +146,79 @@ class AccountingReportViewSet(viewsets.ViewSet):
         
         return Response(report)
 
+    @action(detail=False, methods=['get'])
+    def general_ledger_page(self, request):
+        """دفتر الأستاذ بصفحات: ?account=&cursor=&page_size= (المؤشر التالي في next_cursor)"""
+        account_id = request.query_params.get('account')
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        cost_center_id = request.query_params.get('cost_center')
+        cursor = request.query_params.get('cursor')
+
+        if not account_id:
+            return Response({'error': 'Account ID is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            page_size = min(max(int(request.query_params.get('page_size', 100)), 1), 1000)
+            report = AccountingReports.get_general_ledger_page(
+                account_id, start_date, end_date, cost_center_id, cursor=cursor, page_size=page_size
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not report:
+            return Response({'error': 'Account not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        report['account'] = AccountSerializer(report['account']).data
+        return Response(report)
+
+    @action(detail=False, methods=['get'])
+    def general_ledger_export(self, request):
+        """تصدير دفتر الأستاذ كاملاً كتدفق JSON أو CSV: ?account=&output=json|csv"""
+        account_id = request.query_params.get('account')
+        start_date = request.query_params.get('start_date')
+        end_date = request.query_params.get('end_date')
+        cost_center_id = request.query_params.get('cost_center')
+        output = request.query_params.get('output', 'json')
+
+        if not account_id:
+            return Response({'error': 'Account ID is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if output not in ('json', 'csv'):
+            return Response({'error': 'output must be json or csv'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # التحقق من المعرفات قبل بدء التدفق (القيمة غير الرقمية ترفع ValueError عند الاستعلام)
+        try:
+            account_id = int(account_id)
+            cost_center_id = int(cost_center_id) if cost_center_id else None
+        except ValueError:
+            return Response({'error': 'Invalid account or cost center ID'}, status=status.HTTP_400_BAD_REQUEST)
+
+        account = Account.objects.filter(id=account_id).first()
+        if not account:
+            return Response({'error': 'Account not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        opening_balance = AccountingReports._ledger_opening_balance(account, start_date, cost_center_id)
+        rows = AccountingReports.iter_general_ledger(
+            account, start_date, end_date, cost_center_id, opening_balance=opening_balance
+        )
+        if output == 'csv':
+            response = StreamingHttpResponse(_stream_ledger_csv(rows), content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = f'attachment; filename=general_ledger_{account.code}.csv'
+        else:
+            response = StreamingHttpResponse(
+                _stream_ledger_json(account, opening_balance, rows), content_type='application/json'
+            )
+        return response
+
+    @action(detail=False, methods=['get'])
+    def cache_stats(self, request):
+        """
+        إحصائيات cache التقارير (الإصابة/الإخفاق ورقم إصدار دفتر الأستاذ).
+        عدادات الإصابة والإخفاق خاصة بالعامل الذي أجاب الطلب (scope='process' مع pid)،
+        وليست مجموع كل العمال.
+        """
+        return Response(report_cache.stats())
+
     @action(detail=False, methods=['get'])
     def dashboard_stats(self, request):
         from django.db.models import Sum
@@ -123,19 +228,14 @@ class AccountingReportViewSet(viewsets.ViewSet):
         assets = Account.objects.filter(account_type='asset', parent=None).aggregate(total=Sum('balance'))['total'] or 0
         liabilities = Account.objects.filter(account_type='liability', parent=None).aggregate(total=Sum('balance'))['total'] or 0
         
-        # 2. صافي الربح لهذا الشهر
-        this_month_start = timezone.now().replace(day=1, hour=0, minute=0, second=0)
-        income = JournalItem.objects.filter(
-            account__account_type='income',
-            journal_entry__date__gte=this_month_start,
-            journal_entry__is_posted=True
-        ).aggregate(total=Sum('credit'))['total'] or 0
-        
-        expenses = JournalItem.objects.filter(
-            account__account_type='expense',
-            journal_entry__date__gte=this_month_start,
-            journal_entry__is_posted=True
-        ).aggregate(total=Sum('debit'))['total'] or 0
+        # 2. صافي الربح لهذا الشهر (من أرصدة الفترات، بداية الشهر بالتوقيت المحلي)
+        this_month_start = timezone.localtime().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        income_ids = set(Account.objects.filter(account_type='income').values_list('id', flat=True))
+        expense_ids = set(Account.objects.filter(account_type='expense').values_list('id', flat=True))
+        totals = AccountPeriodBalance.totals(start_date=this_month_start, accounts=income_ids | expense_ids)
+
+        income = sum((credit for acc_id, (debit, credit) in totals.items() if acc_id in income_ids), 0)
+        expenses = sum((debit for acc_id, (debit, credit) in totals.items() if acc_id in expense_ids), 0)
         
         return Response({
             'assets': float(assets),
@@ -146,14 +246,28 @@ class AccountingReportViewSet(viewsets.ViewSet):
         })
 
 class AccountViewSet(viewsets.ModelViewSet):
-    queryset = Account.objects.all()
+    queryset = Account.objects.select_related('parent').order_by('tree_id', 'lft')
     serializer_class = AccountSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['account_type', 'parent', 'is_selectable']
+    search_fields = ['code', 'name']
+    ordering_fields = ['code', 'name', 'balance']
+
+class JournalEntryFilter(DateRangeFilterSet):
+    class Meta:
+        model = JournalEntry
+        fields = ['is_posted', 'reference']
 
 class JournalEntryViewSet(viewsets.ModelViewSet):
-    queryset = JournalEntry.objects.all()
+    queryset = JournalEntry.objects.prefetch_related(
+        Prefetch('items', queryset=JournalItem.objects.select_related('account', 'cost_center'))
+    ).order_by('-date', '-entry_number')
     serializer_class = JournalEntrySerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = JournalEntryFilter
+    search_fields = ['entry_number', 'reference', 'description']
+    search_index = [('journal_entry', 'pk')]
+    ordering_fields = ['date', 'entry_number']
 
     @action(detail=True, methods=['post'])
     def post_entry(self, request, pk=None):
@@ -176,24 +290,29 @@ class JournalEntryViewSet(viewsets.ModelViewSet):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 class JournalItemViewSet(viewsets.ModelViewSet):
-    queryset = JournalItem.objects.all()
+    queryset = JournalItem.objects.select_related('account', 'cost_center').order_by('id')
     serializer_class = JournalItemSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['journal_entry', 'account', 'cost_center']
 
 class CostCenterViewSet(viewsets.ModelViewSet):
-    queryset = CostCenter.objects.all()
+    queryset = CostCenter.objects.order_by('code')
     serializer_class = CostCenterSerializer
     permission_classes = [IsAuthenticated]
+    search_fields = ['code', 'name']
 
 class FinancialPeriodViewSet(viewsets.ModelViewSet):
-    queryset = FinancialPeriod.objects.all()
+    queryset = FinancialPeriod.objects.order_by('-start_date')
     serializer_class = FinancialPeriodSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['is_closed']
 
 class FixedAssetViewSet(viewsets.ModelViewSet):
-    queryset = FixedAsset.objects.all()
+    queryset = FixedAsset.objects.select_related('asset_account', 'depreciation_account', 'expense_account').order_by('id')
     serializer_class = FixedAssetSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['is_active']
+    search_fields = ['code', 'name']
 
     @action(detail=True, methods=['post'])
     def run_depreciation(self, request, pk=None):
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from accounting.models import AccountPeriodBalance
+
+class Command(BaseCommand):
+    help = 'Rebuild monthly account period balances from posted journal items'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Starting period balance rebuild at {timezone.now()}'))
+
+        count = AccountPeriodBalance.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(f'Period balance rebuild completed. {count} balances written.'))
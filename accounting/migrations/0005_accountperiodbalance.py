@@ -0,0 +1,105 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def populate_period_balances(apps, schema_editor):
+    JournalItem = apps.get_model("accounting", "JournalItem")
+    AccountPeriodBalance = apps.get_model("accounting", "AccountPeriodBalance")
+    rows = (
+        JournalItem.objects.filter(journal_entry__is_posted=True)
+        .order_by()
+        .annotate(month=TruncMonth("journal_entry__date"))
+        .values("account_id", "cost_center_id", "month")
+        .annotate(total_debit=Sum("debit"), total_credit=Sum("credit"))
+    )
+    AccountPeriodBalance.objects.bulk_create(
+        [
+            AccountPeriodBalance(
+                account_id=row["account_id"],
+                cost_center_id=row["cost_center_id"],
+                period=timezone.localtime(row["month"]).date().replace(day=1),
+                debit=row["total_debit"] or 0,
+                credit=row["total_credit"] or 0,
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0004_alter_financialperiod_options_fixedasset"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccountPeriodBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.DateField(
+                        help_text="أول يوم في الشهر", verbose_name="الشهر"
+                    ),
+                ),
+                (
+                    "debit",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=15, verbose_name="مدين"
+                    ),
+                ),
+                (
+                    "credit",
+                    models.DecimalField(
+                        decimal_places=2, default=0, max_digits=15, verbose_name="دائن"
+                    ),
+                ),
+                (
+                    "account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="period_balances",
+                        to="accounting.account",
+                        verbose_name="الحساب",
+                    ),
+                ),
+                (
+                    "cost_center",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="period_balances",
+                        to="accounting.costcenter",
+                        verbose_name="مركز التكلفة",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "رصيد حساب لفترة",
+                "verbose_name_plural": "أرصدة الحسابات للفترات",
+                "indexes": [
+                    models.Index(
+                        fields=["period", "account"], name="acc_period_balance_idx"
+                    )
+                ],
+                "unique_together": {("account", "cost_center", "period")},
+            },
+        ),
+        migrations.RunPython(populate_period_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0005_accountperiodbalance"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="journalentry",
+            index=models.Index(
+                fields=["date", "entry_number"], name="journal_entry_date_idx"
+            ),
+        ),
+    ]
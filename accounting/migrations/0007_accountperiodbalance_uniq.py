@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:27
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_period_balances(apps, schema_editor):
+    """دمج الصفوف المكررة لنفس (الحساب، مركز التكلفة، الشهر) قبل إضافة القيود الفريدة"""
+    AccountPeriodBalance = apps.get_model("accounting", "AccountPeriodBalance")
+    duplicates = (
+        AccountPeriodBalance.objects.order_by()
+        .values("account_id", "cost_center_id", "period")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for row in list(duplicates):
+        balances = list(
+            AccountPeriodBalance.objects.filter(
+                account_id=row["account_id"], cost_center_id=row["cost_center_id"], period=row["period"]
+            ).order_by("pk")
+        )
+        kept = balances[0]
+        kept.debit = sum(balance.debit for balance in balances)
+        kept.credit = sum(balance.credit for balance in balances)
+        kept.save(update_fields=["debit", "credit"])
+        AccountPeriodBalance.objects.filter(pk__in=[balance.pk for balance in balances[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0006_journalentry_journal_entry_date_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_period_balances, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="accountperiodbalance",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="accountperiodbalance",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("cost_center__isnull", False)),
+                fields=("account", "cost_center", "period"),
+                name="acc_period_balance_cc_uniq",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="accountperiodbalance",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("cost_center__isnull", True)),
+                fields=("account", "period"),
+                name="acc_period_balance_no_cc_uniq",
+            ),
+        ),
+    ]
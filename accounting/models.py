@@ -2,7 +2,9 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from mptt.models import MPTTModel, TreeForeignKey
 from django.utils import timezone
+from datetime import datetime, timedelta
 from decimal import Decimal
+from . import report_cache
 
 class AuditLog(models.Model):
     """سجل التدقيق (Audit Trail) لمراقبة التغييرات الحساسة"""
@@ -134,6 +136,9 @@ class JournalEntry(models.Model):
         verbose_name = _("قيد محاسبي")
         verbose_name_plural = _("القيود المحاسبية")
         ordering = ['-date', '-entry_number']
+        indexes = [
+            models.Index(fields=['date', 'entry_number'], name='journal_entry_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.entry_number} ({self.date.date()})"
@@ -152,7 +157,13 @@ class JournalEntry(models.Model):
         if FinancialPeriod.is_date_locked(self.date):
             from django.core.exceptions import ValidationError
             raise ValidationError(_("لا يمكن حذف قيود في فترة مالية مغلقة."))
-        super().delete(*args, **kwargs)
+        from django.db import transaction
+        with transaction.atomic():
+            if self.is_posted:
+                # حذف قيد مرحل يزيل أثره من أرصدة الفترات
+                AccountPeriodBalance.apply_entry(self, self.items.all(), sign=-1)
+                report_cache.bump_ledger_version()
+            super().delete(*args, **kwargs)
 
     def post(self):
         """ترحيل القيد وتحديث أرصدة الحسابات"""
@@ -164,7 +175,7 @@ class JournalEntry(models.Model):
             raise ValueError(_("لا يمكن الترحيل في هذه الفترة لأنها مغلقة مالياً."))
         
         # التأكد من توازن القيد
-        items = self.items.all()
+        items = self.items.select_related('account')
         if not items.exists():
             raise ValueError(_("لا يمكن ترحيل قيد فارغ."))
 
@@ -178,29 +189,12 @@ class JournalEntry(models.Model):
 
         from django.db import transaction
         with transaction.atomic():
-            for item in items:
-                account = item.account
-                # حساب مبلغ التغيير
-                if account.account_type in ['asset', 'expense']:
-                    amount = (item.debit - item.credit)
-                else:
-                    amount = (item.credit - item.debit)
-                
-                # تحديث الرصيد للحساب وجميع آبائه (Propagate balance up the tree)
-                for acc in account.get_ancestors(include_self=True):
-                    acc.balance += amount
-                    acc.save()
-
-                # تحديث أرصدة الموديلات المرتبطة (للحساب المباشر فقط)
-                if hasattr(account, 'safe'):
-                    safe = account.safe
-                    safe.current_balance = account.balance
-                    safe.save(update_fields=['current_balance'])
-                elif hasattr(account, 'contact'):
-                    contact = account.contact
-                    contact.current_balance = account.balance
-                    contact.save(update_fields=['current_balance'])
-            
+            # تحديث الرصيد للحسابات وجميع آبائها (Propagate balance up the tree)
+            self._apply_balances(items)
+
+            AccountPeriodBalance.apply_entry(self, items)
+            report_cache.bump_ledger_version()
+
             self.is_posted = True
             self.save()
 
@@ -215,6 +209,57 @@ class JournalEntry(models.Model):
         
         return True
 
+    @staticmethod
+    def _apply_balances(items, sign=1):
+        """
+        تحديث أرصدة الحسابات بأثر بنود القيد دفعة واحدة:
+        تجميع التغيير لكل حساب، ثم توزيعه على الآباء باستخدام فترات MPTT (lft/rght)،
+        ثم تحديث واحد F('balance') + delta لكل حساب متأثر، ومزامنة الخزن وجهات الاتصال المرتبطة.
+        """
+        from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
+        from core.models import Safe, Contact
+
+        # 1. صافي التغيير لكل حساب مباشر حسب طبيعة الحساب
+        direct = {}
+        deltas = {}
+        for item in items:
+            account = item.account
+            if account.account_type in ['asset', 'expense']:
+                amount = (item.debit - item.credit)
+            else:
+                amount = (item.credit - item.debit)
+            direct[account.id] = account
+            deltas[account.id] = deltas.get(account.id, Decimal('0')) + amount * sign
+        if not direct:
+            return
+
+        # 2. توزيع التغيير على الآباء (الحساب نفسه ضمن آبائه) باستعلام واحد
+        ancestors_filter = Q()
+        for account in direct.values():
+            ancestors_filter |= Q(tree_id=account.tree_id, lft__lte=account.lft, rght__gte=account.rght)
+        ancestors = list(Account.objects.filter(ancestors_filter).values('id', 'tree_id', 'lft', 'rght'))
+
+        totals = {}
+        for account_id, amount in deltas.items():
+            account = direct[account_id]
+            for ancestor in ancestors:
+                if (ancestor['tree_id'] == account.tree_id and ancestor['lft'] <= account.lft
+                        and ancestor['rght'] >= account.rght):
+                    totals[ancestor['id']] = totals.get(ancestor['id'], Decimal('0')) + amount
+
+        # 3. تحديث واحد F('balance') + delta لكل الحسابات المتأثرة
+        totals = {account_id: amount for account_id, amount in totals.items() if amount}
+        if totals:
+            Account.objects.filter(pk__in=totals).update(balance=F('balance') + Case(
+                *[When(pk=account_id, then=Value(amount)) for account_id, amount in totals.items()],
+                output_field=models.DecimalField(max_digits=15, decimal_places=2),
+            ))
+
+        # 4. مزامنة أرصدة الموديلات المرتبطة (للحسابات المباشرة فقط)
+        account_balance = Subquery(Account.objects.filter(pk=OuterRef('account_id')).values('balance')[:1])
+        Safe.objects.filter(account_id__in=direct).update(current_balance=account_balance)
+        Contact.objects.filter(account_id__in=direct).update(current_balance=account_balance)
+
     def unpost(self):
         """إلغاء ترحيل القيد وعكس تأثيره على أرصدة الحسابات"""
         if not self.is_posted:
@@ -226,30 +271,14 @@ class JournalEntry(models.Model):
             
         from django.db import transaction
         with transaction.atomic():
-            items = self.items.all()
-            for item in items:
-                account = item.account
-                # حساب مبلغ التغيير للعكس
-                if account.account_type in ['asset', 'expense']:
-                    amount = (item.debit - item.credit)
-                else:
-                    amount = (item.credit - item.debit)
-                
-                # عكس التحديث للحساب وجميع آبائه
-                for acc in account.get_ancestors(include_self=True):
-                    acc.balance -= amount
-                    acc.save()
-
-                # تحديث أرصدة الموديلات المرتبطة (للحساب المباشر فقط)
-                if hasattr(account, 'safe'):
-                    safe = account.safe
-                    safe.current_balance = account.balance
-                    safe.save(update_fields=['current_balance'])
-                elif hasattr(account, 'contact'):
-                    contact = account.contact
-                    contact.current_balance = account.balance
-                    contact.save(update_fields=['current_balance'])
-            
+            items = self.items.select_related('account')
+
+            # عكس التحديث للحسابات وجميع آبائها
+            self._apply_balances(items, sign=-1)
+
+            AccountPeriodBalance.apply_entry(self, items, sign=-1)
+            report_cache.bump_ledger_version()
+
             self.is_posted = False
             self.save()
 
@@ -308,6 +337,193 @@ class JournalItem(models.Model):
             raise ValidationError(_("لا يمكن حذف بنود في فترة مالية مغلقة."))
         super().delete(*args, **kwargs)
 
+class AccountPeriodBalance(models.Model):
+    """
+    مجاميع المدين والدائن المرحلة لكل (حساب، مركز تكلفة، شهر).
+    تُحدَّث داخل معاملة ترحيل القيد وإلغاء ترحيله، فتقرأ التقارير الأشهر الكاملة
+    من هذا الجدول وتجمع الحركات الخام لأطراف الفترة الجزئية فقط.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE,
+                                related_name='period_balances', verbose_name=_("الحساب"))
+    cost_center = models.ForeignKey(CostCenter, on_delete=models.CASCADE, null=True, blank=True,
+                                    related_name='period_balances', verbose_name=_("مركز التكلفة"))
+    period = models.DateField(_("الشهر"), help_text=_("أول يوم في الشهر"))
+    debit = models.DecimalField(_("مدين"), max_digits=15, decimal_places=2, default=0)
+    credit = models.DecimalField(_("دائن"), max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _("رصيد حساب لفترة")
+        verbose_name_plural = _("أرصدة الحسابات للفترات")
+        # صف واحد لكل (حساب، مركز تكلفة، شهر)، والصفوف بدون مركز تكلفة لها قيد منفصل
+        # لأن القيمة NULL لا تتعارض مع نفسها في القيد الفريد العادي
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'cost_center', 'period'],
+                                    condition=models.Q(cost_center__isnull=False),
+                                    name='acc_period_balance_cc_uniq'),
+            models.UniqueConstraint(fields=['account', 'period'], condition=models.Q(cost_center__isnull=True),
+                                    name='acc_period_balance_no_cc_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'account'], name='acc_period_balance_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.account} - {self.period:%Y-%m}: {self.debit} / {self.credit}"
+
+    @staticmethod
+    def month_of(value):
+        """أول يوم في الشهر المحلي لتاريخ/وقت"""
+        if isinstance(value, datetime):
+            if timezone.is_aware(value):
+                value = timezone.localtime(value)
+            value = value.date()
+        return value.replace(day=1)
+
+    @staticmethod
+    def _next_month(period):
+        return (period + timedelta(days=32)).replace(day=1)
+
+    @staticmethod
+    def _month_start(period):
+        """بداية الشهر كلحظة زمنية بالتوقيت المحلي"""
+        return timezone.make_aware(datetime.combine(period, datetime.min.time()))
+
+    @staticmethod
+    def _as_datetime(value):
+        """تحويل قيمة التاريخ بنفس طريقة فلترة الحقل date في القيود (نص أو تاريخ أو وقت)"""
+        if value in (None, ''):
+            return None
+        value = models.DateTimeField().to_python(value)
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        return value
+
+    @classmethod
+    def apply_entry(cls, entry, items, sign=1):
+        """إضافة (أو طرح عند sign=-1) أثر بنود قيد إلى أرصدة شهره"""
+        cls.apply_items(entry.date, items, sign)
+
+    @classmethod
+    def apply_items(cls, date, items, sign=1):
+        """إضافة أثر بنود (من قيد أو أكثر في نفس الشهر) إلى أرصدة شهر التاريخ المعطى"""
+        period = cls.month_of(date)
+        totals = {}
+        for item in items:
+            key = (item.account_id, item.cost_center_id)
+            debit, credit = totals.get(key, (Decimal('0'), Decimal('0')))
+            totals[key] = (debit + item.debit, credit + item.credit)
+
+        if not totals:
+            return
+
+        def rows():
+            return {
+                (row['account_id'], row['cost_center_id']): row['id']
+                for row in cls.objects.filter(period=period, account_id__in={key[0] for key in totals}).values(
+                    'id', 'account_id', 'cost_center_id'
+                )
+                if (row['account_id'], row['cost_center_id']) in totals
+            }
+
+        # إنشاء الصفوف الناقصة بأرصدة صفرية دفعة واحدة: إنشاء نفس الصف من معاملة متزامنة
+        # يتعارض مع القيود الفريدة فيُتجاهل بدلاً من تكرار الصف
+        existing = rows()
+        missing = [key for key in totals if key not in existing]
+        if missing:
+            cls.objects.bulk_create([
+                cls(account_id=account_id, cost_center_id=cost_center_id, period=period)
+                for account_id, cost_center_id in missing
+            ], ignore_conflicts=True)
+            existing = rows()
+
+        # ثم إضافة الأثر لكل الصفوف بتحديث F() واحد (ذري لكل صف فلا تضيع التحديثات المتزامنة)
+        amount_field = models.DecimalField(max_digits=15, decimal_places=2)
+
+        def delta(index):
+            return models.Case(
+                *[models.When(pk=pk, then=models.Value(totals[key][index] * sign)) for key, pk in existing.items()],
+                output_field=amount_field,
+            )
+
+        cls.objects.filter(pk__in=existing.values()).update(
+            debit=models.F('debit') + delta(0), credit=models.F('credit') + delta(1)
+        )
+
+    @classmethod
+    def totals(cls, start_date=None, end_date=None, cost_center_id=None, accounts=None):
+        """
+        مجاميع المدين والدائن المرحلة لكل حساب خلال فترة: {account_id: (debit, credit)}.
+        الأشهر الواقعة بالكامل داخل الفترة تُقرأ من الجدول، وأطراف الفترة من بنود القيود.
+        النتيجة مطابقة لفلترة JournalItem على journal_entry__date__gte/lte بنفس القيم.
+        """
+        start = cls._as_datetime(start_date)
+        end = cls._as_datetime(end_date)
+
+        items = JournalItem.objects.filter(journal_entry__is_posted=True)
+        balances = cls.objects.all()
+        if start:
+            items = items.filter(journal_entry__date__gte=start)
+        if end:
+            items = items.filter(journal_entry__date__lte=end)
+        if cost_center_id:
+            items = items.filter(cost_center_id=cost_center_id)
+            balances = balances.filter(cost_center_id=cost_center_id)
+        if accounts is not None:
+            items = items.filter(account__in=accounts)
+            balances = balances.filter(account__in=accounts)
+
+        # نطاق الأشهر الكاملة [first_month, end_month): كل حركات الشهر تقع داخل الفترة
+        first_month = None
+        if start:
+            first_month = cls.month_of(start)
+            if cls._month_start(first_month) < start:
+                first_month = cls._next_month(first_month)
+        end_month = cls.month_of(end) if end else None
+
+        totals = {}
+
+        def add(queryset):
+            rows = queryset.order_by().values('account_id').annotate(
+                total_debit=models.Sum('debit'), total_credit=models.Sum('credit'))
+            for row in rows:
+                debit, credit = totals.get(row['account_id'], (Decimal('0.00'), Decimal('0.00')))
+                totals[row['account_id']] = (debit + (row['total_debit'] or 0), credit + (row['total_credit'] or 0))
+
+        if first_month and end_month and first_month >= end_month:
+            # لا يوجد شهر كامل داخل الفترة
+            add(items)
+            return totals
+
+        if first_month:
+            balances = balances.filter(period__gte=first_month)
+            add(items.filter(journal_entry__date__lt=cls._month_start(first_month)))
+        if end_month:
+            balances = balances.filter(period__lt=end_month)
+            add(items.filter(journal_entry__date__gte=cls._month_start(end_month)))
+        add(balances)
+        return totals
+
+    @classmethod
+    def rebuild(cls):
+        """إعادة بناء الجدول بالكامل من بنود القيود المرحلة"""
+        from django.db import transaction
+        from django.db.models.functions import TruncMonth
+
+        rows = JournalItem.objects.filter(journal_entry__is_posted=True).order_by().annotate(
+            month=TruncMonth('journal_entry__date')
+        ).values('account_id', 'cost_center_id', 'month').annotate(
+            total_debit=models.Sum('debit'), total_credit=models.Sum('credit')
+        )
+        with transaction.atomic():
+            cls.objects.all().delete()
+            created = cls.objects.bulk_create([
+                cls(account_id=row['account_id'], cost_center_id=row['cost_center_id'],
+                    period=cls.month_of(row['month']),
+                    debit=row['total_debit'] or 0, credit=row['total_credit'] or 0)
+                for row in rows
+            ], batch_size=1000)
+        return len(created)
+
 class FixedAsset(models.Model):
     """إدارة الأصول الثابتة (Fixed Assets)"""
     DEPRECIATION_METHODS = (
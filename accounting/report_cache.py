@@ -0,0 +1,171 @@
+"""
+تخزين نتائج التقارير المحاسبية مؤقتًا مع إبطال تلقائي.
+
+مفتاح كل نتيجة = اسم التقرير + المعاملات بعد توحيدها + رقم إصدار دفتر الأستاذ.
+رقم الإصدار يزيد عند ترحيل القيود وإلغاء ترحيلها وعند تعديل بنودها، فتصبح كل النتائج
+المخزنة قبل التغيير غير مستخدمة دون الحاجة لحذفها (تنتهي صلاحيتها تلقائيًا).
+
+رقم الإصدار عداد ذري في DocumentSequence ('accounting.ledger_version') يزيد بتحديث F() واحد،
+لأن incr في cache الملفات ليس ذريًا فتضيع الزيادات المتزامنة بين العمليات.
+يُقرأ مرة واحدة لكل طلب HTTP (ويُقرأ في كل مرة خارج الطلبات).
+
+الإعدادات (acc/settings.py):
+    ACCOUNTING_REPORT_CACHE: اسم الـ cache في CACHES (الافتراضي 'reports')
+    ACCOUNTING_REPORT_CACHE_TIMEOUT: مدة صلاحية النتيجة بالثواني
+
+عدادات الإصابة والإخفاق تُحفظ في الـ cache الافتراضي (locmem) لكل عملية على حدة،
+فإحصائيات stats() تخص العملية (العامل) التي أجابت الطلب فقط.
+"""
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+from django.db import IntegrityError, transaction
+
+VERSION_SEQUENCE = 'accounting.ledger_version'
+HITS_KEY = 'accounting:report_cache:hits'
+MISSES_KEY = 'accounting:report_cache:misses'
+
+
+def get_cache():
+    """الـ cache المستخدم للتقارير، أو الافتراضي إذا لم يُعرَّف"""
+    alias = getattr(settings, 'ACCOUNTING_REPORT_CACHE', 'reports')
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def get_stats_cache():
+    """الـ cache المستخدم لعدادات الإصابة والإخفاق (locmem: زيادة ذرية داخل العملية)"""
+    return caches['default']
+
+
+def _incr(cache, key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # المفتاح غير موجود (أول استخدام أو تم إفراغ الـ cache)
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+# رقم الإصدار المقروء خلال الطلب الحالي (انظر begin_request / end_request)
+_request = threading.local()
+
+
+def begin_request(**kwargs):
+    """بداية طلب HTTP: يُقرأ رقم الإصدار من قاعدة البيانات مرة واحدة عند أول حاجة إليه"""
+    _request.active = True
+    _request.version = None
+
+
+def end_request(**kwargs):
+    _request.active = False
+    _request.version = None
+
+
+def _sequence():
+    from core.models import DocumentSequence
+    return DocumentSequence.objects.filter(document_type=VERSION_SEQUENCE, branch__isnull=True, year=0)
+
+
+def _read_version():
+    from core.models import DocumentSequence
+    version = _sequence().values_list('last_number', flat=True).first()
+    if version is None:
+        # قيمة بداية مختلفة لكل قاعدة بيانات حتى لا تتطابق مع نتائج مخزنة من قاعدة أخرى في cache مشترك
+        try:
+            with transaction.atomic():
+                DocumentSequence.objects.create(document_type=VERSION_SEQUENCE, branch=None, year=0,
+                                                last_number=int(time.time() * 1000))
+        except IntegrityError:
+            pass
+        version = _sequence().values_list('last_number', flat=True).get()
+    return version
+
+
+def ledger_version():
+    """رقم الإصدار الحالي لدفتر الأستاذ"""
+    if not getattr(_request, 'active', False):
+        return _read_version()
+    if _request.version is None:
+        _request.version = _read_version()
+    return _request.version
+
+
+def bump_ledger_version():
+    """
+    زيادة رقم الإصدار بعد تأكيد المعاملة الحالية (أو فورًا خارج أي معاملة)،
+    حتى لا تُخزَّن نتيجة محسوبة من بيانات لم تُؤكد بعد تحت الإصدار الجديد
+    """
+    from django.db.models import F
+
+    def bump():
+        _read_version()
+        _sequence().update(last_number=F('last_number') + 1)
+        # التقارير التالية في نفس الطلب ترى البيانات الجديدة فتحتاج الإصدار الجديد
+        _request.version = None
+    transaction.on_commit(bump)
+
+
+def stats():
+    """
+    عدادات الإصابة والإخفاق للمراقبة. العدادات خاصة بالعملية الحالية (locmem)،
+    لذلك تُعاد معها scope و pid لتوضيح أي عامل أجاب، أما ledger_version فمشترك.
+    """
+    cache = get_stats_cache()
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else 0,
+        'scope': 'process',
+        'pid': os.getpid(),
+        'ledger_version': ledger_version(),
+    }
+
+
+def _normalize(value):
+    if value is None or value == '':
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _make_key(name, func, args, kwargs):
+    bound = inspect.signature(func).bind(*args, **kwargs)
+    bound.apply_defaults()
+    params = json.dumps({key: _normalize(value) for key, value in bound.arguments.items()}, sort_keys=True)
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return f'accounting:report:{name}:{ledger_version()}:{digest}'
+
+
+def cached_report(name):
+    """مزخرف لدالة تقرير يخزن نتيجتها حسب اسم التقرير ومعاملاته وإصدار دفتر الأستاذ"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            key = _make_key(name, func, args, kwargs)
+            result = cache.get(key)
+            if result is not None:
+                _incr(get_stats_cache(), HITS_KEY)
+                return result
+
+            _incr(get_stats_cache(), MISSES_KEY)
+            result = func(*args, **kwargs)
+            cache.set(key, result, getattr(settings, 'ACCOUNTING_REPORT_CACHE_TIMEOUT', 300))
+            return result
+        return wrapper
+    return decorator
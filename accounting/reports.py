@@ -1,54 +1,87 @@
 from django.db.models import Sum, Q
-from .models import Account, JournalItem, JournalEntry
+from .models import Account, JournalItem, JournalEntry, AccountPeriodBalance
+from .report_cache import cached_report
 from django.utils import timezone
+from django.utils.translation import gettext as _
+from datetime import datetime
 from decimal import Decimal
+import base64
+import binascii
+import json
 
 class AccountingReports:
     """محرك التقارير المحاسبية"""
 
     @staticmethod
+    def _split_balance(account_type, debit, credit):
+        """تحويل مجاميع المدين والدائن إلى رصيد مدين أو دائن حسب طبيعة الحساب"""
+        balance_debit = Decimal('0.00')
+        balance_credit = Decimal('0.00')
+
+        if account_type in ['asset', 'expense']:
+            net = debit - credit
+            if net >= 0:
+                balance_debit = net
+            else:
+                balance_credit = abs(net)
+        else:
+            net = credit - debit
+            if net >= 0:
+                balance_credit = net
+            else:
+                balance_debit = abs(net)
+
+        return balance_debit, balance_credit
+
+    @staticmethod
+    def _rollup(accounts, own_totals):
+        """
+        تجميع مجاميع الحسابات الأب في الذاكرة من مجاميع الحسابات نفسها باستخدام فترات MPTT.
+        accounts: قائمة الحسابات مرتبة حسب (tree_id, lft)
+        own_totals: {account_id: (debit, credit)} للحركات المسجلة على الحساب مباشرة
+        """
+        zero = (Decimal('0.00'), Decimal('0.00'))
+        totals = {}
+        ancestors = []
+        for account in accounts:
+            # إزالة الحسابات التي انتهت فترتها (ليست أسلافًا للحساب الحالي)
+            while ancestors and (ancestors[-1].tree_id != account.tree_id or ancestors[-1].rght < account.lft):
+                ancestors.pop()
+
+            debit, credit = own_totals.get(account.id, zero)
+            totals[account.id] = [debit, credit]
+            if debit or credit:
+                for ancestor in ancestors:
+                    totals[ancestor.id][0] += debit
+                    totals[ancestor.id][1] += credit
+
+            if account.rght - account.lft > 1:
+                ancestors.append(account)
+        return totals
+
+    @staticmethod
+    @cached_report('trial_balance')
     def get_trial_balance(start_date=None, end_date=None, cost_center_id=None):
-        """تقرير ميزان المراجعة"""
-        accounts = Account.objects.all().order_by('code')
+        """
+        تقرير ميزان المراجعة من مجاميع الحسابات المجمعة (أرصدة الفترات وأطراف الفترة من الحركات)،
+        مع تجميع أرصدة الحسابات الأب في الذاكرة. الإجماليات تُحسب من الحركات المسجلة
+        على كل حساب مباشرة حتى لا تتكرر مبالغ الحسابات الفرعية في الحسابات الأب.
+        """
+        # مجاميع الحركات المرحلة لكل حساب حسب التاريخ والمركز التكلفة
+        own_totals = AccountPeriodBalance.totals(start_date, end_date, cost_center_id)
+
+        accounts = list(Account.objects.order_by('tree_id', 'lft'))
+        totals = AccountingReports._rollup(accounts, own_totals)
+
         report_data = []
-        
         total_debit_balance = Decimal('0.00')
         total_credit_balance = Decimal('0.00')
 
-        for account in accounts:
-            # فلترة حركات القيد حسب التاريخ والمركز التكلفة
-            items = JournalItem.objects.filter(account=account, journal_entry__is_posted=True)
-            if start_date:
-                items = items.filter(journal_entry__date__gte=start_date)
-            if end_date:
-                items = items.filter(journal_entry__date__lte=end_date)
-            if cost_center_id:
-                items = items.filter(cost_center_id=cost_center_id)
-
-            aggregates = items.aggregate(
-                total_debit=Sum('debit'),
-                total_credit=Sum('credit')
-            )
-
-            debit = aggregates['total_debit'] or Decimal('0.00')
-            credit = aggregates['total_credit'] or Decimal('0.00')
+        for account in sorted(accounts, key=lambda acc: acc.code):
+            debit, credit = totals[account.id]
 
             # حساب الرصيد النهائي للميزان
-            balance_debit = Decimal('0.00')
-            balance_credit = Decimal('0.00')
-
-            if account.account_type in ['asset', 'expense']:
-                net = debit - credit
-                if net >= 0:
-                    balance_debit = net
-                else:
-                    balance_credit = abs(net)
-            else:
-                net = credit - debit
-                if net >= 0:
-                    balance_credit = net
-                else:
-                    balance_debit = abs(net)
+            balance_debit, balance_credit = AccountingReports._split_balance(account.account_type, debit, credit)
 
             if debit > 0 or credit > 0 or balance_debit > 0 or balance_credit > 0:
                 report_data.append({
@@ -58,8 +91,11 @@ class AccountingReports:
                     'balance_debit': balance_debit,
                     'balance_credit': balance_credit,
                 })
-                total_debit_balance += balance_debit
-                total_credit_balance += balance_credit
+
+            if account.id in own_totals:
+                own_debit, own_credit = AccountingReports._split_balance(account.account_type, *own_totals[account.id])
+                total_debit_balance += own_debit
+                total_credit_balance += own_credit
 
         return {
             'data': report_data,
@@ -69,11 +105,18 @@ class AccountingReports:
         }
 
     @staticmethod
+    @cached_report('profit_loss')
     def get_profit_loss(start_date=None, end_date=None, cost_center_id=None):
         """تقرير قائمة الدخل"""
         income_accounts = Account.objects.filter(account_type='income')
         expense_accounts = Account.objects.filter(account_type='expense')
-        
+
+        totals = AccountPeriodBalance.totals(
+            start_date, end_date, cost_center_id,
+            accounts=Account.objects.filter(account_type__in=['income', 'expense'])
+        )
+        zero = (Decimal('0.00'), Decimal('0.00'))
+
         report_income = []
         report_expense = []
         
@@ -82,17 +125,8 @@ class AccountingReports:
 
         # حساب الإيرادات
         for acc in income_accounts:
-            items = JournalItem.objects.filter(account=acc, journal_entry__is_posted=True)
-            if start_date:
-                items = items.filter(journal_entry__date__gte=start_date)
-            if end_date:
-                items = items.filter(journal_entry__date__lte=end_date)
-            if cost_center_id:
-                items = items.filter(cost_center_id=cost_center_id)
-            
-            balance = items.aggregate(
-                net=Sum('credit') - Sum('debit')
-            )['net'] or Decimal('0.00')
+            debit, credit = totals.get(acc.id, zero)
+            balance = credit - debit
             
             if balance != 0:
                 report_income.append({'account': acc, 'balance': balance})
@@ -100,17 +134,8 @@ class AccountingReports:
 
         # حساب المصروفات
         for acc in expense_accounts:
-            items = JournalItem.objects.filter(account=acc, journal_entry__is_posted=True)
-            if start_date:
-                items = items.filter(journal_entry__date__gte=start_date)
-            if end_date:
-                items = items.filter(journal_entry__date__lte=end_date)
-            if cost_center_id:
-                items = items.filter(cost_center_id=cost_center_id)
-            
-            balance = items.aggregate(
-                net=Sum('debit') - Sum('credit')
-            )['net'] or Decimal('0.00')
+            debit, credit = totals.get(acc.id, zero)
+            balance = debit - credit
             
             if balance != 0:
                 report_expense.append({'account': acc, 'balance': balance})
@@ -127,6 +152,7 @@ class AccountingReports:
         }
 
     @staticmethod
+    @cached_report('balance_sheet')
     def get_balance_sheet(date=None, cost_center_id=None):
         """تقرير الميزانية العمومية"""
         if not date:
@@ -136,18 +162,22 @@ class AccountingReports:
         liabilities = Account.objects.filter(account_type='liability')
         equity = Account.objects.filter(account_type='equity')
 
+        totals = AccountPeriodBalance.totals(
+            end_date=date, cost_center_id=cost_center_id,
+            accounts=Account.objects.filter(account_type__in=['asset', 'liability', 'equity'])
+        )
+        zero = (Decimal('0.00'), Decimal('0.00'))
+
         def get_acc_balance(accounts, as_of_date, cc_id):
             data = []
             total = Decimal('0.00')
             for acc in accounts:
-                items = JournalItem.objects.filter(account=acc, journal_entry__is_posted=True, journal_entry__date__lte=as_of_date)
-                if cc_id:
-                    items = items.filter(cost_center_id=cc_id)
+                debit, credit = totals.get(acc.id, zero)
                 
                 if acc.account_type in ['asset', 'expense']:
-                    balance = items.aggregate(net=Sum('debit') - Sum('credit'))['net'] or Decimal('0.00')
+                    balance = debit - credit
                 else:
-                    balance = items.aggregate(net=Sum('credit') - Sum('debit'))['net'] or Decimal('0.00')
+                    balance = credit - debit
                 
                 if balance != 0:
                     data.append({'account': acc, 'balance': balance})
@@ -177,6 +207,7 @@ class AccountingReports:
         }
 
     @staticmethod
+    @cached_report('vat_report')
     def get_vat_report(start_date=None, end_date=None):
         """تقرير ضريبة القيمة المضافة"""
         from core.models import SystemSettings
@@ -189,23 +220,24 @@ class AccountingReports:
         total_input_vat = Decimal('0.00')  # ضريبة المشتريات (مدين عادة)
         total_output_vat = Decimal('0.00') # ضريبة المبيعات (دائن عادة)
 
+        # البحث عن أي حسابات ضريبة أخرى لم يتم شمولها
+        excluded_ids = []
+        if input_acc: excluded_ids.append(input_acc.id)
+        if output_acc: excluded_ids.append(output_acc.id)
+        
+        other_vat_accounts = list(Account.objects.filter(
+            Q(name__icontains='ضريبة') | Q(name__icontains='VAT') | Q(code__startswith='22')
+        ).exclude(id__in=excluded_ids))
+
+        # مجاميع جميع حسابات الضريبة دفعة واحدة
+        vat_account_ids = excluded_ids + [acc.id for acc in other_vat_accounts]
+        totals = AccountPeriodBalance.totals(start_date, end_date, accounts=vat_account_ids)
+
         # دالة مساعدة لحساب بيانات الحساب
         def get_account_vat_data(acc, label):
             if not acc:
                 return None
-            items = JournalItem.objects.filter(account=acc, journal_entry__is_posted=True)
-            if start_date:
-                items = items.filter(journal_entry__date__gte=start_date)
-            if end_date:
-                items = items.filter(journal_entry__date__lte=end_date)
-            
-            aggregates = items.aggregate(
-                debit=Sum('debit'),
-                credit=Sum('credit')
-            )
-            
-            debit = aggregates['debit'] or Decimal('0.00')
-            credit = aggregates['credit'] or Decimal('0.00')
+            debit, credit = totals.get(acc.id, (Decimal('0.00'), Decimal('0.00')))
             
             if debit > 0 or credit > 0:
                 return {
@@ -229,15 +261,6 @@ class AccountingReports:
             report_data.append(output_data)
             total_output_vat = output_data['credit'] - output_data['debit']
 
-        # البحث عن أي حسابات ضريبة أخرى لم يتم شمولها
-        excluded_ids = []
-        if input_acc: excluded_ids.append(input_acc.id)
-        if output_acc: excluded_ids.append(output_acc.id)
-        
-        other_vat_accounts = Account.objects.filter(
-            Q(name__icontains='ضريبة') | Q(name__icontains='VAT') | Q(code__startswith='22')
-        ).exclude(id__in=excluded_ids)
-        
         for acc in other_vat_accounts:
             data = get_account_vat_data(acc, acc.name)
             if data:
@@ -255,57 +278,149 @@ class AccountingReports:
             'net_vat': total_output_vat - total_input_vat
         }
 
+    # الحقول المطلوبة لسطور دفتر الأستاذ (بدون تحميل كائنات القيود كاملة)
+    LEDGER_FIELDS = ('id', 'journal_entry__date', 'journal_entry__entry_number',
+                     'journal_entry__description', 'memo', 'debit', 'credit')
+
     @staticmethod
-    def get_general_ledger(account_id, start_date=None, end_date=None, cost_center_id=None):
-        """تقرير دفتر الأستاذ لحساب معين"""
-        try:
-            account = Account.objects.get(id=account_id)
-        except Account.DoesNotExist:
-            return None
-        
-        # 1. حساب الرصيد الافتتاحي (قبل تاريخ البداية)
+    def _ledger_items(account, start_date=None, end_date=None, cost_center_id=None):
+        """بنود الحساب المرحلة خلال الفترة مرتبة حسب (تاريخ القيد، المعرف)"""
+        items = JournalItem.objects.filter(account=account, journal_entry__is_posted=True)
+        if start_date:
+            items = items.filter(journal_entry__date__gte=start_date)
+        if end_date:
+            items = items.filter(journal_entry__date__lte=end_date)
+        if cost_center_id:
+            items = items.filter(cost_center_id=cost_center_id)
+        return items.order_by('journal_entry__date', 'id').values(*AccountingReports.LEDGER_FIELDS)
+
+    @staticmethod
+    def _ledger_opening_balance(account, start_date=None, cost_center_id=None):
+        """الرصيد الافتتاحي للحساب (قبل تاريخ البداية)"""
         opening_items = JournalItem.objects.filter(account=account, journal_entry__is_posted=True)
         if start_date:
             opening_items = opening_items.filter(journal_entry__date__lt=start_date)
         if cost_center_id:
             opening_items = opening_items.filter(cost_center_id=cost_center_id)
-            
-        opening_debit = opening_items.aggregate(Sum('debit'))['debit__sum'] or Decimal('0.00')
-        opening_credit = opening_items.aggregate(Sum('credit'))['credit__sum'] or Decimal('0.00')
-        
+
+        totals = opening_items.aggregate(debit=Sum('debit'), credit=Sum('credit'))
+        opening_debit = totals['debit'] or Decimal('0.00')
+        opening_credit = totals['credit'] or Decimal('0.00')
+
+        if account.account_type in ['asset', 'expense']:
+            return opening_debit - opening_credit
+        return opening_credit - opening_debit
+
+    @staticmethod
+    def _ledger_row(account, item, balance):
+        """تحويل بند إلى سطر دفتر الأستاذ وإرجاعه مع الرصيد الجاري بعده"""
         if account.account_type in ['asset', 'expense']:
-            opening_balance = opening_debit - opening_credit
+            balance += (item['debit'] - item['credit'])
         else:
-            opening_balance = opening_credit - opening_debit
-            
-        # 2. الحصول على الحركات خلال الفترة
-        items = JournalItem.objects.filter(account=account, journal_entry__is_posted=True).order_by('journal_entry__date', 'id')
-        if start_date:
-            items = items.filter(journal_entry__date__gte=start_date)
-        if end_date:
-            items = items.filter(journal_entry__date__lte=end_date)
-        if cost_center_id:
-            items = items.filter(cost_center_id=cost_center_id)
-            
+            balance += (item['credit'] - item['debit'])
+
+        return {
+            'id': item['id'],
+            'date': item['journal_entry__date'],
+            'entry_number': item['journal_entry__entry_number'],
+            'description': item['journal_entry__description'],
+            'memo': item['memo'],
+            'debit': item['debit'],
+            'credit': item['credit'],
+            'balance': balance
+        }, balance
+
+    @staticmethod
+    def iter_general_ledger(account, start_date=None, end_date=None, cost_center_id=None,
+                            opening_balance=None, chunk_size=2000):
+        """
+        مولّد سطور دفتر الأستاذ مع الرصيد الجاري، يقرأ البنود على دفعات (iterator)
+        بدلاً من تحميلها كلها في الذاكرة. مناسب للتصدير الكامل.
+        """
+        if opening_balance is None:
+            opening_balance = AccountingReports._ledger_opening_balance(account, start_date, cost_center_id)
+        balance = opening_balance
+        items = AccountingReports._ledger_items(account, start_date, end_date, cost_center_id)
+        for item in items.iterator(chunk_size=chunk_size):
+            row, balance = AccountingReports._ledger_row(account, item, balance)
+            yield row
+
+    @staticmethod
+    def encode_ledger_cursor(date, item_id, balance, opening_balance):
+        """ترميز موضع آخر سطر (التاريخ، المعرف) مع الرصيد الجاري بعده والرصيد الافتتاحي للفترة"""
+        payload = json.dumps({'d': date.isoformat(), 'i': item_id, 'b': str(balance), 'o': str(opening_balance)})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_ledger_cursor(cursor):
+        """فك ترميز المؤشر، ويرفع ValueError إذا كان غير صالح"""
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            return (datetime.fromisoformat(payload['d']), int(payload['i']), Decimal(payload['b']),
+                    Decimal(payload['o']))
+        except (KeyError, TypeError, ValueError, ArithmeticError, binascii.Error) as e:
+            raise ValueError(_("مؤشر الصفحة غير صالح")) from e
+
+    @staticmethod
+    def get_general_ledger_page(account_id, start_date=None, end_date=None, cost_center_id=None,
+                                cursor=None, page_size=100):
+        """
+        صفحة من دفتر الأستاذ بترقيم المفاتيح (Keyset Pagination) على (تاريخ القيد، المعرف).
+        المؤشر يحمل موضع آخر سطر والرصيد الجاري بعده والرصيد الافتتاحي، فلا تُعاد قراءة الصفحات السابقة
+        ولا يُعاد حساب الرصيد الافتتاحي إلا للصفحة الأولى.
+        """
+        try:
+            account = Account.objects.get(id=account_id)
+        except Account.DoesNotExist:
+            return None
+
+        items = AccountingReports._ledger_items(account, start_date, end_date, cost_center_id)
+        if cursor:
+            last_date, last_id, balance, opening_balance = AccountingReports.decode_ledger_cursor(cursor)
+            items = items.filter(
+                Q(journal_entry__date__gt=last_date) | Q(journal_entry__date=last_date, id__gt=last_id)
+            )
+        else:
+            opening_balance = AccountingReports._ledger_opening_balance(account, start_date, cost_center_id)
+            balance = opening_balance
+
+        page = list(items[:page_size + 1])
+        has_more = len(page) > page_size
         report_data = []
-        current_balance = opening_balance
+        for item in page[:page_size]:
+            row, balance = AccountingReports._ledger_row(account, item, balance)
+            report_data.append(row)
+
+        next_cursor = None
+        if has_more and report_data:
+            last = report_data[-1]
+            next_cursor = AccountingReports.encode_ledger_cursor(
+                last['date'], last['id'], last['balance'], opening_balance
+            )
+
+        return {
+            'account': account,
+            'opening_balance': opening_balance,
+            'data': report_data,
+            'next_cursor': next_cursor,
+        }
+
+    @staticmethod
+    def get_general_ledger(account_id, start_date=None, end_date=None, cost_center_id=None):
+        """تقرير دفتر الأستاذ لحساب معين"""
+        try:
+            account = Account.objects.get(id=account_id)
+        except Account.DoesNotExist:
+            return None
         
-        for item in items:
-            if account.account_type in ['asset', 'expense']:
-                current_balance += (item.debit - item.credit)
-            else:
-                current_balance += (item.credit - item.debit)
-                
-            report_data.append({
-                'id': item.id,
-                'date': item.journal_entry.date,
-                'entry_number': item.journal_entry.entry_number,
-                'description': item.journal_entry.description,
-                'memo': item.memo,
-                'debit': item.debit,
-                'credit': item.credit,
-                'balance': current_balance
-            })
+        # 1. حساب الرصيد الافتتاحي (قبل تاريخ البداية)
+        opening_balance = AccountingReports._ledger_opening_balance(account, start_date, cost_center_id)
+            
+        # 2. الحصول على الحركات خلال الفترة مع الرصيد الجاري
+        report_data = list(AccountingReports.iter_general_ledger(
+            account, start_date, end_date, cost_center_id, opening_balance=opening_balance
+        ))
+        current_balance = report_data[-1]['balance'] if report_data else opening_balance
             
         return {
             'account': account,
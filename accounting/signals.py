@@ -0,0 +1,25 @@
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import report_cache
+from .models import Account, JournalItem
+
+
+@receiver([post_save, post_delete], sender=JournalItem)
+def journal_item_changed(sender, instance, **kwargs):
+    """تعديل بند في قيد مرحل يغير نتائج التقارير (الترحيل وإلغاؤه يزيدان الإصدار من JournalEntry)"""
+    entry = getattr(instance, 'journal_entry', None)
+    if entry is not None and entry.is_posted:
+        report_cache.bump_ledger_version()
+
+
+@receiver([post_save, post_delete], sender=Account)
+def account_changed(sender, instance, **kwargs):
+    """أسماء الحسابات وشجرتها جزء من نتائج التقارير المخزنة"""
+    report_cache.bump_ledger_version()
+
+
+# رقم إصدار دفتر الأستاذ يُقرأ مرة واحدة لكل طلب
+request_started.connect(report_cache.begin_request, dispatch_uid='accounting_report_cache_begin')
+request_finished.connect(report_cache.end_request, dispatch_uid='accounting_report_cache_end')
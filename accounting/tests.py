@@ -1,3 +1,84 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.db.models import Sum
 from django.test import TestCase
+from django.utils import timezone
+
+from .models import Account, CostCenter, JournalEntry, JournalItem
+from .reports import AccountingReports
+
+
+def at(year, month, day):
+    return timezone.make_aware(datetime(year, month, day, 12))
+
+
+class TrialBalanceTests(TestCase):
+    """ميزان المراجعة (من أرصدة الفترات) يجب أن يطابق تجميع بنود القيود المرحلة مباشرة"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.assets = Account.objects.create(name='assets', code='1', account_type='asset', is_selectable=False)
+        cls.cash = Account.objects.create(name='cash', code='11', account_type='asset', parent=cls.assets)
+        cls.bank = Account.objects.create(name='bank', code='12', account_type='asset', parent=cls.assets)
+        cls.income = Account.objects.create(name='income', code='4', account_type='income')
+        cls.cost_center = CostCenter.objects.create(name='cc', code='CC1')
+
+        cls.entry(at(2026, 1, 10), [(cls.cash, 100, 0), (cls.income, 0, 100)])
+        cls.entry(at(2026, 1, 20), [(cls.bank, 25, 0), (cls.income, 0, 25)])
+        cls.entry(at(2026, 2, 15), [(cls.bank, 40, 0, cls.cost_center), (cls.income, 0, 40, cls.cost_center)])
+        cls.entry(at(2026, 3, 5), [(cls.cash, 10, 0), (cls.income, 0, 10)])
+        cls.entry(at(2026, 3, 25), [(cls.cash, 0, 15, cls.cost_center), (cls.bank, 15, 0, cls.cost_center)])
+        # قيد غير مرحل وقيد أُلغي ترحيله لا يدخلان في الميزان
+        cls.entry(at(2026, 2, 1), [(cls.cash, 500, 0), (cls.income, 0, 500)], post=False)
+        cls.entry(at(2026, 2, 2), [(cls.cash, 700, 0), (cls.income, 0, 700)]).unpost()
+
+    @classmethod
+    def entry(cls, date, lines, post=True):
+        entry = JournalEntry.objects.create(entry_number=f'J{JournalEntry.objects.count() + 1}', date=date)
+        for account, debit, credit, *cost_center in lines:
+            JournalItem.objects.create(journal_entry=entry, account=account, debit=debit, credit=credit,
+                                       cost_center=cost_center[0] if cost_center else None)
+        if post:
+            entry.post()
+        return entry
+
+    def raw_totals(self, start_date=None, end_date=None, cost_center_id=None):
+        items = JournalItem.objects.filter(journal_entry__is_posted=True)
+        if start_date:
+            items = items.filter(journal_entry__date__gte=start_date)
+        if end_date:
+            items = items.filter(journal_entry__date__lte=end_date)
+        if cost_center_id:
+            items = items.filter(cost_center_id=cost_center_id)
+        return {
+            row['account_id']: (row['debit'], row['credit'])
+            for row in items.order_by().values('account_id').annotate(debit=Sum('debit'), credit=Sum('credit'))
+        }
+
+    def assert_matches_raw(self, start_date=None, end_date=None, cost_center_id=None):
+        # الدالة بدون cache التقارير حتى تُحسب النتيجة فعلاً في كل حالة
+        report = AccountingReports.get_trial_balance.__wrapped__(start_date, end_date, cost_center_id)
+        raw = self.raw_totals(start_date, end_date, cost_center_id)
+        rows = {row['account'].pk: (row['debit'], row['credit']) for row in report['data']}
+
+        for account in (self.cash, self.bank, self.income):
+            self.assertEqual(rows.get(account.pk, (0, 0)), raw.get(account.pk, (0, 0)), account.name)
+        children = [raw.get(account.pk, (Decimal('0'), Decimal('0'))) for account in (self.cash, self.bank)]
+        self.assertEqual(rows.get(self.assets.pk, (0, 0)), tuple(sum(side) for side in zip(*children)))
+        self.assertTrue(report['is_balanced'])
+        return report
+
+    def test_all_dates(self):
+        report = self.assert_matches_raw()
+        self.assertEqual(report['total_debit'], Decimal('175'))
+
+    def test_partial_months(self):
+        self.assert_matches_raw(at(2026, 1, 15), at(2026, 3, 10))
+
+    def test_string_dates(self):
+        self.assert_matches_raw('2026-01-15', '2026-02-28')
 
-# Create your tests here.
+    def test_cost_center(self):
+        self.assert_matches_raw(cost_center_id=self.cost_center.pk)
+        self.assert_matches_raw(at(2026, 2, 1), at(2026, 3, 31), self.cost_center.pk)
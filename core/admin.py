@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from .models import Company, Branch, Store, Safe, Representative, Driver, Contact, SystemSettings
+from .models import Company, Branch, Store, Safe, Representative, Driver, Contact, SystemSettings, DocumentSequence
 
 @admin.register(Company)
 class CompanyAdmin(admin.ModelAdmin):
@@ -74,3 +74,9 @@ class SystemSettingsAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         # منع حذف الإعدادات
         return False
+
+
+@admin.register(DocumentSequence)
+class DocumentSequenceAdmin(admin.ModelAdmin):
+    list_display = ('document_type', 'branch', 'year', 'last_number')
+    list_filter = ('document_type', 'branch', 'year')
@@ -30,9 +30,57 @@ from .serializers import (
 )
 
 class BankViewSet(viewsets.ModelViewSet):
-    queryset = Bank.objects.all()
+    queryset = Bank.objects.select_related('branch').order_by('id')
     serializer_class = BankSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['branch']
+    search_fields = ['name', 'account_number']
+
+class SearchAPIView(APIView):
+    """
+    بحث موحد مرتب حسب الصلة (core/search.py):
+    ?q=<نص>&kind=contact,product,invoice,journal_entry&limit=20&offset=0
+    """
+    permission_classes = [IsAuthenticated]
+    max_limit = 100
+
+    def get(self, request):
+        from rest_framework.utils.urls import remove_query_param, replace_query_param
+        from . import search
+        from .models import SearchDocument
+
+        query = request.query_params.get('q', '').strip()
+        kinds = [kind for kind in request.query_params.get('kind', '').split(',') if kind]
+        valid_kinds = dict(SearchDocument.KIND_CHOICES)
+        if any(kind not in valid_kinds for kind in kinds):
+            return Response({'error': f"kind must be one of {', '.join(valid_kinds)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), self.max_limit)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({'error': 'limit and offset must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        count, hits = search.search_page(query, kinds, limit, offset)
+        url = request.build_absolute_uri()
+        next_url = replace_query_param(replace_query_param(url, 'limit', limit), 'offset', offset + limit) \
+            if offset + limit < count else None
+        previous_url = None
+        if offset > 0:
+            previous_url = replace_query_param(url, 'limit', limit)
+            previous_url = replace_query_param(previous_url, 'offset', offset - limit) \
+                if offset - limit > 0 else remove_query_param(previous_url, 'offset')
+        return Response({
+            'count': count,
+            'next': next_url,
+            'previous': previous_url,
+            'results': [{
+                'kind': hit.kind,
+                'kind_display': valid_kinds[hit.kind],
+                'id': hit.object_id,
+                'label': hit.label,
+                'rank': getattr(hit, 'rank', None),
+            } for hit in hits],
+        })
 
 class DashboardStatsAPIView(APIView):
     permission_classes = [IsAuthenticated]
@@ -170,43 +218,49 @@ class SystemSettingsViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 class CompanyViewSet(viewsets.ModelViewSet):
-    queryset = Company.objects.all()
+    queryset = Company.objects.order_by('id')
     serializer_class = CompanySerializer
     permission_classes = [IsAuthenticated]
+    search_fields = ['name']
 
 class BranchViewSet(viewsets.ModelViewSet):
-    queryset = Branch.objects.all()
+    queryset = Branch.objects.select_related('company').order_by('id')
     serializer_class = BranchSerializer
     permission_classes = [IsAuthenticated]
-
-    def get_queryset(self):
-        queryset = Branch.objects.all()
-        company_id = self.request.query_params.get('company', None)
-        if company_id is not None:
-            queryset = queryset.filter(company_id=company_id)
-        return queryset
+    filterset_fields = ['company']
+    search_fields = ['name']
 
 class StoreViewSet(viewsets.ModelViewSet):
-    queryset = Store.objects.all()
+    queryset = Store.objects.select_related('branch').order_by('id')
     serializer_class = StoreSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['branch']
+    search_fields = ['name']
 
 class SafeViewSet(viewsets.ModelViewSet):
-    queryset = Safe.objects.all()
+    queryset = Safe.objects.select_related('branch').order_by('id')
     serializer_class = SafeSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['branch']
+    search_fields = ['name']
 
 class ContactViewSet(viewsets.ModelViewSet):
-    queryset = Contact.objects.all()
+    queryset = Contact.objects.order_by('id')
     serializer_class = ContactSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['contact_type']
+    search_fields = ['name', 'phone', 'tax_number']
+    search_index = [('contact', 'pk')]
+    ordering_fields = ['name', 'current_balance']
 
 class RepresentativeViewSet(viewsets.ModelViewSet):
-    queryset = Representative.objects.all()
+    queryset = Representative.objects.order_by('id')
     serializer_class = RepresentativeSerializer
     permission_classes = [IsAuthenticated]
+    search_fields = ['name', 'phone']
 
 class DriverViewSet(viewsets.ModelViewSet):
-    queryset = Driver.objects.all()
+    queryset = Driver.objects.order_by('id')
     serializer_class = DriverSerializer
     permission_classes = [IsAuthenticated]
+    search_fields = ['name', 'phone']
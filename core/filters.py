@@ -0,0 +1,54 @@
+"""
+فلاتر مشتركة لواجهات DRF (django-filter).
+"""
+from datetime import datetime, time, timedelta
+
+import django_filters
+from django.db import models
+from django.utils import timezone
+from rest_framework.filters import SearchFilter
+
+
+class DateRangeFilterSet(django_filters.FilterSet):
+    """
+    فلترة بفترة تاريخ: ?start_date=YYYY-MM-DD&end_date=YYYY-MM-DD (الطرفان شاملان).
+    حقول DateTimeField تُقارن ببداية اليوم المحلي حتى يُستخدم فهرس التاريخ بدلاً من تحويل كل صف.
+    """
+    date_field = 'date'
+
+    start_date = django_filters.DateFilter(method='filter_start_date')
+    end_date = django_filters.DateFilter(method='filter_end_date')
+
+    def _day_start(self, queryset, day):
+        if isinstance(queryset.model._meta.get_field(self.date_field), models.DateTimeField):
+            return timezone.make_aware(datetime.combine(day, time.min))
+        return day
+
+    def filter_start_date(self, queryset, name, value):
+        return queryset.filter(**{f'{self.date_field}__gte': self._day_start(queryset, value)})
+
+    def filter_end_date(self, queryset, name, value):
+        return queryset.filter(**{f'{self.date_field}__lt': self._day_start(queryset, value + timedelta(days=1))})
+
+
+class IndexedSearchFilter(SearchFilter):
+    """
+    ?search= عبر فهرس البحث الموحد (core/search.py) للواجهات التي تعرّف search_index،
+    مثل: search_index = [('invoice', 'pk'), ('contact', 'contact_id')]
+    وباقي الواجهات تستخدم search_fields كالمعتاد.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_index = getattr(view, 'search_index', None)
+        if not search_index:
+            return super().filter_queryset(request, queryset, view)
+        from django.db.models import Q
+        from core import search
+
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        condition = Q()
+        for kind, field in search_index:
+            condition |= search.q(kind, query, field)
+        return queryset.filter(condition)
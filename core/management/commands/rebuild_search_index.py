@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from core import search
+
+class Command(BaseCommand):
+    help = 'Rebuild the unified search index (contacts, products, invoices, journal entries)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', choices=list(search.SOURCES),
+                            help='Only rebuild this kind (can be repeated)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Rebuilding search index at {timezone.now()} (backend: {search.backend()})'))
+        try:
+            with transaction.atomic():
+                counts = search.rebuild(options['kind'])
+        except Exception as e:
+            raise CommandError(f'Could not rebuild search index: {e}')
+        for kind, count in counts.items():
+            self.stdout.write(self.style.SUCCESS(f'{kind}: {count} documents'))
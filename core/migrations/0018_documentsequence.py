@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+import re
+
+# (نوع المستند، التطبيق، النموذج، فلتر، البادئة) - نسخة ثابتة من DocumentSequence.FORMATS
+SOURCES = [
+    ("invoice.sale", "invoices", "Invoice", {"invoice_type": "sale"}, ""),
+    ("invoice.purchase", "invoices", "Invoice", {"invoice_type": "purchase"}, ""),
+    ("invoice.sale_return", "invoices", "Invoice", {"invoice_type": "sale_return"}, ""),
+    ("invoice.purchase_return", "invoices", "Invoice", {"invoice_type": "purchase_return"}, ""),
+    ("payment.payment", "invoices", "Payment", {"payment_type": "payment"}, "PAY-"),
+    ("payment.receipt", "invoices", "Payment", {"payment_type": "receipt"}, "REC-"),
+    ("store_permit", "finances", "StorePermit", {}, "PER-"),
+    ("store_permit.issue", "finances", "StorePermit", {}, "ISS-"),
+    ("store_permit.receive", "finances", "StorePermit", {}, "REC-"),
+    ("expense", "finances", "Expense", {}, "EXP-"),
+    ("income", "finances", "Income", {}, "INC-"),
+    ("safe_deposit", "finances", "SafeDeposit", {}, "DEP-"),
+    ("safe_withdrawal", "finances", "SafeWithdrawal", {}, "WDR-"),
+    ("money_transfer", "finances", "MoneyTransfer", {}, "TRF-"),
+    ("inventory_adjustment", "finances", "InventoryAdjustment", {}, "ADJ-"),
+    ("stock_transfer", "finances", "StockTransfer", {}, "TRF-ST-"),
+]
+
+
+def seed_sequences(apps, schema_editor):
+    """بدء كل تسلسل من أكبر رقم مستخدم حاليًا (آخر مجموعة أرقام، مع تجاهل ما يشبه الطوابع الزمنية)"""
+    DocumentSequence = apps.get_model("core", "DocumentSequence")
+    for document_type, app_label, model_name, filters, prefix in SOURCES:
+        model = apps.get_model(app_label, model_name)
+        numbers = model.objects.filter(number__startswith=prefix, **filters).values_list("number", flat=True)
+        last_number = 0
+        for number in numbers.iterator():
+            digits = re.findall(r"\d+", number or "")
+            if digits and last_number < int(digits[-1]) < 1000000000:
+                last_number = int(digits[-1])
+        if last_number:
+            DocumentSequence.objects.create(document_type=document_type, year=0, last_number=last_number)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_systemsettings_link_cost_centers_and_more"),
+        ("finances", "0023_balancecheckpoint"),
+        ("invoices", "0007_invoice_discount_type_invoice_discount_value_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentSequence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "document_type",
+                    models.CharField(max_length=50, verbose_name="نوع المستند"),
+                ),
+                (
+                    "year",
+                    models.PositiveIntegerField(
+                        default=0,
+                        help_text="0 = تسلسل واحد لكل السنوات",
+                        verbose_name="السنة",
+                    ),
+                ),
+                (
+                    "last_number",
+                    models.PositiveBigIntegerField(default=0, verbose_name="آخر رقم"),
+                ),
+                (
+                    "branch",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="document_sequences",
+                        to="core.branch",
+                        verbose_name="الفرع",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "تسلسل مستندات",
+                "verbose_name_plural": "تسلسلات المستندات",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("document_type", "branch", "year"),
+                        name="docseq_type_branch_year_uniq",
+                    ),
+                    models.UniqueConstraint(
+                        condition=models.Q(("branch__isnull", True)),
+                        fields=("document_type", "year"),
+                        name="docseq_type_year_no_branch_uniq",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_contact_contact_type_name_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("contact", "جهة اتصال"),
+                            ("product", "منتج"),
+                            ("invoice", "فاتورة"),
+                            ("journal_entry", "قيد محاسبي"),
+                        ],
+                        max_length=20,
+                        verbose_name="النوع",
+                    ),
+                ),
+                ("object_id", models.PositiveBigIntegerField(verbose_name="المعرف")),
+                ("label", models.CharField(max_length=255, verbose_name="العنوان")),
+                ("title", models.CharField(max_length=255, verbose_name="نص العنوان")),
+                ("body", models.TextField(blank=True, verbose_name="نص المحتوى")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "مستند بحث",
+                "verbose_name_plural": "مستندات البحث",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "object_id"),
+                        name="search_document_kind_object_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+from django.db import migrations
+
+
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS core_searchdocument_fts USING fts5("
+    "title, body, content='core_searchdocument', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS core_searchdocument_ai AFTER INSERT ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS core_searchdocument_ad AFTER DELETE ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, title, body) "
+    "VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS core_searchdocument_au AFTER UPDATE ON core_searchdocument BEGIN "
+    "INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, title, body) "
+    "VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO core_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+]
+
+FTS_REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS core_searchdocument_au",
+    "DROP TRIGGER IF EXISTS core_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS core_searchdocument_ai",
+    "DROP TABLE IF EXISTS core_searchdocument_fts",
+]
+
+POSTGRES_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS core_searchdocument_tsv_idx ON core_searchdocument USING gin ("
+    "(setweight(to_tsvector('simple'::regconfig, COALESCE(title, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, COALESCE(body, '')), 'B')))",
+    "CREATE INDEX IF NOT EXISTS core_searchdocument_title_trgm_idx ON core_searchdocument USING gin (title gin_trgm_ops)",
+]
+
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS core_searchdocument_title_trgm_idx",
+    "DROP INDEX IF EXISTS core_searchdocument_tsv_idx",
+]
+
+
+def _execute(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    from django.db import DatabaseError
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            _execute(schema_editor, FTS_SQL)
+        except DatabaseError:
+            # SQLite بدون FTS5: البحث يعمل على جدول المستندات مباشرة
+            pass
+    elif vendor == 'postgresql':
+        _execute(schema_editor, POSTGRES_SQL)
+
+    from core import search
+    search.rebuild(apps=apps)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _execute(schema_editor, FTS_REVERSE_SQL)
+    elif vendor == 'postgresql':
+        _execute(schema_editor, POSTGRES_REVERSE_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0020_searchdocument"),
+        ("products", "0005_product_product_barcode_idx_product_product_code_idx_and_more"),
+        ("invoices", "0007_invoice_discount_type_invoice_discount_value_and_more"),
+        ("accounting", "0006_journalentry_journal_entry_date_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
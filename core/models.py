@@ -47,7 +47,56 @@ class Store(models.Model):
     def __str__(self):
         return f"{self.name} - {self.branch.name}"
 
-class Safe(models.Model):
+class OpeningBalanceMixin:
+    """
+    الرصيد الحالي للخزنة أو البنك = الرصيد الافتتاحي + أثر الحركات، وتحدّثه حركات SafeTransaction تزايديًا.
+    لذلك لا يكتب الحفظ العادي الرصيد الحالي (حتى لا تضيع تحديثات الحركات المتزامنة)،
+    وتغيير الرصيد الافتتاحي يزيح الرصيد الحالي وأرصدة كل الحركات بنفس الفرق.
+    """
+
+    def _ledger_transactions(self):
+        """حركات هذا الكائن بنفس قاعدة SafeTransaction._owner_filter (الخزنة لها الأولوية)"""
+        from finances.models import SafeTransaction
+        if isinstance(self, Safe):
+            return SafeTransaction.objects.filter(safe_id=self.pk)
+        return SafeTransaction.objects.filter(bank_id=self.pk, safe__isnull=True)
+
+    def save(self, *args, **kwargs):
+        from django.db import transaction
+        from django.db.models import F
+
+        if self.pk is None:
+            self.current_balance = self.initial_balance
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic():
+            old_initial = type(self).objects.select_for_update().filter(pk=self.pk) \
+                .values_list('initial_balance', flat=True).first()
+            if old_initial is None:
+                super().save(*args, **kwargs)
+                return
+            if kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name != 'current_balance'
+                ]
+            else:
+                kwargs['update_fields'] = [name for name in kwargs['update_fields'] if name != 'current_balance']
+            if kwargs['update_fields']:
+                super().save(*args, **kwargs)
+
+            delta = self.initial_balance - old_initial
+            if delta and 'initial_balance' in kwargs['update_fields']:
+                self._ledger_transactions().update(
+                    balance_before=F('balance_before') + delta,
+                    balance_after=F('balance_after') + delta,
+                )
+                type(self).objects.filter(pk=self.pk).update(current_balance=F('current_balance') + delta)
+
+        self.refresh_from_db(fields=['current_balance'])
+
+class Safe(OpeningBalanceMixin, models.Model):
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='safes', verbose_name=_("الفرع"))
     name = models.CharField(_("اسم الخزنة"), max_length=255)
     initial_balance = models.DecimalField(_("الرصيد الافتتاحي"), max_digits=15, decimal_places=2, default=0)
@@ -62,7 +111,7 @@ class Safe(models.Model):
     def __str__(self):
         return f"{self.name} - {self.branch.name}"
 
-class Bank(models.Model):
+class Bank(OpeningBalanceMixin, models.Model):
     branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name='banks', verbose_name=_("الفرع"))
     name = models.CharField(_("اسم البنك"), max_length=255)
     account_number = models.CharField(_("رقم الحساب"), max_length=50, blank=True, null=True)
@@ -158,6 +207,9 @@ class Contact(models.Model):
     class Meta:
         verbose_name = _("جهة اتصال")
         verbose_name_plural = _("جهات الاتصال")
+        indexes = [
+            models.Index(fields=['contact_type', 'name'], name='contact_type_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.get_contact_type_display()}"
@@ -279,3 +331,187 @@ class SystemSettings(models.Model):
         """الحصول على إعدادات النظام، أو إنشاء إعدادات افتراضية إذا لم تكن موجودة"""
         settings, created = cls.objects.get_or_create(pk=1)
         return settings
+
+
+class DocumentSequence(models.Model):
+    """
+    عداد أرقام المستندات (فواتير، سندات، أذونات...) لكل نوع مستند، ويمكن تخصيصه لكل فرع و/أو سنة.
+    الرقم التالي يُحجز بتحديث ذري للصف داخل معاملة، فلا يحصل طلبان متزامنان على نفس الرقم.
+    """
+
+    # البادئة وعدد الخانات لكل نوع مستند
+    FORMATS = {
+        'invoice.sale': ('', 0),
+        'invoice.purchase': ('', 0),
+        'invoice.sale_return': ('', 0),
+        'invoice.purchase_return': ('', 0),
+        'payment.payment': ('PAY-', 0),
+        'payment.receipt': ('REC-', 0),
+        'store_permit': ('PER-', 4),
+        'store_permit.issue': ('ISS-', 4),
+        'store_permit.receive': ('REC-', 4),
+        'expense': ('EXP-', 4),
+        'income': ('INC-', 4),
+        'safe_deposit': ('DEP-', 4),
+        'safe_withdrawal': ('WDR-', 4),
+        'money_transfer': ('TRF-', 0),
+        'inventory_adjustment': ('ADJ-', 0),
+        'stock_transfer': ('TRF-ST-', 0),
+        'journal_entry.invoice_adjustment': ('INV-ADJ-', 0),
+        'products.catalog': ('', 0),
+        'accounting.ledger_version': ('', 0),
+    }
+
+    # الأرقام الأكبر من ذلك تشبه الطوابع الزمنية ولا تُعتبر جزءًا من التسلسل
+    MAX_NUMBER = 1000000000
+
+    document_type = models.CharField(_("نوع المستند"), max_length=50)
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='document_sequences', verbose_name=_("الفرع"))
+    year = models.PositiveIntegerField(_("السنة"), default=0, help_text=_("0 = تسلسل واحد لكل السنوات"))
+    last_number = models.PositiveBigIntegerField(_("آخر رقم"), default=0)
+
+    class Meta:
+        verbose_name = _("تسلسل مستندات")
+        verbose_name_plural = _("تسلسلات المستندات")
+        constraints = [
+            models.UniqueConstraint(fields=['document_type', 'branch', 'year'], name='docseq_type_branch_year_uniq'),
+            models.UniqueConstraint(fields=['document_type', 'year'], condition=models.Q(branch__isnull=True),
+                                    name='docseq_type_year_no_branch_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.document_type} - {self.last_number}"
+
+    @classmethod
+    def _scope(cls, document_type, branch=None, year=None):
+        return {'document_type': document_type, 'branch': branch, 'year': year or 0}
+
+    @classmethod
+    def _ensure(cls, scope):
+        """إنشاء صف التسلسل إذا لم يكن موجودًا (مع تحمل إنشائه من طلب متزامن)"""
+        from django.db import IntegrityError, transaction
+        if cls.objects.filter(**scope).exists():
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(**scope)
+        except IntegrityError:
+            pass
+
+    @classmethod
+    def format(cls, document_type, value):
+        prefix, width = cls.FORMATS.get(document_type, ('', 0))
+        return f"{prefix}{value:0{width}d}"
+
+    @classmethod
+    def peek(cls, document_type, branch=None, year=None):
+        """الرقم التالي المتوقع للعرض فقط (بدون حجزه)"""
+        last = cls.objects.filter(**cls._scope(document_type, branch, year)).values_list('last_number', flat=True).first()
+        return cls.format(document_type, (last or 0) + 1)
+
+    @classmethod
+    def reserve(cls, document_type, count, branch=None, year=None):
+        """حجز عدد من الأرقام المتتالية بتحديث واحد (للاستيراد الجماعي) وإرجاعها منسقة"""
+        from django.db import transaction
+        if count <= 0:
+            return []
+        scope = cls._scope(document_type, branch, year)
+        with transaction.atomic():
+            cls._ensure(scope)
+            # التحديث يقفل الصف حتى نهاية المعاملة، ثم نقرأ القيمة التي حجزناها
+            cls.objects.filter(**scope).update(last_number=models.F('last_number') + count)
+            last = cls.objects.filter(**scope).values_list('last_number', flat=True).get()
+        return [cls.format(document_type, value) for value in range(last - count + 1, last + 1)]
+
+    @classmethod
+    def next_number(cls, document_type, branch=None, year=None):
+        """حجز الرقم التالي وإرجاعه منسقًا"""
+        return cls.reserve(document_type, 1, branch, year)[0]
+
+    @classmethod
+    def observe(cls, document_type, numbers, branch=None, year=None):
+        """
+        تقديم التسلسل إلى أكبر رقم بصيغته من أرقام محفوظة كما هي (مثل أرقام فواتير مستوردة)
+        حتى لا يصدر التسلسل لاحقًا رقمًا مستخدمًا
+        """
+        import re
+        from django.db import transaction
+        prefix, width = cls.FORMATS.get(document_type, ('', 0))
+        pattern = re.compile(re.escape(prefix) + r'(\d+)')
+        values = [int(match.group(1)) for match in (pattern.fullmatch(str(number).strip()) for number in numbers if number)
+                  if match and int(match.group(1)) < cls.MAX_NUMBER]
+        if not values:
+            return
+        scope = cls._scope(document_type, branch, year)
+        with transaction.atomic():
+            cls._ensure(scope)
+            cls.objects.filter(**scope, last_number__lt=max(values)).update(last_number=max(values))
+
+    @classmethod
+    def claim(cls, document_type, number=None, branch=None, year=None, documents=None):
+        """
+        تحديد رقم مستند جديد:
+        - بدون رقم: يُحجز الرقم التالي
+        - رقم بصيغة التسلسل لم يُستخدم بعد: يُقبل ويتقدم التسلسل إليه
+        - رقم بصيغة التسلسل سبق حجزه ومستخدم فعلاً في documents (اقتراح قديم عرضه نموذج آخر):
+          يُستبدل بالرقم التالي، أما الرقم المحجوز غير المستخدم (فجوة أو رقم محذوف) فيُقبل كما هو
+        - رقم بصيغة أخرى (رقم يدوي): يُحفظ كما هو
+        documents: استعلام مستندات نفس النوع للتحقق من استخدام الرقم (حقل number)،
+        وبدونه يُستبدل أي رقم سبق حجزه.
+        """
+        import re
+        from django.db import transaction
+        if not number:
+            return cls.next_number(document_type, branch, year)
+
+        prefix, width = cls.FORMATS.get(document_type, ('', 0))
+        match = re.fullmatch(re.escape(prefix) + r'(\d+)', str(number).strip())
+        if not match or int(match.group(1)) >= cls.MAX_NUMBER:
+            return number
+
+        value = int(match.group(1))
+        scope = cls._scope(document_type, branch, year)
+        with transaction.atomic():
+            cls._ensure(scope)
+            if cls.objects.filter(**scope, last_number__lt=value).update(last_number=value):
+                return number
+            if documents is not None and not documents.filter(number=number).exists():
+                return number
+        return cls.next_number(document_type, branch, year)
+
+
+class SearchDocument(models.Model):
+    """
+    مستند في فهرس البحث الموحد (core/search.py): صف لكل جهة اتصال/منتج/فاتورة/قيد.
+    title و body نص مُطبَّع للبحث، و label النص الأصلي للعرض.
+    على SQLite يُفهرس بجدول FTS5 (core_searchdocument_fts) تحدّثه triggers قاعدة البيانات.
+    """
+    CONTACT = 'contact'
+    PRODUCT = 'product'
+    INVOICE = 'invoice'
+    JOURNAL_ENTRY = 'journal_entry'
+
+    KIND_CHOICES = [
+        (CONTACT, _("جهة اتصال")),
+        (PRODUCT, _("منتج")),
+        (INVOICE, _("فاتورة")),
+        (JOURNAL_ENTRY, _("قيد محاسبي")),
+    ]
+
+    kind = models.CharField(_("النوع"), max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField(_("المعرف"))
+    label = models.CharField(_("العنوان"), max_length=255)
+    title = models.CharField(_("نص العنوان"), max_length=255)
+    body = models.TextField(_("نص المحتوى"), blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _("مستند بحث")
+        verbose_name_plural = _("مستندات البحث")
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_document_kind_object_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} {self.label}"
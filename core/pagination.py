@@ -0,0 +1,25 @@
+"""
+ترقيم صفحات واجهات DRF.
+
+كل قائمة مرقمة دائمًا حتى لا يعيد طلب واحد جدولاً كاملاً:
+- StandardPagination (الافتراضي لكل الواجهات): ?limit=50&offset=100
+  يعيد {'count', 'next', 'previous', 'results'}، وبدون limit يعيد PAGE_SIZE صف
+- LedgerCursorPagination (دفاتر الحركات الكبيرة): ?limit=100 ثم رابط next (?cursor=...)
+  ترقيم بالمؤشر على (التاريخ، المعرف) بدون COUNT ولا OFFSET، فيبقى سريعًا مهما كبر الدفتر
+الشاشات التي تحتاج القائمة كاملة (القوائم المرجعية مثل الخزن والمخازن) تطلب ?limit=500 صراحة،
+ولا يُقبل أكثر من max_limit في الطلب الواحد.
+"""
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.settings import api_settings
+
+
+class StandardPagination(LimitOffsetPagination):
+    default_limit = api_settings.PAGE_SIZE
+    max_limit = 500
+
+
+class LedgerCursorPagination(CursorPagination):
+    ordering = ('-date', '-id')
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = 500
@@ -0,0 +1,250 @@
+"""
+البحث الموحد في جهات الاتصال والمنتجات والفواتير والقيود المحاسبية.
+
+كل كائن مفهرس له صف في SearchDocument يُحدَّث من الإشارات (core/signals.py):
+- SQLite: جدول FTS5 خارجي المحتوى (core_searchdocument_fts) تحدّثه triggers، والترتيب بـ bm25
+- PostgreSQL: فهارس GIN على tsvector و trigram للعنوان، والترتيب بـ SearchRank
+- غير ذلك: icontains على جدول المستندات وحده (بدون joins)
+
+النص يُطبَّع قبل الفهرسة والبحث (إزالة التشكيل وتوحيد الألف والياء والتاء المربوطة) حتى
+يطابق "احمد" كلمة "أحمد".
+
+الاستخدام من الشاشات:
+    invoices.filter(search.q('invoice', query) | search.q('contact', query, 'contact_id'))
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import SearchDocument
+
+FTS_TABLE = 'core_searchdocument_fts'
+
+# النوع -> (النموذج، حقل العنوان، حقول المحتوى)
+SOURCES = {
+    SearchDocument.CONTACT: ('core.Contact', 'name', ['phone', 'alternative_phone', 'email', 'tax_number']),
+    SearchDocument.PRODUCT: ('products.Product', 'name', ['code', 'barcode']),
+    SearchDocument.INVOICE: ('invoices.Invoice', 'number', ['notes']),
+    SearchDocument.JOURNAL_ENTRY: ('accounting.JournalEntry', 'entry_number', ['reference', 'description']),
+}
+
+_DIACRITICS = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_LETTERS = str.maketrans({'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ى': 'ي', 'ة': 'ه', 'ؤ': 'و', 'ئ': 'ي'})
+_TOKEN = re.compile(r'\w+')
+_DIGIT = re.compile(r'\d')
+
+
+def normalize(text):
+    """تطبيع النص العربي للبحث"""
+    if not text:
+        return ''
+    return _DIACRITICS.sub('', str(text)).translate(_LETTERS).lower()
+
+
+def backend():
+    if connection.vendor == 'sqlite':
+        return 'fts5' if fts5_available() else 'basic'
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    return 'basic'
+
+
+_fts5_ready = set()
+
+
+def fts5_available():
+    """هل أُنشئ جدول FTS5 (يتطلب SQLite مبنيًا بدعم FTS5)؟ يُحفظ الجواب الإيجابي لكل اتصال"""
+    if connection.alias in _fts5_ready:
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        if cursor.fetchone()[0]:
+            _fts5_ready.add(connection.alias)
+            return True
+    return False
+
+
+def kind_of(instance):
+    label = instance._meta.label
+    for kind, (model_label, _title, _body) in SOURCES.items():
+        if model_label == label:
+            return kind
+    return None
+
+
+def indexed_fields(kind):
+    _model, title_field, body_fields = SOURCES[kind]
+    return {title_field, *body_fields}
+
+
+def _document(kind, obj):
+    _model, title_field, body_fields = SOURCES[kind]
+    label = str(getattr(obj, title_field) or '')[:255]
+    parts = (getattr(obj, field) for field in body_fields)
+    return SearchDocument(
+        kind=kind, object_id=obj.pk, label=label, title=normalize(label)[:255],
+        body=' '.join(normalize(part) for part in parts if part),
+    )
+
+
+def index(instance, update_fields=None, created=False):
+    """
+    فهرسة كائن واحد أو تحديث فهرسه باستعلام واحد في الغالب
+    (لا شيء إذا لم تتغير الحقول المفهرسة في update_fields)
+    """
+    kind = kind_of(instance)
+    if kind is None or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & indexed_fields(kind):
+        return
+    doc = _document(kind, instance)
+    if not created and SearchDocument.objects.filter(kind=kind, object_id=instance.pk).update(
+            label=doc.label, title=doc.title, body=doc.body):
+        return
+    doc.save(force_insert=True)
+
+
+def index_many(kind, objects):
+    """فهرسة دفعة كائنات (للإنشاء الجماعي bulk_create الذي لا يرسل إشارات)"""
+    docs = [_document(kind, obj) for obj in objects if obj.pk is not None]
+    SearchDocument.objects.bulk_create(
+        docs, batch_size=500, update_conflicts=True,
+        unique_fields=['kind', 'object_id'], update_fields=['label', 'title', 'body'],
+    )
+
+
+def unindex(instance):
+    kind = kind_of(instance)
+    if kind is not None:
+        SearchDocument.objects.filter(kind=kind, object_id=instance.pk).delete()
+
+
+def rebuild(kinds=None, apps=None):
+    """
+    إعادة بناء الفهرس بالكامل (أمر rebuild_search_index وترحيل إنشاء الفهرس).
+    apps: سجل النماذج التاريخي عند الاستدعاء من ترحيل
+    """
+    from django.apps import apps as global_apps
+    apps = apps or global_apps
+    document_model = apps.get_model('core', 'SearchDocument')
+    counts = {}
+    for kind in kinds or SOURCES:
+        model = apps.get_model(SOURCES[kind][0])
+        document_model.objects.filter(kind=kind).delete()
+        docs = []
+        for obj in model.objects.order_by('pk').iterator(chunk_size=2000):
+            doc = _document(kind, obj)
+            docs.append(document_model(kind=kind, object_id=doc.object_id, label=doc.label,
+                                       title=doc.title, body=doc.body))
+        document_model.objects.bulk_create(docs, batch_size=500)
+        counts[kind] = len(docs)
+    return counts
+
+
+def _tokens(query):
+    return _TOKEN.findall(normalize(query))
+
+
+def _fts_query(tokens):
+    # كل كلمة مطلوبة، مع مطابقة البادئة للبحث أثناء الكتابة
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _pg_query(tokens):
+    from django.contrib.postgres.search import SearchQuery
+    return SearchQuery(' & '.join(f'{token}:*' for token in tokens), search_type='raw', config='simple')
+
+
+def _pg_documents(tokens):
+    from django.contrib.postgres.search import SearchRank, SearchVector, TrigramSimilarity
+    vector = SearchVector('title', weight='A', config='simple') + SearchVector('body', weight='B', config='simple')
+    text = ' '.join(tokens)
+    return SearchDocument.objects.annotate(
+        rank=SearchRank(vector, _pg_query(tokens)) + TrigramSimilarity('title', text),
+        similarity=TrigramSimilarity('title', text),
+    ).filter(Q(rank__gt=0.05) | Q(similarity__gt=0.3))
+
+
+def documents(query, kinds=None):
+    """
+    مستندات البحث المطابقة مرتبة حسب الصلة (PostgreSQL) أو حسب العنوان (بدون FTS5).
+    على FTS5 استخدم search_page؛ للتصفية داخل استعلام آخر استخدم q()
+    """
+    tokens = _tokens(query)
+    if not tokens:
+        return SearchDocument.objects.none()
+    engine = backend()
+    if engine == 'postgresql':
+        docs = _pg_documents(tokens)
+        if kinds:
+            docs = docs.filter(kind__in=kinds)
+        return docs.order_by('-rank', 'kind', 'object_id')
+
+    docs = SearchDocument.objects.all()
+    for token in tokens:
+        docs = docs.filter(Q(title__contains=token) | Q(body__contains=token))
+    if kinds:
+        docs = docs.filter(kind__in=kinds)
+    return docs.order_by('kind', 'title', 'object_id')
+
+
+def search_page(query, kinds=None, limit=50, offset=0):
+    """صفحة نتائج مرتبة وعدد النتائج الكلي: (count, [SearchDocument مع rank])"""
+    tokens = _tokens(query)
+    if not tokens:
+        return 0, []
+    if backend() != 'fts5':
+        docs = documents(query, kinds)
+        return docs.count(), list(docs[offset:offset + limit])
+
+    where = f'{FTS_TABLE} MATCH %s'
+    params = [_fts_query(tokens)]
+    if kinds:
+        where += f" AND d.kind IN ({', '.join(['%s'] * len(kinds))})"
+        params += list(kinds)
+    source = f'FROM {FTS_TABLE} JOIN core_searchdocument d ON d.id = {FTS_TABLE}.rowid WHERE {where}'
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) {source}', params)
+        count = cursor.fetchone()[0]
+    # العنوان أهم من المحتوى في الترتيب
+    hits = SearchDocument.objects.raw(
+        f'SELECT d.*, bm25({FTS_TABLE}, 10.0, 1.0) AS rank {source} ORDER BY rank LIMIT %s OFFSET %s',
+        params + [limit, offset],
+    )
+    return count, list(hits)
+
+
+def _substring_documents(kind, query):
+    """مستندات نوع معين يحتوي عنوانها أو محتواها على query كجزء من كلمة (مثل "123" داخل "INV-00123")"""
+    text = normalize(query).strip()
+    return SearchDocument.objects.filter(kind=kind).filter(
+        Q(title__contains=text) | Q(body__contains=text)
+    ).values('object_id')
+
+
+def q(kind, query, field='pk'):
+    """
+    شرط Q يطابق الكائنات من نوع kind التي تحتوي على query، كاستعلام فرعي واحد
+    (بدلاً من سلاسل icontains عبر الجداول المرتبطة).
+    البحث بلا كلمات (رموز فقط) لا يصفّي شيئًا، والبحث برقم يطابق أيضًا جزءًا من الأرقام والأكواد.
+    """
+    from django.db.models.expressions import RawSQL
+
+    tokens = _tokens(query)
+    if not tokens:
+        return Q()
+    engine = backend()
+    if engine == 'fts5':
+        subquery = RawSQL(
+            f'SELECT d.object_id FROM {FTS_TABLE} JOIN core_searchdocument d ON d.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s AND d.kind = %s',
+            (_fts_query(tokens), kind),
+        )
+    else:
+        subquery = documents(query, [kind]).order_by().values('object_id')
+    condition = Q(**{f'{field}__in': subquery})
+    if engine != 'basic' and _DIGIT.search(query):
+        # الفهرس يطابق بداية الكلمات فقط، وأرقام الفواتير والقيود وأكواد المنتجات يُبحث فيها بجزء من الرقم
+        condition |= Q(**{f'{field}__in': _substring_documents(kind, query)})
+    return condition
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save, post_delete
+
+from . import search
+from .models import Contact
+
+
+def _indexed_models():
+    from accounting.models import JournalEntry
+    from invoices.models import Invoice
+    from products.models import Product
+    return [Contact, Product, Invoice, JournalEntry]
+
+
+def object_saved(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """تحديث مستند البحث للكائن (الفهرس FTS5 يتحدث من triggers قاعدة البيانات)"""
+    if not raw:
+        search.index(instance, update_fields, created)
+
+
+def object_deleted(sender, instance, **kwargs):
+    search.unindex(instance)
+
+
+def connect():
+    for model in _indexed_models():
+        post_save.connect(object_saved, sender=model, dispatch_uid=f'search_index_{model._meta.label}')
+        post_delete.connect(object_deleted, sender=model, dispatch_uid=f'search_unindex_{model._meta.label}')
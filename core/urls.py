@@ -17,6 +17,7 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('', views.home, name='home'),
     path('api/dashboard-stats/', api_views.DashboardStatsAPIView.as_view(), name='api_dashboard_stats'),
+    path('api/search/', api_views.SearchAPIView.as_view(), name='api_search'),
 
     # Company URLs
     path('companies/', views.company_list, name='company_list'),
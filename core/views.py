@@ -1,3 +1,4 @@
+from datetime import datetime
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
@@ -6,7 +7,7 @@ from .models import Company, Branch, Store, Safe, Contact, Representative, Drive
 from .forms import CompanyForm, BranchForm, StoreForm, SafeForm, RepresentativeForm, DriverForm, ContactForm, SystemSettingsForm
 from products.models import Product, Category
 from invoices.models import Invoice
-from finances.models import ContactTransaction
+from finances.models import ContactTransaction, BalanceCheckpoint
 from users.decorators import can_create, can_edit, can_delete
 
 # Create your views here.
@@ -199,10 +200,8 @@ def safe_add(request):
     if request.method == 'POST':
         form = SafeForm(request.POST)
         if form.is_valid():
+            # الحفظ يضبط الرصيد الحالي على الرصيد الافتتاحي عند الإنشاء
             safe = form.save()
-            # Set current_balance to initial_balance when creating
-            safe.current_balance = safe.initial_balance
-            safe.save()
             messages.success(request, f'تم إضافة الخزنة {safe.name} بنجاح')
             return redirect('safe_detail', pk=safe.pk)
     else:
@@ -216,15 +215,8 @@ def safe_edit(request, pk):
     if request.method == 'POST':
         form = SafeForm(request.POST, instance=safe)
         if form.is_valid():
-            # Save the old initial balance
-            old_initial_balance = safe.initial_balance
-            # Save the form
+            # الحفظ يزيح الرصيد الحالي وأرصدة الحركات بفرق الرصيد الافتتاحي
             safe = form.save()
-            # Adjust current balance based on the change in initial balance
-            if old_initial_balance != safe.initial_balance:
-                difference = safe.initial_balance - old_initial_balance
-                safe.current_balance += difference
-                safe.save()
             messages.success(request, f'تم تعديل الخزنة {safe.name} بنجاح')
             return redirect('safe_detail', pk=safe.pk)
     else:
@@ -516,8 +508,18 @@ def contact_statement(request, pk):
             Q(invoice__number__icontains=query)
         )
 
+    # رصيد أول المدة: الرصيد الافتتاحي، أو الرصيد في بداية الفترة من نقاط الأرصدة اليومية
+    opening_balance = contact.initial_balance
+    if date_from:
+        try:
+            opening_balance = BalanceCheckpoint.opening_balance(
+                contact, datetime.strptime(date_from, '%Y-%m-%d')
+            )
+        except ValueError:
+            pass
+
     # حساب الرصيد التراكمي لكل حركة
-    running_balance = contact.initial_balance
+    running_balance = opening_balance
     transaction_list = []
 
     for transaction in transactions:
@@ -545,6 +547,7 @@ def contact_statement(request, pk):
         'contact': contact,
         'transactions': transaction_list,
         'initial_balance': contact.initial_balance,
+        'opening_balance': opening_balance,
         'current_balance': contact.current_balance,
         'date_from': date_from,
         'date_to': date_to,
@@ -4,7 +4,7 @@ from django.urls import path
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib import messages
 from django.db import transaction
-from .models import Employee, Attendance, EmployeeLoan, Salary
+from .models import Employee, Attendance, EmployeeLoan, Salary, PayrollRun
 
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
@@ -51,7 +51,7 @@ class EmployeeLoanAdmin(admin.ModelAdmin):
     list_display = ('employee', 'amount', 'date', 'is_paid', 'is_posted')
     list_filter = ('is_paid', 'is_posted', 'date')
     search_fields = ('employee__name', 'description')
-    readonly_fields = ('transaction',)
+    readonly_fields = ('transaction', 'payroll_run')
 
     def get_urls(self):
         urls = super().get_urls()
@@ -102,7 +102,7 @@ class SalaryAdmin(admin.ModelAdmin):
     list_display = ('employee', 'month', 'year', 'base_salary', 'deductions', 'loans_deduction', 'net_salary', 'is_paid', 'is_posted')
     list_filter = ('is_paid', 'is_posted', 'month', 'year')
     search_fields = ('employee__name',)
-    readonly_fields = ('transaction',)
+    readonly_fields = ('transaction', 'payroll_run')
 
     def get_urls(self):
         urls = super().get_urls()
@@ -147,3 +147,10 @@ class SalaryAdmin(admin.ModelAdmin):
                 messages.error(request, f'{_("حدث خطأ أثناء إلغاء ترحيل الراتب")}: {str(e)}')
 
         return redirect('admin:employees_salary_change', object_id=object_id)
+
+@admin.register(PayrollRun)
+class PayrollRunAdmin(admin.ModelAdmin):
+    list_display = ('month', 'year', 'safe', 'total_net_salary', 'status', 'posted_at')
+    list_filter = ('status', 'year')
+    readonly_fields = ('status', 'total_base_salary', 'total_deductions', 'total_loans_deduction',
+                       'total_net_salary', 'transaction', 'journal_entry', 'posted_at')
@@ -0,0 +1,106 @@
+"""
+تجميع بيانات الحضور لشاشات وتقارير الحضور اليومية والشهرية وتفاصيل الموظف.
+
+بدلاً من ثلاثة استعلامات count لكل موظف (حاضر/غائب/بعذر):
+- الملخص الشهري: استعلام مجمع واحد values('employee_id', 'status').annotate(Count)
+- الجدول التفصيلي: جلب سجلات الشهر مرة واحدة في مصفوفة أيام لكل موظف
+  (العنصر رقم day - 1 هو سجل ذلك اليوم أو None)، والإجماليات تُحسب من نفس الصفوف
+"""
+import calendar
+from datetime import date
+
+from django.db.models import Count
+
+from .models import Attendance, Employee
+
+STATUSES = (Attendance.PRESENT, Attendance.ABSENT, Attendance.EXCUSED)
+
+
+def month_range(year, month):
+    """أول وآخر يوم في الشهر وعدد أيامه"""
+    _, days_in_month = calendar.monthrange(year, month)
+    return date(year, month, 1), date(year, month, days_in_month), days_in_month
+
+
+def _empty_counts():
+    return {status: 0 for status in STATUSES}
+
+
+def _row(employee, counts, days=None):
+    row = {
+        'employee': employee,
+        'present_count': counts[Attendance.PRESENT],
+        'absent_count': counts[Attendance.ABSENT],
+        'excused_count': counts[Attendance.EXCUSED],
+        'total_days': sum(counts.values()),
+    }
+    if days is not None:
+        row['days'] = days
+    return row
+
+
+def active_employees():
+    return Employee.objects.filter(status=Employee.ACTIVE).order_by('id')
+
+
+def status_counts(start, end, employee_ids=None):
+    """عدد سجلات كل حالة لكل موظف بين تاريخين باستعلام مجمع واحد: {employee_id: {status: count}}"""
+    records = Attendance.objects.filter(date__range=(start, end))
+    if employee_ids is not None:
+        records = records.filter(employee_id__in=employee_ids)
+    counts = {}
+    for row in records.order_by().values('employee_id', 'status').annotate(count=Count('id')):
+        if row['status'] in STATUSES:
+            counts.setdefault(row['employee_id'], _empty_counts())[row['status']] = row['count']
+    return counts
+
+
+def monthly_summary(year, month, employees=None):
+    """ملخص الشهر لكل موظف (عدد أيام الحضور والغياب والغياب بعذر)"""
+    employees = list(active_employees() if employees is None else employees)
+    start, end, _days = month_range(year, month)
+    counts = status_counts(start, end, [employee.id for employee in employees])
+    return [_row(employee, counts.get(employee.id, _empty_counts())) for employee in employees]
+
+
+def monthly_grid(year, month, employees=None):
+    """
+    جدول الشهر التفصيلي: لكل موظف مصفوفة أيام (سجل اليوم أو None) مع الإجماليات،
+    من جلب واحد لسجلات الشهر
+    """
+    employees = list(active_employees() if employees is None else employees)
+    start, end, days_in_month = month_range(year, month)
+    days = {employee.id: [None] * days_in_month for employee in employees}
+    counts = {employee.id: _empty_counts() for employee in employees}
+
+    records = Attendance.objects.filter(date__range=(start, end), employee_id__in=days) \
+        .only('id', 'employee_id', 'date', 'status')
+    for record in records:
+        days[record.employee_id][record.date.day - 1] = record
+        if record.status in STATUSES:
+            counts[record.employee_id][record.status] += 1
+
+    return [_row(employee, counts[employee.id], days[employee.id]) for employee in employees], days_in_month
+
+
+def daily(selected_date, employees=None):
+    """سجل كل موظف في يوم معين (أو None) وعدد كل حالة، من جلب واحد لسجلات اليوم"""
+    employees = list(active_employees() if employees is None else employees)
+    records = {record.employee_id: record for record in Attendance.objects.filter(date=selected_date)}
+    counts = _empty_counts()
+    for record in records.values():
+        if record.status in STATUSES:
+            counts[record.status] += 1
+    rows = [{'employee': employee, 'attendance': records.get(employee.id)} for employee in employees]
+    return rows, counts
+
+
+def employee_month(employee, year, month):
+    """سجلات موظف في شهر مرتبة بالتاريخ مع عدد كل حالة، من جلب واحد"""
+    start, end, _days = month_range(year, month)
+    records = list(employee.attendance_records.filter(date__range=(start, end)).order_by('date'))
+    counts = _empty_counts()
+    for record in records:
+        if record.status in STATUSES:
+            counts[record.status] += 1
+    return records, counts
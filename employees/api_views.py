@@ -2,21 +2,38 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from core.filters import DateRangeFilterSet
 from .models import Employee, Attendance, EmployeeLoan, Salary
 from .serializers import (
     EmployeeSerializer, AttendanceSerializer, 
     EmployeeLoanSerializer, SalarySerializer
 )
 
+class AttendanceFilter(DateRangeFilterSet):
+    class Meta:
+        model = Attendance
+        fields = ['employee', 'status', 'date']
+
+class EmployeeLoanFilter(DateRangeFilterSet):
+    class Meta:
+        model = EmployeeLoan
+        fields = ['employee', 'safe', 'is_posted']
+
 class EmployeeViewSet(viewsets.ModelViewSet):
-    queryset = Employee.objects.all()
+    queryset = Employee.objects.select_related('account').order_by('name', 'id')
     serializer_class = EmployeeSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['status', 'department']
+    search_fields = ['name', 'phone', 'job_title']
+    ordering_fields = ['name', 'hire_date', 'salary']
 
 class AttendanceViewSet(viewsets.ModelViewSet):
-    queryset = Attendance.objects.all()
+    queryset = Attendance.objects.select_related('employee').order_by('-date', '-id')
     serializer_class = AttendanceSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = AttendanceFilter
+    search_fields = ['employee__name']
+    ordering_fields = ['date', 'employee__name']
 
     @action(detail=False, methods=['post'])
     def bulk_add(self, request):
@@ -62,9 +79,10 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         })
 
 class EmployeeLoanViewSet(viewsets.ModelViewSet):
-    queryset = EmployeeLoan.objects.all()
+    queryset = EmployeeLoan.objects.select_related('employee', 'safe').order_by('-date', '-id')
     serializer_class = EmployeeLoanSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = EmployeeLoanFilter
 
     @action(detail=True, methods=['post'])
     def post_loan(self, request, pk=None):
@@ -81,9 +99,10 @@ class EmployeeLoanViewSet(viewsets.ModelViewSet):
         return Response({'error': 'could not unpost loan'}, status=status.HTTP_400_BAD_REQUEST)
 
 class SalaryViewSet(viewsets.ModelViewSet):
-    queryset = Salary.objects.all()
+    queryset = Salary.objects.select_related('employee', 'safe').order_by('-year', '-month', 'employee__name')
     serializer_class = SalarySerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['employee', 'month', 'year', 'safe', 'is_posted']
 
     @action(detail=True, methods=['post'])
     def post_salary(self, request, pk=None):
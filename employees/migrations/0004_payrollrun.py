@@ -0,0 +1,170 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounting", "0006_journalentry_journal_entry_date_idx"),
+        ("core", "0021_search_index"),
+        ("employees", "0003_attendance_attendance_date_idx"),
+        ("finances", "0024_producttransaction_invoice_item"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PayrollRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "month",
+                    models.IntegerField(
+                        choices=[
+                            (1, 1),
+                            (2, 2),
+                            (3, 3),
+                            (4, 4),
+                            (5, 5),
+                            (6, 6),
+                            (7, 7),
+                            (8, 8),
+                            (9, 9),
+                            (10, 10),
+                            (11, 11),
+                            (12, 12),
+                        ],
+                        verbose_name="الشهر",
+                    ),
+                ),
+                ("year", models.IntegerField(verbose_name="السنة")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("draft", "مسودة"), ("posted", "مرحل")],
+                        default="draft",
+                        max_length=20,
+                        verbose_name="الحالة",
+                    ),
+                ),
+                (
+                    "total_base_salary",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=15,
+                        verbose_name="إجمالي الرواتب الأساسية",
+                    ),
+                ),
+                (
+                    "total_deductions",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=15,
+                        verbose_name="إجمالي الخصومات",
+                    ),
+                ),
+                (
+                    "total_loans_deduction",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=15,
+                        verbose_name="إجمالي خصم السلف",
+                    ),
+                ),
+                (
+                    "total_net_salary",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=15,
+                        verbose_name="إجمالي صافي الرواتب",
+                    ),
+                ),
+                (
+                    "posted_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="تاريخ الترحيل"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="تاريخ الإنشاء"
+                    ),
+                ),
+                (
+                    "journal_entry",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="payroll_run",
+                        to="accounting.journalentry",
+                        verbose_name="القيد المحاسبي",
+                    ),
+                ),
+                (
+                    "safe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="payroll_runs",
+                        to="core.safe",
+                        verbose_name="الخزنة",
+                    ),
+                ),
+                (
+                    "transaction",
+                    models.OneToOneField(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="payroll_run",
+                        to="finances.safetransaction",
+                        verbose_name="حركة الخزنة",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "مسير رواتب",
+                "verbose_name_plural": "مسيرات الرواتب",
+                "ordering": ["-year", "-month"],
+                "unique_together": {("month", "year")},
+            },
+        ),
+        migrations.AddField(
+            model_name="employeeloan",
+            name="payroll_run",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="settled_loans",
+                to="employees.payrollrun",
+                verbose_name="مسير الرواتب المسدد لها",
+            ),
+        ),
+        migrations.AddField(
+            model_name="salary",
+            name="payroll_run",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="salaries",
+                to="employees.payrollrun",
+                verbose_name="مسير الرواتب",
+            ),
+        ),
+    ]
@@ -1,7 +1,9 @@
+from decimal import Decimal
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from finances.models import SafeTransaction
+from finances import balances
 from core.models import Safe
 
 class Employee(models.Model):
@@ -100,6 +102,9 @@ class Attendance(models.Model):
         verbose_name_plural = _("سجلات الحضور")
         ordering = ['-date']
         unique_together = ['employee', 'date']  # لا يمكن تكرار سجل لنفس الموظف في نفس اليوم
+        indexes = [
+            models.Index(fields=['date'], name='attendance_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.employee.name} - {self.date} - {self.get_status_display()}"
@@ -116,6 +121,7 @@ class EmployeeLoan(models.Model):
     safe = models.ForeignKey(Safe, on_delete=models.PROTECT, related_name='employee_loans', verbose_name=_("الخزنة"))
     is_posted = models.BooleanField(_("مرحل"), default=False)
     transaction = models.OneToOneField(SafeTransaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='employee_loan', verbose_name=_("حركة الخزنة"))
+    payroll_run = models.ForeignKey('PayrollRun', on_delete=models.SET_NULL, null=True, blank=True, related_name='settled_loans', verbose_name=_("مسير الرواتب المسدد لها"))
 
     class Meta:
         verbose_name = _("سلفة موظف")
@@ -218,6 +224,7 @@ class Salary(models.Model):
     safe = models.ForeignKey(Safe, on_delete=models.PROTECT, related_name='employee_salaries', verbose_name=_("الخزنة"), null=True, blank=True)
     is_posted = models.BooleanField(_("مرحل"), default=False)
     transaction = models.OneToOneField(SafeTransaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='employee_salary', verbose_name=_("حركة الخزنة"))
+    payroll_run = models.ForeignKey('PayrollRun', on_delete=models.CASCADE, null=True, blank=True, related_name='salaries', verbose_name=_("مسير الرواتب"))
 
     class Meta:
         verbose_name = _("راتب")
@@ -235,13 +242,14 @@ class Salary(models.Model):
 
     def post_salary(self):
         """ترحيل الراتب وإنشاء حركة خزنة والقيود المحاسبية"""
-        if self.is_posted or not self.safe:
+        # رواتب المسير تُرحَّل معًا بقيد وحركة خزنة واحدة من PayrollRun.post
+        if self.is_posted or not self.safe or self.payroll_run_id:
             return False
 
-        from django.db import transaction
         from accounting.models import JournalEntry, JournalItem
 
-        with transaction.atomic():
+        # تأجيل إعادة حساب رصيد الخزنة حتى تأكيد المعاملة
+        with balances.deferred():
             # إنشاء حركة خزنة للراتب
             current_balance = self.safe.current_balance
             balance_after = current_balance - self.net_salary
@@ -337,3 +345,268 @@ class Salary(models.Model):
         self.save(update_fields=['transaction', 'is_posted'])
 
         return True
+
+
+class PayrollRun(models.Model):
+    """
+    مسير رواتب شهري: يُنشئ رواتب كل الموظفين النشطين دفعة واحدة، ويرحّلها بحركة خزنة واحدة
+    وقيد محاسبي مجمع ببنود لكل موظف، ويمكن إلغاء ترحيله أو التراجع عنه بالكامل.
+    """
+
+    DRAFT = 'draft'
+    POSTED = 'posted'
+
+    STATUS_CHOICES = [
+        (DRAFT, _('مسودة')),
+        (POSTED, _('مرحل')),
+    ]
+
+    # نسبة الراتب القصوى التي تُخصم للسلف في الشهر
+    MAX_LOAN_DEDUCTION_RATE = Decimal('0.5')
+
+    month = models.IntegerField(_("الشهر"), choices=[(i, i) for i in range(1, 13)])
+    year = models.IntegerField(_("السنة"))
+    safe = models.ForeignKey(Safe, on_delete=models.PROTECT, related_name='payroll_runs', verbose_name=_("الخزنة"))
+    status = models.CharField(_("الحالة"), max_length=20, choices=STATUS_CHOICES, default=DRAFT)
+    total_base_salary = models.DecimalField(_("إجمالي الرواتب الأساسية"), max_digits=15, decimal_places=2, default=0)
+    total_deductions = models.DecimalField(_("إجمالي الخصومات"), max_digits=15, decimal_places=2, default=0)
+    total_loans_deduction = models.DecimalField(_("إجمالي خصم السلف"), max_digits=15, decimal_places=2, default=0)
+    total_net_salary = models.DecimalField(_("إجمالي صافي الرواتب"), max_digits=15, decimal_places=2, default=0)
+    transaction = models.OneToOneField(SafeTransaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='payroll_run', verbose_name=_("حركة الخزنة"))
+    journal_entry = models.OneToOneField('accounting.JournalEntry', on_delete=models.SET_NULL, null=True, blank=True, related_name='payroll_run', verbose_name=_("القيد المحاسبي"))
+    posted_at = models.DateTimeField(_("تاريخ الترحيل"), null=True, blank=True)
+    created_at = models.DateTimeField(_("تاريخ الإنشاء"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("مسير رواتب")
+        verbose_name_plural = _("مسيرات الرواتب")
+        ordering = ['-year', '-month']
+        unique_together = ['month', 'year']
+
+    def __str__(self):
+        return f"مسير رواتب {self.month}/{self.year}"
+
+    @property
+    def is_posted(self):
+        return self.status == self.POSTED
+
+    @classmethod
+    def calculate(cls, month, year, safe=None):
+        """
+        معاينة رواتب الشهر لكل الموظفين النشطين (رواتب غير محفوظة).
+        السلف غير المسددة تُجمع لكل الموظفين في استعلام واحد بدلاً من get_total_loans لكل موظف.
+        """
+        from django.db.models.functions import Coalesce
+
+        employees = Employee.objects.filter(status=Employee.ACTIVE).annotate(
+            unpaid_loans=Coalesce(
+                models.Sum('loans__amount', filter=models.Q(loans__is_paid=False)), Decimal('0'),
+                output_field=models.DecimalField(max_digits=15, decimal_places=2),
+            )
+        )
+        salaries = []
+        for employee in employees:
+            # خصم كامل السلف المستحقة بما لا يتجاوز نسبة MAX_LOAN_DEDUCTION_RATE من الراتب
+            loans_deduction = min(employee.unpaid_loans, employee.salary * cls.MAX_LOAN_DEDUCTION_RATE)
+            salary = Salary(
+                employee=employee,
+                month=month,
+                year=year,
+                base_salary=employee.salary,
+                # الموظف ليس له خصومات ثابتة؛ تُضاف الخصومات بتعديل الراتب قبل ترحيل المسير
+                deductions=Decimal('0'),
+                loans_deduction=loans_deduction,
+                safe=safe,
+            )
+            salary.calculate_net_salary()
+            salaries.append(salary)
+        return salaries
+
+    @classmethod
+    def generate(cls, month, year, safe, auto_post=False):
+        """إنشاء المسير ورواتبه بإدراج جماعي، وترحيله اختياريًا؛ يرفع ValueError إذا وُجدت رواتب للشهر"""
+        from django.db import transaction
+
+        with transaction.atomic():
+            if Salary.objects.filter(month=month, year=year).exists() or \
+                    cls.objects.filter(month=month, year=year).exists():
+                raise ValueError(_('يوجد رواتب بالفعل لهذا الشهر. يمكنك تعديلها من قائمة الرواتب.'))
+
+            run = cls.objects.create(month=month, year=year, safe=safe)
+            salaries = cls.calculate(month, year, safe)
+            for salary in salaries:
+                salary.payroll_run = run
+            Salary.objects.bulk_create(salaries, batch_size=500)
+            run.refresh_totals()
+
+            if auto_post:
+                run.post()
+        return run
+
+    def refresh_totals(self):
+        """إعادة حساب إجماليات المسير من رواتبه باستعلام واحد (الرواتب قد تُعدَّل قبل الترحيل)"""
+        totals = self.salaries.aggregate(
+            base=models.Sum('base_salary'), deductions=models.Sum('deductions'),
+            loans=models.Sum('loans_deduction'), net=models.Sum('net_salary'),
+        )
+        self.total_base_salary = totals['base'] or 0
+        self.total_deductions = totals['deductions'] or 0
+        self.total_loans_deduction = totals['loans'] or 0
+        self.total_net_salary = totals['net'] or 0
+        self.save(update_fields=['total_base_salary', 'total_deductions', 'total_loans_deduction', 'total_net_salary'])
+
+    def post(self):
+        """ترحيل المسير: حركة خزنة واحدة بالصافي، وقيد مجمع ببنود لكل موظف، وتسوية السلف المخصومة"""
+        if self.is_posted:
+            return False
+
+        from django.db import transaction
+        from core.models import SystemSettings
+
+        with transaction.atomic():
+            # قفل صف المسير دائمًا ثم فحص حالته المقفلة حتى لا يُرحَّل مرتين بالتزامن
+            locked = PayrollRun.objects.select_for_update().get(pk=self.pk)
+            if locked.status == self.POSTED:
+                self.status = locked.status
+                return False
+
+            self.refresh_totals()
+            salaries = list(self.salaries.select_related('employee').order_by('employee__name', 'pk'))
+            if not salaries:
+                raise ValueError(_('لا توجد رواتب في هذا المسير.'))
+
+            safe_transaction = SafeTransaction.objects.create(
+                safe=self.safe,
+                amount=self.total_net_salary,
+                transaction_type=SafeTransaction.WITHDRAWAL,
+                description=f"رواتب الموظفين عن شهر {self.month}/{self.year}",
+                reference_number=f"PAYROLL-{self.id}",
+            )
+
+            settings = SystemSettings.get_settings()
+            journal_entry = self._create_journal_entry(settings, salaries)
+            if settings.default_loans_account:
+                self._settle_loans(salaries)
+
+            today = timezone.now().date()
+            self.salaries.update(is_posted=True, is_paid=True, payment_date=today)
+
+            self.transaction = safe_transaction
+            self.journal_entry = journal_entry
+            self.status = self.POSTED
+            self.posted_at = timezone.now()
+            self.save(update_fields=['transaction', 'journal_entry', 'status', 'posted_at'])
+
+        return True
+
+    def _create_journal_entry(self, settings, salaries):
+        """القيد المجمع: مصروف الرواتب وتسوية السلف لكل موظف (مدين/دائن) والخزنة بالصافي الإجمالي (دائن)"""
+        from accounting.models import JournalEntry, JournalItem
+
+        salary_expense_account = settings.default_salaries_account
+        loan_account = settings.default_loans_account
+        if not salary_expense_account or not self.safe.account:
+            return None
+
+        journal_entry = JournalEntry.objects.create(
+            entry_number=f"PAY-{self.id}-{timezone.now().strftime('%Y%m%d%H%M%S')}",
+            date=timezone.now(),
+            description=f"قيد مسير رواتب تلقائي: {self.month}/{self.year}",
+            reference=f"PAYROLL-{self.id}"
+        )
+        lines = []
+        for salary in salaries:
+            employee = salary.employee
+            lines.append(JournalItem(
+                account=salary_expense_account,
+                debit=salary.base_salary - salary.deductions,
+                memo=f"استحقاق راتب الموظف {employee.name} شهر {self.month}/{self.year}"
+            ))
+            if salary.loans_deduction > 0 and loan_account:
+                lines.append(JournalItem(
+                    account=loan_account,
+                    credit=salary.loans_deduction,
+                    memo=f"تسوية سلف الموظف {employee.name} من الراتب"
+                ))
+        lines.append(JournalItem(
+            account=self.safe.account,
+            credit=self.total_net_salary,
+            memo=f"صرف صافي رواتب شهر {self.month}/{self.year}"
+        ))
+        checked_accounts = set()
+        for line in lines:
+            line.journal_entry = journal_entry
+            # نفس تحقق JournalItem.save لأن الإنشاء الجماعي لا يستدعيها؛
+            # البنود تشترك في القيد وتاريخه فيكفي التحقق مرة لكل حساب
+            if line.account_id not in checked_accounts:
+                line.clean()
+                checked_accounts.add(line.account_id)
+        JournalItem.objects.bulk_create(lines, batch_size=500)
+
+        journal_entry.post()
+        return journal_entry
+
+    def _settle_loans(self, salaries):
+        """تسوية السلف المغطاة بالكامل من خصم كل موظف (الأقدم فالأقدم) باستعلام واحد وتحديث جماعي"""
+        remaining = {salary.employee_id: salary.loans_deduction for salary in salaries if salary.loans_deduction > 0}
+        if not remaining:
+            return
+
+        today = timezone.now().date()
+        settled = []
+        blocked = set()
+        loans = EmployeeLoan.objects.filter(employee_id__in=remaining, is_paid=False).order_by('employee_id', 'date', 'pk')
+        for loan in loans:
+            if loan.employee_id in blocked:
+                continue
+            if loan.amount <= remaining[loan.employee_id]:
+                remaining[loan.employee_id] -= loan.amount
+                loan.is_paid = True
+                loan.payment_date = today
+                loan.payroll_run = self
+                settled.append(loan)
+            else:
+                # السلفة أكبر من المتبقي من الخصم: تبقى غير مسددة، ولا تُسدد سلف أحدث منها
+                blocked.add(loan.employee_id)
+        EmployeeLoan.objects.bulk_update(settled, ['is_paid', 'payment_date', 'payroll_run'], batch_size=500)
+
+    def unpost(self):
+        """إلغاء ترحيل المسير: حذف حركة الخزنة والقيد وإعادة السلف المسددة منه إلى غير مسددة"""
+        if not self.is_posted:
+            return False
+
+        from django.db import transaction
+
+        with transaction.atomic():
+            # نفس القفل المستخدم في الترحيل حتى لا يُلغى الترحيل مرتين بالتزامن
+            locked = PayrollRun.objects.select_for_update().get(pk=self.pk)
+            if locked.status != self.POSTED:
+                self.status = locked.status
+                return False
+            self.transaction_id = locked.transaction_id
+            self.journal_entry_id = locked.journal_entry_id
+
+            if self.transaction:
+                self.transaction.delete()
+            if self.journal_entry:
+                self.journal_entry.unpost()
+                self.journal_entry.delete()
+
+            self.settled_loans.update(is_paid=False, payment_date=None, payroll_run=None)
+            self.salaries.update(is_posted=False, is_paid=False, payment_date=None)
+
+            self.transaction = None
+            self.journal_entry = None
+            self.status = self.DRAFT
+            self.posted_at = None
+            self.save(update_fields=['transaction', 'journal_entry', 'status', 'posted_at'])
+
+        return True
+
+    def rollback(self):
+        """التراجع عن المسير بالكامل: إلغاء ترحيله إن كان مرحلاً ثم حذفه مع رواتبه"""
+        from django.db import transaction
+
+        with transaction.atomic():
+            self.unpost()
+            self.delete()
@@ -47,6 +47,10 @@ urlpatterns = [
     path('salary/<int:pk>/unpost/', views.salary_unpost, name='salary_unpost'),
     path('salary/<int:pk>/delete/', views.salary_delete, name='salary_delete'),
     path('salary/generate-monthly/', views.salary_generate_monthly, name='salary_generate_monthly'),
+    path('payroll-run/<int:pk>/', views.payroll_run_detail, name='payroll_run_detail'),
+    path('payroll-run/<int:pk>/post/', views.payroll_run_post, name='payroll_run_post'),
+    path('payroll-run/<int:pk>/unpost/', views.payroll_run_unpost, name='payroll_run_unpost'),
+    path('payroll-run/<int:pk>/rollback/', views.payroll_run_rollback, name='payroll_run_rollback'),
 
     # التقارير
     path('reports/attendance/daily/', views.report_attendance_daily, name='report_attendance_daily'),
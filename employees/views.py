@@ -8,8 +8,9 @@ from django.db.models import Sum, Count, Q
 from django.http import HttpResponse
 from datetime import datetime, timedelta
 import calendar
-from .models import Employee, Attendance, EmployeeLoan, Salary
+from .models import Employee, Attendance, EmployeeLoan, Salary, PayrollRun
 from core.models import Safe
+from . import analytics
 from .forms import EmployeeForm, AttendanceForm, BulkAttendanceForm, EmployeeLoanForm, SalaryForm, SalaryGenerateForm
 
 # صفحات الموظفين
@@ -26,10 +27,7 @@ def employee_detail(request, pk):
 
     # الحصول على بيانات الحضور للشهر الحالي
     today = timezone.now().date()
-    attendance_records = employee.attendance_records.filter(
-        date__year=today.year,
-        date__month=today.month
-    ).order_by('date')
+    attendance_records, attendance_counts = analytics.employee_month(employee, today.year, today.month)
 
     # الحصول على السلف النشطة
     active_loans = employee.loans.filter(is_paid=False)
@@ -40,6 +38,9 @@ def employee_detail(request, pk):
     context = {
         'employee': employee,
         'attendance_records': attendance_records,
+        'present_count': attendance_counts[Attendance.PRESENT],
+        'absent_count': attendance_counts[Attendance.ABSENT],
+        'excused_count': attendance_counts[Attendance.EXCUSED],
         'active_loans': active_loans,
         'last_salary': last_salary,
     }
@@ -135,31 +136,15 @@ def attendance_daily(request):
     else:
         selected_date = timezone.now().date()
 
-    # الحصول على سجلات الحضور لهذا اليوم
-    attendance_records = Attendance.objects.filter(date=selected_date).order_by('employee__id')
-
-    # الحصول على جميع الموظفين النشطين مرتبين حسب الـ ID
-    active_employees = Employee.objects.filter(status=Employee.ACTIVE).order_by('id')
-
-    # إنشاء قائمة بالموظفين وحالة حضورهم
-    employees_attendance = []
-    for employee in active_employees:
-        try:
-            attendance = attendance_records.get(employee=employee)
-        except Attendance.DoesNotExist:
-            attendance = None
-
-        employees_attendance.append({
-            'employee': employee,
-            'attendance': attendance
-        })
+    # الموظفون النشطون وسجل كل منهم لهذا اليوم من جلب واحد للسجلات
+    employees_attendance, counts = analytics.daily(selected_date)
 
     context = {
         'selected_date': selected_date,
         'employees_attendance': employees_attendance,
-        'present_count': attendance_records.filter(status=Attendance.PRESENT).count(),
-        'absent_count': attendance_records.filter(status=Attendance.ABSENT).count(),
-        'excused_count': attendance_records.filter(status=Attendance.EXCUSED).count(),
+        'present_count': counts[Attendance.PRESENT],
+        'absent_count': counts[Attendance.ABSENT],
+        'excused_count': counts[Attendance.EXCUSED],
     }
 
     return render(request, 'employees/attendance/daily.html', context)
@@ -178,43 +163,8 @@ def attendance_monthly(request):
         year = timezone.now().year
         month = timezone.now().month
 
-    # الحصول على عدد أيام الشهر
-    _, days_in_month = calendar.monthrange(year, month)
-
-    # الحصول على جميع الموظفين النشطين مرتبين حسب الـ ID
-    active_employees = Employee.objects.filter(status=Employee.ACTIVE).order_by('id')
-
-    # الحصول على سجلات الحضور لهذا الشهر
-    attendance_records = Attendance.objects.filter(
-        date__year=year,
-        date__month=month
-    )
-
-    # إنشاء قاموس لتسهيل الوصول إلى سجلات الحضور
-    attendance_dict = {}
-    for record in attendance_records:
-        key = f"{record.employee_id}_{record.date.day}"
-        attendance_dict[key] = record
-
-    # إنشاء بيانات الجدول
-    employees_data = []
-    for employee in active_employees:
-        days_data = []
-        for day in range(1, days_in_month + 1):
-            key = f"{employee.id}_{day}"
-            attendance = attendance_dict.get(key)
-            days_data.append({
-                'day': day,
-                'attendance': attendance
-            })
-
-        employees_data.append({
-            'employee': employee,
-            'days': days_data,
-            'present_count': attendance_records.filter(employee=employee, status=Attendance.PRESENT).count(),
-            'absent_count': attendance_records.filter(employee=employee, status=Attendance.ABSENT).count(),
-            'excused_count': attendance_records.filter(employee=employee, status=Attendance.EXCUSED).count(),
-        })
+    # جدول الشهر لكل الموظفين النشطين من جلب واحد لسجلات الشهر
+    employees_data, days_in_month = analytics.monthly_grid(year, month)
 
     context = {
         'year': year,
@@ -716,112 +666,109 @@ def salary_delete(request, pk):
 
 @login_required
 def salary_generate_monthly(request):
-    """إنشاء رواتب شهرية لجميع الموظفين"""
-    preview_data = []
-    total_base_salary = 0
-    total_deductions = 0
-    total_loans_deduction = 0
-    total_net_salary = 0
-
+    """إنشاء رواتب شهرية لجميع الموظفين كمسير رواتب واحد"""
     if request.method == 'POST':
         form = SalaryGenerateForm(request.POST)
         if form.is_valid():
-            month = form.cleaned_data['month']
-            year = form.cleaned_data['year']
-            safe = form.cleaned_data['safe']
-            auto_post = form.cleaned_data['auto_post']
-
-            # التحقق من عدم وجود رواتب للشهر المحدد
-            existing_salaries = Salary.objects.filter(month=month, year=year)
-            if existing_salaries.exists():
-                messages.warning(request, _('يوجد رواتب بالفعل لهذا الشهر. يمكنك تعديلها من قائمة الرواتب.'))
-                return redirect('employees:salary_list')
-
-            # الحصول على جميع الموظفين النشطين
-            active_employees = Employee.objects.filter(status=Employee.ACTIVE)
-
-            # إنشاء رواتب لجميع الموظفين
-            created_salaries = []
-            for employee in active_employees:
-                # حساب خصم السلف - الحصول على إجمالي السلف المستحقة
-                total_unpaid_loans = employee.get_total_loans()
-                
-                # خصم السلفة بالكامل إذا كانت أقل من الراتب، أو خصم جزء منها (يمكن تطوير السياسة لاحقاً)
-                # حالياً سنخصم كامل السلفة المتاحة بما لا يتجاوز 50% من الراتب كمثال
-                max_loan_deduction = employee.salary * Decimal('0.5')
-                loans_deduction = min(total_unpaid_loans, max_loan_deduction)
-
-                # حساب صافي الراتب
-                net_salary = employee.salary - employee.deductions - loans_deduction
-
-                # إنشاء الراتب
-                salary = Salary(
-                    employee=employee,
-                    month=month,
-                    year=year,
-                    base_salary=employee.salary,
-                    deductions=employee.deductions,
-                    loans_deduction=loans_deduction,
-                    net_salary=net_salary,
-                    safe=safe
+            try:
+                run = PayrollRun.generate(
+                    month=form.cleaned_data['month'],
+                    year=form.cleaned_data['year'],
+                    safe=form.cleaned_data['safe'],
+                    auto_post=form.cleaned_data['auto_post'],
                 )
+            except ValueError as e:
+                messages.warning(request, str(e))
+                return redirect('employees:salary_list')
+            except Exception as e:
+                # فشل الترحيل التلقائي يلغي المسير بالكامل
+                messages.error(request, f'{_("حدث خطأ أثناء ترحيل مسير الرواتب")}: {str(e)}')
+                return redirect('employees:salary_list')
 
-                # حفظ الراتب
-                salary.save()
-                created_salaries.append(salary)
-
-                # ترحيل الراتب إذا تم اختيار ذلك
-                if auto_post:
-                    try:
-                        with transaction.atomic():
-                            salary.post_salary()
-                    except Exception as e:
-                        messages.error(request, f'{_("حدث خطأ أثناء ترحيل راتب الموظف")}: {employee.name} - {str(e)}')
-
-            messages.success(request, f'تم إنشاء {len(created_salaries)} راتب بنجاح')
-            return redirect('employees:salary_list')
+            messages.success(request, f'تم إنشاء {run.salaries.count()} راتب بنجاح')
+            return redirect('employees:payroll_run_detail', pk=run.pk)
+        month, year = form.data.get('month'), form.data.get('year')
     else:
         # تعيين القيم الافتراضية
         today = timezone.now().date()
+        month, year = today.month, today.year
         form = SalaryGenerateForm(initial={
-            'month': today.month,
-            'year': today.year,
+            'month': month,
+            'year': year,
         })
 
-        # إنشاء معاينة للرواتب
-        active_employees = Employee.objects.filter(status=Employee.ACTIVE)
-        for employee in active_employees:
-            # حساب خصم السلف
-            total_unpaid_loans = employee.get_total_loans()
-            max_loan_deduction = employee.salary * Decimal('0.5')
-            loans_deduction = min(total_unpaid_loans, max_loan_deduction)
-
-            # حساب صافي الراتب
-            net_salary = employee.salary - employee.deductions - loans_deduction
-
-            preview_data.append({
-                'employee': employee,
-                'base_salary': employee.salary,
-                'deductions': employee.deductions,
-                'loans_deduction': loans_deduction,
-                'net_salary': net_salary
-            })
-
-            # حساب الإجماليات
-            total_base_salary += employee.salary
-            total_deductions += employee.deductions
-            total_loans_deduction += loans_deduction
-            total_net_salary += net_salary
+    # معاينة الرواتب (بدون حفظ)
+    preview_data = PayrollRun.calculate(month, year)
 
     return render(request, 'employees/salary/generate_monthly.html', {
         'form': form,
         'preview_data': preview_data,
-        'total_base_salary': total_base_salary,
-        'total_deductions': total_deductions,
-        'total_loans_deduction': total_loans_deduction,
-        'total_net_salary': total_net_salary
+        'total_base_salary': sum((salary.base_salary for salary in preview_data), 0),
+        'total_deductions': sum((salary.deductions for salary in preview_data), 0),
+        'total_loans_deduction': sum((salary.loans_deduction for salary in preview_data), 0),
+        'total_net_salary': sum((salary.net_salary for salary in preview_data), 0),
     })
 
+@login_required
+def payroll_run_detail(request, pk):
+    """عرض تفاصيل مسير رواتب"""
+    run = get_object_or_404(PayrollRun.objects.select_related('safe', 'journal_entry'), pk=pk)
+    salaries = run.salaries.select_related('employee').order_by('employee__name')
+    return render(request, 'employees/salary/payroll_run_detail.html', {'run': run, 'salaries': salaries})
+
+@login_required
+def payroll_run_post(request, pk):
+    """ترحيل مسير رواتب"""
+    run = get_object_or_404(PayrollRun, pk=pk)
+
+    if run.is_posted:
+        messages.warning(request, _('تم ترحيل المسير بالفعل'))
+    else:
+        try:
+            if run.post():
+                messages.success(request, _('تم ترحيل مسير الرواتب بنجاح'))
+            else:
+                messages.error(request, _('فشل ترحيل مسير الرواتب'))
+        except Exception as e:
+            messages.error(request, f'{_("حدث خطأ أثناء ترحيل مسير الرواتب")}: {str(e)}')
+
+    return redirect('employees:payroll_run_detail', pk=pk)
+
+@login_required
+def payroll_run_unpost(request, pk):
+    """إلغاء ترحيل مسير رواتب"""
+    run = get_object_or_404(PayrollRun, pk=pk)
+
+    if not run.is_posted:
+        messages.warning(request, _('لم يتم ترحيل المسير بعد'))
+    else:
+        try:
+            if run.unpost():
+                messages.success(request, _('تم إلغاء ترحيل مسير الرواتب بنجاح'))
+            else:
+                messages.error(request, _('فشل إلغاء ترحيل مسير الرواتب'))
+        except Exception as e:
+            messages.error(request, f'{_("حدث خطأ أثناء إلغاء ترحيل مسير الرواتب")}: {str(e)}')
+
+    return redirect('employees:payroll_run_detail', pk=pk)
+
+@login_required
+def payroll_run_rollback(request, pk):
+    """التراجع عن مسير رواتب بالكامل (إلغاء الترحيل وحذف الرواتب)"""
+    run = get_object_or_404(PayrollRun, pk=pk)
+
+    if request.method == 'POST':
+        title = str(run)
+        try:
+            run.rollback()
+        except Exception as e:
+            messages.error(request, f'{_("حدث خطأ أثناء التراجع عن مسير الرواتب")}: {str(e)}')
+            return redirect('employees:payroll_run_detail', pk=pk)
+        messages.success(request, f'تم التراجع عن {title} بنجاح')
+        return redirect('employees:salary_list')
+
+    return redirect('employees:payroll_run_detail', pk=pk)
+
 # التقارير
 @login_required
 def report_attendance_daily(request):
@@ -836,31 +783,15 @@ def report_attendance_daily(request):
     else:
         selected_date = timezone.now().date()
 
-    # الحصول على سجلات الحضور لهذا اليوم
-    attendance_records = Attendance.objects.filter(date=selected_date).order_by('employee__id')
-
-    # الحصول على جميع الموظفين النشطين مرتبين حسب الـ ID
-    active_employees = Employee.objects.filter(status=Employee.ACTIVE).order_by('id')
-
-    # إنشاء قائمة بالموظفين وحالة حضورهم
-    employees_attendance = []
-    for employee in active_employees:
-        try:
-            attendance = attendance_records.get(employee=employee)
-        except Attendance.DoesNotExist:
-            attendance = None
-
-        employees_attendance.append({
-            'employee': employee,
-            'attendance': attendance
-        })
+    # الموظفون النشطون وسجل كل منهم لهذا اليوم من جلب واحد للسجلات
+    employees_attendance, counts = analytics.daily(selected_date)
 
     context = {
         'selected_date': selected_date,
         'employees_attendance': employees_attendance,
-        'present_count': attendance_records.filter(status=Attendance.PRESENT).count(),
-        'absent_count': attendance_records.filter(status=Attendance.ABSENT).count(),
-        'excused_count': attendance_records.filter(status=Attendance.EXCUSED).count(),
+        'present_count': counts[Attendance.PRESENT],
+        'absent_count': counts[Attendance.ABSENT],
+        'excused_count': counts[Attendance.EXCUSED],
         'now': timezone.now(),
     }
 
@@ -885,23 +816,26 @@ def report_attendance_monthly(request):
         year = timezone.now().year
         month = timezone.now().month
 
-    # الحصول على جميع الموظفين النشطين مرتبين حسب الـ ID
-    active_employees = Employee.objects.filter(status=Employee.ACTIVE).order_by('id')
-
-    # إنشاء بيانات التقرير
-    report_data = []
-    for employee in active_employees:
-        present_count = employee.get_attendance_count(year, month)
-        absent_count = employee.get_absence_count(year, month)
-        excused_count = employee.get_excused_absence_count(year, month)
-
-        report_data.append({
-            'employee': employee,
-            'present_count': present_count,
-            'absent_count': absent_count,
-            'excused_count': excused_count,
-            'total_days': present_count + absent_count + excused_count
-        })
+    # التحقق مما إذا كان المستخدم يريد استخدام قالب الطباعة المخصص
+    print_mode = request.GET.get('print', False)
+
+    # التقرير التفصيلي (للطباعة فقط): جدول الشهر من جلب واحد لسجلات الشهر
+    if print_mode and request.GET.get('detailed', False):
+        employees_data, days_in_month = analytics.monthly_grid(year, month)
+
+        detailed_context = {
+            'year': year,
+            'month': month,
+            'month_name': calendar.month_name[month],
+            'days_in_month': days_in_month,
+            'employees_data': employees_data,
+            'now': timezone.now(),
+        }
+
+        return render(request, 'employees/reports/print_templates/attendance_monthly_detailed_print.html', detailed_context)
+
+    # ملخص الشهر لكل الموظفين النشطين باستعلام مجمع واحد
+    report_data = analytics.monthly_summary(year, month)
 
     context = {
         'year': year,
@@ -911,58 +845,7 @@ def report_attendance_monthly(request):
         'now': timezone.now(),
     }
 
-    # التحقق مما إذا كان المستخدم يريد استخدام قالب الطباعة المخصص
-    print_mode = request.GET.get('print', False)
     if print_mode:
-        # التحقق مما إذا كان المستخدم يريد التقرير التفصيلي أو الملخص
-        detailed = request.GET.get('detailed', False)
-        if detailed:
-            # الحصول على عدد أيام الشهر
-            _, days_in_month = calendar.monthrange(year, month)
-
-            # الحصول على سجلات الحضور لهذا الشهر
-            attendance_records = Attendance.objects.filter(
-                date__year=year,
-                date__month=month
-            )
-
-            # إنشاء قاموس لتسهيل الوصول إلى سجلات الحضور
-            attendance_dict = {}
-            for record in attendance_records:
-                key = f"{record.employee_id}_{record.date.day}"
-                attendance_dict[key] = record
-
-            # إنشاء بيانات الجدول
-            employees_data = []
-            for employee in active_employees:
-                days_data = []
-                for day in range(1, days_in_month + 1):
-                    key = f"{employee.id}_{day}"
-                    attendance = attendance_dict.get(key)
-                    days_data.append({
-                        'day': day,
-                        'attendance': attendance
-                    })
-
-                employees_data.append({
-                    'employee': employee,
-                    'days': days_data,
-                    'present_count': attendance_records.filter(employee=employee, status=Attendance.PRESENT).count(),
-                    'absent_count': attendance_records.filter(employee=employee, status=Attendance.ABSENT).count(),
-                    'excused_count': attendance_records.filter(employee=employee, status=Attendance.EXCUSED).count(),
-                })
-
-            detailed_context = {
-                'year': year,
-                'month': month,
-                'month_name': calendar.month_name[month],
-                'days_in_month': days_in_month,
-                'employees_data': employees_data,
-                'now': timezone.now(),
-            }
-
-            return render(request, 'employees/reports/print_templates/attendance_monthly_detailed_print.html', detailed_context)
-
         return render(request, 'employees/reports/print_templates/attendance_monthly_print.html', context)
 
     return render(request, 'employees/reports/attendance_monthly.html', context)
@@ -983,8 +866,8 @@ def report_employee_attendance(request, pk):
         year = timezone.now().year
         month = timezone.now().month
 
-    # الحصول على سجلات الحضور للموظف في الشهر المحدد
-    attendance_records = employee.get_monthly_attendance_report(year, month)
+    # الحصول على سجلات الحضور للموظف في الشهر المحدد مع عدد كل حالة
+    attendance_records, counts = analytics.employee_month(employee, year, month)
 
     context = {
         'employee': employee,
@@ -992,9 +875,9 @@ def report_employee_attendance(request, pk):
         'month': month,
         'month_name': calendar.month_name[month],
         'attendance_records': attendance_records,
-        'present_count': employee.get_attendance_count(year, month),
-        'absent_count': employee.get_absence_count(year, month),
-        'excused_count': employee.get_excused_absence_count(year, month),
+        'present_count': counts[Attendance.PRESENT],
+        'absent_count': counts[Attendance.ABSENT],
+        'excused_count': counts[Attendance.EXCUSED],
         'now': timezone.now(),
     }
 
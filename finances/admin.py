@@ -5,7 +5,7 @@ from django.urls import reverse
 from django.http import HttpResponseRedirect
 from django.contrib import messages
 from .models import (
-    SafeTransaction, ContactTransaction, ProductTransaction,
+    SafeTransaction, ContactTransaction, ProductTransaction, ProductStoreBalance,
     ExpenseCategory, IncomeCategory, Expense, Income, SafeDeposit, SafeWithdrawal,
     StorePermit, StorePermitItem
 )
@@ -142,6 +142,14 @@ class ProductTransactionAdmin(admin.ModelAdmin):
     invoice_link.short_description = _("الفاتورة")
     invoice_link.admin_order_field = 'invoice'
 
+@admin.register(ProductStoreBalance)
+class ProductStoreBalanceAdmin(admin.ModelAdmin):
+    list_display = ('product', 'store', 'quantity', 'last_transaction_date')
+    list_filter = ('store', 'product__category')
+    search_fields = ('product__name', 'product__code', 'store__name')
+    list_select_related = ('product', 'store')
+    readonly_fields = ('product', 'store', 'quantity', 'last_transaction_date')
+
 # تسجيل أقسام المصروفات والإيرادات
 @admin.register(ExpenseCategory)
 class ExpenseCategoryAdmin(admin.ModelAdmin):
@@ -586,12 +594,20 @@ class StorePermitAdmin(admin.ModelAdmin):
 
     def post_permit_action(self, request, queryset):
         """ترحيل الأذونات المحددة"""
+        from finances import balances
+
         posted_count = 0
-        for permit in queryset:
-            if not permit.is_posted:
-                success = permit.post_permit()
-                if success:
-                    posted_count += 1
+        # إعادة حساب رصيد كل منتج مرة واحدة لكل الأذونات المحددة
+        with balances.deferred():
+            for permit in queryset:
+                if not permit.is_posted:
+                    try:
+                        success = permit.post_permit()
+                    except ValueError as e:
+                        messages.error(request, f'{permit}: {e}')
+                        continue
+                    if success:
+                        posted_count += 1
 
         if posted_count > 0:
             messages.success(request, f'تم ترحيل {posted_count} إذن بنجاح.')
@@ -2,9 +2,12 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django_filters.rest_framework import DjangoFilterBackend
+from core.filters import DateRangeFilterSet
+from core.pagination import LedgerCursorPagination
 from .models import (
     ExpenseCategory, IncomeCategory, SafeTransaction, 
-    ContactTransaction, ProductTransaction, Expense, Income,
+    ContactTransaction, ProductTransaction, ProductStoreBalance, Expense, Income,
     SafeDeposit, SafeWithdrawal, MoneyTransfer,
     InventoryAdjustment, StockTransfer
 )
@@ -12,38 +15,90 @@ from .serializers import (
     ExpenseCategorySerializer, IncomeCategorySerializer, SafeTransactionSerializer,
     ContactTransactionSerializer, ProductTransactionSerializer, ExpenseSerializer, IncomeSerializer,
     SafeDepositSerializer, SafeWithdrawalSerializer, MoneyTransferSerializer,
-    InventoryAdjustmentSerializer, StockTransferSerializer
+    InventoryAdjustmentSerializer, StockTransferSerializer, ProductStoreBalanceSerializer
 )
 
+class SafeTransactionFilter(DateRangeFilterSet):
+    class Meta:
+        model = SafeTransaction
+        fields = ['safe', 'bank', 'contact', 'invoice', 'transaction_type']
+
+class ContactTransactionFilter(DateRangeFilterSet):
+    class Meta:
+        model = ContactTransaction
+        fields = ['contact', 'invoice', 'transaction_type']
+
+class ProductTransactionFilter(DateRangeFilterSet):
+    class Meta:
+        model = ProductTransaction
+        fields = ['product', 'store', 'invoice', 'transaction_type']
+
 class ExpenseCategoryViewSet(viewsets.ModelViewSet):
-    queryset = ExpenseCategory.objects.all()
+    queryset = ExpenseCategory.objects.order_by('id')
     serializer_class = ExpenseCategorySerializer
     permission_classes = [IsAuthenticated]
+    search_fields = ['name']
 
 class IncomeCategoryViewSet(viewsets.ModelViewSet):
-    queryset = IncomeCategory.objects.all()
+    queryset = IncomeCategory.objects.order_by('id')
     serializer_class = IncomeCategorySerializer
     permission_classes = [IsAuthenticated]
+    search_fields = ['name']
 
+# دفاتر الحركات تُرقَّم بالمؤشر (?limit=) لأنها أكبر جداول النظام
 class SafeTransactionViewSet(viewsets.ModelViewSet):
-    queryset = SafeTransaction.objects.all()
+    queryset = SafeTransaction.objects.select_related(
+        'safe', 'bank', 'contact',
+        'created_by_expense', 'created_by_income', 'created_by_deposit', 'created_by_withdrawal'
+    ).order_by('-date', '-id')
     serializer_class = SafeTransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = LedgerCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = SafeTransactionFilter
 
 class ContactTransactionViewSet(viewsets.ModelViewSet):
-    queryset = ContactTransaction.objects.all()
+    queryset = ContactTransaction.objects.select_related('contact').order_by('-date', '-id')
     serializer_class = ContactTransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = LedgerCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ContactTransactionFilter
 
 class ProductTransactionViewSet(viewsets.ModelViewSet):
-    queryset = ProductTransaction.objects.all()
+    queryset = ProductTransaction.objects.select_related('product', 'store').order_by('-date', '-id')
     serializer_class = ProductTransactionSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = LedgerCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ProductTransactionFilter
+
+class ProductStoreBalanceViewSet(viewsets.ReadOnlyModelViewSet):
+    """أرصدة المنتجات في المخازن (تُحدَّث تلقائيًا من حركات المنتجات)"""
+    queryset = ProductStoreBalance.objects.select_related('product', 'store').order_by('product_id', 'store_id')
+    serializer_class = ProductStoreBalanceSerializer
+    permission_classes = [IsAuthenticated]
+    filterset_fields = ['product', 'store']
+    search_fields = ['product__name', 'product__code']
+
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """الكمية المتاحة من منتج في مخزن معين: ?product=<id>&store=<id>"""
+        product_id = request.query_params.get('product')
+        store_id = request.query_params.get('store')
+        if not product_id or not store_id:
+            return Response({'error': 'product and store are required'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'product': int(product_id),
+            'store': int(store_id),
+            'quantity': ProductStoreBalance.get_quantity(product_id, store_id),
+        })
 
 class ExpenseViewSet(viewsets.ModelViewSet):
-    queryset = Expense.objects.all()
+    queryset = Expense.objects.select_related('category', 'safe', 'bank').order_by('-date', '-id')
     serializer_class = ExpenseSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['category', 'safe', 'bank', 'cost_center', 'is_posted']
 
     @action(detail=True, methods=['post'])
     def post_expense(self, request, pk=None):
@@ -53,9 +108,10 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         return Response({'error': 'could not post expense'}, status=status.HTTP_400_BAD_REQUEST)
 
 class IncomeViewSet(viewsets.ModelViewSet):
-    queryset = Income.objects.all()
+    queryset = Income.objects.select_related('category', 'safe', 'bank').order_by('-date', '-id')
     serializer_class = IncomeSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['category', 'safe', 'bank', 'cost_center', 'is_posted']
 
     @action(detail=True, methods=['post'])
     def post_income(self, request, pk=None):
@@ -65,24 +121,28 @@ class IncomeViewSet(viewsets.ModelViewSet):
         return Response({'error': 'could not post income'}, status=status.HTTP_400_BAD_REQUEST)
 
 class SafeDepositViewSet(viewsets.ModelViewSet):
-    queryset = SafeDeposit.objects.all()
+    queryset = SafeDeposit.objects.select_related('safe', 'bank').order_by('-date', '-id')
     serializer_class = SafeDepositSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['safe', 'bank', 'is_posted']
 
 class SafeWithdrawalViewSet(viewsets.ModelViewSet):
-    queryset = SafeWithdrawal.objects.all()
+    queryset = SafeWithdrawal.objects.select_related('safe', 'bank').order_by('-date', '-id')
     serializer_class = SafeWithdrawalSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['safe', 'bank', 'is_posted']
 
 class MoneyTransferViewSet(viewsets.ModelViewSet):
-    queryset = MoneyTransfer.objects.all()
+    queryset = MoneyTransfer.objects.select_related('from_safe', 'from_bank', 'to_safe', 'to_bank').order_by('-date', '-id')
     serializer_class = MoneyTransferSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['from_safe', 'from_bank', 'to_safe', 'to_bank', 'is_posted']
 
 class InventoryAdjustmentViewSet(viewsets.ModelViewSet):
-    queryset = InventoryAdjustment.objects.all().order_by('-date')
+    queryset = InventoryAdjustment.objects.select_related('product', 'store', 'product_unit__unit').order_by('-date', '-id')
     serializer_class = InventoryAdjustmentSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['product', 'store', 'adjustment_type', 'is_posted']
 
     @action(detail=True, methods=['post'])
     def post_adjustment(self, request, pk=None):
@@ -94,9 +154,10 @@ class InventoryAdjustmentViewSet(viewsets.ModelViewSet):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 class StockTransferViewSet(viewsets.ModelViewSet):
-    queryset = StockTransfer.objects.all().order_by('-date')
+    queryset = StockTransfer.objects.select_related('product', 'from_store', 'to_store', 'product_unit__unit').order_by('-date', '-id')
     serializer_class = StockTransferSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['product', 'from_store', 'to_store', 'is_posted']
 
     @action(detail=True, methods=['post'])
     def post_transfer(self, request, pk=None):
@@ -0,0 +1,150 @@
+"""
+تأجيل إعادة حساب أرصدة الخزن والبنوك وجهات الاتصال والمنتجات.
+
+عمليات الترحيل (الفواتير، الأذونات المخزنية، التحويلات، المرتبات) تنشئ عدة حركات
+في نفس المعاملة، وكل حفظ أو حذف لحركة كان يعيد حساب رصيد الكائن المرتبط بالكامل.
+داخل نطاق deferred() تكتفي دوال الحفظ والحذف بتسجيل الكائنات المتأثرة، ثم يعاد حساب
+رصيد كل كائن مرة واحدة فقط عند الخروج من النطاق الخارجي، داخل نفس المعاملة وقبل تأكيدها،
+فإذا فشلت إعادة الحساب تُلغى المعاملة كلها.
+
+حركات الخزن والبنوك لا تُؤجَّل: حفظها يحدّث الأرصدة تزايديًا دائمًا، وتُسجل الخزن والبنوك هنا
+فقط عند الحذف الجماعي (touch_transactions) فيعاد بناؤها بالمجموع التراكمي.
+
+مثال:
+    from finances import balances
+
+    with balances.deferred():
+        ...  # إنشاء أو حذف حركات
+
+    @balances.deferred()
+    def post_something(self):
+        ...
+"""
+import threading
+from contextlib import ContextDecorator
+
+from django.db import transaction
+
+_state = threading.local()
+
+
+def _pending():
+    if not hasattr(_state, 'pending'):
+        _state.pending = {}
+    return _state.pending
+
+
+def _atomics():
+    if not hasattr(_state, 'atomics'):
+        _state.atomics = []
+    return _state.atomics
+
+
+def is_deferred():
+    """هل يعمل الكود الحالي داخل نطاق تأجيل إعادة الحساب؟"""
+    return bool(_atomics())
+
+
+def touch(obj):
+    """تسجيل كائن (خزنة، بنك، جهة اتصال، منتج) تأثر رصيده داخل نطاق التأجيل"""
+    if obj is None or obj.pk is None:
+        return
+    _pending().setdefault(type(obj), set()).add(obj.pk)
+
+
+def touch_ids(model, pks):
+    """تسجيل مجموعة معرفات لنموذج معين تأثرت أرصدتها"""
+    pks = {pk for pk in pks if pk is not None}
+    if pks:
+        _pending().setdefault(model, set()).update(pks)
+
+
+def touch_transactions(queryset):
+    """
+    تسجيل أصحاب الحركات في استعلام قبل حذفه دفعة واحدة (queryset.delete)
+    لأن الحذف الجماعي لا يمر بدالة delete الخاصة بكل حركة
+    """
+    from core.models import Safe, Bank, Contact
+    from products.models import Product
+
+    fields = {f.name for f in queryset.model._meta.get_fields()}
+    for field, model in (('safe', Safe), ('bank', Bank), ('contact', Contact), ('product', Product)):
+        if field in fields:
+            touch_ids(model, queryset.values_list(f'{field}_id', flat=True).distinct())
+
+
+def schedule(obj):
+    """إعادة حساب رصيد الكائن فورًا، أو تأجيلها إذا كنا داخل نطاق التأجيل"""
+    if obj is None:
+        return
+    if is_deferred():
+        touch(obj)
+    else:
+        rebuild(type(obj), [obj.pk])
+
+
+def schedule_ids(model, pks):
+    """مثل schedule لمجموعة معرفات من نفس النموذج"""
+    if is_deferred():
+        touch_ids(model, pks)
+    else:
+        rebuild(model, [pk for pk in pks if pk is not None])
+
+
+def rebuild(model, pks):
+    """إعادة حساب الأرصدة من الحركات لمجموعة كائنات من نفس النموذج"""
+    from core.models import Safe, Bank, Contact
+    from products.models import Product
+    from finances.models import SafeTransaction, ContactTransaction, ProductTransaction
+
+    if model in (Safe, Bank):
+        # كل الخزن (أو البنوك) باستعلام تراكمي واحد مقسم حسب صاحب الحركة
+        SafeTransaction.recalculate_owners(model, list(pks))
+        return
+
+    handlers = {
+        Contact: ContactTransaction.recalculate_balances,
+        Product: ProductTransaction.recalculate_balances,
+    }
+    handler = handlers.get(model)
+    if handler is None:
+        return
+    for obj in model.objects.filter(pk__in=pks):
+        handler(obj)
+
+
+def flush(pending):
+    """إعادة حساب كل كائن مسجل مرة واحدة"""
+    with transaction.atomic():
+        for model, pks in pending.items():
+            rebuild(model, sorted(pks))
+
+
+class deferred(ContextDecorator):
+    """
+    نطاق (Context Manager / Decorator) يؤجل إعادة حساب الأرصدة حتى نهاية النطاق الخارجي.
+    يفتح النطاق معاملة ذرية، والنطاقات المتداخلة تُدمج في النطاق الخارجي.
+    """
+
+    def __enter__(self):
+        atomic = transaction.atomic()
+        atomic.__enter__()
+        _atomics().append(atomic)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        atomics = _atomics()
+        atomic = atomics.pop()
+        if not atomics:
+            pending = _pending().copy()
+            _pending().clear()
+            if exc_type is None and pending:
+                # إعادة الحساب داخل المعاملة (خارج نطاق التأجيل) قبل تأكيدها
+                try:
+                    flush(pending)
+                except BaseException as error:
+                    if not atomic.__exit__(type(error), error, error.__traceback__):
+                        raise
+                    return False
+        atomic.__exit__(exc_type, exc_value, traceback)
+        return False
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from finances.models import BalanceCheckpoint
+
+class Command(BaseCommand):
+    help = 'Rebuild daily balance checkpoints for safes, banks, contacts and products from their transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=BalanceCheckpoint.KINDS, action='append',
+                            help='Only rebuild this kind of checkpoint (repeatable, default: all)')
+        parser.add_argument('--id', type=int, action='append', dest='ids',
+                            help='Limit the rebuild to this owner id (requires a single --kind)')
+
+    def handle(self, *args, **options):
+        kinds = options['kind'] or BalanceCheckpoint.KINDS
+        ids = options['ids']
+        if ids and len(kinds) != 1:
+            self.stderr.write(self.style.ERROR('--id requires exactly one --kind'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'Starting checkpoint backfill at {timezone.now()}'))
+
+        for kind in kinds:
+            count = BalanceCheckpoint.rebuild(kind, ids)
+            self.stdout.write(self.style.SUCCESS(f'{kind}: {count} checkpoints written.'))
+
+        self.stdout.write(self.style.SUCCESS('Checkpoint backfill completed.'))
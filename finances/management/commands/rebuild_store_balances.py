@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from finances.models import ProductStoreBalance
+
+class Command(BaseCommand):
+    help = 'Rebuild per-store product balances from product transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', help='Limit the rebuild to this product id (repeatable)')
+        parser.add_argument('--store', type=int, action='append', help='Limit the rebuild to this store id (repeatable)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Starting store balance rebuild at {timezone.now()}'))
+
+        count = ProductStoreBalance.rebuild(products=options['product'], stores=options['store'])
+
+        self.stdout.write(self.style.SUCCESS(f'Store balance rebuild completed. {count} balances written.'))
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finances", "0019_inventoryadjustment_stocktransfer"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="safetransaction",
+            index=models.Index(fields=["safe", "date"], name="safetrans_safe_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="safetransaction",
+            index=models.Index(fields=["bank", "date"], name="safetrans_bank_date_idx"),
+        ),
+    ]
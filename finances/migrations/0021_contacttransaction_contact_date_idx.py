@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finances", "0020_safetransaction_balance_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="contacttransaction",
+            index=models.Index(
+                fields=["contact", "date"], name="contacttrans_contact_date_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Case, F, Max, Sum, When
+
+
+def populate_store_balances(apps, schema_editor):
+    ProductTransaction = apps.get_model("finances", "ProductTransaction")
+    ProductStoreBalance = apps.get_model("finances", "ProductStoreBalance")
+    rows = (
+        ProductTransaction.objects.order_by()
+        .values("product_id", "store_id")
+        .annotate(
+            quantity=Sum(
+                Case(
+                    When(transaction_type__in=("sale", "purchase_return"), then=-F("base_quantity")),
+                    default=F("base_quantity"),
+                )
+            ),
+            last_transaction_date=Max("date"),
+        )
+    )
+    ProductStoreBalance.objects.bulk_create(
+        [ProductStoreBalance(**row) for row in rows], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_systemsettings_link_cost_centers_and_more"),
+        ("finances", "0021_contacttransaction_contact_date_idx"),
+        ("products", "0003_product_tax_rate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductStoreBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "quantity",
+                    models.DecimalField(
+                        decimal_places=3,
+                        default=0,
+                        max_digits=15,
+                        verbose_name="الكمية بالوحدة الأساسية",
+                    ),
+                ),
+                (
+                    "last_transaction_date",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="تاريخ آخر حركة"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "رصيد منتج في مخزن",
+                "verbose_name_plural": "أرصدة المنتجات في المخازن",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="producttransaction",
+            index=models.Index(
+                fields=["product", "date"], name="prodtrans_product_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="producttransaction",
+            index=models.Index(
+                fields=["product", "store", "date"],
+                name="prodtrans_prod_store_date_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productstorebalance",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="store_balances",
+                to="products.product",
+                verbose_name="المنتج",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productstorebalance",
+            name="store",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="product_balances",
+                to="core.store",
+                verbose_name="المخزن",
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="productstorebalance",
+            unique_together={("product", "store")},
+        ),
+        migrations.RunPython(populate_store_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,124 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_systemsettings_link_cost_centers_and_more"),
+        ("finances", "0022_productstorebalance"),
+        ("products", "0003_product_tax_rate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BalanceCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="التاريخ")),
+                (
+                    "net_change",
+                    models.DecimalField(
+                        decimal_places=3,
+                        default=0,
+                        max_digits=15,
+                        verbose_name="صافي حركة اليوم",
+                    ),
+                ),
+                (
+                    "cumulative_change",
+                    models.DecimalField(
+                        decimal_places=3,
+                        default=0,
+                        max_digits=15,
+                        verbose_name="الحركة التراكمية حتى نهاية اليوم",
+                    ),
+                ),
+                (
+                    "bank",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_checkpoints",
+                        to="core.bank",
+                        verbose_name="البنك",
+                    ),
+                ),
+                (
+                    "contact",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_checkpoints",
+                        to="core.contact",
+                        verbose_name="جهة الاتصال",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_checkpoints",
+                        to="products.product",
+                        verbose_name="المنتج",
+                    ),
+                ),
+                (
+                    "safe",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_checkpoints",
+                        to="core.safe",
+                        verbose_name="الخزنة",
+                    ),
+                ),
+                (
+                    "store",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="balance_checkpoints",
+                        to="core.store",
+                        verbose_name="المخزن",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "نقطة رصيد يومية",
+                "verbose_name_plural": "نقاط الأرصدة اليومية",
+                "ordering": ["date"],
+                "indexes": [
+                    models.Index(
+                        fields=["safe", "date"], name="checkpoint_safe_date_idx"
+                    ),
+                    models.Index(
+                        fields=["bank", "date"], name="checkpoint_bank_date_idx"
+                    ),
+                    models.Index(
+                        fields=["contact", "date"], name="checkpoint_contact_date_idx"
+                    ),
+                    models.Index(
+                        fields=["product", "store", "date"],
+                        name="checkpoint_product_date_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finances", "0023_balancecheckpoint"),
+        ("invoices", "0007_invoice_discount_type_invoice_discount_value_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="producttransaction",
+            name="invoice_item",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="product_transactions",
+                to="invoices.invoiceitem",
+                verbose_name="بند الفاتورة",
+            ),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:49
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count
+
+OWNER_FIELDS = ("safe_id", "bank_id", "contact_id", "product_id", "store_id")
+
+
+def merge_duplicate_checkpoints(apps, schema_editor):
+    """دمج النقاط المكررة لنفس الصاحب واليوم ثم إعادة حساب الحركة التراكمية لما بعدها"""
+    BalanceCheckpoint = apps.get_model("finances", "BalanceCheckpoint")
+    duplicates = (
+        BalanceCheckpoint.objects.order_by()
+        .values(*OWNER_FIELDS, "date")
+        .annotate(count=Count("id"))
+        .filter(count__gt=1)
+    )
+    for row in list(duplicates):
+        keys = {field: row[field] for field in OWNER_FIELDS}
+        checkpoints = list(BalanceCheckpoint.objects.filter(date=row["date"], **keys).order_by("pk"))
+        kept = checkpoints[0]
+        kept.net_change = sum((checkpoint.net_change for checkpoint in checkpoints), Decimal("0"))
+        kept.save(update_fields=["net_change"])
+        BalanceCheckpoint.objects.filter(pk__in=[checkpoint.pk for checkpoint in checkpoints[1:]]).delete()
+
+        cumulative = (
+            BalanceCheckpoint.objects.filter(date__lt=row["date"], **keys)
+            .order_by("-date")
+            .values_list("cumulative_change", flat=True)
+            .first()
+            or Decimal("0")
+        )
+        for checkpoint in BalanceCheckpoint.objects.filter(date__gte=row["date"], **keys).order_by("date"):
+            cumulative += checkpoint.net_change
+            checkpoint.cumulative_change = cumulative
+            checkpoint.save(update_fields=["cumulative_change"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0021_search_index"),
+        ("finances", "0024_producttransaction_invoice_item"),
+        (
+            "products",
+            "0005_product_product_barcode_idx_product_product_code_idx_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_checkpoints, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="balancecheckpoint",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("safe__isnull", False)),
+                fields=("safe", "date"),
+                name="checkpoint_safe_date_uniq",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="balancecheckpoint",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("bank__isnull", False)),
+                fields=("bank", "date"),
+                name="checkpoint_bank_date_uniq",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="balancecheckpoint",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("contact__isnull", False)),
+                fields=("contact", "date"),
+                name="checkpoint_contact_date_uniq",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="balancecheckpoint",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("product__isnull", False), ("store__isnull", True)),
+                fields=("product", "date"),
+                name="checkpoint_product_total_date_uniq",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="balancecheckpoint",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("product__isnull", False), ("store__isnull", False)
+                ),
+                fields=("product", "store", "date"),
+                name="checkpoint_product_store_date_uniq",
+            ),
+        ),
+    ]
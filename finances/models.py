@@ -1,9 +1,48 @@
+from datetime import datetime
+from decimal import Decimal
 from django.db import models
+from django.db.models import Case, F, Max, Q, Sum, Value, When, Window
+from django.db.models.functions import TruncDate
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
-from core.models import Safe, Bank, Contact, Store, Representative, Driver
+from core.models import Safe, Bank, Contact, Store, Representative, Driver, DocumentSequence
+from finances import balances
 from products.models import Product, ProductUnit
 
+
+def lock_owners(owners):
+    """
+    قفل صفوف أصحاب الأرصدة (('safe', id), ('bank', id), ('contact', id), ('product', id))
+    بترتيب ثابت حسب النوع ثم المعرف، حتى لا يتقاطع قفل تعديلين متزامنين ينقلان حركات بين نفس الأصحاب
+    """
+    models_by_kind = {'bank': Bank, 'contact': Contact, 'product': Product, 'safe': Safe}
+    for kind in sorted({kind for kind, pk in owners}):
+        pks = sorted({pk for owner_kind, pk in owners if owner_kind == kind and pk is not None})
+        if pks:
+            list(models_by_kind[kind].objects.select_for_update().filter(pk__in=pks)
+                 .order_by('pk').values_list('pk', flat=True))
+
+
+def reload_locked(queryset, fields, owners_of, extra_owners=()):
+    """
+    إعادة قراءة حركة محفوظة تحت قفل أصحابها قبل تعديل الأرصدة بأثرها، لأن النسخة في الذاكرة قد تكون قديمة
+    (حذف مكرر، أو تعديل من طلب آخر بعد تحميلها).
+    تُقفل أصحاب الحركة المحفوظة والأصحاب الإضافيون (صاحب الحالة الجديدة عند التعديل) ثم تُقرأ الحركة مقفلة،
+    وإذا نقلها طلب آخر إلى صاحب غير مقفول تُعاد المحاولة.
+    يرجع قيم الحركة المحفوظة، أو None إذا لم تعد موجودة.
+    """
+    locked = set()
+    while True:
+        row = queryset.values(*fields).first()
+        needed = set(extra_owners) | (set(owners_of(row)) if row is not None else set())
+        if needed - locked:
+            lock_owners(needed - locked)
+            locked |= needed
+        row = queryset.select_for_update().values(*fields).first()
+        if row is None or set(owners_of(row)) <= locked:
+            return row
+
+
 class ExpenseCategory(models.Model):
     """أقسام المصروفات في النظام"""
     name = models.CharField(_("اسم القسم"), max_length=100)
@@ -36,6 +75,23 @@ class IncomeCategory(models.Model):
     def __str__(self):
         return self.name
 
+class SafeTransactionQuerySet(models.QuerySet):
+    def delete(self):
+        """الحذف الجماعي لا يمر بدالة delete لكل حركة، لذا نعيد بناء نقاط الأرصدة اليومية المتأثرة"""
+        from django.db import transaction
+
+        with transaction.atomic():
+            owners = list(self.order_by().values_list('safe_id', 'bank_id').distinct())
+            result = super().delete()
+            safes = {safe_id for safe_id, _bank_id in owners if safe_id}
+            banks = {bank_id for safe_id, bank_id in owners if not safe_id and bank_id}
+            if safes:
+                BalanceCheckpoint.rebuild('safe', safes)
+            if banks:
+                BalanceCheckpoint.rebuild('bank', banks)
+        return result
+
+
 class SafeTransaction(models.Model):
     # أنواع العمليات المالية المتعلقة بالخزنة
     SALE_INVOICE = 'sale_invoice'
@@ -62,6 +118,13 @@ class SafeTransaction(models.Model):
         (INCOME, _("إيراد")),
     ]
 
+    # أنواع العمليات التي تزيد رصيد الخزنة أو البنك والأنواع التي تنقصه
+    INCREASE_TYPES = (SALE_INVOICE, COLLECTION, DEPOSIT, INCOME, PURCHASE_RETURN_INVOICE)
+    DECREASE_TYPES = (PURCHASE_INVOICE, PAYMENT, WITHDRAWAL, EXPENSE, SALE_RETURN_INVOICE)
+
+    # الحقول التي يؤثر تغييرها على تسلسل الأرصدة
+    BALANCE_FIELDS = {'safe', 'bank', 'date', 'amount', 'transaction_type'}
+
     safe = models.ForeignKey(Safe, on_delete=models.CASCADE, related_name='transactions', verbose_name=_("الخزنة"), null=True, blank=True)
     bank = models.ForeignKey(Bank, on_delete=models.CASCADE, related_name='transactions', verbose_name=_("البنك"), null=True, blank=True)
     date = models.DateTimeField(_("تاريخ العملية"), default=timezone.now)
@@ -76,10 +139,16 @@ class SafeTransaction(models.Model):
     balance_before = models.DecimalField(_("الرصيد قبل العملية"), max_digits=15, decimal_places=2)
     balance_after = models.DecimalField(_("الرصيد بعد العملية"), max_digits=15, decimal_places=2)
 
+    objects = SafeTransactionQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("حركة مالية")
         verbose_name_plural = _("حركات مالية")
         ordering = ['date']  # ترتيب الحركات حسب التاريخ تصاعديًا للحصول على تسلسل صحيح
+        indexes = [
+            models.Index(fields=['safe', 'date'], name='safetrans_safe_date_idx'),
+            models.Index(fields=['bank', 'date'], name='safetrans_bank_date_idx'),
+        ]
 
     def __str__(self):
         obj_name = self.safe.name if self.safe else self.bank.name
@@ -97,96 +166,288 @@ class SafeTransaction(models.Model):
             elif self.invoice.invoice_type == 'purchase_return':
                 self.transaction_type = self.PURCHASE_RETURN_INVOICE
 
+    @classmethod
+    def signed_amount_sql(cls):
+        """نفس تأثير signed_amount كتعبير SQL خام (للمجموع التراكمي في recalculate_owners)"""
+        increase = ', '.join(['%s'] * len(cls.INCREASE_TYPES))
+        decrease = ', '.join(['%s'] * len(cls.DECREASE_TYPES))
+        sql = (f"CASE WHEN transaction_type IN ({increase}) THEN amount "
+               f"WHEN transaction_type IN ({decrease}) THEN -amount ELSE 0 END")
+        return sql, list(cls.INCREASE_TYPES) + list(cls.DECREASE_TYPES)
+
     @staticmethod
     def recalculate_balances(obj):
+        """إعادة حساب أرصدة جميع حركات الخزنة أو البنك من البداية (انظر recalculate_owners)"""
+        SafeTransaction.recalculate_owners(type(obj), [obj.pk])
+        obj.refresh_from_db(fields=['current_balance'])
+        return obj.current_balance
+
+    @staticmethod
+    def recalculate_owners(model, pks):
         """
-        إعادة حساب أرصدة جميع حركات الخزنة أو البنك من البداية
+        إعادة حساب أرصدة حركات مجموعة خزن أو بنوك من البداية باستعلامين فقط مهما كان عددها:
+        تحديث واحد يعتمد على المجموع التراكمي (Window Function) مقسمًا حسب صاحب الحركة،
+        ثم تحديث واحد للرصيد الحالي لكل صاحب من آخر حركة له.
+        حركات البنك هي الحركات غير المرتبطة بخزنة (نفس قاعدة _owner_filter في الحفظ التزايدي).
         """
-        from django.db import transaction
+        from django.db import connection, transaction
+        from django.db.models import OuterRef, Subquery
+        from django.db.models.functions import Coalesce
+
+        pks = [pk for pk in pks if pk is not None]
+        if not pks:
+            return
+
+        is_safe = model is Safe
+        table = connection.ops.quote_name(SafeTransaction._meta.db_table)
+        owner_table = connection.ops.quote_name(model._meta.db_table)
+        owner_column = 'safe_id' if is_safe else 'bank_id'
+        signed_sql, signed_params = SafeTransaction.signed_amount_sql()
+        placeholders = ', '.join(['%s'] * len(pks))
+        where = f"{owner_column} IN ({placeholders})" + ('' if is_safe else ' AND safe_id IS NULL')
+
+        # الرصيد بعد كل حركة = الرصيد الافتتاحي لصاحبها + مجموع تأثير حركاته حتى هذه الحركة (بترتيب التاريخ ثم المعرف)
+        sql = f"""
+            WITH running AS (
+                SELECT id,
+                       {signed_sql} AS signed_amount,
+                       (SELECT initial_balance FROM {owner_table} WHERE {owner_table}.id = {table}.{owner_column})
+                       + SUM({signed_sql}) OVER (
+                           PARTITION BY {owner_column}
+                           ORDER BY date, id ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                       ) AS balance_after
+                FROM {table}
+                WHERE {where}
+            )
+            UPDATE {table}
+            SET balance_after = (
+                    SELECT ROUND(running.balance_after, 2) FROM running WHERE running.id = {table}.id
+                ),
+                balance_before = (
+                    SELECT ROUND(running.balance_after - running.signed_amount, 2)
+                    FROM running WHERE running.id = {table}.id
+                )
+            WHERE {where}
+        """
+        params = signed_params + signed_params + pks + pks
+
+        owner_filter = {owner_column: OuterRef('pk')}
+        if not is_safe:
+            owner_filter['safe__isnull'] = True
+        last_balance = SafeTransaction.objects.filter(**owner_filter).order_by('-date', '-id').values('balance_after')[:1]
 
-        is_safe = isinstance(obj, Safe)
-        
         with transaction.atomic():
-            # الحصول على جميع حركات الخزنة أو البنك مرتبة حسب التاريخ
-            if is_safe:
-                transactions = SafeTransaction.objects.filter(safe=obj).order_by('date')
-            else:
-                transactions = SafeTransaction.objects.filter(bank=obj).order_by('date')
-
-            # إعادة تعيين الرصيد إلى الرصيد الافتتاحي
-            current_balance = obj.initial_balance
-
-            # طباعة معلومات تصحيح الأخطاء
-            print(f"إعادة حساب أرصدة {obj.name} - الرصيد الافتتاحي: {current_balance}")
-
-            # إعادة حساب الأرصدة لكل حركة
-            for trans in transactions:
-                # تحديث الرصيد قبل العملية
-                trans.balance_before = current_balance
-
-                # إعادة حساب الرصيد بعد العملية بناءً على نوع العملية
-                if trans.transaction_type in [SafeTransaction.SALE_INVOICE, SafeTransaction.COLLECTION, SafeTransaction.DEPOSIT, SafeTransaction.INCOME]:
-                    # عمليات تزيد الرصيد
-                    trans.balance_after = trans.balance_before + trans.amount
-                elif trans.transaction_type in [SafeTransaction.PURCHASE_INVOICE, SafeTransaction.PAYMENT, SafeTransaction.WITHDRAWAL, SafeTransaction.EXPENSE]:
-                    # عمليات تنقص الرصيد
-                    trans.balance_after = trans.balance_before - trans.amount
-                elif trans.transaction_type == SafeTransaction.SALE_RETURN_INVOICE:
-                    # مرتجع بيع ينقص الرصيد
-                    trans.balance_after = trans.balance_before - trans.amount
-                elif trans.transaction_type == SafeTransaction.PURCHASE_RETURN_INVOICE:
-                    # مرتجع شراء يزيد الرصيد
-                    trans.balance_after = trans.balance_before + trans.amount
-
-                # تحديث الرصيد الحالي للحركة التالية
-                current_balance = trans.balance_after
-
-                # حفظ التغييرات بدون استدعاء دالة save المخصصة
-                SafeTransaction.objects.filter(pk=trans.pk).update(
-                    balance_before=trans.balance_before,
-                    balance_after=trans.balance_after
-                )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+            # الرصيد الحالي من آخر حركة، أو الرصيد الافتتاحي إذا لم توجد حركات
+            model.objects.filter(pk__in=pks).update(
+                current_balance=Coalesce(Subquery(last_balance), F('initial_balance'))
+            )
 
-            # تحديث الرصيد النهائي
-            if transactions.exists():
-                obj.current_balance = transactions.last().balance_after
-            else:
-                obj.current_balance = obj.initial_balance
+    @classmethod
+    def signed_amount(cls, transaction_type, amount):
+        """تأثير العملية على رصيد الخزنة أو البنك (موجب للزيادة وسالب للنقصان)"""
+        if transaction_type in cls.INCREASE_TYPES:
+            return amount
+        if transaction_type in cls.DECREASE_TYPES:
+            return -amount
+        return Decimal('0')
+
+    @classmethod
+    def signed_amount_expression(cls):
+        """نفس تأثير signed_amount كتعبير قاعدة بيانات للتجميع"""
+        return Case(
+            When(transaction_type__in=cls.INCREASE_TYPES, then=F('amount')),
+            When(transaction_type__in=cls.DECREASE_TYPES, then=-F('amount')),
+            default=Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=15, decimal_places=2),
+        )
+
+    @staticmethod
+    def _checkpoint_owner(safe_id, bank_id):
+        """مفتاح صاحب الحركة في نقاط الأرصدة اليومية (الخزنة لها الأولوية كما في _owner_filter)"""
+        if safe_id:
+            return {'safe_id': safe_id}
+        if bank_id:
+            return {'bank_id': bank_id}
+        return None
 
-            obj.save(update_fields=['current_balance'])
+    @staticmethod
+    def _owner_filter(safe_id, bank_id):
+        """شرط التصفية على الخزنة أو البنك صاحب الحركة (حركات البنك هي غير المرتبطة بخزنة)"""
+        if safe_id:
+            return {'safe_id': safe_id}
+        return {'bank_id': bank_id, 'safe__isnull': True}
+
+    @staticmethod
+    def _owner_model(safe_id):
+        return Safe if safe_id else Bank
+
+    @classmethod
+    def _lock_owner(cls, safe_id, bank_id):
+        """قفل صف الخزنة أو البنك حتى تتسلسل التحديثات المتزامنة على نفس الرصيد"""
+        if not safe_id and not bank_id:
+            return None
+        model = cls._owner_model(safe_id)
+        return model.objects.select_for_update().only('id', 'initial_balance').get(pk=safe_id or bank_id)
+
+    @classmethod
+    def _bump_owner(cls, safe_id, bank_id, delta):
+        """تعديل الرصيد الحالي للخزنة أو البنك بمقدار التغيير في استعلام واحد"""
+        if not delta or (not safe_id and not bank_id):
+            return
+        cls._owner_model(safe_id).objects.filter(pk=safe_id or bank_id).update(
+            current_balance=F('current_balance') + delta
+        )
+
+    @classmethod
+    def _shift_after(cls, safe_id, bank_id, date, pk, delta):
+        """
+        إزاحة أرصدة جميع الحركات اللاحقة لموضع (التاريخ، المعرف) بمقدار delta
+        بتحديث واحد على مستوى المجموعة بدلاً من حلقة على كل حركة
+        """
+        if not delta or (not safe_id and not bank_id):
+            return
+        cls.objects.filter(**cls._owner_filter(safe_id, bank_id)).filter(
+            Q(date__gt=date) | Q(date=date, pk__gt=pk)
+        ).update(
+            balance_before=F('balance_before') + delta,
+            balance_after=F('balance_after') + delta,
+        )
+
+    LEDGER_FIELDS = ('safe_id', 'bank_id', 'date', 'amount', 'transaction_type')
+
+    @staticmethod
+    def _owners(row):
+        """صاحب الحركة كمفتاح قفل (الخزنة لها الأولوية كما في _owner_filter)"""
+        if row['safe_id']:
+            return [('safe', row['safe_id'])]
+        if row['bank_id']:
+            return [('bank', row['bank_id'])]
+        return []
+
+    def _reload_locked(self):
+        """الحركة كما هي محفوظة بعد قفل صاحبها القديم والجديد (انظر reload_locked)"""
+        return reload_locked(
+            SafeTransaction.objects.filter(pk=self.pk), self.LEDGER_FIELDS, self._owners,
+            self._owners({'safe_id': self.safe_id, 'bank_id': self.bank_id}),
+        )
+
+    def _previous_balance(self, owner):
+        """رصيد آخر حركة تسبق موضع هذه الحركة، أو الرصيد الافتتاحي إذا لم توجد"""
+        transactions = SafeTransaction.objects.filter(**self._owner_filter(self.safe_id, self.bank_id))
+        if self.pk is None:
+            # الحركة الجديدة تأخذ أكبر معرف، فتأتي بعد كل الحركات في نفس التاريخ
+            transactions = transactions.filter(date__lte=self.date)
+        else:
+            transactions = transactions.filter(Q(date__lt=self.date) | Q(date=self.date, pk__lt=self.pk))
+        previous = transactions.order_by('-date', '-pk').values_list('balance_after', flat=True).first()
+        return previous if previous is not None else owner.initial_balance
 
-            return obj.current_balance
+    def _refresh_owner_balance(self):
+        """مزامنة الرصيد الحالي للكائن المرتبط في الذاكرة بعد التحديث"""
+        owner = self.safe if self.safe_id else self.bank
+        if owner is not None:
+            owner.refresh_from_db(fields=['current_balance'])
 
     def save(self, *args, **kwargs):
+        """
+        حفظ الحركة مع تحديث الأرصدة تزايديًا:
+        - الحركة المضافة في نهاية التسلسل تحسب رصيدها من الحركة السابقة فقط
+        - الإضافة بتاريخ سابق أو التعديل تزيح أرصدة الحركات اللاحقة فقط بتحديث واحد
+        نفس المسار داخل نطاق balances.deferred() حتى تبقى الأرصدة صحيحة داخل المعاملة.
+        """
+        from django.db import transaction
+
         # تحديد نوع العملية من الفاتورة إذا كانت متوفرة
         if self.invoice and not self.transaction_type:
             self.set_transaction_type_from_invoice()
 
-        # حفظ الحركة أولاً
-        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not self.BALANCE_FIELDS.intersection(update_fields):
+            super().save(*args, **kwargs)
+            return
 
-        # إعادة حساب جميع الأرصدة من البداية
-        if self.safe:
-            SafeTransaction.recalculate_balances(self.safe)
-        elif self.bank:
-            SafeTransaction.recalculate_balances(self.bank)
+        with transaction.atomic():
+            # الحالة القديمة تُقرأ من قاعدة البيانات تحت القفل وليس من النسخة في الذاكرة
+            old = self._reload_locked() if self.pk is not None else None
+
+            if old is not None:
+                # إزالة أثر الحركة القديمة من الحركات اللاحقة لموضعها القديم
+                old_delta = self.signed_amount(old['transaction_type'], old['amount'])
+                self._shift_after(old['safe_id'], old['bank_id'], old['date'], self.pk, -old_delta)
+                self._bump_owner(old['safe_id'], old['bank_id'], -old_delta)
+
+            owner = self._lock_owner(self.safe_id, self.bank_id)
+            delta = self.signed_amount(self.transaction_type, self.amount)
+            if owner is not None:
+                self.balance_before = self._previous_balance(owner)
+                self.balance_after = self.balance_before + delta
+
+            super().save(*args, **kwargs)
+
+            # إضافة أثر الحركة إلى الحركات اللاحقة لموضعها الجديد (لا شيء عند الإضافة في النهاية)
+            self._shift_after(self.safe_id, self.bank_id, self.date, self.pk, delta)
+            self._bump_owner(self.safe_id, self.bank_id, delta)
+            self._apply_checkpoints(old)
+
+        self._refresh_owner_balance()
+
+    def _apply_checkpoints(self, old=None):
+        """تحديث نقاط الأرصدة اليومية بإزالة أثر الحالة القديمة للحركة وإضافة أثر حالتها الحالية"""
+        if old is not None:
+            owner = self._checkpoint_owner(old['safe_id'], old['bank_id'])
+            if owner:
+                BalanceCheckpoint.apply(
+                    owner, old['date'], -self.signed_amount(old['transaction_type'], old['amount'])
+                )
+        owner = self._checkpoint_owner(self.safe_id, self.bank_id)
+        if owner:
+            BalanceCheckpoint.apply(owner, self.date, self.signed_amount(self.transaction_type, self.amount))
 
     def delete(self, *args, **kwargs):
         """
-        تجاوز دالة الحذف الافتراضية لإعادة حساب الأرصدة
+        تجاوز دالة الحذف الافتراضية لإزاحة أرصدة الحركات اللاحقة فقط
         """
         from django.db import transaction
 
         with transaction.atomic():
-            # حفظ المعلومات المطلوبة قبل الحذف
-            obj = self.safe or self.bank
+            # أثر الحذف يُحسب من الحركة المحفوظة تحت القفل؛ الحذف المكرر لا يغير شيئًا
+            pk = self.pk
+            stored = reload_locked(SafeTransaction.objects.filter(pk=pk), self.LEDGER_FIELDS, self._owners)
+            if stored is None:
+                return 0, {}
+            delta = self.signed_amount(stored['transaction_type'], stored['amount'])
 
             # حذف العملية الحالية
-            super().delete(*args, **kwargs)
+            result = super().delete(*args, **kwargs)
+
+            # طرح أثر العملية من الحركات اللاحقة ومن رصيد الخزنة أو البنك
+            self._shift_after(stored['safe_id'], stored['bank_id'], stored['date'], pk, -delta)
+            self._bump_owner(stored['safe_id'], stored['bank_id'], -delta)
+            self._remove_checkpoints(stored)
+
+        self._refresh_owner_balance()
+        return result
+
+    def _remove_checkpoints(self, stored):
+        owner = self._checkpoint_owner(stored['safe_id'], stored['bank_id'])
+        if owner:
+            BalanceCheckpoint.apply(owner, stored['date'],
+                                    -self.signed_amount(stored['transaction_type'], stored['amount']))
+
+class ContactTransactionQuerySet(models.QuerySet):
+    def delete(self):
+        """الحذف الجماعي لا يمر بدالة delete لكل حركة، لذا نعيد بناء نقاط الأرصدة اليومية المتأثرة"""
+        from django.db import transaction
+
+        with transaction.atomic():
+            contacts = set(self.order_by().values_list('contact_id', flat=True).distinct())
+            result = super().delete()
+            if contacts:
+                BalanceCheckpoint.rebuild('contact', contacts)
+        return result
 
-            # إعادة حساب جميع الأرصدة من البداية
-            if obj:
-                SafeTransaction.recalculate_balances(obj)
 
 class ContactTransaction(models.Model):
     # أنواع العمليات المتعلقة بحسابات العملاء والموردين
@@ -217,10 +478,15 @@ class ContactTransaction(models.Model):
     balance_before = models.DecimalField(_("الرصيد قبل العملية"), max_digits=15, decimal_places=2)
     balance_after = models.DecimalField(_("الرصيد بعد العملية"), max_digits=15, decimal_places=2)
 
+    objects = ContactTransactionQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("حركة حساب")
         verbose_name_plural = _("حركات الحسابات")
         ordering = ['date']  # ترتيب الحركات حسب التاريخ تصاعديًا للحصول على تسلسل صحيح
+        indexes = [
+            models.Index(fields=['contact', 'date'], name='contacttrans_contact_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_transaction_type_display()} - {self.contact.name} - {self.amount}"
@@ -237,99 +503,136 @@ class ContactTransaction(models.Model):
             elif self.invoice.invoice_type == 'purchase_return':
                 self.transaction_type = self.PURCHASE_RETURN_INVOICE
 
+    @staticmethod
+    def signed_amount_sql(contact_type):
+        """
+        تعبير SQL لتأثير العملية على رصيد جهة الاتصال حسب نوعها، مع معاملاته.
+        العملاء: فاتورة البيع تزيد المديونية، ومرتجع البيع والتحصيل ينقصانها.
+        الموردون: فاتورة الشراء تزيد الالتزام، ومرتجع الشراء والدفع ينقصانه.
+        أي عملية أخرى لا تؤثر على الرصيد.
+        """
+        if contact_type == Contact.CUSTOMER:
+            params = [ContactTransaction.SALE_INVOICE,
+                      ContactTransaction.SALE_RETURN_INVOICE, ContactTransaction.COLLECTION]
+        else:
+            params = [ContactTransaction.PURCHASE_INVOICE,
+                      ContactTransaction.PURCHASE_RETURN_INVOICE, ContactTransaction.PAYMENT]
+        sql = ("CASE WHEN transaction_type = %s THEN amount "
+               "WHEN transaction_type IN (%s, %s) THEN -amount ELSE 0 END")
+        return sql, params
+
+    @classmethod
+    def _signed_types(cls, contact_type):
+        """نوع العملية التي تزيد الرصيد وأنواع العمليات التي تنقصه حسب نوع جهة الاتصال"""
+        if contact_type == Contact.CUSTOMER:
+            return cls.SALE_INVOICE, (cls.SALE_RETURN_INVOICE, cls.COLLECTION)
+        return cls.PURCHASE_INVOICE, (cls.PURCHASE_RETURN_INVOICE, cls.PAYMENT)
+
+    @classmethod
+    def signed_amount(cls, contact_type, transaction_type, amount):
+        """تأثير العملية على رصيد جهة الاتصال (نفس قواعد signed_amount_sql)"""
+        increase, decreases = cls._signed_types(contact_type)
+        if transaction_type == increase:
+            return amount
+        if transaction_type in decreases:
+            return -amount
+        return Decimal('0')
+
+    @classmethod
+    def signed_amount_expression(cls):
+        """نفس قواعد signed_amount كتعبير قاعدة بيانات يعتمد على نوع جهة الاتصال"""
+        output_field = models.DecimalField(max_digits=15, decimal_places=2)
+
+        def signed(contact_type):
+            increase, decreases = cls._signed_types(contact_type)
+            return Case(
+                When(transaction_type=increase, then=F('amount')),
+                When(transaction_type__in=decreases, then=-F('amount')),
+                default=Value(Decimal('0')),
+                output_field=output_field,
+            )
+
+        return Case(
+            When(contact__contact_type=Contact.CUSTOMER, then=signed(Contact.CUSTOMER)),
+            default=signed(Contact.SUPPLIER),
+            output_field=output_field,
+        )
+
     @staticmethod
     def recalculate_balances(contact):
         """
         إعادة حساب أرصدة جميع حركات الحساب لجهة اتصال معينة من البداية
+        باستعلام واحد يعتمد على المجموع التراكمي (Window Function) بدلاً من حلقة في بايثون.
+        يعمل على SQLite (3.25 فأحدث) و PostgreSQL.
         """
-        from django.db import transaction
-
-        with transaction.atomic():
-            # الحصول على جميع حركات الحساب لجهة الاتصال مرتبة حسب التاريخ
-            transactions = ContactTransaction.objects.filter(contact=contact).order_by('date')
-
-            # إعادة تعيين رصيد جهة الاتصال إلى الرصيد الافتتاحي
-            current_balance = contact.initial_balance
-
-            # طباعة معلومات تصحيح الأخطاء
-            print(f"إعادة حساب أرصدة {contact.name} - الرصيد الافتتاحي: {current_balance}")
-
-            # إعادة حساب الأرصدة لكل حركة
-            for trans in transactions:
-                # تحديث الرصيد قبل العملية
-                old_balance_before = trans.balance_before
-                old_balance_after = trans.balance_after
-
-                trans.balance_before = current_balance
-
-                # إعادة حساب الرصيد بعد العملية بناءً على نوع العملية
-                if contact.contact_type == Contact.CUSTOMER:
-                    # العمليات المتعلقة بالعملاء
-                    if trans.transaction_type == ContactTransaction.SALE_INVOICE:
-                        # فاتورة بيع تزيد مديونية العميل
-                        trans.balance_after = trans.balance_before + trans.amount
-                    elif trans.transaction_type == ContactTransaction.SALE_RETURN_INVOICE:
-                        # مرتجع بيع ينقص مديونية العميل
-                        trans.balance_after = trans.balance_before - trans.amount
-                    elif trans.transaction_type == ContactTransaction.COLLECTION:
-                        # تحصيل من العميل ينقص مديونيته
-                        trans.balance_after = trans.balance_before - trans.amount
-                    else:
-                        # أي عملية أخرى لا تؤثر على الرصيد
-                        trans.balance_after = trans.balance_before
-                else:
-                    # العمليات المتعلقة بالموردين
-                    if trans.transaction_type == ContactTransaction.PURCHASE_INVOICE:
-                        # فاتورة شراء تزيد الالتزام تجاه المورد
-                        trans.balance_after = trans.balance_before + trans.amount
-                    elif trans.transaction_type == ContactTransaction.PURCHASE_RETURN_INVOICE:
-                        # مرتجع شراء ينقص الالتزام تجاه المورد
-                        trans.balance_after = trans.balance_before - trans.amount
-                    elif trans.transaction_type == ContactTransaction.PAYMENT:
-                        # دفع للمورد ينقص الالتزام تجاهه
-                        trans.balance_after = trans.balance_before - trans.amount
-                    else:
-                        # أي عملية أخرى لا تؤثر على الرصيد
-                        trans.balance_after = trans.balance_before
-
-                # طباعة معلومات تصحيح الأخطاء
-                print(f"العملية: {trans.get_transaction_type_display()} - المبلغ: {trans.amount}")
-                print(f"الرصيد قبل (قديم): {old_balance_before} - الرصيد بعد (قديم): {old_balance_after}")
-                print(f"الرصيد قبل (جديد): {trans.balance_before} - الرصيد بعد (جديد): {trans.balance_after}")
-                print("---")
-
-                # تحديث الرصيد الحالي للحركة التالية
-                current_balance = trans.balance_after
-
-                # حفظ التغييرات بدون استدعاء دالة save المخصصة
-                ContactTransaction.objects.filter(pk=trans.pk).update(
-                    balance_before=trans.balance_before,
-                    balance_after=trans.balance_after
+        from django.db import connection, transaction
+
+        table = connection.ops.quote_name(ContactTransaction._meta.db_table)
+        signed_sql, signed_params = ContactTransaction.signed_amount_sql(contact.contact_type)
+
+        # الرصيد بعد كل حركة = الرصيد الافتتاحي + مجموع تأثير الحركات حتى هذه الحركة (بترتيب التاريخ ثم المعرف)
+        sql = f"""
+            WITH running AS (
+                SELECT id,
+                       {signed_sql} AS signed_amount,
+                       %s + SUM({signed_sql}) OVER (
+                           ORDER BY date, id ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                       ) AS balance_after
+                FROM {table}
+                WHERE contact_id = %s
+            )
+            UPDATE {table}
+            SET balance_after = (
+                    SELECT ROUND(running.balance_after, 2) FROM running WHERE running.id = {table}.id
+                ),
+                balance_before = (
+                    SELECT ROUND(running.balance_after - running.signed_amount, 2)
+                    FROM running WHERE running.id = {table}.id
                 )
+            WHERE contact_id = %s
+        """
+        params = signed_params + [contact.initial_balance] + signed_params + [contact.pk, contact.pk]
 
-            # تحديث رصيد جهة الاتصال النهائي
-            if transactions.exists():
-                contact.current_balance = transactions.last().balance_after
-            else:
-                contact.current_balance = contact.initial_balance
-
-            contact.save(update_fields=['current_balance'])
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
 
-            # طباعة معلومات تصحيح الأخطاء
-            print(f"الرصيد النهائي لـ {contact.name}: {contact.current_balance}")
+            # تحديث رصيد جهة الاتصال النهائي من آخر حركة
+            last_balance = ContactTransaction.objects.filter(contact=contact).order_by(
+                '-date', '-id'
+            ).values_list('balance_after', flat=True).first()
+            contact.current_balance = last_balance if last_balance is not None else contact.initial_balance
+            Contact.objects.filter(pk=contact.pk).update(current_balance=contact.current_balance)
 
             return contact.current_balance
 
     def save(self, *args, **kwargs):
+        from django.db import transaction
+
         # تحديد نوع العملية من الفاتورة إذا كانت متوفرة
         if self.invoice and not self.transaction_type:
             self.set_transaction_type_from_invoice()
 
-        # حفظ الحركة أولاً
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # الحالة القديمة تُقرأ من قاعدة البيانات تحت قفل جهة الاتصال القديمة والجديدة
+            old = self._reload_locked([('contact', self.contact_id)]) if self.pk is not None else None
+
+            # حفظ الحركة أولاً
+            super().save(*args, **kwargs)
+
+            # تحديث نقاط الأرصدة اليومية بفرق الحركة
+            if old is not None:
+                BalanceCheckpoint.apply(
+                    {'contact_id': old['contact_id']}, old['date'],
+                    -self.signed_amount(old['contact__contact_type'], old['transaction_type'], old['amount']),
+                )
+            BalanceCheckpoint.apply(
+                {'contact_id': self.contact_id}, self.date,
+                self.signed_amount(self.contact.contact_type, self.transaction_type, self.amount),
+            )
 
-        # إعادة حساب جميع الأرصدة من البداية
-        ContactTransaction.recalculate_balances(self.contact)
+            # إعادة حساب جميع الأرصدة من البداية (أو تأجيلها حتى تأكيد المعاملة)
+            balances.schedule(self.contact)
 
     def delete(self, *args, **kwargs):
         """
@@ -338,14 +641,53 @@ class ContactTransaction(models.Model):
         from django.db import transaction
 
         with transaction.atomic():
-            # حفظ المعلومات المطلوبة قبل الحذف
-            contact = self.contact
+            # أثر الحذف يُحسب من الحركة المحفوظة تحت القفل؛ الحذف المكرر لا يغير شيئًا
+            stored = self._reload_locked()
+            if stored is None:
+                return 0, {}
 
             # حذف العملية الحالية
-            super().delete(*args, **kwargs)
+            result = super().delete(*args, **kwargs)
+
+            BalanceCheckpoint.apply(
+                {'contact_id': stored['contact_id']}, stored['date'],
+                -self.signed_amount(stored['contact__contact_type'], stored['transaction_type'], stored['amount']),
+            )
+
+            # إعادة حساب جميع الأرصدة من البداية (أو تأجيلها حتى تأكيد المعاملة)
+            balances.schedule_ids(Contact, [stored['contact_id']])
+
+        return result
+
+    LEDGER_FIELDS = ('contact_id', 'contact__contact_type', 'date', 'amount', 'transaction_type')
+
+    def _reload_locked(self, extra_owners=()):
+        """الحركة كما هي محفوظة بعد قفل جهة الاتصال (وجهة الحالة الجديدة عند التعديل)، انظر reload_locked"""
+        return reload_locked(
+            ContactTransaction.objects.filter(pk=self.pk), self.LEDGER_FIELDS,
+            lambda row: [('contact', row['contact_id'])], extra_owners,
+        )
+
+class ProductTransactionQuerySet(models.QuerySet):
+    def delete(self):
+        """
+        الحذف الجماعي لا يمر بدالة delete لكل حركة، لذا نعيد بناء أرصدة
+        المنتجات في المخازن المتأثرة بعد الحذف
+        """
+        from django.db import transaction
+
+        with transaction.atomic():
+            pairs = list(self.order_by().values_list('product_id', 'store_id').distinct())
+            result = super().delete()
+            if pairs:
+                products = {product_id for product_id, _store_id in pairs}
+                ProductStoreBalance.rebuild(
+                    products=products,
+                    stores={store_id for _product_id, store_id in pairs},
+                )
+                BalanceCheckpoint.rebuild('product', products)
+        return result
 
-            # إعادة حساب جميع الأرصدة من البداية
-            ContactTransaction.recalculate_balances(contact)
 
 class ProductTransaction(models.Model):
     # أنواع حركات المنتجات
@@ -453,6 +795,9 @@ class ProductTransaction(models.Model):
     transaction_type = models.CharField(_("نوع العملية"), max_length=20, choices=TRANSACTION_TYPE_CHOICES)
     invoice = models.ForeignKey('invoices.Invoice', on_delete=models.SET_NULL, related_name='product_transactions',
                               verbose_name=_("الفاتورة"), null=True, blank=True)
+    # بند الفاتورة المنشئ للحركة، لتعديل حركة البند فقط عند تعديل الفاتورة
+    invoice_item = models.ForeignKey('invoices.InvoiceItem', on_delete=models.SET_NULL, related_name='product_transactions',
+                                   verbose_name=_("بند الفاتورة"), null=True, blank=True)
     store = models.ForeignKey('core.Store', on_delete=models.CASCADE, related_name='product_transactions',
                             verbose_name=_("المخزن"), default=1)
     description = models.TextField(_("الوصف"), blank=True, null=True)
@@ -460,10 +805,16 @@ class ProductTransaction(models.Model):
     balance_before = models.DecimalField(_("الرصيد قبل العملية"), max_digits=15, decimal_places=3)
     balance_after = models.DecimalField(_("الرصيد بعد العملية"), max_digits=15, decimal_places=3)
 
+    objects = ProductTransactionQuerySet.as_manager()
+
     class Meta:
         verbose_name = _("حركة منتج")
         verbose_name_plural = _("حركات المنتجات")
         ordering = ['date']  # ترتيب الحركات حسب التاريخ تصاعديًا للحصول على تسلسل صحيح
+        indexes = [
+            models.Index(fields=['product', 'date'], name='prodtrans_product_date_idx'),
+            models.Index(fields=['product', 'store', 'date'], name='prodtrans_prod_store_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_transaction_type_display()} - {self.product.name} - {self.quantity}"
@@ -473,67 +824,75 @@ class ProductTransaction(models.Model):
         if self.invoice:
             self.transaction_type = self.invoice.invoice_type
 
+    # أنواع الحركات التي تنقص المخزون، وكل ما عداها يزيده (والتسوية تعتمد على إشارة الكمية)
+    DECREASE_TYPES = (SALE, PURCHASE_RETURN)
+
+    @classmethod
+    def signed_quantity(cls, transaction_type, base_quantity):
+        """تأثير الحركة على رصيد المخزون بالوحدة الأساسية"""
+        if transaction_type in cls.DECREASE_TYPES:
+            return -base_quantity
+        return base_quantity
+
+    @classmethod
+    def signed_quantity_expression(cls):
+        """نفس تأثير signed_quantity كتعبير قاعدة بيانات للتجميع"""
+        return Case(
+            When(transaction_type__in=cls.DECREASE_TYPES, then=-F('base_quantity')),
+            default=F('base_quantity'),
+        )
+
+    @classmethod
+    def signed_quantity_sql(cls):
+        """تعبير SQL لتأثير الحركة على رصيد المخزون، مع معاملاته (نفس signed_quantity)"""
+        placeholders = ', '.join(['%s'] * len(cls.DECREASE_TYPES))
+        return f"CASE WHEN transaction_type IN ({placeholders}) THEN -base_quantity ELSE base_quantity END", \
+            list(cls.DECREASE_TYPES)
+
     @staticmethod
     def recalculate_balances(product):
         """
         إعادة حساب أرصدة جميع حركات المنتج لمنتج معين من البداية
+        باستعلام واحد يعتمد على المجموع التراكمي (Window Function) كما في ContactTransaction.
         """
-        from django.db import transaction
-
-        with transaction.atomic():
-            # الحصول على جميع حركات المنتج مرتبة حسب التاريخ
-            transactions = ProductTransaction.objects.filter(product=product).order_by('date')
-
-            # إعادة تعيين رصيد المنتج إلى الرصيد الافتتاحي
-            current_balance = product.initial_balance
-
-            # طباعة معلومات تصحيح الأخطاء
-            print(f"إعادة حساب أرصدة المنتج {product.name} - الرصيد الافتتاحي: {current_balance}")
-
-            # إعادة حساب الأرصدة لكل حركة
-            for trans in transactions:
-                # تحديث الرصيد قبل العملية
-                old_balance_before = trans.balance_before
-                old_balance_after = trans.balance_after
-
-                trans.balance_before = current_balance
-
-                # إعادة حساب الرصيد بعد العملية بناءً على نوع العملية
-                if trans.transaction_type in [ProductTransaction.SALE, ProductTransaction.PURCHASE_RETURN]:
-                    # عمليات تنقص المخزون
-                    trans.balance_after = trans.balance_before - trans.base_quantity
-                elif trans.transaction_type == ProductTransaction.ADJUSTMENT:
-                    # في حالة التسوية، نعتمد على إشارة base_quantity
-                    # إذا كانت موجبة فهي زيادة، وإذا كانت سالبة فهي نقصان
-                    trans.balance_after = trans.balance_before + trans.base_quantity
-                else:
-                    # عمليات تزيد المخزون (PURCHASE, SALE_RETURN)
-                    trans.balance_after = trans.balance_before + trans.base_quantity
-
-                # طباعة معلومات تصحيح الأخطاء
-                print(f"العملية: {trans.get_transaction_type_display()} - الكمية: {trans.quantity} {trans.product_unit.unit.name} - الكمية الأساسية: {trans.base_quantity}")
-                print(f"الرصيد قبل (جديد): {trans.balance_before} - الرصيد بعد (جديد): {trans.balance_after}")
-                print("---")
-
-                # تحديث الرصيد الحالي للحركة التالية
-                current_balance = trans.balance_after
-
-                # حفظ التغييرات بدون استدعاء دالة save المخصصة
-                ProductTransaction.objects.filter(pk=trans.pk).update(
-                    balance_before=trans.balance_before,
-                    balance_after=trans.balance_after
+        from django.db import connection, transaction
+
+        table = connection.ops.quote_name(ProductTransaction._meta.db_table)
+        signed_sql, signed_params = ProductTransaction.signed_quantity_sql()
+
+        # الرصيد بعد كل حركة = الرصيد الافتتاحي + مجموع تأثير الحركات حتى هذه الحركة (بترتيب التاريخ ثم المعرف)
+        sql = f"""
+            WITH running AS (
+                SELECT id,
+                       {signed_sql} AS signed_quantity,
+                       %s + SUM({signed_sql}) OVER (
+                           ORDER BY date, id ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                       ) AS balance_after
+                FROM {table}
+                WHERE product_id = %s
+            )
+            UPDATE {table}
+            SET balance_after = (
+                    SELECT ROUND(running.balance_after, 3) FROM running WHERE running.id = {table}.id
+                ),
+                balance_before = (
+                    SELECT ROUND(running.balance_after - running.signed_quantity, 3)
+                    FROM running WHERE running.id = {table}.id
                 )
+            WHERE product_id = %s
+        """
+        params = signed_params + [product.initial_balance] + signed_params + [product.pk, product.pk]
 
-            # تحديث رصيد المنتج النهائي
-            if transactions.exists():
-                product.current_balance = transactions.last().balance_after
-            else:
-                product.current_balance = product.initial_balance
-
-            product.save(update_fields=['current_balance'])
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
 
-            # طباعة معلومات تصحيح الأخطاء
-            print(f"الرصيد النهائي للمنتج {product.name}: {product.current_balance}")
+            # تحديث رصيد المنتج النهائي من آخر حركة
+            last_balance = ProductTransaction.objects.filter(product=product).order_by(
+                '-date', '-id'
+            ).values_list('balance_after', flat=True).first()
+            product.current_balance = last_balance if last_balance is not None else product.initial_balance
+            Product.objects.filter(pk=product.pk).update(current_balance=product.current_balance)
 
             return product.current_balance
 
@@ -542,14 +901,31 @@ class ProductTransaction(models.Model):
         if self.invoice and not self.transaction_type:
             self.set_transaction_type_from_invoice()
 
+        from django.db import transaction
+
         # تحويل الكمية إلى الوحدة الأساسية
         self.base_quantity = self.quantity * self.product_unit.conversion_factor
 
-        # حفظ الحركة أولاً
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # الحالة القديمة تُقرأ من قاعدة البيانات تحت قفل المنتج القديم والجديد وليس من النسخة في الذاكرة
+            old = self._reload_locked([('product', self.product_id)]) if self.pk is not None else None
+
+            # حفظ الحركة أولاً
+            super().save(*args, **kwargs)
+
+            # تحديث رصيد المنتج في المخزن تزايديًا (إزالة أثر الحركة القديمة ثم إضافة الجديدة)
+            if old is not None:
+                old_quantity = -self.signed_quantity(old['transaction_type'], old['base_quantity'])
+                ProductStoreBalance.apply(
+                    old['product_id'], old['store_id'], old_quantity, removed_date=old['date'],
+                )
+                self._apply_checkpoints(old['product_id'], old['store_id'], old['date'], old_quantity)
+            quantity = self.signed_quantity(self.transaction_type, self.base_quantity)
+            ProductStoreBalance.apply(self.product_id, self.store_id, quantity, date=self.date)
+            self._apply_checkpoints(self.product_id, self.store_id, self.date, quantity)
 
-        # إعادة حساب جميع الأرصدة من البداية
-        ProductTransaction.recalculate_balances(self.product)
+            # إعادة حساب جميع الأرصدة من البداية (أو تأجيلها حتى تأكيد المعاملة)
+            balances.schedule(self.product)
 
     def delete(self, *args, **kwargs):
         """
@@ -558,14 +934,380 @@ class ProductTransaction(models.Model):
         from django.db import transaction
 
         with transaction.atomic():
-            # حفظ المعلومات المطلوبة قبل الحذف
-            product = self.product
+            # أثر الحذف يُحسب من الحركة المحفوظة تحت القفل؛ الحذف المكرر لا يغير شيئًا
+            stored = self._reload_locked()
+            if stored is None:
+                return 0, {}
 
             # حذف العملية الحالية
-            super().delete(*args, **kwargs)
+            result = super().delete(*args, **kwargs)
+
+            # طرح أثر الحركة من رصيد المنتج في المخزن ومن نقاط الأرصدة اليومية
+            quantity = -self.signed_quantity(stored['transaction_type'], stored['base_quantity'])
+            ProductStoreBalance.apply(stored['product_id'], stored['store_id'], quantity, removed_date=stored['date'])
+            self._apply_checkpoints(stored['product_id'], stored['store_id'], stored['date'], quantity)
+
+            # إعادة حساب جميع الأرصدة من البداية (أو تأجيلها حتى تأكيد المعاملة)
+            balances.schedule_ids(Product, [stored['product_id']])
+
+        return result
+
+    LEDGER_FIELDS = ('product_id', 'store_id', 'date', 'transaction_type', 'base_quantity')
+
+    def _reload_locked(self, extra_owners=()):
+        """الحركة كما هي محفوظة بعد قفل منتجها (ومنتج الحالة الجديدة عند التعديل)، انظر reload_locked"""
+        return reload_locked(
+            ProductTransaction.objects.filter(pk=self.pk), self.LEDGER_FIELDS,
+            lambda row: [('product', row['product_id'])], extra_owners,
+        )
+
+    @staticmethod
+    def _apply_checkpoints(product_id, store_id, date, quantity):
+        """تحديث نقطة الرصيد اليومية للمنتج إجمالاً وفي المخزن"""
+        BalanceCheckpoint.apply({'product_id': product_id}, date, quantity)
+        BalanceCheckpoint.apply({'product_id': product_id, 'store_id': store_id}, date, quantity)
+
+
+class ProductStoreBalance(models.Model):
+    """
+    رصيد المنتج في كل مخزن بالوحدة الأساسية، يُحدَّث تزايديًا مع كل حركة منتج
+    ليعطي الكمية المتاحة في مخزن معين باستعلام واحد بدلاً من تجميع كل الحركات.
+    الرصيد يعكس حركات المنتجات فقط (الرصيد الافتتاحي للمنتج غير موزع على المخازن).
+    """
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='store_balances',
+                              verbose_name=_("المنتج"))
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, related_name='product_balances',
+                            verbose_name=_("المخزن"))
+    quantity = models.DecimalField(_("الكمية بالوحدة الأساسية"), max_digits=15, decimal_places=3, default=0)
+    last_transaction_date = models.DateTimeField(_("تاريخ آخر حركة"), null=True, blank=True)
+
+    class Meta:
+        verbose_name = _("رصيد منتج في مخزن")
+        verbose_name_plural = _("أرصدة المنتجات في المخازن")
+        unique_together = [['product', 'store']]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.store.name}: {self.quantity}"
+
+    @classmethod
+    def apply(cls, product_id, store_id, quantity, date=None, removed_date=None):
+        """
+        إضافة تغيير على رصيد منتج في مخزن (موجب للزيادة وسالب للنقصان) داخل المعاملة الحالية.
+        date: تاريخ الحركة المضافة، removed_date: تاريخ الحركة المحذوفة أو المعدلة.
+        """
+        from django.db import transaction
+
+        with transaction.atomic():
+            balance, created = cls.objects.select_for_update().get_or_create(
+                product_id=product_id, store_id=store_id
+            )
+            fields = {}
+            if quantity:
+                fields['quantity'] = F('quantity') + quantity
+            if date is not None and (balance.last_transaction_date is None or date > balance.last_transaction_date):
+                fields['last_transaction_date'] = date
+            elif removed_date is not None and balance.last_transaction_date is not None \
+                    and removed_date >= balance.last_transaction_date:
+                # الحركة المحذوفة كانت الأحدث، نعيد قراءة تاريخ آخر حركة متبقية
+                fields['last_transaction_date'] = ProductTransaction.objects.filter(
+                    product_id=product_id, store_id=store_id
+                ).aggregate(last=Max('date'))['last']
+            if fields:
+                cls.objects.filter(pk=balance.pk).update(**fields)
+
+    @classmethod
+    def get_quantity(cls, product, store):
+        """الكمية المتاحة من منتج في مخزن معين بالوحدة الأساسية"""
+        quantity = cls.objects.filter(product=product, store=store).values_list('quantity', flat=True).first()
+        return quantity if quantity is not None else Decimal('0')
+
+    @classmethod
+    def rebuild(cls, products=None, stores=None):
+        """
+        إعادة بناء أرصدة المنتجات في المخازن من حركات المنتجات باستعلام تجميعي واحد.
+        يمكن قصر إعادة البناء على منتجات أو مخازن معينة.
+        """
+        from django.db import transaction
+
+        transactions = ProductTransaction.objects.all()
+        existing = cls.objects.all()
+        if products is not None:
+            transactions = transactions.filter(product__in=products)
+            existing = existing.filter(product__in=products)
+        if stores is not None:
+            transactions = transactions.filter(store__in=stores)
+            existing = existing.filter(store__in=stores)
+
+        rows = transactions.order_by().values('product_id', 'store_id').annotate(
+            quantity=Sum(ProductTransaction.signed_quantity_expression()),
+            last_transaction_date=Max('date'),
+        )
+
+        with transaction.atomic():
+            existing.delete()
+            created = cls.objects.bulk_create([cls(**row) for row in rows], batch_size=1000)
+
+        return len(created)
+
+
+class BalanceCheckpoint(models.Model):
+    """
+    نقطة رصيد يومية لخزنة أو بنك أو جهة اتصال أو منتج (إجمالاً أو في مخزن معين).
+    تحفظ صافي حركة اليوم والحركة التراكمية حتى نهاية اليوم (بدون الرصيد الافتتاحي)،
+    فيصبح رصيد أول المدة لأي تاريخ = الرصيد الافتتاحي + آخر نقطة قبل اليوم + حركة اليوم حتى اللحظة
+    بدلاً من تجميع كل الحركات السابقة.
+    تُحدَّث تزايديًا مع حفظ وحذف الحركات، ويمكن إعادة بنائها بالأمر backfill_balance_checkpoints.
+    """
+
+    # مفاتيح صاحب النقطة، وكل نقطة تخص صاحبًا واحدًا فقط (المخزن يُستخدم مع المنتج فقط)
+    OWNER_FIELDS = ('safe_id', 'bank_id', 'contact_id', 'product_id', 'store_id')
+    KINDS = ('safe', 'bank', 'contact', 'product')
+
+    safe = models.ForeignKey(Safe, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='balance_checkpoints', verbose_name=_("الخزنة"))
+    bank = models.ForeignKey(Bank, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='balance_checkpoints', verbose_name=_("البنك"))
+    contact = models.ForeignKey(Contact, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='balance_checkpoints', verbose_name=_("جهة الاتصال"))
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True,
+                                related_name='balance_checkpoints', verbose_name=_("المنتج"))
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, null=True, blank=True,
+                              related_name='balance_checkpoints', verbose_name=_("المخزن"))
+    date = models.DateField(_("التاريخ"))
+    net_change = models.DecimalField(_("صافي حركة اليوم"), max_digits=15, decimal_places=3, default=0)
+    cumulative_change = models.DecimalField(_("الحركة التراكمية حتى نهاية اليوم"), max_digits=15,
+                                            decimal_places=3, default=0)
+
+    class Meta:
+        verbose_name = _("نقطة رصيد يومية")
+        verbose_name_plural = _("نقاط الأرصدة اليومية")
+        ordering = ['date']
+        indexes = [
+            models.Index(fields=['safe', 'date'], name='checkpoint_safe_date_idx'),
+            models.Index(fields=['bank', 'date'], name='checkpoint_bank_date_idx'),
+            models.Index(fields=['contact', 'date'], name='checkpoint_contact_date_idx'),
+            models.Index(fields=['product', 'store', 'date'], name='checkpoint_product_date_idx'),
+        ]
+        # نقطة واحدة فقط لكل صاحب في اليوم (حتى لا تكرر الإضافات المتزامنة أثر اليوم)
+        constraints = [
+            models.UniqueConstraint(fields=['safe', 'date'], condition=models.Q(safe__isnull=False),
+                                    name='checkpoint_safe_date_uniq'),
+            models.UniqueConstraint(fields=['bank', 'date'], condition=models.Q(bank__isnull=False),
+                                    name='checkpoint_bank_date_uniq'),
+            models.UniqueConstraint(fields=['contact', 'date'], condition=models.Q(contact__isnull=False),
+                                    name='checkpoint_contact_date_uniq'),
+            models.UniqueConstraint(fields=['product', 'date'],
+                                    condition=models.Q(product__isnull=False, store__isnull=True),
+                                    name='checkpoint_product_total_date_uniq'),
+            models.UniqueConstraint(fields=['product', 'store', 'date'],
+                                    condition=models.Q(product__isnull=False, store__isnull=False),
+                                    name='checkpoint_product_store_date_uniq'),
+        ]
+
+    def __str__(self):
+        owner = self.safe or self.bank or self.contact or self.product
+        return f"{owner} - {self.date}: {self.cumulative_change}"
+
+    @classmethod
+    def _owner_keys(cls, owner):
+        """مفاتيح التصفية الكاملة لصاحب النقطة (الحقول غير المحددة تُطابق NULL)"""
+        keys = dict.fromkeys(cls.OWNER_FIELDS)
+        keys.update(owner)
+        return keys
+
+    @staticmethod
+    def _day(value):
+        """تاريخ اليوم المحلي لقيمة تاريخ/وقت"""
+        if isinstance(value, datetime):
+            if timezone.is_aware(value):
+                return timezone.localtime(value).date()
+            return value.date()
+        return value
+
+    @staticmethod
+    def _source(owner):
+        """استعلام حركات صاحب النقطة وتعبير تأثيرها على الرصيد"""
+        if owner.get('safe_id'):
+            return (SafeTransaction.objects.filter(safe_id=owner['safe_id']),
+                    SafeTransaction.signed_amount_expression())
+        if owner.get('bank_id'):
+            return (SafeTransaction.objects.filter(safe__isnull=True, bank_id=owner['bank_id']),
+                    SafeTransaction.signed_amount_expression())
+        if owner.get('contact_id'):
+            return (ContactTransaction.objects.filter(contact_id=owner['contact_id']),
+                    ContactTransaction.signed_amount_expression())
+        transactions = ProductTransaction.objects.filter(product_id=owner['product_id'])
+        if owner.get('store_id'):
+            transactions = transactions.filter(store_id=owner['store_id'])
+        return transactions, ProductTransaction.signed_quantity_expression()
+
+    @classmethod
+    def _lock_owner(cls, owner):
+        """قفل صف صاحب النقطة (المنتج لنقاط المخازن) حتى تتسلسل تحديثات نقاطه المتزامنة"""
+        models_by_field = {'safe_id': Safe, 'bank_id': Bank, 'contact_id': Contact, 'product_id': Product}
+        field = next(field for field in models_by_field if owner.get(field))
+        models_by_field[field].objects.select_for_update().only('id').get(pk=owner[field])
+
+    @classmethod
+    def apply(cls, owner, date, delta):
+        """
+        إضافة أثر حركة (موجب أو سالب) إلى نقطة يومها وإلى الحركة التراكمية لكل النقاط اللاحقة.
+        owner: قاموس بمفتاح صاحب النقطة مثل {'safe_id': 1} أو {'product_id': 1, 'store_id': 2}
+        """
+        from django.db import transaction
+
+        if not delta:
+            return
+        keys = cls._owner_keys(owner)
+        day = cls._day(date)
+
+        with transaction.atomic():
+            cls._lock_owner(owner)
+            checkpoints = cls.objects.filter(**keys)
 
-            # إعادة حساب جميع الأرصدة من البداية
-            ProductTransaction.recalculate_balances(product)
+            def cumulative_change():
+                previous = checkpoints.filter(date__lt=day).order_by('-date').values_list(
+                    'cumulative_change', flat=True
+                ).first() or Decimal('0')
+                return previous + delta
+
+            checkpoint, created = cls.objects.get_or_create(
+                date=day, **keys, defaults={'net_change': delta, 'cumulative_change': cumulative_change}
+            )
+            if not created:
+                cls.objects.filter(pk=checkpoint.pk).update(
+                    net_change=F('net_change') + delta,
+                    cumulative_change=F('cumulative_change') + delta,
+                )
+            checkpoints.filter(date__gt=day).update(cumulative_change=F('cumulative_change') + delta)
+
+    @classmethod
+    def movement_before(cls, at, **owner):
+        """
+        صافي الحركة (بدون الرصيد الافتتاحي) لصاحب معين قبل لحظة أو تاريخ:
+        آخر نقطة قبل اليوم + حركة اليوم نفسه حتى اللحظة المطلوبة.
+        """
+        day = cls._day(at)
+        movement = cls.objects.filter(date__lt=day, **cls._owner_keys(owner)).order_by('-date').values_list(
+            'cumulative_change', flat=True
+        ).first() or Decimal('0')
+
+        if isinstance(at, datetime):
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+            day_start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            if at > day_start:
+                transactions, signed = cls._source(owner)
+                movement += transactions.filter(date__gte=day_start, date__lt=at).aggregate(
+                    total=Sum(signed)
+                )['total'] or Decimal('0')
+        return movement
+
+    @classmethod
+    def total_movement_before(cls, at, kinds=('safe', 'bank')):
+        """
+        مجموع صافي الحركة قبل لحظة أو تاريخ لكل أصحاب أنواع معينة (مثل كل الخزن والبنوك) معًا:
+        آخر نقطة قبل اليوم لكل صاحب باستعلام تجميعي واحد (Window) + حركة اليوم نفسه حتى اللحظة.
+        نقاط المنتجات المحسوبة هنا هي الإجمالية فقط (بدون نقاط المخازن).
+        """
+        day = cls._day(at)
+        owners = Q()
+        for kind in kinds:
+            owners |= Q(**{f'{kind}__isnull': False})
+        if 'product' in kinds:
+            owners &= Q(store__isnull=True)
+        movement = cls.objects.filter(owners, date__lt=day).annotate(
+            latest=Window(Max('date'), partition_by=[F(field) for field in cls.OWNER_FIELDS])
+        ).filter(date=F('latest')).aggregate(total=Sum('cumulative_change'))['total'] or Decimal('0')
+
+        if isinstance(at, datetime):
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+            day_start = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            if at > day_start:
+                for kind in kinds:
+                    transactions, signed = cls._source_all(kind)
+                    movement += transactions.filter(date__gte=day_start, date__lt=at).aggregate(
+                        total=Sum(signed)
+                    )['total'] or Decimal('0')
+        return movement
+
+    @staticmethod
+    def _source_all(kind):
+        """حركات كل أصحاب نوع معين وتعبير تأثيرها (نفس قواعد _source)"""
+        if kind == 'safe':
+            return SafeTransaction.objects.filter(safe__isnull=False), SafeTransaction.signed_amount_expression()
+        if kind == 'bank':
+            return (SafeTransaction.objects.filter(safe__isnull=True, bank__isnull=False),
+                    SafeTransaction.signed_amount_expression())
+        if kind == 'contact':
+            return ContactTransaction.objects.all(), ContactTransaction.signed_amount_expression()
+        return ProductTransaction.objects.all(), ProductTransaction.signed_quantity_expression()
+
+    @classmethod
+    def opening_balance(cls, obj, at, store=None):
+        """رصيد أول المدة لخزنة أو بنك أو جهة اتصال أو منتج عند لحظة أو تاريخ"""
+        if isinstance(obj, Product) and store is not None:
+            # أرصدة المخازن لا تتضمن الرصيد الافتتاحي للمنتج (مثل ProductStoreBalance)
+            return cls.movement_before(at, product_id=obj.pk, store_id=getattr(store, 'pk', store))
+        field = {Safe: 'safe_id', Bank: 'bank_id', Contact: 'contact_id', Product: 'product_id'}[type(obj)]
+        return obj.initial_balance + cls.movement_before(at, **{field: obj.pk})
+
+    @classmethod
+    def rebuild(cls, kind, ids=None):
+        """
+        إعادة بناء نقاط نوع معين (safe, bank, contact, product) من الحركات
+        باستعلام تجميعي واحد حسب اليوم لكل مصدر. يمكن قصرها على معرفات محددة.
+        """
+        from django.db import transaction
+
+        field = f'{kind}_id'
+        if kind in ('safe', 'bank'):
+            transactions = SafeTransaction.objects.all()
+            if kind == 'bank':
+                transactions = transactions.filter(safe__isnull=True)
+            sources = [(transactions.filter(**{f'{field}__isnull': False}), [field],
+                        SafeTransaction.signed_amount_expression())]
+        elif kind == 'contact':
+            sources = [(ContactTransaction.objects.all(), [field], ContactTransaction.signed_amount_expression())]
+        elif kind == 'product':
+            signed = ProductTransaction.signed_quantity_expression()
+            sources = [(ProductTransaction.objects.all(), [field], signed),
+                       (ProductTransaction.objects.all(), [field, 'store_id'], signed)]
+        else:
+            raise ValueError(f"Unknown checkpoint kind: {kind}")
+
+        existing = cls.objects.filter(**{f'{field}__isnull': False})
+        if ids is not None:
+            ids = list(ids)
+            existing = existing.filter(**{f'{field}__in': ids})
+
+        checkpoints = []
+        for transactions, keys, signed in sources:
+            if ids is not None:
+                transactions = transactions.filter(**{f'{field}__in': ids})
+            rows = transactions.order_by().annotate(day=TruncDate('date')).values(*keys, 'day').annotate(
+                net_change=Sum(signed)
+            ).order_by(*keys, 'day')
+
+            current_owner, cumulative = None, Decimal('0')
+            for row in rows:
+                owner = tuple(row[key] for key in keys)
+                if owner != current_owner:
+                    current_owner, cumulative = owner, Decimal('0')
+                net_change = row['net_change'] or Decimal('0')
+                cumulative += net_change
+                checkpoints.append(cls(
+                    date=row['day'], net_change=net_change, cumulative_change=cumulative,
+                    **{key: row[key] for key in keys}
+                ))
+
+        with transaction.atomic():
+            existing.delete()
+            cls.objects.bulk_create(checkpoints, batch_size=1000)
+
+        return len(checkpoints)
 
 
 # تم نقل نموذج StorePermit إلى نهاية الملف
@@ -1165,11 +1907,7 @@ class MoneyTransfer(models.Model):
         is_new = self.pk is None
         if not self.number and is_new:
             # توليد رقم مستند تلقائي
-            last_transfer = MoneyTransfer.objects.all().order_by('id').last()
-            if last_transfer:
-                self.number = f"TRF-{last_transfer.id + 1}"
-            else:
-                self.number = "TRF-1"
+            self.number = DocumentSequence.next_number('money_transfer')
         
         super().save(*args, **kwargs)
 
@@ -1190,7 +1928,8 @@ class MoneyTransfer(models.Model):
         if not source_obj or not dest_obj:
             return False
 
-        with transaction.atomic():
+        # تأجيل إعادة حساب أرصدة المصدر والوجهة حتى تأكيد المعاملة
+        with balances.deferred():
             # 1. إنشاء حركة السحب من المصدر
             withdrawal = SafeTransaction.objects.create(
                 safe=self.from_safe,
@@ -1260,7 +1999,7 @@ class MoneyTransfer(models.Model):
         if not self.is_posted:
             return False
 
-        with transaction.atomic():
+        with balances.deferred():
             if self.withdrawal_transaction:
                 self.withdrawal_transaction.delete()
                 self.withdrawal_transaction = None
@@ -1306,129 +2045,90 @@ class StorePermit(models.Model):
     def __str__(self):
         return f"{self.get_permit_type_display()} - {self.number}"
 
+    def validate_items(self, items):
+        """التحقق من كل بنود الإذن قبل الترحيل، وإرجاع قائمة رسائل الأخطاء"""
+        errors = []
+        if not items:
+            errors.append(_("لا يمكن ترحيل إذن بدون بنود."))
+        for index, item in enumerate(items, start=1):
+            if item.quantity is None or item.quantity <= 0:
+                errors.append(_("البند %(index)s: الكمية يجب أن تكون أكبر من صفر.") % {'index': index})
+            if item.product_unit.product_id != item.product_id:
+                errors.append(_("البند %(index)s: الوحدة لا تخص المنتج %(product)s.") % {
+                    'index': index, 'product': item.product.name
+                })
+        return errors
+
     def post_permit(self):
-        """ترحيل الإذن وإنشاء حركات المنتجات المرتبطة والقيود المحاسبية"""
+        """
+        ترحيل الإذن وإنشاء حركات المنتجات المرتبطة والقيود المحاسبية.
+        تُنشأ الحركات دفعة واحدة، ويعاد حساب رصيد كل منتج مرة واحدة فقط مهما تكرر في البنود.
+        """
         if self.is_posted:
             return False
 
-        from django.db import transaction
-        from accounting.models import JournalEntry, JournalItem
         from core.models import SystemSettings
 
-        settings = SystemSettings.get_settings()
+        items = list(self.items.select_related('product__category', 'product_unit'))
+        errors = self.validate_items(items)
+        if errors:
+            raise ValueError(' '.join(str(error) for error in errors))
+
+        # تحديد نوع الحركة بناءً على نوع الإذن
+        if self.permit_type == self.ISSUE:
+            transaction_type = ProductTransaction.SALE
+            description = f"صرف من المخزن: {self.number} - {self.person_name}"
+        else:  # RECEIVE
+            transaction_type = ProductTransaction.PURCHASE
+            description = f"استلام في المخزن: {self.number} - {self.person_name}"
+
+        total_value = 0
+        running = {}
+        transactions = []
+        for item in items:
+            # حساب الكمية بالوحدة الأساسية
+            base_quantity = item.quantity * item.product_unit.conversion_factor
+
+            # قيمة البند (استخدام سعر الشراء لتقييم المخزون)
+            total_value += item.quantity * (item.product_unit.purchase_price or 0)
+
+            # الرصيد قبل وبعد العملية (تكرار المنتج في عدة بنود يكمل من رصيد البند السابق)
+            balance_before = running.get(item.product_id, item.product.current_balance)
+            balance_after = balance_before + ProductTransaction.signed_quantity(transaction_type, base_quantity)
+            running[item.product_id] = balance_after
+
+            transactions.append(ProductTransaction(
+                product=item.product,
+                date=self.date,
+                quantity=item.quantity,
+                product_unit=item.product_unit,
+                base_quantity=base_quantity,
+                transaction_type=transaction_type,
+                store=self.store,
+                description=description,
+                reference_number=self.number,
+                balance_before=balance_before,
+                balance_after=balance_after,
+            ))
 
-        with transaction.atomic():
-            total_value = 0
-            # إنشاء حركات المنتجات لكل بند في الإذن
-            for item in self.items.all():
-                # حساب الكمية بالوحدة الأساسية
-                base_quantity = item.quantity * item.product_unit.conversion_factor
-                
-                # قيمة البند (استخدام سعر الشراء لتقييم المخزون)
-                item_value = item.quantity * (item.product_unit.purchase_price or 0)
-                total_value += item_value
-
-                # تحديد نوع الحركة بناءً على نوع الإذن
-                if self.permit_type == self.ISSUE:
-                    transaction_type = ProductTransaction.SALE
-                    description = f"صرف من المخزن: {self.number} - {self.person_name}"
-                else:  # RECEIVE
-                    transaction_type = ProductTransaction.PURCHASE
-                    description = f"استلام في المخزن: {self.number} - {self.person_name}"
-
-                # الحصول على الرصيد الحالي للمنتج
-                current_balance = item.product.current_balance
-
-                # حساب الرصيد بعد العملية
-                if self.permit_type == self.ISSUE:
-                    balance_after = current_balance - base_quantity
-                else:  # RECEIVE
-                    balance_after = current_balance + base_quantity
-
-                # إنشاء حركة المنتج
-                product_transaction = ProductTransaction.objects.create(
-                    product=item.product,
-                    date=self.date,
-                    quantity=item.quantity,
-                    product_unit=item.product_unit,
-                    base_quantity=base_quantity,
-                    transaction_type=transaction_type,
-                    store=self.store,
-                    description=description,
-                    reference_number=self.number,
-                    balance_before=current_balance,
-                    balance_after=balance_after
-                )
+        with balances.deferred():
+            ProductTransaction.objects.bulk_create(transactions)
 
-                # ربط حركة المنتج بالإذن
+            # ربط حركات المنتجات ببنود الإذن
+            for item, product_transaction in zip(items, transactions):
                 item.created_transaction = product_transaction
-                item.save(update_fields=['created_transaction'])
+            StorePermitItem.objects.bulk_update(items, ['created_transaction'])
 
-                # تحديث رصيد المنتج
-                item.product.current_balance = balance_after
-                item.product.save(update_fields=['current_balance'])
+            # الإنشاء الجماعي لا يمر بدالة save: أرصدة المخزن والنقاط اليومية تُبنى للمنتجات المتأثرة،
+            # وسجل كل منتج يعاد حسابه مرة واحدة عند تأكيد المعاملة
+            product_ids = set(running)
+            ProductStoreBalance.rebuild(products=product_ids, stores=[self.store_id])
+            BalanceCheckpoint.rebuild('product', product_ids)
+            balances.touch_ids(Product, product_ids)
 
             # إنشاء القيد المحاسبي إذا توفرت الحسابات
             if self.store.account and total_value > 0:
-                journal_entry = JournalEntry.objects.create(
-                    entry_number=f"STR-{self.number}-{timezone.now().strftime('%Y%m%d%H%M%S')}",
-                    date=self.date,
-                    description=f"قيد مخزني تلقائي: {self.get_permit_type_display()} - {self.number}",
-                    reference=self.number
-                )
-                
-                if self.permit_type == self.RECEIVE:
-                    # استلام: من حساب المخزون (مدين) إلى حساب المشتريات (دائن)
-                    JournalItem.objects.create(
-                        journal_entry=journal_entry,
-                        account=self.store.account,
-                        debit=total_value,
-                        memo=f"استلام بضاعة - إذن رقم {self.number}"
-                    )
-                    
-                    # استخدام حساب المشتريات من الإعدادات
-                    purchases_acc = settings.purchases_account
-                    if not purchases_acc:
-                        from accounting.models import Account
-                        purchases_acc = Account.objects.filter(code='3101').first()
-                        
-                    if purchases_acc:
-                        JournalItem.objects.create(
-                            journal_entry=journal_entry,
-                            account=purchases_acc,
-                            credit=total_value,
-                            memo=f"مقابل استلام بضاعة - إذن رقم {self.number}"
-                        )
-                else:
-                    # صرف: من حساب تكلفة المبيعات (مدين) إلى حساب المخزون (دائن)
-                    # محاولة الحصول على حساب التكلفة من أول صنف أو من الإعدادات
-                    cogs_acc = settings.cogs_account
-                    if not cogs_acc:
-                        first_item = self.items.first()
-                        if first_item and first_item.product.category:
-                            cogs_acc = first_item.product.category.cogs_account
-                    
-                    if not cogs_acc:
-                        from accounting.models import Account
-                        cogs_acc = Account.objects.filter(code='4101').first()
-
-                    if cogs_acc:
-                        JournalItem.objects.create(
-                            journal_entry=journal_entry,
-                            account=cogs_acc,
-                            debit=total_value,
-                            memo=f"تكلفة بضاعة منصرفة - إذن رقم {self.number}"
-                        )
-                        JournalItem.objects.create(
-                            journal_entry=journal_entry,
-                            account=self.store.account,
-                            credit=total_value,
-                            memo=f"صرف بضاعة - إذن رقم {self.number}"
-                        )
-                
-                # ترحيل القيد إذا كان متوازناً ولدينا طرفين
-                if journal_entry.items.count() >= 2:
-                    journal_entry.post()
+                self._create_journal_entry(SystemSettings.get_settings(), items, total_value)
 
             # تحديث حالة الترحيل
             self.is_posted = True
@@ -1436,27 +2136,66 @@ class StorePermit(models.Model):
 
             return True
 
+    def _create_journal_entry(self, settings, items, total_value):
+        """قيد المخزون للإذن بقيمة البنود؛ الحسابات تُحدد مرة واحدة لكل ترحيل"""
+        from accounting.models import Account, JournalEntry, JournalItem
+
+        if self.permit_type == self.RECEIVE:
+            # استلام: من حساب المخزون (مدين) إلى حساب المشتريات (دائن)
+            # استخدام حساب المشتريات من الإعدادات
+            purchases_acc = settings.purchases_account or Account.objects.filter(code='3101').first()
+            lines = [JournalItem(account=self.store.account, debit=total_value,
+                                 memo=f"استلام بضاعة - إذن رقم {self.number}")]
+            if purchases_acc:
+                lines.append(JournalItem(account=purchases_acc, credit=total_value,
+                                         memo=f"مقابل استلام بضاعة - إذن رقم {self.number}"))
+        else:
+            # صرف: من حساب تكلفة المبيعات (مدين) إلى حساب المخزون (دائن)
+            # محاولة الحصول على حساب التكلفة من الإعدادات أو من أول صنف
+            cogs_acc = settings.cogs_account
+            if not cogs_acc and items[0].product.category:
+                cogs_acc = items[0].product.category.cogs_account
+            if not cogs_acc:
+                cogs_acc = Account.objects.filter(code='4101').first()
+
+            lines = []
+            if cogs_acc:
+                lines = [
+                    JournalItem(account=cogs_acc, debit=total_value,
+                                memo=f"تكلفة بضاعة منصرفة - إذن رقم {self.number}"),
+                    JournalItem(account=self.store.account, credit=total_value,
+                                memo=f"صرف بضاعة - إذن رقم {self.number}"),
+                ]
+
+        journal_entry = JournalEntry.objects.create(
+            entry_number=f"STR-{self.number}-{timezone.now().strftime('%Y%m%d%H%M%S')}",
+            date=self.date,
+            description=f"قيد مخزني تلقائي: {self.get_permit_type_display()} - {self.number}",
+            reference=self.number
+        )
+        for line in lines:
+            line.journal_entry = journal_entry
+            # نفس تحقق JournalItem.save لأن الإنشاء الجماعي لا يستدعيها
+            line.clean()
+        JournalItem.objects.bulk_create(lines)
+
+        # ترحيل القيد إذا كان متوازناً ولدينا طرفين
+        if len(lines) >= 2:
+            journal_entry.post()
+        return journal_entry
+
     def unpost_permit(self):
         """إلغاء ترحيل الإذن وحذف حركات المنتجات المرتبطة"""
         if not self.is_posted:
             return False
 
-        from django.db import transaction
-
-        with transaction.atomic():
-            # حذف حركات المنتجات لكل بند في الإذن
-            for item in self.items.all():
-                if item.created_transaction:
-                    # حفظ المنتج قبل حذف الحركة
-                    product = item.created_transaction.product
-
-                    # حذف حركة المنتج
-                    item.created_transaction.delete()
-                    item.created_transaction = None
-                    item.save(update_fields=['created_transaction'])
-
-                    # إعادة حساب أرصدة المنتج
-                    ProductTransaction.recalculate_balances(product)
+        # حذف الحركات يسجل المنتجات المتأثرة، ويعاد حساب كل منتج مرة واحدة عند التأكيد
+        with balances.deferred():
+            # حذف حركات المنتجات لكل بنود الإذن دفعة واحدة (ربط البنود يُفرغ تلقائيًا بـ SET_NULL)،
+            # والحذف الجماعي يعيد بناء أرصدة المخازن والنقاط اليومية للمنتجات المتأثرة
+            transactions = ProductTransaction.objects.filter(created_by_permit_item__permit=self)
+            balances.touch_transactions(transactions)
+            transactions.delete()
 
             # تحديث حالة الترحيل
             self.is_posted = False
@@ -1535,8 +2274,7 @@ class InventoryAdjustment(models.Model):
     def save(self, *args, **kwargs):
         is_new = self.pk is None
         if not self.number and is_new:
-            last = InventoryAdjustment.objects.all().order_by('id').last()
-            self.number = f"ADJ-{last.id + 1}" if last else "ADJ-1"
+            self.number = DocumentSequence.next_number('inventory_adjustment')
         
         super().save(*args, **kwargs)
         
@@ -1544,8 +2282,7 @@ class InventoryAdjustment(models.Model):
             self.post_adjustment()
 
     def post_adjustment(self):
-        from django.db import transaction
-        with transaction.atomic():
+        with balances.deferred():
             # حساب الكمية الأساسية
             base_qty = self.quantity * self.product_unit.conversion_factor
             
@@ -1570,7 +2307,6 @@ class InventoryAdjustment(models.Model):
             )
             self.created_transaction = trans
             self.save(update_fields=['created_transaction'])
-            ProductTransaction.recalculate_balances(self.product)
 
 
 class StockTransfer(models.Model):
@@ -1600,8 +2336,7 @@ class StockTransfer(models.Model):
     def save(self, *args, **kwargs):
         is_new = self.pk is None
         if not self.number and is_new:
-            last = StockTransfer.objects.all().order_by('id').last()
-            self.number = f"TRF-ST-{last.id + 1}" if last else "TRF-ST-1"
+            self.number = DocumentSequence.next_number('stock_transfer')
         
         super().save(*args, **kwargs)
         
@@ -1609,8 +2344,8 @@ class StockTransfer(models.Model):
             self.post_transfer()
 
     def post_transfer(self):
-        from django.db import transaction
-        with transaction.atomic():
+        # حركتا الصرف والإيداع تحدّثان رصيد المخزنين، ويعاد حساب رصيد المنتج مرة واحدة عند التأكيد
+        with balances.deferred():
             base_qty = self.quantity * self.product_unit.conversion_factor
             
             # 1. حركة الصرف من المخزن المصدر (نستخدم SALE للصرف)
@@ -1646,4 +2381,3 @@ class StockTransfer(models.Model):
             self.withdrawal_transaction = withdrawal
             self.deposit_transaction = deposit
             self.save(update_fields=['withdrawal_transaction', 'deposit_transaction'])
-            ProductTransaction.recalculate_balances(self.product)
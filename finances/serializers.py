@@ -1,7 +1,7 @@
 from rest_framework import serializers
 from .models import (
     ExpenseCategory, IncomeCategory, SafeTransaction, 
-    ContactTransaction, ProductTransaction, Expense, Income,
+    ContactTransaction, ProductTransaction, ProductStoreBalance, Expense, Income,
     StoreIssue, StoreIssueItem, StoreReceive, StoreReceiveItem,
     StorePermit, StorePermitItem, SafeDeposit, SafeWithdrawal, MoneyTransfer,
     InventoryAdjustment, StockTransfer
@@ -122,3 +122,12 @@ class StockTransferSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockTransfer
         fields = '__all__'
+
+class ProductStoreBalanceSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    product_code = serializers.CharField(source='product.code', read_only=True)
+    store_name = serializers.CharField(source='store.name', read_only=True)
+
+    class Meta:
+        model = ProductStoreBalance
+        fields = '__all__'
@@ -1,3 +1,208 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Branch, Company, Safe, Store
+from products.models import Product, ProductUnit, Unit
+
+from .models import BalanceCheckpoint, ProductStoreBalance, ProductTransaction, SafeTransaction
+
+
+class SafeLedgerTests(TestCase):
+    """دفتر الخزنة: التحديث التزايدي يجب أن يطابق إعادة البناء الكاملة في كل حالة"""
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='C')
+        cls.branch = Branch.objects.create(company=company, name='B')
+
+    def setUp(self):
+        self.safe = Safe.objects.create(branch=self.branch, name='S', initial_balance=100, current_balance=100)
+
+    def add(self, amount, transaction_type=SafeTransaction.DEPOSIT, date=None, safe=None):
+        transaction = SafeTransaction(safe=safe or self.safe, amount=amount, transaction_type=transaction_type)
+        if date is not None:
+            transaction.date = date
+        transaction.save()
+        return transaction
+
+    def balance(self, safe=None):
+        safe = safe or self.safe
+        safe.refresh_from_db(fields=['current_balance'])
+        return safe.current_balance
+
+    def ledger(self):
+        return list(SafeTransaction.objects.order_by('date', 'id').values_list('amount', 'balance_before', 'balance_after'))
+
+    def test_append(self):
+        self.add(1000)
+        self.add(100, SafeTransaction.WITHDRAWAL)
+        self.assertEqual(self.ledger(), [
+            (Decimal('1000'), Decimal('100'), Decimal('1100')),
+            (Decimal('100'), Decimal('1100'), Decimal('1000')),
+        ])
+        self.assertEqual(self.balance(), Decimal('1000'))
+
+    def test_back_dated_transaction_shifts_later_rows(self):
+        self.add(1000)
+        self.add(50, SafeTransaction.WITHDRAWAL, date=timezone.now() - timedelta(days=3))
+        self.assertEqual(self.ledger(), [
+            (Decimal('50'), Decimal('100'), Decimal('50')),
+            (Decimal('1000'), Decimal('50'), Decimal('1050')),
+        ])
+        self.assertEqual(self.balance(), Decimal('1050'))
+
+    def test_edit_replaces_old_effect(self):
+        self.add(1000)
+        withdrawal = self.add(100, SafeTransaction.WITHDRAWAL)
+        withdrawal.amount = 40
+        withdrawal.save()
+        self.assertEqual(self.balance(), Decimal('1060'))
+
+    def test_edit_moves_transaction_between_safes(self):
+        other = Safe.objects.create(branch=self.branch, name='S2', initial_balance=0)
+        withdrawal = self.add(40, SafeTransaction.WITHDRAWAL)
+        withdrawal.safe = other
+        withdrawal.save()
+        self.assertEqual(self.balance(), Decimal('100'))
+        self.assertEqual(self.balance(other), Decimal('-40'))
+
+    def test_delete_and_double_delete(self):
+        self.add(1000)
+        withdrawal = self.add(100, SafeTransaction.WITHDRAWAL)
+        first = SafeTransaction.objects.get(pk=withdrawal.pk)
+        second = SafeTransaction.objects.get(pk=withdrawal.pk)
+
+        first.delete()
+        self.assertEqual(self.balance(), Decimal('1100'))
+        self.assertEqual(second.delete(), (0, {}))
+        self.assertEqual(self.balance(), Decimal('1100'))
+
+    def test_stale_delete_uses_stored_row(self):
+        withdrawal = self.add(100, SafeTransaction.WITHDRAWAL)
+        stale = SafeTransaction.objects.get(pk=withdrawal.pk)
+        withdrawal.amount = 30
+        withdrawal.save()
+
+        stale.delete()
+        self.assertEqual(self.balance(), Decimal('100'))
+
+    def test_rebuild_matches_incremental(self):
+        now = timezone.now()
+        self.add(1000)
+        edited = self.add(200, SafeTransaction.WITHDRAWAL, date=now - timedelta(days=5))
+        deleted = self.add(70, SafeTransaction.WITHDRAWAL, date=now - timedelta(days=2))
+        self.add(30, SafeTransaction.DEPOSIT, date=now - timedelta(days=5))
+        edited.amount = 150
+        edited.date = now - timedelta(days=1)
+        edited.save()
+        deleted.delete()
+
+        incremental = self.ledger()
+        balance = self.balance()
+        self.assertEqual(SafeTransaction.recalculate_balances(self.safe), balance)
+        self.assertEqual(self.ledger(), incremental)
+        self.assertEqual(balance, Decimal('980'))
+        self.assertEqual(
+            BalanceCheckpoint.movement_before(now + timedelta(days=1), safe_id=self.safe.pk),
+            balance - self.safe.initial_balance,
+        )
+
+
+class ProductStoreLedgerTests(TestCase):
+    """أرصدة المنتجات في المخازن ودفتر حركات المنتج"""
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='C')
+        branch = Branch.objects.create(company=company, name='B')
+        cls.store = Store.objects.create(branch=branch, name='ST')
+        cls.other_store = Store.objects.create(branch=branch, name='ST2')
+        cls.unit = Unit.objects.create(name='u', symbol='u')
+
+    def setUp(self):
+        self.product = Product.objects.create(name='p')
+        self.product_unit = ProductUnit.objects.create(product=self.product, unit=self.unit)
+
+    def add(self, quantity, transaction_type=ProductTransaction.PURCHASE, store=None, date=None):
+        transaction = ProductTransaction(
+            product=self.product, product_unit=self.product_unit, store=store or self.store,
+            quantity=quantity, transaction_type=transaction_type, balance_before=0, balance_after=0,
+        )
+        if date is not None:
+            transaction.date = date
+        transaction.save()
+        return transaction
+
+    def quantity(self, store=None):
+        return ProductStoreBalance.get_quantity(self.product, store or self.store)
+
+    def ledger(self):
+        return list(ProductTransaction.objects.filter(product=self.product).order_by('date', 'id')
+                    .values_list('balance_before', 'balance_after'))
+
+    def test_append(self):
+        self.add(10)
+        self.add(4, ProductTransaction.SALE)
+        self.assertEqual(self.quantity(), Decimal('6'))
+        self.assertEqual(self.ledger(), [(Decimal('0'), Decimal('10')), (Decimal('10'), Decimal('6'))])
+
+    def test_back_dated_transaction_shifts_later_rows(self):
+        self.add(10)
+        self.add(3, ProductTransaction.SALE, date=timezone.now() - timedelta(days=2))
+        self.assertEqual(self.quantity(), Decimal('7'))
+        self.assertEqual(self.ledger(), [(Decimal('0'), Decimal('-3')), (Decimal('-3'), Decimal('7'))])
+
+    def test_edit_replaces_old_effect(self):
+        purchase = self.add(10)
+        purchase.quantity = 4
+        purchase.save()
+        self.assertEqual(self.quantity(), Decimal('4'))
+
+        purchase.store = self.other_store
+        purchase.save()
+        self.assertEqual(self.quantity(), Decimal('0'))
+        self.assertEqual(self.quantity(self.other_store), Decimal('4'))
+
+    def test_delete_and_double_delete(self):
+        purchase = self.add(10)
+        first = ProductTransaction.objects.get(pk=purchase.pk)
+        second = ProductTransaction.objects.get(pk=purchase.pk)
+
+        first.delete()
+        self.assertEqual(self.quantity(), Decimal('0'))
+        self.assertEqual(second.delete(), (0, {}))
+        self.assertEqual(self.quantity(), Decimal('0'))
+
+    def test_stale_delete_uses_stored_row(self):
+        purchase = self.add(10)
+        stale = ProductTransaction.objects.get(pk=purchase.pk)
+        purchase.quantity = 4
+        purchase.save()
+
+        stale.delete()
+        self.assertEqual(self.quantity(), Decimal('0'))
+
+    def test_rebuild_matches_incremental(self):
+        now = timezone.now()
+        self.add(10)
+        edited = self.add(5, ProductTransaction.SALE, date=now - timedelta(days=4))
+        deleted = self.add(2, ProductTransaction.SALE, date=now - timedelta(days=1))
+        self.add(8, store=self.other_store, date=now - timedelta(days=3))
+        edited.quantity = 3
+        edited.save()
+        deleted.delete()
+
+        balances = dict(ProductStoreBalance.objects.filter(product=self.product).values_list('store_id', 'quantity'))
+        incremental = self.ledger()
+        ProductStoreBalance.rebuild(products=[self.product])
+        ProductTransaction.recalculate_balances(self.product)
 
-# Create your tests here.
+        self.assertEqual(
+            dict(ProductStoreBalance.objects.filter(product=self.product).values_list('store_id', 'quantity')),
+            balances,
+        )
+        self.assertEqual(self.ledger(), incremental)
+        self.assertEqual(balances, {self.store.pk: Decimal('7'), self.other_store.pk: Decimal('8')})
@@ -8,6 +8,7 @@ router.register(r'income-categories', api_views.IncomeCategoryViewSet)
 router.register(r'safe-transactions', api_views.SafeTransactionViewSet)
 router.register(r'contact-transactions', api_views.ContactTransactionViewSet)
 router.register(r'product-transactions', api_views.ProductTransactionViewSet)
+router.register(r'product-store-balances', api_views.ProductStoreBalanceViewSet)
 router.register(r'expenses', api_views.ExpenseViewSet)
 router.register(r'incomes', api_views.IncomeViewSet)
 router.register(r'safe-deposits', api_views.SafeDepositViewSet)
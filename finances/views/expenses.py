@@ -7,7 +7,7 @@ from django.utils import timezone
 
 from ..models import Expense, ExpenseCategory
 from ..forms import ExpenseForm
-from core.models import Safe
+from core.models import Safe, DocumentSequence
 
 @login_required
 def expense_list(request):
@@ -79,17 +79,13 @@ def expense_list(request):
 @login_required
 def expense_add(request):
     """إضافة مصروف جديد"""
-    # إنشاء رقم مستند جديد
-    last_expense = Expense.objects.order_by('-id').first()
-    new_number = f"EXP-{1:04d}" if not last_expense else f"EXP-{int(last_expense.number.split('-')[1]) + 1:04d}"
-
     if request.method == 'POST':
         form = ExpenseForm(request.POST)
         if form.is_valid():
             with transaction.atomic():
                 expense = form.save(commit=False)
                 # دائماً قم بتعيين رقم مستند جديد
-                expense.number = new_number
+                expense.number = DocumentSequence.next_number('expense')
                 expense.save()
                 messages.success(request, 'تم إضافة المصروف بنجاح')
                 return redirect('expense_list')
@@ -5,8 +5,9 @@ from django.db import transaction
 from django.db.models import Q, Sum
 from django.utils import timezone
 
-from ..models import ProductTransaction
+from ..models import ProductTransaction, BalanceCheckpoint
 from ..forms import ProductTransactionForm
+from core import search
 from core.models import Store
 from products.models import Product, ProductUnit, Category
 
@@ -53,11 +54,12 @@ def product_transaction_list(request):
     # البحث
     search_query = request.GET.get('q')
     if search_query:
+        # المنتجات من فهرس البحث والمخازن باستعلام فرعي، بدون joins على جدول الحركات
         transactions = transactions.filter(
-            Q(product__name__icontains=search_query) |
+            search.q('product', search_query, 'product_id') |
             Q(description__icontains=search_query) |
             Q(reference_number__icontains=search_query) |
-            Q(store__name__icontains=search_query)
+            Q(store_id__in=Store.objects.filter(name__icontains=search_query).values('id'))
         )
 
     # قوائم للتصفية
@@ -226,10 +228,13 @@ def product_movement_report(request, product_id):
     from_date = request.GET.get('from_date')
     to_date = request.GET.get('to_date')
 
+    opening_balance = None
     if from_date:
         try:
             from_date_obj = timezone.datetime.strptime(from_date, '%Y-%m-%d').replace(hour=0, minute=0, second=0)
             movements = movements.filter(date__gte=from_date_obj)
+            # رصيد أول المدة من نقاط الأرصدة اليومية (للمنتج إجمالاً أو في المخزن المحدد)
+            opening_balance = BalanceCheckpoint.opening_balance(product, from_date_obj, store=store_id or None)
         except ValueError:
             messages.error(request, 'تنسيق تاريخ البداية غير صحيح. يرجى استخدام التنسيق YYYY-MM-DD')
             from_date = None
@@ -253,7 +258,8 @@ def product_movement_report(request, product_id):
         'selected_store': store_id,
         'selected_type': transaction_type,
         'from_date': from_date,
-        'to_date': to_date
+        'to_date': to_date,
+        'opening_balance': opening_balance
     })
 
 @login_required
@@ -295,11 +301,7 @@ def product_inventory(request):
     # البحث
     search_query = request.GET.get('q')
     if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(code__icontains=search_query) |
-            Q(barcode__icontains=search_query)
-        )
+        products = products.filter(search.q('product', search_query))
 
     # الحصول على حركات المنتجات حسب المخزن إذا تم تحديده
     product_movements = {}
@@ -4,9 +4,20 @@ from django.db.models import Q, Sum
 from django.utils import timezone
 from datetime import datetime, timedelta
 
-from ...models import SafeTransaction
+from ...models import SafeTransaction, BalanceCheckpoint
 from core.models import Safe
 
+
+def _previous_balance(safe, from_date):
+    """
+    صافي الحركات قبل بداية الفترة للخزنة المحددة أو لكل الخزن والبنوك،
+    من آخر نقطة رصيد يومية بدلاً من تجميع كل الحركات السابقة
+    """
+    if safe:
+        return BalanceCheckpoint.movement_before(from_date, safe_id=safe.pk)
+    # آخر نقطة لكل الخزن والبنوك معًا باستعلام تجميعي واحد بدلاً من استعلام لكل خزنة وبنك
+    return BalanceCheckpoint.total_movement_before(from_date, kinds=('safe', 'bank'))
+
 @login_required
 def financial_transactions_report(request):
     """تقرير الحركات المالية"""
@@ -58,21 +69,8 @@ def financial_transactions_report(request):
     if safe:
         transactions = transactions.filter(safe=safe)
 
-    # الحصول على الرصيد السابق
-    previous_transactions = SafeTransaction.objects.filter(date__lt=from_date_obj)
-    if safe:
-        previous_transactions = previous_transactions.filter(safe=safe)
-
-    # حساب الإيرادات والمصروفات السابقة
-    previous_in = previous_transactions.filter(
-        transaction_type__in=['deposit', 'income', 'receipt', 'sale_invoice', 'purchase_return_invoice']
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-    previous_out = previous_transactions.filter(
-        transaction_type__in=['withdrawal', 'expense', 'payment', 'purchase_invoice', 'sale_return_invoice']
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-    previous_balance = previous_in - previous_out
+    # الحصول على الرصيد السابق من نقاط الأرصدة اليومية
+    previous_balance = _previous_balance(safe, from_date_obj)
 
     # حساب الإيرادات والمصروفات الحالية
     current_in = transactions.filter(
@@ -212,21 +210,8 @@ def financial_transactions_print(request):
     if safe:
         transactions = transactions.filter(safe=safe)
 
-    # الحصول على الرصيد السابق
-    previous_transactions = SafeTransaction.objects.filter(date__lt=from_date_obj)
-    if safe:
-        previous_transactions = previous_transactions.filter(safe=safe)
-
-    # حساب الإيرادات والمصروفات السابقة
-    previous_in = previous_transactions.filter(
-        transaction_type__in=['deposit', 'income', 'receipt', 'sale_invoice', 'purchase_return_invoice']
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-    previous_out = previous_transactions.filter(
-        transaction_type__in=['withdrawal', 'expense', 'payment', 'purchase_invoice', 'sale_return_invoice']
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-
-    previous_balance = previous_in - previous_out
+    # الحصول على الرصيد السابق من نقاط الأرصدة اليومية
+    previous_balance = _previous_balance(safe, from_date_obj)
 
     # حساب الإيرادات والمصروفات الحالية
     current_in = transactions.filter(
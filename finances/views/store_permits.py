@@ -8,7 +8,7 @@ from django.utils import timezone
 
 from ..models import StorePermit, StorePermitItem, ProductTransaction
 from ..forms import StorePermitForm, StorePermitItemForm
-from core.models import Store, Driver, Representative
+from core.models import Store, Driver, Representative, DocumentSequence
 from products.models import Product, ProductUnit
 
 # ======== أذونات المخزن (الصرف والاستلام) ========
@@ -103,17 +103,13 @@ def store_permit_list(request):
 @login_required
 def store_permit_add(request):
     """إضافة إذن مخزني جديد"""
-    # إنشاء رقم مستند جديد
-    last_permit = StorePermit.objects.order_by('-id').first()
-    new_number = f"PER-{1:04d}" if not last_permit else f"PER-{int(last_permit.number.split('-')[1]) + 1:04d}"
-
     # إنشاء نموذج البيانات الرئيسي
     if request.method == 'POST':
         form = StorePermitForm(request.POST)
         if form.is_valid():
             with transaction.atomic():
                 permit = form.save(commit=False)
-                permit.number = new_number
+                permit.number = DocumentSequence.next_number('store_permit')
                 permit.save()
 
                 # إنشاء نموذج البنود
@@ -164,10 +160,6 @@ def store_permit_add(request):
 @login_required
 def store_permit_add_issue(request):
     """إضافة إذن صرف مخزني جديد"""
-    # إنشاء رقم مستند جديد
-    last_permit = StorePermit.objects.order_by('-id').first()
-    new_number = f"ISS-{1:04d}" if not last_permit else f"ISS-{int(last_permit.number.split('-')[1]) + 1:04d}"
-
     # إنشاء نموذج البيانات الرئيسي
     if request.method == 'POST':
         form = StorePermitForm(request.POST)
@@ -175,7 +167,7 @@ def store_permit_add_issue(request):
             with transaction.atomic():
                 permit = form.save(commit=False)
                 permit.permit_type = StorePermit.ISSUE
-                permit.number = new_number
+                permit.number = DocumentSequence.next_number('store_permit.issue')
                 permit.save()
 
                 # إنشاء نموذج البنود
@@ -228,10 +220,6 @@ def store_permit_add_issue(request):
 @login_required
 def store_permit_add_receive(request):
     """إضافة إذن استلام مخزني جديد"""
-    # إنشاء رقم مستند جديد
-    last_permit = StorePermit.objects.order_by('-id').first()
-    new_number = f"REC-{1:04d}" if not last_permit else f"REC-{int(last_permit.number.split('-')[1]) + 1:04d}"
-
     # إنشاء نموذج البيانات الرئيسي
     if request.method == 'POST':
         form = StorePermitForm(request.POST)
@@ -239,7 +227,7 @@ def store_permit_add_receive(request):
             with transaction.atomic():
                 permit = form.save(commit=False)
                 permit.permit_type = StorePermit.RECEIVE
-                permit.number = new_number
+                permit.number = DocumentSequence.next_number('store_permit.receive')
                 permit.save()
 
                 # إنشاء نموذج البنود
@@ -394,10 +382,13 @@ def store_permit_post(request, pk):
     if permit.is_posted:
         messages.warning(request, 'الإذن المخزني مرحل بالفعل')
     else:
-        if permit.post_permit():
-            messages.success(request, 'تم ترحيل الإذن المخزني بنجاح')
-        else:
-            messages.error(request, 'حدث خطأ أثناء ترحيل الإذن المخزني')
+        try:
+            if permit.post_permit():
+                messages.success(request, 'تم ترحيل الإذن المخزني بنجاح')
+            else:
+                messages.error(request, 'حدث خطأ أثناء ترحيل الإذن المخزني')
+        except ValueError as e:
+            messages.error(request, f'تعذر ترحيل الإذن المخزني: {e}')
 
     return redirect('store_permit_detail', pk=permit.pk)
 
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
-import api from './api';
+import api, { fetchList } from './api';
 import { 
   Plus, 
   Calculator, 
@@ -117,12 +117,12 @@ const Accounting = () => {
   const fetchAccounts = async () => {
     try {
       setLoading(true);
-      const response = await api.get('/accounting/api/accounts/');
-      setAccounts(response.data);
+      const response = await fetchList('/accounting/api/accounts/');
+      setAccounts(response);
       
       // Auto-expand root accounts by default
       const initialExpanded = {};
-      response.data.forEach(acc => {
+      response.forEach(acc => {
         if (!acc.parent) initialExpanded[acc.id] = true;
       });
       setExpandedAccounts(initialExpanded);
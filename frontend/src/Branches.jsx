@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import api from './api';
+import api, { fetchList } from './api';
 import { 
   Building2, 
   Plus, 
@@ -42,12 +42,12 @@ const Branches = () => {
     setLoading(true);
     try {
       const [branchesRes, companiesRes, settingsRes] = await Promise.all([
-        api.get('/core/api/branches/'),
-        api.get('/core/api/companies/'),
+        fetchList('/core/api/branches/'),
+        fetchList('/core/api/companies/'),
         api.get('/core/api/system-settings/current/')
       ]);
-      setBranches(branchesRes.data);
-      setCompanies(companiesRes.data);
+      setBranches(branchesRes);
+      setCompanies(companiesRes);
       setSettings(settingsRes.data);
     } catch (err) {
       console.error('Error fetching data:', err);
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from './api';
+import api, { fetchList } from './api';
 import { Plus, Building2, Phone, Mail, MapPin, Trash2, Edit2, X, Save } from 'lucide-react';
 
 const Companies = () => {
@@ -19,8 +19,7 @@ const Companies = () => {
 
   const fetchBranches = async (companyId) => {
     try {
-      const response = await api.get(`/api/branches/?company=${companyId}`);
-      setBranches(response.data);
+      setBranches(await fetchList('/api/branches/', { company: companyId }));
     } catch (err) {
       console.error('Error fetching branches:', err);
     }
@@ -67,8 +66,8 @@ const Companies = () => {
   const fetchCompanies = async () => {
     try {
       setLoading(true);
-      const response = await api.get('/api/companies/');
-      setCompanies(response.data);
+      const response = await fetchList('/api/companies/');
+      setCompanies(response);
     } catch (err) {
       console.error('Error fetching companies:', err);
     } finally {
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useSearchParams } from 'react-router-dom';
-import api from './api';
+import api, { fetchList } from './api';
 import { 
   Users, 
   UserPlus, 
@@ -64,8 +64,8 @@ const Contacts = () => {
     try {
       setLoading(true);
       // Fetch contacts separately to ensure they show even if stats fail
-      const contactsRes = await api.get('/api/contacts/');
-      setContacts(Array.isArray(contactsRes.data) ? contactsRes.data : []);
+      const contactsRes = await fetchList('/api/contacts/');
+      setContacts(contactsRes);
       
       // Fetch stats separately
       try {
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from './api';
+import api, { fetchList } from './api';
 import { 
   Users, 
   UserPlus, 
@@ -34,8 +34,8 @@ const Drivers = () => {
   const fetchDrivers = async () => {
     try {
       setLoading(true);
-      const response = await api.get('/api/drivers/');
-      setDrivers(response.data);
+      const response = await fetchList('/api/drivers/');
+      setDrivers(response);
     } catch (err) {
       console.error('Error fetching drivers:', err);
     } finally {
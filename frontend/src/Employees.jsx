@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
-import api from './api';
+import api, { fetchList, fetchPage } from './api';
 import { 
   Users, 
   UserPlus, 
@@ -36,6 +36,8 @@ const Employees = () => {
   
   const [employees, setEmployees] = useState([]);
   const [attendanceRecords, setAttendanceRecords] = useState([]);
+  const [attendanceCount, setAttendanceCount] = useState(0);
+  const [hasMoreAttendance, setHasMoreAttendance] = useState(false);
   const [loans, setLoans] = useState([]);
   const [salaries, setSalaries] = useState([]);
   const [safes, setSafes] = useState([]);
@@ -123,18 +125,20 @@ const Employees = () => {
   const fetchData = async () => {
     try {
       setLoading(true);
-      const [empRes, attRes, loanRes, salRes, safeRes] = await Promise.all([
-        api.get('/employees/api/employees/'),
-        api.get('/employees/api/attendance/'),
-        api.get('/employees/api/loans/'),
-        api.get('/employees/api/salaries/'),
-        api.get('/finances/api/safes/')
+      const [empRes, attPage, loanRes, salRes, safeRes] = await Promise.all([
+        fetchList('/employees/api/employees/'),
+        fetchPage('/employees/api/attendance/'),
+        fetchList('/employees/api/loans/'),
+        fetchList('/employees/api/salaries/'),
+        fetchList('/finances/api/safes/')
       ]);
-      setEmployees(empRes.data);
-      setAttendanceRecords(attRes.data);
-      setLoans(loanRes.data);
-      setSalaries(salRes.data);
-      setSafes(safeRes.data);
+      setEmployees(empRes);
+      setAttendanceRecords(attPage.results);
+      setAttendanceCount(attPage.count);
+      setHasMoreAttendance(Boolean(attPage.next));
+      setLoans(loanRes);
+      setSalaries(salRes);
+      setSafes(safeRes);
     } catch (err) {
       console.error('Error fetching data:', err);
     } finally {
@@ -142,6 +146,17 @@ const Employees = () => {
     }
   };
 
+  // سجلات الحضور تُجلب صفحة بصفحة (الأحدث أولاً)
+  const fetchMoreAttendance = async () => {
+    try {
+      const page = await fetchPage('/employees/api/attendance/', { offset: attendanceRecords.length });
+      setAttendanceRecords(prev => [...prev, ...page.results]);
+      setHasMoreAttendance(Boolean(page.next));
+    } catch (err) {
+      console.error('Error fetching attendance:', err);
+    }
+  };
+
   useEffect(() => {
     fetchData();
   }, []);
@@ -554,7 +569,7 @@ const Employees = () => {
         >
           <div className="flex items-center gap-2">
             <Calendar size={18} />
-            سجلات الحضور ({attendanceRecords.length})
+            سجلات الحضور ({attendanceCount})
           </div>
           {activeTab === 'attendance' && <div className="absolute bottom-0 left-0 right-0 h-0.5 bg-green-600 rounded-full" />}
         </button>
@@ -738,6 +753,16 @@ const Employees = () => {
                   <p className="font-bold">لا توجد سجلات حضور حالياً</p>
                 </div>
               )}
+              {hasMoreAttendance && (
+                <div className="p-4 border-t border-gray-50 text-center">
+                  <button
+                    onClick={fetchMoreAttendance}
+                    className="px-6 py-2 bg-gray-50 text-gray-600 rounded-xl font-bold hover:bg-gray-100 transition"
+                  >
+                    عرض المزيد
+                  </button>
+                </div>
+              )}
             </div>
           )}
 
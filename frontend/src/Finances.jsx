@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from './api';
+import api, { fetchList } from './api';
 import { 
   Wallet, 
   Plus, 
@@ -544,22 +544,22 @@ const Finances = () => {
       
       // Fetch common data
       const [banksRes, safesRes, accountsRes, branchesRes, expCatRes, incCatRes, contactsRes] = await Promise.all([
-        api.get('/api/banks/'),
-        api.get('/api/safes/'),
-        api.get('/accounting/api/accounts/'),
-        api.get('/api/branches/'),
-        api.get('/finances/api/expense-categories/'),
-        api.get('/finances/api/income-categories/'),
-        api.get('/core/api/contacts/')
+        fetchList('/api/banks/'),
+        fetchList('/api/safes/'),
+        fetchList('/accounting/api/accounts/'),
+        fetchList('/api/branches/'),
+        fetchList('/finances/api/expense-categories/'),
+        fetchList('/finances/api/income-categories/'),
+        fetchList('/core/api/contacts/')
       ]);
 
-      setBanks(banksRes.data);
-      setSafes(safesRes.data);
-      setAccounts(accountsRes.data);
-      setBranches(branchesRes.data);
-      setExpenseCategories(expCatRes.data);
-      setIncomeCategories(incCatRes.data);
-      setContacts(contactsRes.data);
+      setBanks(banksRes);
+      setSafes(safesRes);
+      setAccounts(accountsRes);
+      setBranches(branchesRes);
+      setExpenseCategories(expCatRes);
+      setIncomeCategories(incCatRes);
+      setContacts(contactsRes);
 
       let endpoint = '';
       if (activeTab === 'transactions') endpoint = '/finances/api/safe-transactions/';
@@ -575,15 +575,13 @@ const Finances = () => {
         return;
       }
       
-      const response = await api.get(endpoint);
-      if (activeTab === 'money_transfers') setMoneyTransfers(response.data);
-      else if (activeTab === 'payments' || activeTab === 'receipts') {
-        const filteredPayments = activeTab === 'payments' 
-          ? response.data.filter(p => p.payment_type === 'payment')
-          : response.data.filter(p => p.payment_type === 'receipt');
-        setPayments(filteredPayments);
+      if (activeTab === 'payments' || activeTab === 'receipts') {
+        // نوع السند يُفلتر في الخادم حتى لا تُستهلك الصفحة بسندات النوع الآخر
+        const paymentType = activeTab === 'payments' ? 'payment' : 'receipt';
+        setPayments(await fetchList(endpoint, { payment_type: paymentType }));
       }
-      else setTransactions(response.data);
+      else if (activeTab === 'money_transfers') setMoneyTransfers(await fetchList(endpoint));
+      else setTransactions(await fetchList(endpoint));
 
     } catch (err) {
       console.error('Error fetching financial data:', err);
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from './api';
+import api, { fetchList } from './api';
 import { 
   Plus, 
   Search, 
@@ -40,8 +40,8 @@ const FixedAssets = () => {
   const fetchAssets = async () => {
     try {
       setLoading(true);
-      const response = await api.get('/accounting/api/fixed-assets/');
-      setAssets(response.data);
+      const response = await fetchList('/accounting/api/fixed-assets/');
+      setAssets(response);
     } catch (err) {
       console.error('Error fetching assets:', err);
     } finally {
@@ -51,8 +51,8 @@ const FixedAssets = () => {
 
   const fetchAccounts = async () => {
     try {
-      const response = await api.get('/accounting/api/accounts/');
-      setAccounts(response.data);
+      const response = await fetchList('/accounting/api/accounts/');
+      setAccounts(response);
     } catch (err) {
       console.error('Error fetching accounts:', err);
     }
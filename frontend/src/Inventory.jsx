@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from './api';
+import api, { fetchList } from './api';
 import { 
   Warehouse, 
   Wallet, 
@@ -42,13 +42,13 @@ const Inventory = () => {
     try {
       setLoading(true);
       const [storesRes, safesRes, branchesRes] = await Promise.all([
-        api.get('/api/stores/'),
-        api.get('/api/safes/'),
-        api.get('/api/branches/')
+        fetchList('/api/stores/'),
+        fetchList('/api/safes/'),
+        fetchList('/api/branches/')
       ]);
-      setStores(storesRes.data);
-      setSafes(safesRes.data);
-      setBranches(branchesRes.data);
+      setStores(storesRes);
+      setSafes(safesRes);
+      setBranches(branchesRes);
     } catch (err) {
       console.error('Error fetching inventory data:', err);
     } finally {
@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { useParams } from 'react-router-dom';
-import api from './api';
+import api, { fetchList } from './api';
+import { loadCatalog } from './catalog';
 import { 
   Plus, 
   Search, 
@@ -74,16 +75,16 @@ const InventoryOperations = () => {
   const fetchData = async () => {
     try {
       setLoading(true);
-      const [productsRes, storesRes, adjRes, transRes] = await Promise.all([
-        api.get('/api/products/'),
-        api.get('/api/stores/'),
-        api.get('/api/inventory-adjustments/'),
-        api.get('/api/stock-transfers/')
+      const [catalogProducts, storesRes, adjRes, transRes] = await Promise.all([
+        loadCatalog(),
+        fetchList('/api/stores/'),
+        fetchList('/api/inventory-adjustments/'),
+        fetchList('/api/stock-transfers/')
       ]);
-      setProducts(productsRes.data);
-      setStores(storesRes.data);
-      setAdjustments(adjRes.data);
-      setTransfers(transRes.data);
+      setProducts(catalogProducts);
+      setStores(storesRes);
+      setAdjustments(adjRes);
+      setTransfers(transRes);
     } catch (err) {
       console.error('Error fetching data:', err);
     } finally {
@@ -95,16 +96,14 @@ const InventoryOperations = () => {
     if (!movementFilters.product) return;
     try {
       setLoading(true);
-      const res = await api.get('/api/product-transactions/', {
-        params: {
-          product: movementFilters.product,
-          store: movementFilters.store,
-          start_date: movementFilters.start_date,
-          end_date: movementFilters.end_date
-        }
+      const movements = await fetchList('/api/product-transactions/', {
+        product: movementFilters.product,
+        store: movementFilters.store,
+        start_date: movementFilters.start_date,
+        end_date: movementFilters.end_date
       });
       // Sort by date and id
-      const sorted = res.data.sort((a, b) => new Date(a.date) - new Date(b.date) || a.id - b.id);
+      const sorted = movements.sort((a, b) => new Date(a.date) - new Date(b.date) || a.id - b.id);
       setProductMovements(sorted);
     } catch (err) {
       console.error('Error fetching movements:', err);
@@ -127,16 +126,13 @@ const InventoryOperations = () => {
     const product = products.find(p => p.id === parseInt(productId));
     if (product) {
       setSelectedProduct(product);
-      try {
-        const res = await api.get(`/api/products/${productId}/units/`);
-        setProductUnits(res.data);
-        if (type === 'adjustment') {
-          setAdjustmentFormData(prev => ({ ...prev, product: productId, product_unit: res.data[0]?.id || '' }));
-        } else {
-          setTransferFormData(prev => ({ ...prev, product: productId, product_unit: res.data[0]?.id || '' }));
-        }
-      } catch (err) {
-        console.error('Error fetching units:', err);
+      // الوحدات موجودة في الكتالوج المحلي فلا حاجة لطلب لكل منتج
+      const units = product.units || [];
+      setProductUnits(units);
+      if (type === 'adjustment') {
+        setAdjustmentFormData(prev => ({ ...prev, product: productId, product_unit: units[0]?.id || '' }));
+      } else {
+        setTransferFormData(prev => ({ ...prev, product: productId, product_unit: units[0]?.id || '' }));
       }
     }
   };
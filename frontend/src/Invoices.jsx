@@ -1,6 +1,7 @@
 import React, { useEffect, useState, useRef } from 'react';
 import { useParams } from 'react-router-dom';
-import api from './api';
+import api, { fetchList, fetchPage } from './api';
+import { loadCatalog } from './catalog';
 import { useReactToPrint } from 'react-to-print';
 import * as XLSX from 'xlsx';
 import InvoicePrint from './InvoicePrint';
@@ -45,6 +46,8 @@ const Invoices = () => {
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
   const [activeTab, setActiveTab] = useState(typeMap[type] || 'all');
+  const [hasMore, setHasMore] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchFormData();
@@ -56,25 +59,13 @@ const Invoices = () => {
     setView('list');
     setEditingInvoice(null);
     setSearchTerm('');
-    
-    // Explicitly fetch data when type changes to ensure UI updates
-    const fetchData = async () => {
-      try {
-        setLoading(true);
-        let url = '/invoices/api/invoices/';
-        if (mappedType !== 'all') {
-          url += `?type=${mappedType}`;
-        }
-        const response = await api.get(url);
-        setInvoices(response.data);
-      } catch (err) {
-        console.error('Error fetching invoices:', err);
-      } finally {
-        setLoading(false);
-      }
-    };
-    fetchData();
   }, [type]);
+
+  // البحث والتصفية على الخادم صفحة بصفحة بدلاً من تحميل كل الفواتير
+  useEffect(() => {
+    const timer = setTimeout(() => fetchInvoices(), searchTerm ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [type, activeTab, searchTerm]);
   const [view, setView] = useState('list'); // 'list' or 'form'
   const [editingInvoice, setEditingInvoice] = useState(null);
   const [previousBalance, setPreviousBalance] = useState(0);
@@ -149,49 +140,54 @@ const Invoices = () => {
     items: []
   });
 
-  const fetchInvoices = async () => {
+  const fetchInvoices = async (offset = 0) => {
     try {
-      setLoading(true);
-      let url = '/invoices/api/invoices/';
+      offset ? setLoadingMore(true) : setLoading(true);
+      const params = { offset };
       if (activeTab !== 'all') {
-        url += `?type=${activeTab}`;
+        params.type = activeTab;
+      }
+      if (searchTerm) {
+        params.search = searchTerm;
       }
-      const response = await api.get(url);
-      setInvoices(response.data);
+      const page = await fetchPage('/invoices/api/invoices/', params);
+      setInvoices(prev => offset ? [...prev, ...page.results] : page.results);
+      setHasMore(Boolean(page.next));
     } catch (err) {
       console.error('Error fetching invoices:', err);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
   const fetchFormData = async () => {
     try {
       const [c, s, sf, p, r, d, sett, comp] = await Promise.all([
-        api.get('/core/api/contacts/'),
-        api.get('/core/api/stores/'),
-        api.get('/core/api/safes/'),
-        api.get('/products/api/products/'),
-        api.get('/core/api/representatives/'),
-        api.get('/core/api/drivers/'),
-        api.get('/core/api/system-settings/'),
-        api.get('/core/api/companies/')
+        fetchList('/core/api/contacts/'),
+        fetchList('/core/api/stores/'),
+        fetchList('/core/api/safes/'),
+        loadCatalog(),
+        fetchList('/core/api/representatives/'),
+        fetchList('/core/api/drivers/'),
+        fetchList('/core/api/system-settings/'),
+        fetchList('/core/api/companies/')
       ]);
-      setContacts(c.data);
-      setStores(s.data);
-      setSafes(sf.data);
-      setProducts(p.data);
-      setRepresentatives(r.data);
-      setDrivers(d.data);
+      setContacts(c);
+      setStores(s);
+      setSafes(sf);
+      setProducts(p);
+      setRepresentatives(r);
+      setDrivers(d);
       
       let finalSettings = {};
-      if (sett.data && sett.data.length > 0) {
-        finalSettings = { ...sett.data[0] };
+      if (sett && sett.length > 0) {
+        finalSettings = { ...sett[0] };
       }
       
       // دمج بيانات الشركة في الإعدادات لتظهر في الطباعة
-      if (comp.data && comp.data.length > 0) {
-        const mainCompany = comp.data[0];
+      if (comp && comp.length > 0) {
+        const mainCompany = comp[0];
         finalSettings.company_name = mainCompany.name;
         finalSettings.address = mainCompany.address;
         finalSettings.phone = mainCompany.phone;
@@ -529,10 +525,8 @@ const Invoices = () => {
     }
   };
 
-  const filteredInvoices = invoices.filter(invoice => 
-    invoice.number.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    (invoice.contact_name && invoice.contact_name.toLowerCase().includes(searchTerm.toLowerCase()))
-  );
+  // البحث يتم على الخادم (?search=)
+  const filteredInvoices = invoices;
 
   const getStatusBadge = (invoice) => {
     if (invoice.is_posted) {
@@ -1183,6 +1177,17 @@ const Invoices = () => {
             ))}
           </tbody>
         </table>
+        {hasMore && (
+          <div className="p-4 border-t border-gray-50 text-center">
+            <button
+              onClick={() => fetchInvoices(invoices.length)}
+              disabled={loadingMore}
+              className="px-6 py-2 bg-gray-50 text-gray-600 rounded-xl font-bold hover:bg-gray-100 transition disabled:opacity-50"
+            >
+              {loadingMore ? 'جاري التحميل...' : 'عرض المزيد'}
+            </button>
+          </div>
+        )}
       </div>
 
       {/* Hidden Print Component */}
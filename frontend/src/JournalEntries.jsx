@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from './api';
+import api, { fetchList } from './api';
 import { 
   BookOpen, 
   Plus, 
@@ -41,8 +41,8 @@ const JournalEntries = () => {
   const fetchEntries = async () => {
     try {
       setLoading(true);
-      const response = await api.get('/accounting/api/journal-entries/');
-      setEntries(response.data);
+      const response = await fetchList('/accounting/api/journal-entries/');
+      setEntries(response);
     } catch (err) {
       console.error('Error fetching journal entries:', err);
     } finally {
@@ -52,8 +52,8 @@ const JournalEntries = () => {
 
   const fetchAccounts = async () => {
     try {
-      const response = await api.get('/accounting/api/accounts/');
-      setAccounts(response.data.filter(a => a.is_selectable));
+      const response = await fetchList('/accounting/api/accounts/');
+      setAccounts(response.filter(a => a.is_selectable));
     } catch (err) {
       console.error('Error fetching accounts:', err);
     }
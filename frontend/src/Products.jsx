@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from './api';
+import api, { fetchList, fetchPage } from './api';
 import { 
   Plus, 
   Package, 
@@ -29,6 +29,8 @@ const Products = () => {
   const [viewMode, setViewMode] = useState('grid');
   const [searchTerm, setSearchTerm] = useState('');
   const [activeTab, setActiveTab] = useState('products'); // 'products', 'categories', 'units'
+  const [hasMoreProducts, setHasMoreProducts] = useState(false);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   // Modals state
   const [isProductModalOpen, setIsProductModalOpen] = useState(false);
@@ -63,16 +65,15 @@ const Products = () => {
   const fetchData = async () => {
     try {
       setLoading(true);
-      const [productsRes, categoriesRes, unitsRes, storesRes] = await Promise.all([
-        api.get('/products/api/products/'),
-        api.get('/products/api/categories/'),
-        api.get('/products/api/units/'),
-        api.get('/api/stores/')
+      const [categoriesRes, unitsRes, storesRes] = await Promise.all([
+        fetchList('/products/api/categories/'),
+        fetchList('/products/api/units/'),
+        fetchList('/api/stores/'),
+        fetchProducts()
       ]);
-      setProducts(productsRes.data);
-      setCategories(categoriesRes.data);
-      setUnits(unitsRes.data);
-      setStores(storesRes.data);
+      setCategories(categoriesRes);
+      setUnits(unitsRes);
+      setStores(storesRes);
     } catch (err) {
       console.error('Error fetching data:', err);
     } finally {
@@ -80,10 +81,34 @@ const Products = () => {
     }
   };
 
+  // المنتجات تُجلب صفحة بصفحة ويتم البحث فيها على الخادم
+  const fetchProducts = async (offset = 0) => {
+    try {
+      if (offset) setLoadingMore(true);
+      const params = { offset };
+      if (activeTab === 'products' && searchTerm) {
+        params.search = searchTerm;
+      }
+      const page = await fetchPage('/products/api/products/', params);
+      setProducts(prev => offset ? [...prev, ...page.results] : page.results);
+      setHasMoreProducts(Boolean(page.next));
+    } catch (err) {
+      console.error('Error fetching products:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchData();
   }, []);
 
+  useEffect(() => {
+    if (activeTab !== 'products' || loading) return;
+    const timer = setTimeout(() => fetchProducts(), 300);
+    return () => clearTimeout(timer);
+  }, [searchTerm]);
+
   const handleProductSubmit = async (e) => {
     e.preventDefault();
     try {
@@ -250,10 +275,8 @@ const Products = () => {
     }
   };
 
-  const filteredProducts = products.filter(product => 
-    product.name.toLowerCase().includes(searchTerm.toLowerCase()) ||
-    (product.code && product.code.toLowerCase().includes(searchTerm.toLowerCase()))
-  );
+  // البحث في المنتجات يتم على الخادم (?search=)
+  const filteredProducts = products;
 
   const filteredCategories = categories.filter(cat => 
     cat.name.toLowerCase().includes(searchTerm.toLowerCase())
@@ -581,6 +604,18 @@ const Products = () => {
         </div>
       )}
 
+      {activeTab === 'products' && hasMoreProducts && (
+        <div className="text-center">
+          <button
+            onClick={() => fetchProducts(products.length)}
+            disabled={loadingMore}
+            className="px-6 py-2 bg-white border border-gray-100 text-gray-600 rounded-xl font-bold hover:bg-gray-50 transition shadow-sm disabled:opacity-50"
+          >
+            {loadingMore ? 'جاري التحميل...' : 'عرض المزيد'}
+          </button>
+        </div>
+      )}
+
       {/* Product Modal */}
       {isProductModalOpen && (
         <div className="fixed inset-0 z-50 flex items-center justify-center p-4">
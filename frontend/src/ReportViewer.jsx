@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import api from './api';
+import api, { fetchList } from './api';
 import { X, Download, Printer, Filter, Calendar } from 'lucide-react';
 
 const ReportViewer = ({ reportType, title, onClose }) => {
@@ -14,9 +14,9 @@ const ReportViewer = ({ reportType, title, onClose }) => {
 
   const fetchAccounts = async () => {
     try {
-      const response = await api.get('/accounting/api/accounts/');
+      const response = await fetchList('/accounting/api/accounts/');
       // Filter for selectable accounts only
-      setAccounts(response.data.filter(a => a.is_selectable));
+      setAccounts(response.filter(a => a.is_selectable));
     } catch (err) {
       console.error('Error fetching accounts:', err);
     }
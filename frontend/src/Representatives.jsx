@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from './api';
+import api, { fetchList } from './api';
 import { 
   Users, 
   UserPlus, 
@@ -34,8 +34,8 @@ const Representatives = () => {
   const fetchRepresentatives = async () => {
     try {
       setLoading(true);
-      const response = await api.get('/api/representatives/');
-      setRepresentatives(response.data);
+      const response = await fetchList('/api/representatives/');
+      setRepresentatives(response);
     } catch (err) {
       console.error('Error fetching representatives:', err);
     } finally {
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import api from './api';
+import api, { fetchList } from './api';
 import { 
   Settings as SettingsIcon, 
   User, 
@@ -38,24 +38,24 @@ const Settings = () => {
     try {
       const [settingsRes, companyRes, c, s, sf, a] = await Promise.all([
         api.get('/core/api/system-settings/current/'),
-        api.get('/core/api/companies/'),
-        api.get('/core/api/contacts/'),
-        api.get('/core/api/stores/'),
-        api.get('/core/api/safes/'),
-        api.get('/accounting/api/accounts/')
+        fetchList('/core/api/companies/'),
+        fetchList('/core/api/contacts/'),
+        fetchList('/core/api/stores/'),
+        fetchList('/core/api/safes/'),
+        fetchList('/accounting/api/accounts/')
       ]);
       
       setSettings(settingsRes.data);
-      if (companyRes.data && companyRes.data.length > 0) {
-        setCompany(companyRes.data[0]);
+      if (companyRes && companyRes.length > 0) {
+        setCompany(companyRes[0]);
       } else {
         setCompany({ name: '', address: '', phone: '', email: '', tax_number: '' });
       }
       
-      setContacts(c.data);
-      setStores(s.data);
-      setSafes(sf.data);
-      setAccounts(a.data);
+      setContacts(c);
+      setStores(s);
+      setSafes(sf);
+      setAccounts(a);
     } catch (err) {
       console.error('Error fetching data:', err);
     } finally {
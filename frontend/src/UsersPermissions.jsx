@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import api from './api';
+import api, { fetchList } from './api';
 import { 
   Users, 
   Shield, 
@@ -53,15 +53,15 @@ const UsersPermissions = () => {
       setLoading(true);
       setError(null);
       const [usersRes, rolesRes, customRolesRes] = await Promise.all([
-        api.get('/users/api/users/'),
+        fetchList('/users/api/users/'),
         api.get('/users/api/users/roles_list/'),
-        api.get('/users/api/custom-roles/')
+        fetchList('/users/api/custom-roles/')
       ]);
       
       // Handle potential paginated response
-      const usersData = Array.isArray(usersRes.data) ? usersRes.data : usersRes.data.results || [];
+      const usersData = usersRes;
       const rolesData = Array.isArray(rolesRes.data) ? rolesRes.data : rolesRes.data.results || [];
-      const customRolesData = Array.isArray(customRolesRes.data) ? customRolesRes.data : customRolesRes.data.results || [];
+      const customRolesData = customRolesRes;
       
       setUsers(usersData);
       setRoles(rolesData);
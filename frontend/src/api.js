@@ -32,3 +32,27 @@ api.interceptors.response.use(
 );
 
 export default api;
+
+// حجم الصفحة في القوائم المرقمة من الخادم
+export const PAGE_SIZE = 50;
+
+// جلب صفحة من قائمة (?limit=&offset=) وتوحيد الرد إلى { results, next, count }
+export const fetchPage = async (url, params = {}) => {
+  const response = await api.get(url, { params: { limit: PAGE_SIZE, ...params } });
+  const data = response.data;
+  if (Array.isArray(data)) {
+    return { results: data, next: null, count: data.length };
+  }
+  return data;
+};
+
+// أقصى عدد صفوف يعيده الخادم في طلب واحد (max_limit في core/pagination.py)
+export const MAX_LIMIT = 500;
+
+// جلب قائمة كمصفوفة حتى MAX_LIMIT صف (القوائم المرجعية والشاشات التي لا تحمل صفحات بعد).
+// الحد يُطلب صراحة لأن الخادم يعيد PAGE_SIZE صف فقط بدون limit.
+export const fetchList = async (url, params = {}) => {
+  const response = await api.get(url, { params: { limit: MAX_LIMIT, ...params } });
+  const data = response.data;
+  return Array.isArray(data) ? data : data.results;
+};
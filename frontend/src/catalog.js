@@ -0,0 +1,70 @@
+import api from './api';
+
+// نسخة محلية من كتالوج المنتجات تُزامن بالتغييرات فقط (/products/api/products/catalog/)
+const STORAGE_KEY = 'product_catalog';
+
+const toObjects = ({ columns, rows }) =>
+  rows.map(row => Object.fromEntries(columns.map((column, i) => [column, row[i]])));
+
+const mergeRows = (current, table, ids) => {
+  const merged = { ...current };
+  toObjects(table).forEach(row => { merged[row.id] = row; });
+  if (!ids) return merged;
+  const keep = new Set(ids);
+  return Object.fromEntries(Object.entries(merged).filter(([id]) => keep.has(Number(id))));
+};
+
+const readCache = () => {
+  try {
+    return JSON.parse(localStorage.getItem(STORAGE_KEY));
+  } catch {
+    return null;
+  }
+};
+
+// المنتجات بنفس شكل ProductSerializer الذي تستخدمه الشاشات (مع units و unit_name)
+const toProducts = (cache) => {
+  const units = Object.fromEntries(cache.units.map(unit => [unit.id, unit]));
+  const productUnits = {};
+  Object.values(cache.productUnits).forEach(pu => {
+    (productUnits[pu.product] = productUnits[pu.product] || []).push({
+      ...pu,
+      unit_name: units[pu.unit]?.name,
+      unit_symbol: units[pu.unit]?.symbol,
+    });
+  });
+  return Object.values(cache.products)
+    .sort((a, b) => a.id - b.id)
+    .map(product => ({
+      ...product,
+      units: (productUnits[product.id] || []).sort((a, b) => a.id - b.id),
+    }));
+};
+
+export const loadCatalog = async () => {
+  let cache = readCache();
+  const config = { validateStatus: status => status === 200 || status === 304 };
+  if (cache) {
+    config.params = { since: cache.version };
+    config.headers = { 'If-None-Match': cache.etag };
+  }
+
+  const response = await api.get('/products/api/products/catalog/', config);
+  if (response.status === 200) {
+    const data = response.data;
+    const delta = data.since !== null && cache;
+    cache = {
+      version: data.version,
+      etag: response.headers.etag,
+      products: mergeRows(delta ? cache.products : {}, data.products, data.product_ids),
+      productUnits: mergeRows(delta ? cache.productUnits : {}, data.product_units, data.product_unit_ids),
+      units: toObjects(data.units),
+    };
+    try {
+      localStorage.setItem(STORAGE_KEY, JSON.stringify(cache));
+    } catch {
+      // المساحة ممتلئة: تُستخدم النسخة في الذاكرة فقط
+    }
+  }
+  return toProducts(cache);
+};
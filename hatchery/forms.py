@@ -145,13 +145,13 @@ class DisinfectantCategoryForm(forms.ModelForm):
 class DisinfectantInventoryForm(forms.ModelForm):
     class Meta:
         model = DisinfectantInventory
-        fields = ['category', 'name', 'supplier', 'unit', 'current_stock', 'minimum_stock', 'notes']
+        fields = ['category', 'name', 'supplier', 'unit', 'opening_stock', 'minimum_stock', 'notes']
         widgets = {
             'category': forms.Select(attrs={'class': 'form-select'}),
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'supplier': forms.TextInput(attrs={'class': 'form-control'}),
             'unit': forms.TextInput(attrs={'class': 'form-control'}),
-            'current_stock': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
+            'opening_stock': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'minimum_stock': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
             'notes': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
@@ -190,8 +190,14 @@ class DisinfectantTransactionForm(forms.ModelForm):
 
         if disinfectant and transaction_type == 'dispense' and quantity:
             # التحقق من أن كمية الصرف لا تتجاوز المخزون الحالي
-            if quantity > disinfectant.current_stock:
-                self.add_error('quantity', f'الكمية المتاحة للصرف هي {disinfectant.current_stock} {disinfectant.unit} فقط.')
+            # (عند التعديل يُستبعد أثر الحركة الأصلية لأنها ستُلغى قبل تطبيق الجديدة)
+            available = disinfectant.current_stock
+            if self.instance.pk and self.instance.disinfectant_id == disinfectant.pk:
+                available -= DisinfectantTransaction.signed_quantity(
+                    self.instance.transaction_type, self.instance.quantity
+                )
+            if quantity > available:
+                self.add_error('quantity', f'الكمية المتاحة للصرف هي {available} {disinfectant.unit} فقط.')
 
         return cleaned_data
 
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from hatchery.models import DisinfectantTransaction
+
+class Command(BaseCommand):
+    help = 'Rebuild disinfectant transaction running balances and current stock from opening stock and movements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--disinfectant', type=int, action='append', dest='disinfectants',
+                            help='Disinfectant id to rebuild (repeatable, default: all)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Starting disinfectant ledger rebuild at {timezone.now()}'))
+
+        count = DisinfectantTransaction.rebuild(options['disinfectants'])
+
+        self.stdout.write(self.style.SUCCESS(f'Disinfectant ledger rebuild completed. {count} disinfectants updated.'))
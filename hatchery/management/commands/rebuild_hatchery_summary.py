@@ -0,0 +1,18 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from hatchery.models import HatcheryDailySummary
+
+class Command(BaseCommand):
+    help = 'Rebuild the hatchery daily summary table from entries, incubations, hatchings, distributions and culled sales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Starting hatchery summary rebuild at {timezone.now()}'))
+
+        count = HatcheryDailySummary.refresh(start=options['start'], end=options['end'])
+
+        self.stdout.write(self.style.SUCCESS(f'Hatchery summary rebuild completed. {count} days written.'))
@@ -0,0 +1,124 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+def build_summaries(apps, schema_editor):
+    """حساب الملخصات اليومية للبيانات الموجودة"""
+    from hatchery.models import HatcheryDailySummary
+    HatcheryDailySummary.refresh(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hatchery", "0009_batchdistribution_is_merged_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HatcheryDailySummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True, verbose_name="التاريخ")),
+                (
+                    "entries_quantity",
+                    models.PositiveIntegerField(default=0, verbose_name="عدد الوارد"),
+                ),
+                (
+                    "incubations_quantity",
+                    models.PositiveIntegerField(default=0, verbose_name="عدد التسكين"),
+                ),
+                (
+                    "incubations_damaged",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="المعدم عند التسكين"
+                    ),
+                ),
+                (
+                    "hatched_chicks",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="عدد الكتاكيت الخارجة"
+                    ),
+                ),
+                (
+                    "hatched_culled",
+                    models.PositiveIntegerField(default=0, verbose_name="عدد الفرزة"),
+                ),
+                (
+                    "hatched_dead",
+                    models.PositiveIntegerField(default=0, verbose_name="عدد الفاطس"),
+                ),
+                (
+                    "hatched_wasted",
+                    models.IntegerField(default=0, verbose_name="عدد المعدم"),
+                ),
+                (
+                    "distributed_chicks",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="عدد الكتاكيت الموزعة"
+                    ),
+                ),
+                (
+                    "distributions_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="قيمة التوزيعات",
+                    ),
+                ),
+                (
+                    "distributions_paid",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="المدفوع من التوزيعات",
+                    ),
+                ),
+                (
+                    "culled_sales_quantity",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="عدد الفرزة المباعة"
+                    ),
+                ),
+                (
+                    "culled_sales_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="قيمة مبيعات الفرزة",
+                    ),
+                ),
+                (
+                    "culled_sales_paid",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=14,
+                        verbose_name="المدفوع من مبيعات الفرزة",
+                    ),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="تاريخ التحديث"),
+                ),
+            ],
+            options={
+                "verbose_name": "ملخص يومي للمفرخة",
+                "verbose_name_plural": "الملخصات اليومية للمفرخة",
+                "ordering": ["-date"],
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
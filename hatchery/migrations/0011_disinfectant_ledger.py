@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+def build_ledger(apps, schema_editor):
+    """
+    الرصيد الافتتاحي = المخزون الحالي المسجل - صافي الحركات، حتى لا يتغير المخزون الظاهر،
+    ثم حساب رصيد كل حركة بترتيب (التاريخ، المعرف)
+    """
+    DisinfectantInventory = apps.get_model('hatchery', 'DisinfectantInventory')
+    DisinfectantTransaction = apps.get_model('hatchery', 'DisinfectantTransaction')
+    for inventory in DisinfectantInventory.objects.all():
+        transactions = list(DisinfectantTransaction.objects.filter(disinfectant=inventory)
+                            .order_by('transaction_date', 'id'))
+        signed = [t.quantity if t.transaction_type == 'receive' else -t.quantity for t in transactions]
+        balance = inventory.current_stock - sum(signed, 0)
+        DisinfectantInventory.objects.filter(pk=inventory.pk).update(opening_stock=balance)
+        for transaction, delta in zip(transactions, signed):
+            balance += delta
+            transaction.balance_after = balance
+        DisinfectantTransaction.objects.bulk_update(transactions, ['balance_after'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hatchery", "0010_hatcherydailysummary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="disinfectantinventory",
+            name="opening_stock",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                max_digits=10,
+                verbose_name="الرصيد الافتتاحي",
+            ),
+        ),
+        migrations.AddField(
+            model_name="disinfectanttransaction",
+            name="balance_after",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                editable=False,
+                max_digits=12,
+                verbose_name="الرصيد بعد الحركة",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="disinfectantinventory",
+            name="current_stock",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                editable=False,
+                max_digits=10,
+                verbose_name="المخزون الحالي",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="disinfectanttransaction",
+            index=models.Index(
+                fields=["disinfectant", "transaction_date"],
+                name="disinf_trans_date_idx",
+            ),
+        ),
+        migrations.RunPython(build_ledger, migrations.RunPython.noop),
+    ]
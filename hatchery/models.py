@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
 
@@ -241,7 +242,10 @@ class DisinfectantInventory(models.Model):
     name = models.CharField(max_length=100, verbose_name="اسم المطهر")
     supplier = models.CharField(max_length=100, blank=True, null=True, verbose_name="المورد")
     unit = models.CharField(max_length=50, verbose_name="وحدة القياس")
-    current_stock = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="المخزون الحالي")
+    opening_stock = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="الرصيد الافتتاحي")
+    # الرصيد الافتتاحي + أثر كل الحركات، يُحدَّث من DisinfectantTransaction فقط
+    current_stock = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False,
+                                        verbose_name="المخزون الحالي")
     minimum_stock = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="الحد الأدنى للمخزون")
     notes = models.TextField(blank=True, null=True, verbose_name="ملاحظات")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
@@ -260,13 +264,71 @@ class DisinfectantInventory(models.Model):
         """التحقق مما إذا كان المخزون منخفضًا"""
         return self.current_stock <= self.minimum_stock
 
+    def save(self, *args, **kwargs):
+        """
+        المخزون الحالي لا يُكتب من الحفظ العادي حتى لا تضيع تحديثات الحركات المتزامنة،
+        وتغيير الرصيد الافتتاحي يزيح المخزون الحالي وأرصدة كل الحركات بنفس الفرق.
+        """
+        from django.db import transaction
+
+        if self.pk is None:
+            self.current_stock = self.opening_stock
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic():
+            old_opening = DisinfectantInventory.objects.select_for_update().filter(pk=self.pk) \
+                .values_list('opening_stock', flat=True).first()
+            if old_opening is None:
+                super().save(*args, **kwargs)
+                return
+            if kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name != 'current_stock'
+                ]
+            else:
+                kwargs['update_fields'] = [name for name in kwargs['update_fields'] if name != 'current_stock']
+            super().save(*args, **kwargs)
+
+            delta = self.opening_stock - old_opening
+            if delta and 'opening_stock' in kwargs['update_fields']:
+                DisinfectantTransaction.objects.filter(disinfectant_id=self.pk).update(
+                    balance_after=F('balance_after') + delta
+                )
+                DisinfectantTransaction._bump_stock(self.pk, delta)
+
+        self.refresh_from_db(fields=['current_stock'])
+
+    def balance_at(self, date):
+        """الرصيد في نهاية يوم معين (رصيد آخر حركة حتى هذا اليوم، أو الرصيد الافتتاحي)"""
+        balance = self.transactions.filter(transaction_date__lte=date).order_by('-transaction_date', '-id') \
+            .values_list('balance_after', flat=True).first()
+        return balance if balance is not None else self.opening_stock
+
+
+class DisinfectantTransactionQuerySet(models.QuerySet):
+    def delete(self):
+        """الحذف الجماعي لا يمر بدالة delete لكل حركة، لذا نعيد بناء دفتر المطهرات المتأثرة بعد الحذف"""
+        from django.db import transaction
+
+        with transaction.atomic():
+            ids = set(self.order_by().values_list('disinfectant_id', flat=True).distinct())
+            result = super().delete()
+            if ids:
+                DisinfectantTransaction.rebuild(ids)
+        return result
+
 
 class DisinfectantTransaction(models.Model):
     """نموذج لحركات المطهرات (استلام أو صرف)"""
 
+    RECEIVE = 'receive'
+    DISPENSE = 'dispense'
+
     TRANSACTION_TYPES = (
-        ('receive', 'استلام'),
-        ('dispense', 'صرف'),
+        (RECEIVE, 'استلام'),
+        (DISPENSE, 'صرف'),
     )
 
     disinfectant = models.ForeignKey(
@@ -278,28 +340,245 @@ class DisinfectantTransaction(models.Model):
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES, verbose_name="نوع الحركة")
     transaction_date = models.DateField(default=timezone.now, verbose_name="تاريخ الحركة")
     quantity = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="الكمية")
+    # رصيد المطهر بعد الحركة بترتيب (التاريخ، المعرف)
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False,
+                                        verbose_name="الرصيد بعد الحركة")
     notes = models.TextField(blank=True, null=True, verbose_name="ملاحظات")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="تاريخ التحديث")
 
+    objects = DisinfectantTransactionQuerySet.as_manager()
+
     class Meta:
         verbose_name = "حركة مطهر"
         verbose_name_plural = "حركات المطهرات"
         ordering = ['-transaction_date', '-created_at']
+        indexes = [
+            models.Index(fields=['disinfectant', 'transaction_date'], name='disinf_trans_date_idx'),
+        ]
 
     def __str__(self):
         transaction_type_display = dict(self.TRANSACTION_TYPES)[self.transaction_type]
         return f"{self.disinfectant} - {transaction_type_display} - {self.transaction_date}"
 
-    def save(self, *args, **kwargs):
-        # تحديث المخزون الحالي للمطهر
-        if self.transaction_type == 'receive':
-            self.disinfectant.current_stock += self.quantity
-        else:  # صرف
-            self.disinfectant.current_stock -= self.quantity
+    @classmethod
+    def signed_quantity(cls, transaction_type, quantity):
+        """أثر الحركة على المخزون (موجب للاستلام وسالب للصرف)"""
+        return quantity if transaction_type == cls.RECEIVE else -quantity
+
+    @staticmethod
+    def _lock_disinfectants(*ids):
+        """قفل صفوف المطهرات بترتيب ثابت حتى تتسلسل التحديثات المتزامنة على نفس الرصيد"""
+        ids = sorted({pk for pk in ids if pk is not None})
+        return {item.pk: item for item in DisinfectantInventory.objects.select_for_update()
+                .filter(pk__in=ids).order_by('pk').only('id', 'opening_stock')}
+
+    def _reload_locked(self, *extra_ids):
+        """
+        الحركة كما هي محفوظة بعد قفل مطهرها (والمطهرات الإضافية المعطاة).
+        تُقرأ مرة أخرى تحت القفل لأن حركة متزامنة قد تكون عدلتها أو حذفتها قبل الحصول عليه.
+        تعيد (الصف أو None إذا حُذفت، المطهرات المقفلة).
+        """
+        rows = DisinfectantTransaction.objects.filter(pk=self.pk)
+        fields = ('disinfectant_id', 'transaction_date', 'transaction_type', 'quantity')
+        locked = {}
+        while True:
+            row = rows.values(*fields).first()
+            needed = {pk for pk in extra_ids if pk is not None}
+            if row is not None:
+                needed.add(row['disinfectant_id'])
+            if needed - set(locked):
+                locked.update(self._lock_disinfectants(*(needed | set(locked))))
+            row = rows.select_for_update().values(*fields).first()
+            if row is None or row['disinfectant_id'] in locked:
+                return row, locked
+
+    @staticmethod
+    def _bump_stock(disinfectant_id, delta):
+        """تعديل المخزون الحالي للمطهر بمقدار التغيير في استعلام واحد"""
+        if delta:
+            DisinfectantInventory.objects.filter(pk=disinfectant_id).update(current_stock=F('current_stock') + delta)
+
+    @classmethod
+    def _shift_after(cls, disinfectant_id, date, pk, delta):
+        """إزاحة أرصدة الحركات اللاحقة لموضع (التاريخ، المعرف) بمقدار delta بتحديث واحد"""
+        if delta:
+            cls.objects.filter(disinfectant_id=disinfectant_id).filter(
+                models.Q(transaction_date__gt=date) | models.Q(transaction_date=date, pk__gt=pk)
+            ).update(balance_after=F('balance_after') + delta)
+
+    def _previous_balance(self, disinfectant):
+        """رصيد آخر حركة تسبق موضع هذه الحركة، أو الرصيد الافتتاحي إذا لم توجد"""
+        transactions = DisinfectantTransaction.objects.filter(disinfectant_id=self.disinfectant_id)
+        if self.pk is None:
+            # الحركة الجديدة تأخذ أكبر معرف، فتأتي بعد كل الحركات في نفس التاريخ
+            transactions = transactions.filter(transaction_date__lte=self.transaction_date)
+        else:
+            transactions = transactions.filter(
+                models.Q(transaction_date__lt=self.transaction_date) |
+                models.Q(transaction_date=self.transaction_date, pk__lt=self.pk)
+            )
+        previous = transactions.order_by('-transaction_date', '-pk').values_list('balance_after', flat=True).first()
+        return previous if previous is not None else disinfectant.opening_stock
 
-        self.disinfectant.save()
-        super().save(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        """
+        حفظ الحركة مع تحديث الدفتر تزايديًا تحت قفل صف المطهر:
+        التعديل يزيل أثر القيم القديمة أولاً ثم يضيف أثر الجديدة (بدلاً من إضافة الكمية مرة أخرى).
+        """
+        from django.db import transaction
+
+        with transaction.atomic():
+            old = None
+            if self.pk is not None:
+                old, locked = self._reload_locked(self.disinfectant_id)
+            else:
+                locked = self._lock_disinfectants(self.disinfectant_id)
+
+            if old is not None:
+                old_delta = self.signed_quantity(old['transaction_type'], old['quantity'])
+                self._shift_after(old['disinfectant_id'], old['transaction_date'], self.pk, -old_delta)
+                self._bump_stock(old['disinfectant_id'], -old_delta)
+
+            delta = self.signed_quantity(self.transaction_type, self.quantity)
+            self.balance_after = self._previous_balance(locked[self.disinfectant_id]) + delta
+            super().save(*args, **kwargs)
+
+            self._shift_after(self.disinfectant_id, self.transaction_date, self.pk, delta)
+            self._bump_stock(self.disinfectant_id, delta)
+
+        self.disinfectant.refresh_from_db(fields=['current_stock'])
+
+    def delete(self, *args, **kwargs):
+        from django.db import transaction
+
+        with transaction.atomic():
+            pk = self.pk
+            # أثر الحذف يُحسب من الحركة المحفوظة تحت القفل؛ الحذف المكرر لا يغير شيئًا
+            stored, _ = self._reload_locked()
+            if stored is None:
+                return 0, {}
+            delta = self.signed_quantity(stored['transaction_type'], stored['quantity'])
+            result = super().delete(*args, **kwargs)
+
+            # طرح أثر الحركة من الحركات اللاحقة ومن المخزون الحالي
+            self._shift_after(stored['disinfectant_id'], stored['transaction_date'], pk, -delta)
+            self._bump_stock(stored['disinfectant_id'], -delta)
+
+        self.disinfectant.refresh_from_db(fields=['current_stock'])
+        return result
+
+    @classmethod
+    def rebuild(cls, disinfectant_ids=None):
+        """
+        إعادة بناء أرصدة الحركات والمخزون الحالي من الرصيد الافتتاحي والحركات
+        باستعلام مجموع تراكمي واحد (Window Function) لكل المطهرات المحددة.
+        """
+        from django.db import connection, transaction
+        from django.db.models import DecimalField, OuterRef, Subquery, Sum
+        from django.db.models.functions import Coalesce
+
+        table = connection.ops.quote_name(cls._meta.db_table)
+        inventory_table = connection.ops.quote_name(DisinfectantInventory._meta.db_table)
+        where, params = '', []
+        if disinfectant_ids is not None:
+            disinfectant_ids = list(disinfectant_ids)
+            if not disinfectant_ids:
+                return 0
+            where = f"WHERE t.disinfectant_id IN ({', '.join(['%s'] * len(disinfectant_ids))})"
+            params = disinfectant_ids
+
+        sql = f"""
+            WITH running AS (
+                SELECT t.id,
+                       i.opening_stock + SUM(CASE WHEN t.transaction_type = %s THEN t.quantity ELSE -t.quantity END) OVER (
+                           PARTITION BY t.disinfectant_id
+                           ORDER BY t.transaction_date, t.id ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
+                       ) AS balance_after
+                FROM {table} t
+                JOIN {inventory_table} i ON i.id = t.disinfectant_id
+                {where}
+            )
+            UPDATE {table}
+            SET balance_after = (SELECT ROUND(running.balance_after, 2) FROM running WHERE running.id = {table}.id)
+            WHERE id IN (SELECT id FROM running)
+        """
+
+        signed = models.Case(
+            models.When(transaction_type=cls.RECEIVE, then=F('quantity')),
+            default=-F('quantity'),
+        )
+        totals = cls.objects.filter(disinfectant=OuterRef('pk')).order_by().values('disinfectant') \
+            .annotate(total=Sum(signed)).values('total')
+        inventory = DisinfectantInventory.objects.all()
+        if disinfectant_ids is not None:
+            inventory = inventory.filter(pk__in=disinfectant_ids)
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [cls.RECEIVE] + params)
+            return inventory.update(current_stock=F('opening_stock') + Coalesce(
+                Subquery(totals), 0, output_field=DecimalField(max_digits=10, decimal_places=2)
+            ))
+
+    @classmethod
+    def stock_card(cls, disinfectant, start_date=None, end_date=None):
+        """
+        كارت الصنف: الرصيد الافتتاحي في بداية الفترة، وحركات الفترة بأرصدتها، والرصيد الختامي.
+        الرصيد الافتتاحي يُقرأ من رصيد آخر حركة قبل الفترة بدلاً من جمع كل الحركات السابقة.
+        """
+        movements = cls.objects.filter(disinfectant=disinfectant)
+        if start_date is not None:
+            opening = disinfectant.balance_at(start_date - timedelta(days=1))
+            movements = movements.filter(transaction_date__gte=start_date)
+        else:
+            opening = disinfectant.opening_stock
+        if end_date is not None:
+            movements = movements.filter(transaction_date__lte=end_date)
+        movements = list(movements.order_by('transaction_date', 'id'))
+        return {
+            'opening_balance': opening,
+            'movements': movements,
+            'total_received': sum((m.quantity for m in movements if m.transaction_type == cls.RECEIVE), 0),
+            'total_dispensed': sum((m.quantity for m in movements if m.transaction_type == cls.DISPENSE), 0),
+            'closing_balance': movements[-1].balance_after if movements else opening,
+        }
+
+
+class BatchDistributionQuerySet(models.QuerySet):
+    def with_totals(self):
+        """
+        التوزيعات مع إجمالياتها محسوبة باستعلامات فرعية داخل نفس الاستعلام، وسلسلة أسماء الدفعات
+        محملة مسبقًا، فتعمل خصائص الإجماليات و batch_names_display و __str__ بدون استعلام لكل صف.
+        """
+        from django.db.models import Case, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, \
+            Prefetch, Subquery, Sum, When
+        from django.db.models.functions import Coalesce
+
+        def total(queryset, expression, output_field):
+            rows = queryset.filter(distribution=OuterRef('pk')).order_by().values('distribution') \
+                .annotate(total=expression).values('total')
+            return Coalesce(Subquery(rows, output_field=output_field), 0, output_field=output_field)
+
+        money = DecimalField(max_digits=14, decimal_places=2)
+        items = BatchDistributionItem.objects.all()
+        return self.select_related(
+            'hatching__incubation__batch_entry__batch_name'
+        ).prefetch_related(
+            Prefetch('merged_hatchings',
+                     queryset=BatchHatching.objects.select_related('incubation__batch_entry__batch_name'))
+        ).annotate(
+            distributed_count_sum=total(items, Sum('chicks_count'), IntegerField()),
+            paid_amount_sum=total(items, Sum('paid_amount'), money),
+            amount_sum=total(items, Sum(ExpressionWrapper(F('chicks_count') * F('price_per_unit'),
+                                                          output_field=money)), money),
+            available_chicks_sum=Case(
+                When(is_merged=True, then=total(MergedBatchDistribution.objects.all(),
+                                                Sum('hatching__chicks_count'), IntegerField())),
+                default=Coalesce(F('hatching__chicks_count'), 0),
+                output_field=IntegerField(),
+            ),
+        )
 
 
 class BatchDistribution(models.Model):
@@ -330,6 +609,8 @@ class BatchDistribution(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="تاريخ التحديث")
 
+    objects = BatchDistributionQuerySet.as_manager()
+
     class Meta:
         verbose_name = "توزيع دفعة"
         verbose_name_plural = "توزيعات الدفعات"
@@ -344,19 +625,39 @@ class BatchDistribution(models.Model):
         else:
             return f"توزيع - {self.distribution_date}"
 
+    # الخصائص التالية تستخدم القيم المحسوبة من with_totals() إذا وجدت
+
     @property
     def total_distributed_count(self):
         """حساب إجمالي عدد الكتاكيت الموزعة"""
+        if hasattr(self, 'distributed_count_sum'):
+            return self.distributed_count_sum
         return sum(item.chicks_count for item in self.distribution_items.all())
 
     @property
     def total_paid_amount(self):
         """حساب إجمالي المبلغ المدفوع"""
+        if hasattr(self, 'paid_amount_sum'):
+            return self.paid_amount_sum
         return sum(item.paid_amount for item in self.distribution_items.all())
 
+    @property
+    def total_amount(self):
+        """حساب إجمالي مبلغ التوزيع"""
+        if hasattr(self, 'amount_sum'):
+            return self.amount_sum
+        return sum(item.total_amount for item in self.distribution_items.all())
+
+    @property
+    def total_remaining_amount(self):
+        """حساب إجمالي المبلغ المتبقي"""
+        return self.total_amount - self.total_paid_amount
+
     @property
     def total_available_chicks(self):
         """حساب إجمالي الكتاكيت المتاحة للتوزيع"""
+        if hasattr(self, 'available_chicks_sum'):
+            return self.available_chicks_sum
         if self.is_merged:
             return sum(h.chicks_count for h in self.merged_hatchings.all())
         elif self.hatching:
@@ -444,3 +745,131 @@ class BatchDistributionItem(models.Model):
     def remaining_amount(self):
         """حساب المبلغ المتبقي"""
         return self.total_amount - self.paid_amount
+
+
+class HatcheryDailySummary(models.Model):
+    """
+    ملخص يومي محسوب مسبقًا لكل مراحل المفرخة (يُحدَّث من hatchery/signals.py عند أي تعديل في اليوم).
+    التقرير اليومي يقرأ صفًا واحدًا، وتقرير الفترة يقرأ صفوف الملخص فقط.
+    """
+
+    date = models.DateField(unique=True, verbose_name="التاريخ")
+    entries_quantity = models.PositiveIntegerField(default=0, verbose_name="عدد الوارد")
+    incubations_quantity = models.PositiveIntegerField(default=0, verbose_name="عدد التسكين")
+    incubations_damaged = models.PositiveIntegerField(default=0, verbose_name="المعدم عند التسكين")
+    hatched_chicks = models.PositiveIntegerField(default=0, verbose_name="عدد الكتاكيت الخارجة")
+    hatched_culled = models.PositiveIntegerField(default=0, verbose_name="عدد الفرزة")
+    hatched_dead = models.PositiveIntegerField(default=0, verbose_name="عدد الفاطس")
+    hatched_wasted = models.IntegerField(default=0, verbose_name="عدد المعدم")
+    distributed_chicks = models.PositiveIntegerField(default=0, verbose_name="عدد الكتاكيت الموزعة")
+    distributions_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="قيمة التوزيعات")
+    distributions_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="المدفوع من التوزيعات")
+    culled_sales_quantity = models.PositiveIntegerField(default=0, verbose_name="عدد الفرزة المباعة")
+    culled_sales_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="قيمة مبيعات الفرزة")
+    culled_sales_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="المدفوع من مبيعات الفرزة")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاريخ التحديث")
+
+    # الحقول المجمعة (كل ما عدا التاريخ وتاريخ التحديث)
+    TOTAL_FIELDS = [
+        'entries_quantity', 'incubations_quantity', 'incubations_damaged',
+        'hatched_chicks', 'hatched_culled', 'hatched_dead', 'hatched_wasted',
+        'distributed_chicks', 'distributions_amount', 'distributions_paid',
+        'culled_sales_quantity', 'culled_sales_amount', 'culled_sales_paid',
+    ]
+
+    class Meta:
+        verbose_name = "ملخص يومي للمفرخة"
+        verbose_name_plural = "الملخصات اليومية للمفرخة"
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"ملخص {self.date}"
+
+    @staticmethod
+    def _sources(apps):
+        """(استعلام، حقل التاريخ، {حقل الملخص: تعبير التجميع}) لكل مرحلة"""
+        from django.db.models import DecimalField, ExpressionWrapper, F, Sum
+
+        model = lambda name: apps.get_model('hatchery', name)
+        amount = lambda quantity, price: Sum(ExpressionWrapper(
+            F(quantity) * F(price), output_field=DecimalField(max_digits=14, decimal_places=2)
+        ))
+        return [
+            (model('BatchEntry').objects.all(), 'date', {'entries_quantity': Sum('quantity')}),
+            (model('BatchIncubation').objects.all(), 'incubation_date', {
+                'incubations_quantity': Sum('incubation_quantity'),
+                'incubations_damaged': Sum('damaged_quantity'),
+            }),
+            (model('BatchHatching').objects.all(), 'hatch_date', {
+                'hatched_chicks': Sum('chicks_count'),
+                'hatched_culled': Sum('culled_count'),
+                'hatched_dead': Sum('dead_count'),
+                # نفس حساب BatchHatching.wasted_count
+                'hatched_wasted': Sum(
+                    F('incubation__incubation_quantity') - F('incubation__damaged_quantity')
+                    - F('chicks_count') - F('culled_count') - F('dead_count')
+                ),
+            }),
+            (model('BatchDistributionItem').objects.all(), 'distribution__distribution_date', {
+                'distributed_chicks': Sum('chicks_count'),
+                'distributions_amount': amount('chicks_count', 'price_per_unit'),
+                'distributions_paid': Sum('paid_amount'),
+            }),
+            (model('CulledSale').objects.all(), 'invoice_date', {
+                'culled_sales_quantity': Sum('quantity'),
+                'culled_sales_amount': amount('quantity', 'price_per_unit'),
+                'culled_sales_paid': Sum('paid_amount'),
+            }),
+        ]
+
+    @classmethod
+    def refresh(cls, dates=None, start=None, end=None, apps=None):
+        """
+        إعادة حساب ملخص أيام معينة (أو فترة، أو كل الأيام) باستعلام تجميعي واحد لكل مرحلة.
+        الأيام التي لا توجد بها أي حركة يُحذف ملخصها.
+        apps: سجل النماذج التاريخي عند الاستدعاء من ترحيل
+        """
+        from django.apps import apps as global_apps
+        from django.db import transaction
+
+        apps = apps or global_apps
+        summary_model = apps.get_model('hatchery', 'HatcheryDailySummary')
+
+        if dates is not None:
+            dates = sorted(set(dates))
+            if not dates:
+                return 0
+
+        rows = {}
+        for queryset, date_field, aggregates in cls._sources(apps):
+            if dates is not None:
+                queryset = queryset.filter(**{f'{date_field}__in': dates})
+            if start is not None:
+                queryset = queryset.filter(**{f'{date_field}__gte': start})
+            if end is not None:
+                queryset = queryset.filter(**{f'{date_field}__lte': end})
+            for row in queryset.order_by().values(date_field).annotate(**aggregates):
+                day = row.pop(date_field)
+                rows.setdefault(day, {}).update({field: value or 0 for field, value in row.items()})
+
+        existing = summary_model.objects.all()
+        if dates is not None:
+            existing = existing.filter(date__in=dates)
+        if start is not None:
+            existing = existing.filter(date__gte=start)
+        if end is not None:
+            existing = existing.filter(date__lte=end)
+
+        with transaction.atomic():
+            existing.exclude(date__in=list(rows)).delete()
+            summary_model.objects.bulk_create(
+                [summary_model(date=day, **values) for day, values in rows.items()],
+                batch_size=500, update_conflicts=True, unique_fields=['date'],
+                update_fields=cls.TOTAL_FIELDS + ['updated_at'],
+            )
+        return len(rows)
+
+    @classmethod
+    def for_date(cls, date):
+        """ملخص يوم واحد (صف فارغ غير محفوظ إذا لم تكن هناك حركة)"""
+        return cls.objects.filter(date=date).first() or cls(date=date)
@@ -0,0 +1,78 @@
+"""
+تحديث HatcheryDailySummary عند أي تعديل في الدفعات الواردة أو التسكين أو الخروج أو التوزيع أو مبيعات الفرزة.
+
+قبل الحفظ تُسجل تواريخ السجل القديمة، وبعد الحفظ أو الحذف يُعاد حساب ملخص كل يوم متأثر
+(القديم والجديد) مرة واحدة عند تأكيد المعاملة، مهما تعدد تعديل نفس اليوم داخلها.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import (
+    BatchDistribution, BatchDistributionItem, BatchEntry, BatchHatching, BatchIncubation, CulledSale,
+    HatcheryDailySummary,
+)
+
+_state = threading.local()
+
+
+def _pending():
+    if not hasattr(_state, 'dates'):
+        _state.dates = set()
+    return _state.dates
+
+
+def _flush(day):
+    pending = _pending()
+    if day in pending:
+        pending.discard(day)
+        HatcheryDailySummary.refresh([day])
+
+
+def touch(*dates):
+    """تسجيل أيام تحتاج لإعادة حساب ملخصها عند تأكيد المعاملة الحالية"""
+    pending = _pending()
+    for day in {day for day in dates if day is not None}:
+        pending.add(day)
+        transaction.on_commit(lambda day=day: _flush(day))
+
+
+def _dates(instance):
+    """الأيام التي يظهر فيها السجل في الملخص"""
+    if isinstance(instance, BatchEntry):
+        return [instance.date]
+    if isinstance(instance, BatchIncubation):
+        # المعدم في يوم الخروج يعتمد على أعداد التسكين
+        hatching = BatchHatching.objects.filter(incubation_id=instance.pk).values_list('hatch_date', flat=True)
+        return [instance.incubation_date, *hatching]
+    if isinstance(instance, BatchHatching):
+        return [instance.hatch_date]
+    if isinstance(instance, CulledSale):
+        return [instance.invoice_date]
+    if isinstance(instance, BatchDistribution):
+        return [instance.distribution_date]
+    if isinstance(instance, BatchDistributionItem):
+        return list(BatchDistribution.objects.filter(pk=instance.distribution_id)
+                    .values_list('distribution_date', flat=True))
+    return []
+
+
+def remember_old_dates(sender, instance, **kwargs):
+    if instance.pk is None:
+        instance._summary_old_dates = []
+        return
+    old = sender.objects.filter(pk=instance.pk).first()
+    instance._summary_old_dates = _dates(old) if old is not None else []
+
+
+def refresh_dates(sender, instance, **kwargs):
+    touch(*getattr(instance, '_summary_old_dates', []), *_dates(instance))
+
+
+def connect():
+    for model in (BatchEntry, BatchIncubation, BatchHatching, CulledSale, BatchDistribution, BatchDistributionItem):
+        uid = f'hatchery_summary_{model.__name__}'
+        pre_save.connect(remember_old_dates, sender=model, dispatch_uid=f'{uid}_pre_save')
+        post_save.connect(refresh_dates, sender=model, dispatch_uid=f'{uid}_post_save')
+        post_delete.connect(refresh_dates, sender=model, dispatch_uid=f'{uid}_post_delete')
@@ -1,3 +1,110 @@
+import datetime
+import unittest
+from decimal import Decimal
+
+from django.apps import apps
 from django.test import TestCase
 
-# Create your tests here.
+if not apps.is_installed('hatchery'):
+    # التطبيق غير مفعل في INSTALLED_APPS (acc/settings.py) فلا يمكن تحميل نماذجه
+    raise unittest.SkipTest("'hatchery' is not in INSTALLED_APPS")
+
+from .models import DisinfectantCategory, DisinfectantInventory, DisinfectantTransaction
+
+
+class DisinfectantLedgerTests(TestCase):
+    """دفتر حركات المطهرات: التحديث التزايدي يجب أن يطابق إعادة البناء الكاملة"""
+
+    day = datetime.date(2026, 3, 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = DisinfectantCategory.objects.create(name='c')
+
+    def setUp(self):
+        self.disinfectant = DisinfectantInventory.objects.create(
+            category=self.category, name='x', unit='L', opening_stock=Decimal('10')
+        )
+
+    def add(self, quantity, transaction_type=DisinfectantTransaction.RECEIVE, days=0, disinfectant=None):
+        return DisinfectantTransaction.objects.create(
+            disinfectant=disinfectant or self.disinfectant, transaction_type=transaction_type,
+            transaction_date=self.day + datetime.timedelta(days=days), quantity=Decimal(quantity),
+        )
+
+    def stock(self, disinfectant=None):
+        disinfectant = disinfectant or self.disinfectant
+        disinfectant.refresh_from_db(fields=['current_stock'])
+        return disinfectant.current_stock
+
+    def ledger(self):
+        return list(DisinfectantTransaction.objects.filter(disinfectant=self.disinfectant)
+                    .order_by('transaction_date', 'id').values_list('balance_after', flat=True))
+
+    def test_append(self):
+        self.add('5')
+        self.add('3', DisinfectantTransaction.DISPENSE, days=1)
+        self.assertEqual(self.ledger(), [Decimal('15'), Decimal('12')])
+        self.assertEqual(self.stock(), Decimal('12'))
+
+    def test_back_dated_transaction_shifts_later_rows(self):
+        self.add('5', days=4)
+        self.add('2', DisinfectantTransaction.DISPENSE)
+        self.assertEqual(self.ledger(), [Decimal('8'), Decimal('13')])
+        self.assertEqual(self.stock(), Decimal('13'))
+
+    def test_edit_replaces_old_effect(self):
+        later = self.add('1', days=5)
+        transaction = self.add('5', days=1)
+        transaction.quantity = Decimal('2')
+        transaction.transaction_type = DisinfectantTransaction.DISPENSE
+        transaction.save()
+        later.refresh_from_db()
+        self.assertEqual(later.balance_after, Decimal('9'))
+        self.assertEqual(self.stock(), Decimal('9'))
+
+    def test_edit_moves_transaction_between_disinfectants(self):
+        other = DisinfectantInventory.objects.create(category=self.category, name='y', unit='L')
+        transaction = self.add('5')
+        transaction.disinfectant = other
+        transaction.save()
+        self.assertEqual(self.stock(), Decimal('10'))
+        self.assertEqual(self.stock(other), Decimal('5'))
+
+    def test_delete_and_double_delete(self):
+        later = self.add('1', days=2)
+        transaction = self.add('5')
+        first = DisinfectantTransaction.objects.get(pk=transaction.pk)
+        second = DisinfectantTransaction.objects.get(pk=transaction.pk)
+
+        first.delete()
+        self.assertEqual(self.stock(), Decimal('11'))
+        self.assertEqual(second.delete(), (0, {}))
+        self.assertEqual(self.stock(), Decimal('11'))
+        later.refresh_from_db()
+        self.assertEqual(later.balance_after, Decimal('11'))
+
+    def test_stale_delete_uses_stored_row(self):
+        transaction = self.add('5')
+        stale = DisinfectantTransaction.objects.get(pk=transaction.pk)
+        transaction.quantity = Decimal('2')
+        transaction.save()
+
+        stale.delete()
+        self.assertEqual(self.stock(), Decimal('10'))
+
+    def test_rebuild_matches_incremental(self):
+        self.add('5', days=3)
+        edited = self.add('4', DisinfectantTransaction.DISPENSE, days=1)
+        deleted = self.add('2', days=2)
+        self.add('1', days=1)
+        edited.quantity = Decimal('3')
+        edited.transaction_date = self.day + datetime.timedelta(days=4)
+        edited.save()
+        deleted.delete()
+
+        incremental, stock = self.ledger(), self.stock()
+        DisinfectantTransaction.rebuild([self.disinfectant.pk])
+        self.assertEqual(self.ledger(), incremental)
+        self.assertEqual(self.stock(), stock)
+        self.assertEqual(stock, Decimal('13'))
@@ -87,10 +87,12 @@ urlpatterns = [
 
     # Reports URLs
     path('reports/daily/', views.daily_report, name='daily_report'),
+    path('reports/trend/', views.trend_report, name='trend_report'),
     path('reports/', views.reports_home, name='reports'),
     path('settings/print/', views.print_settings, name='print_settings'),
 
     # API URLs
     path('api/incubation/<int:pk>/', views.incubation_api, name='incubation_api'),
+    path('api/disinfectant/<int:pk>/stock-card/', views.disinfectant_stock_card_api, name='disinfectant_stock_card_api'),
     path('api/customer/create/', views.customer_api_create, name='customer_api_create'),
 ]
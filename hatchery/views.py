@@ -5,6 +5,7 @@ from django.utils import timezone
 from django.db.models import Sum, Q, F
 from django.http import HttpResponse, JsonResponse
 from django.template.loader import render_to_string
+from django.core.paginator import Paginator
 
 import io
 import xlsxwriter
@@ -14,7 +15,7 @@ from .models import (
     BatchName, BatchEntry, BatchIncubation, BatchHatching,
     Customer, CulledSale, DisinfectantCategory, DisinfectantInventory,
     DisinfectantTransaction, BatchDistribution, BatchDistributionItem,
-    MergedBatchDistribution
+    MergedBatchDistribution, HatcheryDailySummary
 )
 from .forms import (
     BatchNameForm, BatchEntryForm, BatchIncubationForm, BatchHatchingForm,
@@ -26,6 +27,9 @@ from .forms import (
 )
 import json
 
+# عدد التوزيعات في كل صفحة من قائمة التوزيعات
+DISTRIBUTIONS_PER_PAGE = 50
+
 @login_required
 def home(request):
     """الصفحة الرئيسية لتطبيق المفرخة"""
@@ -872,7 +876,7 @@ def disinfectant_inventory_create(request):
 def disinfectant_inventory_detail(request, pk):
     """عرض تفاصيل مطهر في المخزون"""
     inventory_item = get_object_or_404(DisinfectantInventory, pk=pk)
-    transactions = inventory_item.transactions.all().order_by('-transaction_date')
+    transactions = inventory_item.transactions.all().order_by('-transaction_date', '-id')
 
     return render(request, 'hatchery/disinfectant_inventory_detail.html', {
         'inventory_item': inventory_item,
@@ -1044,30 +1048,11 @@ def disinfectant_transaction_update(request, pk):
     """تحديث بيانات حركة مطهر"""
     transaction = get_object_or_404(DisinfectantTransaction, pk=pk)
 
-    # حفظ القيم القديمة للحركة
-    old_quantity = transaction.quantity
-    old_transaction_type = transaction.transaction_type
-
     if request.method == 'POST':
         form = DisinfectantTransactionForm(request.POST, instance=transaction)
         if form.is_valid():
-            # إلغاء تأثير الحركة القديمة على المخزون
-            if old_transaction_type == 'receive':
-                transaction.disinfectant.current_stock -= old_quantity
-            else:  # صرف
-                transaction.disinfectant.current_stock += old_quantity
-
-            # حفظ الحركة الجديدة
-            transaction = form.save(commit=False)
-
-            # تطبيق تأثير الحركة الجديدة على المخزون
-            if transaction.transaction_type == 'receive':
-                transaction.disinfectant.current_stock += transaction.quantity
-            else:  # صرف
-                transaction.disinfectant.current_stock -= transaction.quantity
-
-            transaction.disinfectant.save()
-            transaction.save()
+            # النموذج يلغي أثر القيم القديمة على المخزون ويطبق الجديدة عند الحفظ
+            form.save()
 
             messages.success(request, 'تم تحديث بيانات حركة المطهر بنجاح')
             return redirect('hatchery:disinfectant_transaction_detail', pk=pk)
@@ -1083,13 +1068,7 @@ def disinfectant_transaction_delete(request, pk):
 
     if request.method == 'POST':
         try:
-            # إلغاء تأثير الحركة على المخزون
-            if transaction.transaction_type == 'receive':
-                transaction.disinfectant.current_stock -= transaction.quantity
-            else:  # صرف
-                transaction.disinfectant.current_stock += transaction.quantity
-
-            transaction.disinfectant.save()
+            # الحذف يلغي أثر الحركة على المخزون وعلى أرصدة الحركات اللاحقة
             transaction.delete()
 
             messages.success(request, 'تم حذف حركة المطهر بنجاح')
@@ -1105,7 +1084,7 @@ def disinfectant_transaction_delete(request, pk):
 @login_required
 def distribution_list(request):
     """عرض قائمة توزيعات الدفعات"""
-    distributions = BatchDistribution.objects.all().order_by('-distribution_date')
+    distributions = BatchDistribution.objects.with_totals().order_by('-distribution_date', '-id')
 
     # البحث
     search_query = request.GET.get('q')
@@ -1165,7 +1144,8 @@ def distribution_list(request):
     # التحقق من نوع الطلب (عرض عادي أو تصدير)
     export_type = request.GET.get('export')
     if export_type == 'print':
-        # الحصول على عناصر التوزيع لكل توزيع
+        # الحصول على عناصر التوزيع لكل توزيع (محملة مسبقًا مع العملاء)
+        distributions = distributions.prefetch_related('distribution_items__customer')
         for distribution in distributions:
             distribution.items = distribution.distribution_items.all()
 
@@ -1177,8 +1157,16 @@ def distribution_list(request):
             'to_date': to_date
         })
 
+    # تقسيم القائمة إلى صفحات
+    paginator = Paginator(distributions, DISTRIBUTIONS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    query_params = request.GET.copy()
+    query_params.pop('page', None)
+
     return render(request, 'hatchery/distribution_list.html', {
-        'distributions': distributions,
+        'distributions': page_obj,
+        'page_obj': page_obj,
+        'query_string': query_params.urlencode(),
         'today_hatchings': today_hatchings,
         'distribution_filters': distribution_filters,
         'search_query': search_query,
@@ -1224,8 +1212,8 @@ def distribution_create(request, hatching_id=None):
 @login_required
 def distribution_detail(request, pk):
     """عرض تفاصيل توزيع الدفعة"""
-    distribution = get_object_or_404(BatchDistribution, pk=pk)
-    items = distribution.distribution_items.all()
+    distribution = get_object_or_404(BatchDistribution.objects.with_totals(), pk=pk)
+    items = distribution.distribution_items.select_related('customer')
 
     return render(request, 'hatchery/distribution_detail.html', {
         'distribution': distribution,
@@ -1330,6 +1318,48 @@ def incubation_api(request, pk):
     except BatchIncubation.DoesNotExist:
         return JsonResponse({'error': 'Incubation not found'}, status=404)
 
+@login_required
+def disinfectant_stock_card_api(request, pk):
+    """API كارت صنف المطهر: الرصيد الافتتاحي في بداية الفترة وحركات الفترة بأرصدتها والرصيد الختامي"""
+    try:
+        disinfectant = DisinfectantInventory.objects.get(pk=pk)
+    except DisinfectantInventory.DoesNotExist:
+        return JsonResponse({'error': 'Disinfectant not found'}, status=404)
+
+    try:
+        start_date, end_date = (
+            timezone.datetime.strptime(value, '%Y-%m-%d').date() if value else None
+            for value in (request.GET.get('start_date'), request.GET.get('end_date'))
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date, expected YYYY-MM-DD'}, status=400)
+
+    card = DisinfectantTransaction.stock_card(disinfectant, start_date, end_date)
+    data = {
+        'id': disinfectant.id,
+        'name': disinfectant.name,
+        'unit': disinfectant.unit,
+        'start_date': start_date.strftime('%Y-%m-%d') if start_date else None,
+        'end_date': end_date.strftime('%Y-%m-%d') if end_date else None,
+        'opening_balance': str(card['opening_balance']),
+        'total_received': str(card['total_received']),
+        'total_dispensed': str(card['total_dispensed']),
+        'closing_balance': str(card['closing_balance']),
+        'movements': [
+            {
+                'id': movement.id,
+                'date': movement.transaction_date.strftime('%Y-%m-%d'),
+                'type': movement.transaction_type,
+                'type_display': movement.get_transaction_type_display(),
+                'quantity': str(movement.quantity),
+                'balance_after': str(movement.balance_after),
+                'notes': movement.notes or '',
+            }
+            for movement in card['movements']
+        ],
+    }
+    return JsonResponse(data)
+
 # Reports views
 @login_required
 def reports_home(request):
@@ -1368,70 +1398,72 @@ def daily_report(request):
         today_entries = BatchEntry.objects.filter(
             date=report_date
         ).order_by('-date')
+    today_entries = today_entries.select_related('batch_name')
 
     # الدفعات التي تم تسكينها اليوم
     today_incubations = BatchIncubation.objects.filter(
         incubation_date=report_date
-    ).order_by('-incubation_date')
+    ).select_related('batch_entry__batch_name').order_by('-incubation_date')
 
     # الدفعات التي خرجت اليوم
     today_hatchings = BatchHatching.objects.filter(
         hatch_date=report_date
-    ).order_by('-hatch_date')
+    ).select_related('incubation__batch_entry__batch_name').order_by('-hatch_date')
 
-    # توزيعات الدفعات اليوم
-    today_distributions = BatchDistribution.objects.filter(
+    # توزيعات الدفعات اليوم (مع البنود والعملاء وأسماء الدفعات لعرضها وتصديرها بدون استعلام لكل صف)
+    today_distributions = BatchDistribution.objects.with_totals().filter(
         distribution_date=report_date
-    ).order_by('-distribution_date')
+    ).prefetch_related('distribution_items__customer').order_by('-distribution_date')
 
     # المطهرات الواردة اليوم
     today_received_disinfectants = DisinfectantTransaction.objects.filter(
         transaction_date=report_date,
         transaction_type='receive'
-    ).order_by('-transaction_date')
+    ).select_related('disinfectant').order_by('-transaction_date')
 
     # المطهرات المنصرفة اليوم
     today_dispensed_disinfectants = DisinfectantTransaction.objects.filter(
         transaction_date=report_date,
         transaction_type='dispense'
-    ).order_by('-transaction_date')
+    ).select_related('disinfectant').order_by('-transaction_date')
 
     # مبيعات الكتاكيت الفرزة اليوم
     today_culled_sales = CulledSale.objects.filter(
         invoice_date=report_date
-    ).order_by('-invoice_date')
+    ).select_related('customer', 'hatching__incubation__batch_entry__batch_name').order_by('-invoice_date')
 
-    # إحصائيات إضافية
+    # الإحصائيات من صف الملخص اليومي (استعلام واحد بدلاً من تجميع كل مرحلة)
+    summary = HatcheryDailySummary.for_date(report_date)
 
     # إجمالي عدد الكتاكيت الواردة اليوم
-    total_entries_count = today_entries.aggregate(total=Sum('quantity'))['total'] or 0
+    if show_created_today:
+        # الملخص مجمع بتاريخ الدخول، أما وضع "المسجل اليوم" فيعتمد على تاريخ الإنشاء
+        total_entries_count = today_entries.aggregate(total=Sum('quantity'))['total'] or 0
+    else:
+        total_entries_count = summary.entries_quantity
 
     # إجمالي عدد الكتاكيت المسكنة اليوم
-    total_incubations_count = today_incubations.aggregate(total=Sum('incubation_quantity'))['total'] or 0
+    total_incubations_count = summary.incubations_quantity
 
     # إجمالي عدد الكتاكيت الخارجة اليوم
-    total_hatchings_count = today_hatchings.aggregate(
-        total_chicks=Sum('chicks_count'),
-        total_culled=Sum('culled_count'),
-        total_dead=Sum('dead_count')
-    )
-
-    # حساب إجمالي المعدم (wasted_count هو خاصية وليس حقلاً)
-    total_wasted = sum(hatching.wasted_count for hatching in today_hatchings)
-    if total_hatchings_count:
-        total_hatchings_count['total_wasted'] = total_wasted
+    total_hatchings_count = {
+        'total_chicks': summary.hatched_chicks,
+        'total_culled': summary.hatched_culled,
+        'total_dead': summary.hatched_dead,
+        'total_wasted': summary.hatched_wasted,
+    }
 
     # إجمالي عدد الكتاكيت الموزعة اليوم
-    total_distributed_count = sum(d.total_distributed_count for d in today_distributions)
+    total_distributed_count = summary.distributed_chicks
 
     # إجمالي عدد الكتاكيت الفرزة المباعة اليوم
-    total_culled_sales_count = today_culled_sales.aggregate(total=Sum('quantity'))['total'] or 0
+    total_culled_sales_count = summary.culled_sales_quantity
 
     # إجمالي المبالغ المحصلة من مبيعات الفرزة اليوم
-    total_culled_sales_amount = today_culled_sales.aggregate(total=Sum('paid_amount'))['total'] or 0
+    total_culled_sales_amount = summary.culled_sales_paid
 
     # إجمالي المبالغ المحصلة من توزيعات الدفعات اليوم
-    total_distributions_amount = sum(d.total_paid_amount for d in today_distributions)
+    total_distributions_amount = summary.distributions_paid
 
     context = {
         'report_date': report_date,
@@ -1449,6 +1481,7 @@ def daily_report(request):
         'total_culled_sales_count': total_culled_sales_count,
         'total_culled_sales_amount': total_culled_sales_amount,
         'total_distributions_amount': total_distributions_amount,
+        'summary': summary,
     }
 
     # التحقق من نوع الطلب (عرض عادي أو تصدير)
@@ -1470,13 +1503,42 @@ def daily_report(request):
         context['hide_empty_sections'] = settings['hide_empty_sections'] == '1'
 
         # حساب إجمالي المبلغ المدفوع من مبيعات الفرزة
-        context['total_culled_sales_paid'] = today_culled_sales.aggregate(total=Sum('paid_amount'))['total'] or 0
+        context['total_culled_sales_paid'] = summary.culled_sales_paid
 
         return render(request, 'hatchery/daily_report_print.html', context)
 
     return render(request, 'hatchery/daily_report.html', context)
 
 
+@login_required
+def trend_report(request):
+    """تقرير الفترة: الملخصات اليومية بين تاريخين مع الإجماليات (من جدول الملخص فقط)"""
+    today = timezone.now().date()
+
+    def parse_date(value, default):
+        try:
+            return timezone.datetime.strptime(value, '%Y-%m-%d').date() if value else default
+        except ValueError:
+            return default
+
+    end_date = parse_date(request.GET.get('end_date'), today)
+    start_date = parse_date(request.GET.get('start_date'), end_date - timezone.timedelta(days=29))
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+
+    summaries = HatcheryDailySummary.objects.filter(date__range=(start_date, end_date)).order_by('date')
+    totals = summaries.aggregate(**{field: Sum(field) for field in HatcheryDailySummary.TOTAL_FIELDS})
+    totals = {field: value or 0 for field, value in totals.items()}
+
+    context = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'summaries': summaries,
+        'totals': totals,
+    }
+    return render(request, 'hatchery/trend_report.html', context)
+
+
 def export_daily_report_excel(context, request=None):
     """تصدير التقرير اليومي بصيغة Excel"""
     # استرجاع إعدادات الطباعة
@@ -2203,9 +2265,10 @@ def merged_distribution_create(request):
 @login_required
 def merged_distribution_detail(request, pk):
     """عرض تفاصيل التوزيع المدمج"""
-    distribution = get_object_or_404(BatchDistribution, pk=pk, is_merged=True)
-    merged_items = MergedBatchDistribution.objects.filter(distribution=distribution)
-    distribution_items = distribution.distribution_items.all()
+    distribution = get_object_or_404(BatchDistribution.objects.with_totals(), pk=pk, is_merged=True)
+    merged_items = MergedBatchDistribution.objects.filter(distribution=distribution) \
+        .select_related('hatching__incubation__batch_entry__batch_name')
+    distribution_items = distribution.distribution_items.select_related('customer')
 
     return render(request, 'hatchery/merged_distribution_detail.html', {
         'distribution': distribution,
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from inventory.models import Disinfectant
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored current stock of disinfectants from received and issued items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--disinfectant', type=int, action='append', help='Limit the rebuild to this disinfectant id (repeatable)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'Starting disinfectant stock rebuild at {timezone.now()}'))
+
+        count = Disinfectant.rebuild_stock(options['disinfectant'])
+
+        self.stdout.write(self.style.SUCCESS(f'Disinfectant stock rebuild completed. {count} disinfectants updated.'))
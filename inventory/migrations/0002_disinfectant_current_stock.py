@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:12
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_current_stock(apps, schema_editor):
+    """حساب الرصيد المحفوظ للمطهرات الموجودة من الواردات والمنصرفات"""
+    Disinfectant = apps.get_model("inventory", "Disinfectant")
+    totals = {}
+    for model, sign in (("DisinfectantReceived", 1), ("DisinfectantIssued", -1)):
+        rows = apps.get_model("inventory", model).objects.order_by().values("disinfectant_id") \
+            .annotate(total=Sum("quantity"))
+        for row in rows:
+            totals[row["disinfectant_id"]] = totals.get(row["disinfectant_id"], 0) + sign * row["total"]
+    for disinfectant_id, stock in totals.items():
+        Disinfectant.objects.filter(pk=disinfectant_id).update(current_stock=stock)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="disinfectant",
+            name="current_stock",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=0,
+                editable=False,
+                max_digits=12,
+                verbose_name="الرصيد الحالي",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="disinfectant",
+            index=models.Index(
+                fields=["is_active", "current_stock", "minimum_stock"],
+                name="disinfectant_stock_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="disinfectantreceived",
+            index=models.Index(
+                fields=["disinfectant", "expiry_date"],
+                name="disinf_received_expiry_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="disinfectantreceived",
+            index=models.Index(fields=["expiry_date"], name="disinf_expiry_idx"),
+        ),
+        migrations.RunPython(backfill_current_stock, migrations.RunPython.noop),
+    ]
@@ -42,6 +42,14 @@ class DisinfectantCategory(models.Model):
         return self.name
 
 
+class DisinfectantQuerySet(models.QuerySet):
+    def low_stock(self):
+        """المطهرات النشطة التي نفذت أو قل رصيدها عن الحد الأدنى (استعلام واحد على الرصيد المحفوظ)"""
+        return self.filter(is_active=True).filter(
+            models.Q(current_stock__lt=F('minimum_stock')) | models.Q(current_stock__lte=0)
+        )
+
+
 class Disinfectant(models.Model):
     """نموذج لتسجيل بيانات المطهرات"""
 
@@ -59,26 +67,81 @@ class Disinfectant(models.Model):
         default=0,
         verbose_name="الحد الأدنى للمخزون"
     )
+    # الرصيد الحالي (الوارد - المنصرف)، يُحدَّث مع كل حفظ أو حذف لوارد أو منصرف
+    current_stock = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name="الرصيد الحالي"
+    )
     description = models.TextField(blank=True, null=True, verbose_name="وصف المطهر")
     is_active = models.BooleanField(default=True, verbose_name="نشط")
     notes = models.TextField(blank=True, null=True, verbose_name="ملاحظات")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="تاريخ التحديث")
 
+    objects = DisinfectantQuerySet.as_manager()
+
     class Meta:
         verbose_name = "مطهر"
         verbose_name_plural = "المطهرات"
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['is_active', 'current_stock', 'minimum_stock'], name='disinfectant_stock_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
-    @property
-    def current_stock(self):
-        """حساب الرصيد الحالي للمطهر"""
-        received = self.received_items.aggregate(total=Sum('quantity'))['total'] or 0
-        issued = self.issued_items.aggregate(total=Sum('quantity'))['total'] or 0
-        return received - issued
+    def save(self, *args, **kwargs):
+        """
+        الرصيد الحالي تحدّثه الواردات والمنصرفات فقط (apply_stock)، لذلك لا يكتبه تعديل المطهر
+        حتى لا تضيع تحديثات الحركات المتزامنة بقيمة قديمة في الذاكرة
+        """
+        if not self._state.adding:
+            update_fields = kwargs.get('update_fields')
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            kwargs['update_fields'] = [name for name in update_fields if name != 'current_stock']
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def apply_stock(cls, disinfectant_id, quantity):
+        """إضافة تغيير (موجب للوارد وسالب للمنصرف) على الرصيد المحفوظ داخل المعاملة الحالية"""
+        if quantity:
+            cls.objects.filter(pk=disinfectant_id).update(current_stock=F('current_stock') + quantity)
+
+    @classmethod
+    def rebuild_stock(cls, ids=None):
+        """إعادة حساب الرصيد المحفوظ من الواردات والمنصرفات باستعلام تحديث واحد"""
+        from django.db.models import DecimalField, OuterRef, Subquery, Value
+        from django.db.models.functions import Coalesce
+
+        def total(model):
+            rows = model.objects.filter(disinfectant=OuterRef('pk')).order_by() \
+                .values('disinfectant').annotate(total=Sum('quantity')).values('total')
+            return Coalesce(Subquery(rows), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+        disinfectants = cls.objects.all()
+        if ids is not None:
+            disinfectants = disinfectants.filter(pk__in=ids)
+        return disinfectants.update(current_stock=total(DisinfectantReceived) - total(DisinfectantIssued))
+
+    def lots(self):
+        """
+        دفعات الوارد مرتبة بتاريخ انتهاء الصلاحية مع الكمية المتبقية من كل دفعة.
+        المنصرف غير مربوط بدفعة، فيُخصم من الأقرب انتهاءً أولاً (FEFO) حتى يساوي مجموع المتبقي الرصيد الحالي.
+        """
+        lots = list(self.received_items.order_by(
+            F('expiry_date').asc(nulls_last=True), 'date', 'id'
+        ))
+        consumed = sum((lot.quantity for lot in lots), 0) - self.current_stock
+        for lot in lots:
+            used = min(max(consumed, 0), lot.quantity)
+            lot.remaining_quantity = lot.quantity - used
+            consumed -= used
+        return lots
 
     @property
     def stock_status(self):
@@ -92,7 +155,63 @@ class Disinfectant(models.Model):
             return "طبيعي"
 
 
-class DisinfectantReceived(models.Model):
+class DisinfectantMovementQuerySet(models.QuerySet):
+    def delete(self):
+        """الحذف الجماعي لا يمر بدالة delete لكل سجل، لذا نعيد حساب أرصدة المطهرات المتأثرة بعد الحذف"""
+        from django.db import transaction
+
+        with transaction.atomic():
+            ids = set(self.order_by().values_list('disinfectant_id', flat=True).distinct())
+            result = super().delete()
+            if ids:
+                Disinfectant.rebuild_stock(ids)
+        return result
+
+
+class DisinfectantReceivedQuerySet(DisinfectantMovementQuerySet):
+    def expiring(self, before):
+        """دفعات الوارد التي تنتهي صلاحيتها قبل تاريخ معين أو فيه"""
+        return self.filter(expiry_date__isnull=False, expiry_date__lte=before).order_by('expiry_date')
+
+
+class StockMovementMixin:
+    """تحديث رصيد المطهر المحفوظ تزايديًا عند حفظ أو حذف وارد أو منصرف"""
+
+    # إشارة أثر الحركة على الرصيد: 1 للوارد و -1 للمنصرف
+    STOCK_SIGN = 1
+
+    def save(self, *args, **kwargs):
+        from django.db import transaction
+
+        with transaction.atomic():
+            old = None
+            if self.pk is not None:
+                # قفل صف الحركة حتى لا يُزال أثر قيم قديمة عدلتها أو حذفتها عملية متزامنة
+                old = type(self).objects.select_for_update().filter(pk=self.pk).values(
+                    'disinfectant_id', 'quantity'
+                ).first()
+            super().save(*args, **kwargs)
+
+            # إزالة أثر القيم القديمة ثم إضافة الجديدة
+            if old is not None:
+                Disinfectant.apply_stock(old['disinfectant_id'], -self.STOCK_SIGN * old['quantity'])
+            Disinfectant.apply_stock(self.disinfectant_id, self.STOCK_SIGN * self.quantity)
+
+    def delete(self, *args, **kwargs):
+        from django.db import transaction
+
+        with transaction.atomic():
+            stored = type(self).objects.select_for_update().filter(pk=self.pk).values(
+                'disinfectant_id', 'quantity'
+            ).first()
+            result = super().delete(*args, **kwargs)
+            # الحذف المكرر لا يحذف شيئًا فلا يُطرح أثره مرة أخرى
+            if stored is not None and result[1].get(self._meta.label):
+                Disinfectant.apply_stock(stored['disinfectant_id'], -self.STOCK_SIGN * stored['quantity'])
+        return result
+
+
+class DisinfectantReceived(StockMovementMixin, models.Model):
     """نموذج لتسجيل المطهرات الواردة من الشركات الموردة"""
 
     disinfectant = models.ForeignKey(
@@ -116,10 +235,16 @@ class DisinfectantReceived(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="تاريخ التحديث")
 
+    objects = DisinfectantReceivedQuerySet.as_manager()
+
     class Meta:
         verbose_name = "وارد مطهر"
         verbose_name_plural = "واردات المطهرات"
         ordering = ['-date']
+        indexes = [
+            models.Index(fields=['disinfectant', 'expiry_date'], name='disinf_received_expiry_idx'),
+            models.Index(fields=['expiry_date'], name='disinf_expiry_idx'),
+        ]
 
     def __str__(self):
         return f"{self.disinfectant} - {self.date} - {self.quantity}"
@@ -130,7 +255,7 @@ class DisinfectantReceived(models.Model):
         return self.quantity * self.unit_price
 
 
-class DisinfectantIssued(models.Model):
+class DisinfectantIssued(StockMovementMixin, models.Model):
     """نموذج لتسجيل المطهرات المنصرفة للمعمل"""
 
     disinfectant = models.ForeignKey(
@@ -147,6 +272,10 @@ class DisinfectantIssued(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="تاريخ التحديث")
 
+    STOCK_SIGN = -1
+
+    objects = DisinfectantMovementQuerySet.as_manager()
+
     class Meta:
         verbose_name = "صرف مطهر"
         verbose_name_plural = "صرفيات المطهرات"
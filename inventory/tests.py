@@ -1,3 +1,84 @@
+import unittest
+from decimal import Decimal
+
+from django.apps import apps
 from django.test import TestCase
 
-# Create your tests here.
+if not apps.is_installed('inventory'):
+    # التطبيق غير مفعل في INSTALLED_APPS (acc/settings.py) فلا يمكن تحميل نماذجه
+    raise unittest.SkipTest("'inventory' is not in INSTALLED_APPS")
+
+from .models import Disinfectant, DisinfectantCategory, DisinfectantIssued, DisinfectantReceived, Supplier
+
+
+class DisinfectantStockTests(TestCase):
+    """الرصيد المحفوظ للمطهر يجب أن يطابق مجموع الوارد ناقص المنصرف بعد أي تعديل أو حذف"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = DisinfectantCategory.objects.create(name='c')
+        cls.supplier = Supplier.objects.create(name='s')
+
+    def setUp(self):
+        self.disinfectant = Disinfectant.objects.create(name='d', category=self.category, unit='L', minimum_stock=10)
+
+    def receive(self, quantity, disinfectant=None):
+        return DisinfectantReceived.objects.create(disinfectant=disinfectant or self.disinfectant,
+                                                   supplier=self.supplier, quantity=quantity, unit_price=1)
+
+    def issue(self, quantity, disinfectant=None):
+        return DisinfectantIssued.objects.create(disinfectant=disinfectant or self.disinfectant,
+                                                 quantity=quantity, issued_to='x')
+
+    def stock(self, disinfectant=None):
+        disinfectant = disinfectant or self.disinfectant
+        disinfectant.refresh_from_db(fields=['current_stock'])
+        return disinfectant.current_stock
+
+    def test_append(self):
+        self.receive(8)
+        self.issue(3)
+        self.assertEqual(self.stock(), Decimal('5'))
+
+    def test_edit_replaces_old_effect(self):
+        other = Disinfectant.objects.create(name='e', category=self.category, unit='L', minimum_stock=10)
+        received = self.receive(8)
+        received.quantity = 5
+        received.save()
+        self.assertEqual(self.stock(), Decimal('5'))
+
+        received.disinfectant = other
+        received.save()
+        self.assertEqual(self.stock(), Decimal('0'))
+        self.assertEqual(self.stock(other), Decimal('5'))
+
+    def test_delete_and_double_delete(self):
+        issued = self.issue(3)
+        first = DisinfectantIssued.objects.get(pk=issued.pk)
+        second = DisinfectantIssued.objects.get(pk=issued.pk)
+
+        first.delete()
+        self.assertEqual(self.stock(), Decimal('0'))
+        second.delete()
+        self.assertEqual(self.stock(), Decimal('0'))
+
+    def test_stale_delete_uses_stored_row(self):
+        received = self.receive(8)
+        stale = DisinfectantReceived.objects.get(pk=received.pk)
+        received.quantity = 2
+        received.save()
+
+        stale.delete()
+        self.assertEqual(self.stock(), Decimal('0'))
+
+    def test_rebuild_matches_incremental(self):
+        self.receive(20)
+        edited = self.issue(5)
+        self.receive(3).delete()
+        edited.quantity = 7
+        edited.save()
+
+        stock = self.stock()
+        Disinfectant.rebuild_stock([self.disinfectant.pk])
+        self.assertEqual(self.stock(), stock)
+        self.assertEqual(stock, Decimal('13'))
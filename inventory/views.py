@@ -16,11 +16,8 @@ def home(request):
     suppliers_count = Supplier.objects.count()
     categories_count = DisinfectantCategory.objects.count()
 
-    # المطهرات منخفضة المخزون
-    low_stock_disinfectants = []
-    for disinfectant in Disinfectant.objects.filter(is_active=True):
-        if disinfectant.stock_status in ["منخفض", "نفذ"]:
-            low_stock_disinfectants.append(disinfectant)
+    # المطهرات منخفضة المخزون (من الرصيد المحفوظ باستعلام واحد)
+    low_stock_disinfectants = Disinfectant.objects.low_stock().order_by('current_stock')
 
     context = {
         'disinfectants_count': disinfectants_count,
@@ -103,7 +100,7 @@ def category_delete(request, pk):
 @login_required
 def disinfectant_list(request):
     """عرض قائمة المطهرات"""
-    disinfectants = Disinfectant.objects.all().order_by('name')
+    disinfectants = Disinfectant.objects.select_related('category').order_by('name')
     return render(request, 'inventory/disinfectant_list.html', {'disinfectants': disinfectants})
 
 @login_required
@@ -124,7 +121,10 @@ def disinfectant_create(request):
 def disinfectant_detail(request, pk):
     """عرض تفاصيل مطهر"""
     disinfectant = get_object_or_404(Disinfectant, pk=pk)
-    return render(request, 'inventory/disinfectant_detail.html', {'disinfectant': disinfectant})
+    return render(request, 'inventory/disinfectant_detail.html', {
+        'disinfectant': disinfectant,
+        'lots': disinfectant.lots(),
+    })
 
 @login_required
 def disinfectant_update(request, pk):
@@ -143,7 +143,7 @@ def disinfectant_delete(request, pk):
 @login_required
 def received_list(request):
     """عرض قائمة المطهرات الواردة"""
-    received_items = DisinfectantReceived.objects.all().order_by('-date')
+    received_items = DisinfectantReceived.objects.select_related('disinfectant', 'supplier').order_by('-date')
     return render(request, 'inventory/received_list.html', {'received_items': received_items})
 
 @login_required
@@ -185,7 +185,7 @@ def received_delete(request, pk):
 @login_required
 def issued_list(request):
     """عرض قائمة المطهرات المنصرفة"""
-    issued_items = DisinfectantIssued.objects.all().order_by('-date')
+    issued_items = DisinfectantIssued.objects.select_related('disinfectant').order_by('-date')
     return render(request, 'inventory/issued_list.html', {'issued_items': issued_items})
 
 @login_required
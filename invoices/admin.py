@@ -27,24 +27,9 @@ class InvoiceAdmin(admin.ModelAdmin):
         """تعديل النموذج لإضافة رقم فاتورة تلقائي"""
         form = super().get_form(request, obj, **kwargs)
         if obj is None:  # فقط عند إنشاء فاتورة جديدة
-            # إنشاء رقم فاتورة جديد
-            last_invoice = Invoice.objects.order_by('-id').first()
-            if not last_invoice:
-                new_number = "1"  # أول فاتورة في النظام
-            else:
-                # استخراج الرقم من آخر فاتورة
-                try:
-                    if '-' in last_invoice.number:
-                        last_number = int(last_invoice.number.split('-')[1])
-                    else:
-                        last_number = int(last_invoice.number)
-                    new_number = str(last_number + 1)  # زيادة الرقم بمقدار 1
-                except (ValueError, IndexError):
-                    # في حالة حدوث خطأ في تحليل الرقم، استخدم الرقم 1
-                    new_number = "1"
-
-            # تعيين القيمة الافتراضية لحقل رقم الفاتورة
-            form.base_fields['number'].initial = new_number
+            # الرقم اختياري ويُحجز ذريًا عند الحفظ حسب نوع الفاتورة
+            form.base_fields['number'].required = False
+            form.base_fields['number'].help_text = _("اتركه فارغًا للترقيم التلقائي")
         return form
 
     def get_readonly_fields(self, request, obj=None):
@@ -61,6 +46,34 @@ class InvoiceAdmin(admin.ModelAdmin):
 
         return readonly_fields
 
+    def save_formset(self, request, form, formset, change):
+        """حفظ بنود الفاتورة دفعة واحدة ثم حساب إجماليات الفاتورة مرة واحدة"""
+        if formset.model is not InvoiceItem:
+            return super().save_formset(request, form, formset, change)
+
+        from django.db import transaction
+        from core.models import SystemSettings
+
+        instances = formset.save(commit=False)
+        settings = SystemSettings.get_settings()
+        with transaction.atomic():
+            for obj in formset.deleted_objects:
+                obj.delete()
+
+            new_items, changed_items = [], []
+            for item in instances:
+                item.calculate_price(settings)
+                (changed_items if item.pk else new_items).append(item)
+            InvoiceItem.objects.bulk_create(new_items)
+            InvoiceItem.objects.bulk_update(changed_items, [
+                field.name for field in InvoiceItem._meta.concrete_fields
+                if not field.primary_key and field.name != 'invoice'
+            ])
+
+            invoice = form.instance
+            invoice.calculate_totals()
+            invoice.save()
+
     def get_post_actions(self, obj):
         """عرض أزرار الترحيل وإلغاء الترحيل في قائمة الفواتير"""
         if obj.pk:
@@ -179,24 +192,9 @@ class PaymentAdmin(admin.ModelAdmin):
         """تعديل النموذج لإضافة رقم مستند تلقائي"""
         form = super().get_form(request, obj, **kwargs)
         if obj is None:  # فقط عند إنشاء مستند جديد
-            # إنشاء رقم مستند جديد
-            last_payment = Payment.objects.order_by('-id').first()
-            if not last_payment:
-                new_number = "1"  # أول مستند في النظام
-            else:
-                # استخراج الرقم من آخر مستند
-                try:
-                    if '-' in last_payment.number:
-                        last_number = int(last_payment.number.split('-')[1])
-                    else:
-                        last_number = int(last_payment.number)
-                    new_number = str(last_number + 1)  # زيادة الرقم بمقدار 1
-                except (ValueError, IndexError):
-                    # في حالة حدوث خطأ في تحليل الرقم، استخدم الرقم 1
-                    new_number = "1"
-
-            # تعيين القيمة الافتراضية لحقل رقم المستند
-            form.base_fields['number'].initial = new_number
+            # الرقم اختياري ويُحجز ذريًا عند الحفظ حسب نوع العملية
+            form.base_fields['number'].required = False
+            form.base_fields['number'].help_text = _("اتركه فارغًا للترقيم التلقائي")
         return form
 
     def get_payment_type_colored(self, obj):
@@ -2,15 +2,35 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count, Q
+import django_filters
+from django.db.models import Sum, Count, Q, Prefetch
 from django.utils import timezone
+from core.filters import DateRangeFilterSet
 from .models import Invoice, InvoiceItem, Payment
 from .serializers import InvoiceSerializer, InvoiceItemSerializer, PaymentSerializer
 
+class InvoiceFilter(DateRangeFilterSet):
+    # ?type= اسم قديم مستخدم في الواجهة لنوع الفاتورة
+    type = django_filters.CharFilter(field_name='invoice_type')
+
+    class Meta:
+        model = Invoice
+        fields = ['invoice_type', 'payment_type', 'contact', 'store', 'safe', 'representative', 'driver', 'is_posted']
+
+class PaymentFilter(DateRangeFilterSet):
+    class Meta:
+        model = Payment
+        fields = ['payment_type', 'contact', 'safe', 'invoice', 'is_posted']
+
 class PaymentViewSet(viewsets.ModelViewSet):
-    queryset = Payment.objects.all().order_by('-date')
+    queryset = Payment.objects.select_related(
+        'contact', 'safe', 'invoice', 'expense_category', 'income_category'
+    ).order_by('-date', '-id')
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = PaymentFilter
+    search_fields = ['number', 'contact__name', 'notes']
+    ordering_fields = ['date', 'number', 'amount']
 
     @action(detail=True, methods=['post'])
     def post_payment(self, request, pk=None):
@@ -88,48 +108,49 @@ class InvoiceReportViewSet(viewsets.ViewSet):
         return Response(report)
 
 class InvoiceViewSet(viewsets.ModelViewSet):
-    queryset = Invoice.objects.all().order_by('-date')
+    queryset = Invoice.objects.select_related('contact', 'store', 'safe', 'representative', 'driver').prefetch_related(
+        Prefetch('items', queryset=InvoiceItem.objects.select_related('product', 'product_unit__unit'))
+    ).order_by('-date', '-id')
     serializer_class = InvoiceSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = InvoiceFilter
+    search_fields = ['number', 'contact__name']
+    search_index = [('invoice', 'pk'), ('contact', 'contact_id')]
+    ordering_fields = ['date', 'number', 'net_amount', 'remaining_amount']
 
     @action(detail=False, methods=['get'])
     def next_number(self, request):
+        from core.models import DocumentSequence
         invoice_type = request.query_params.get('type', 'sale')
-        
-        # البحث عن كل الفواتير من هذا النوع لاستخراج أكبر رقم عددي
-        all_invoices = Invoice.objects.filter(invoice_type=invoice_type)
-        
-        max_num = 0
-        import re
-        
-        for inv in all_invoices:
-            # استخراج الأرقام من رقم الفاتورة
-            nums = re.findall(r'\d+', inv.number)
-            if nums:
-                # نأخذ آخر مجموعة أرقام ونحولها لرقم
-                try:
-                    current_num = int(nums[-1])
-                    # إذا كان الرقم يبدو كطابع زمني (أكبر من 1000000000)، نتجاهله في الحساب التسلسلي
-                    if current_num < 1000000000:
-                        if current_num > max_num:
-                            max_num = current_num
-                except ValueError:
-                    continue
-        
-        next_num = max_num + 1
-        
-        # تنسيق الرقم الناتج (مثلاً INV-1 أو مجرد 1)
-        # سأستخدم الرقم المجرد حالياً ليكون بسيطاً كما طلب المستخدم
-        return Response({'next_number': str(next_num)})
 
-    def get_queryset(self):
-        queryset = Invoice.objects.all().order_by('-date')
-        invoice_type = self.request.query_params.get('type')
-        if invoice_type:
-            queryset = queryset.filter(invoice_type=invoice_type)
-        return queryset
+        # الرقم المقترح فقط؛ الرقم النهائي يُحجز ذريًا عند حفظ الفاتورة
+        return Response({'next_number': DocumentSequence.peek(f'invoice.{invoice_type}')})
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        استيراد وترحيل دفعة فواتير: قائمة فواتير، أو {'invoices': [...], 'post': true, 'atomic': false}.
+        الصفوف غير الصالحة تُعاد في errors ولا توقف باقي الدفعة إلا مع atomic=true.
+        """
+        from .bulk_import import import_invoices
+
+        data = request.data
+        if isinstance(data, list):
+            rows, post, atomic = data, True, False
+        else:
+            rows = data.get('invoices')
+            post = str(data.get('post', True)).lower() not in ('false', '0')
+            atomic = str(data.get('atomic', False)).lower() in ('true', '1')
+        if not isinstance(rows, list) or not rows:
+            return Response({'error': 'invoices must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = import_invoices(rows, post=post, atomic=atomic)
+        if atomic and result['errors']:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST)
 
 class InvoiceItemViewSet(viewsets.ModelViewSet):
-    queryset = InvoiceItem.objects.all()
+    queryset = InvoiceItem.objects.select_related('product', 'product_unit__unit').order_by('id')
     serializer_class = InvoiceItemSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['invoice', 'product', 'product_unit']
@@ -0,0 +1,296 @@
+"""
+استيراد الفواتير وترحيلها دفعة واحدة (مثل مبيعات نقاط البيع الليلية من الفروع).
+
+يتم التحقق من كل فاتورة في الذاكرة بعد تحميل جهات الاتصال والمخازن والخزن والمنتجات
+المشار إليها باستعلام واحد لكل نموذج. بعد ذلك تُدرج الفواتير وبنودها وحركات جهات الاتصال
+والخزن والمخزون والقيود المحاسبية وبنودها باستخدام bulk_create. في النهاية يعاد حساب رصيد
+كل خزنة وجهة اتصال ومنتج متأثر مرة واحدة فقط.
+
+الفواتير غير الصالحة لا توقف الدفعة، وتظهر أخطاؤها في النتيجة مع رقم الصف.
+مع atomic=True لا يُحفظ شيء إذا فشل أي صف.
+
+مثال:
+    from invoices.bulk_import import import_invoices
+
+    result = import_invoices(rows)
+    # {'created': 2, 'failed': 1, 'invoices': [{'row': 0, 'id': 15, 'number': '101'}, ...],
+    #  'errors': [{'row': 2, 'errors': {'contact': ['جهة الاتصال غير موجودة']}}]}
+"""
+import csv
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import Invoice, InvoiceItem
+from .serializers import BulkInvoiceSerializer
+
+# أعمدة ملف CSV: سطر لكل بند، وتُجمع البنود في فواتير حسب رقم الفاتورة ونوعها
+CSV_INVOICE_FIELDS = [
+    'number', 'date', 'invoice_type', 'payment_type', 'contact', 'store', 'safe', 'representative', 'driver',
+    'discount_type', 'discount_value', 'tax_type', 'tax_value', 'paid_amount', 'notes',
+]
+CSV_ITEM_FIELDS = {
+    'product': 'product', 'product_unit': 'product_unit', 'quantity': 'quantity', 'unit_price': 'unit_price',
+    'discount_percentage': 'discount_percentage', 'tax_percentage': 'tax_percentage', 'item_notes': 'notes',
+}
+
+
+def rows_from_csv(file):
+    """تحويل ملف CSV (سطر لكل بند) إلى قائمة فواتير بنفس صيغة JSON"""
+    invoices = {}
+    for line in csv.DictReader(file):
+        line = {key.strip(): (value or '').strip() for key, value in line.items() if key}
+        key = (line.get('number'), line.get('invoice_type'))
+        if key not in invoices:
+            invoices[key] = {field: line[field] for field in CSV_INVOICE_FIELDS if line.get(field)}
+            invoices[key]['items'] = []
+        invoices[key]['items'].append({
+            target: line[column] for column, target in CSV_ITEM_FIELDS.items() if line.get(column)
+        })
+    return list(invoices.values())
+
+
+def _load_references(rows):
+    """تحميل كل الكائنات المشار إليها في الدفعة باستعلام واحد لكل نموذج"""
+    from core.models import Contact, Store, Safe, Representative, Driver
+    from products.models import Product, ProductUnit
+
+    ids = defaultdict(set)
+    for _index, data in rows:
+        for field in ('contact', 'store', 'safe', 'representative', 'driver'):
+            if data.get(field):
+                ids[field].add(data[field])
+        for item in data['items']:
+            ids['product'].add(item['product'])
+            ids['product_unit'].add(item['product_unit'])
+
+    return {
+        'contact': Contact.objects.select_related('account').in_bulk(ids['contact']),
+        'store': Store.objects.select_related('account').in_bulk(ids['store']),
+        'safe': Safe.objects.select_related('account').in_bulk(ids['safe']),
+        'representative': Representative.objects.in_bulk(ids['representative']),
+        'driver': Driver.objects.in_bulk(ids['driver']),
+        'product': Product.objects.in_bulk(ids['product']),
+        'product_unit': ProductUnit.objects.in_bulk(ids['product_unit']),
+    }
+
+
+def _closed_periods():
+    from accounting.models import FinancialPeriod
+    return list(FinancialPeriod.objects.filter(is_closed=True).values_list('start_date', 'end_date'))
+
+
+def _reference_errors(data, refs, closed_periods):
+    """أخطاء الصف المتعلقة بوجود الكائنات المشار إليها والفترات المغلقة"""
+    from django.utils import timezone
+
+    errors = {}
+    for field, message in (('contact', 'جهة الاتصال غير موجودة'), ('store', 'المخزن غير موجود'),
+                           ('safe', 'الخزنة غير موجودة'), ('representative', 'المندوب غير موجود'),
+                           ('driver', 'السائق غير موجود')):
+        if data.get(field) and data[field] not in refs[field]:
+            errors[field] = [message]
+
+    item_errors = []
+    for item in data['items']:
+        item_error = {}
+        if item['product'] not in refs['product']:
+            item_error['product'] = ['المنتج غير موجود']
+        unit = refs['product_unit'].get(item['product_unit'])
+        if unit is None:
+            item_error['product_unit'] = ['وحدة المنتج غير موجودة']
+        elif unit.product_id != item['product']:
+            item_error['product_unit'] = ['وحدة المنتج لا تخص هذا المنتج']
+        item_errors.append(item_error)
+    if any(item_errors):
+        errors['items'] = item_errors
+
+    day = timezone.localtime(data.get('date') or timezone.now()).date()
+    if any(start <= day <= end for start, end in closed_periods):
+        errors['date'] = ['لا يمكن إضافة فواتير في فترة مالية مغلقة']
+    return errors
+
+
+def _build_invoice(data, refs, settings):
+    """إنشاء الفاتورة وبنودها في الذاكرة مع حساب الأسعار والإجماليات"""
+    items_data = data.pop('items')
+    invoice = Invoice(**{
+        **data,
+        'contact': refs['contact'][data['contact']],
+        'store': refs['store'][data['store']],
+        'safe': refs['safe'].get(data.get('safe')),
+        'representative': refs['representative'].get(data.get('representative')),
+        'driver': refs['driver'].get(data.get('driver')),
+    })
+    items = []
+    for item_data in items_data:
+        item = InvoiceItem(invoice=invoice, **{
+            **item_data,
+            'product': refs['product'][item_data['product']],
+            'product_unit': refs['product_unit'][item_data['product_unit']],
+        })
+        item.calculate_price(settings)
+        items.append(item)
+    invoice.calculate_totals(items)
+    return invoice, items
+
+
+def _assign_numbers(invoices):
+    """ترقيم الفواتير بدون رقم بحجز نطاق واحد لكل نوع، وتقديم التسلسل بعد الأرقام المستوردة"""
+    from core.models import DocumentSequence
+
+    by_type = defaultdict(list)
+    for invoice in invoices:
+        by_type[invoice.invoice_type].append(invoice)
+    for invoice_type, group in by_type.items():
+        document_type = f'invoice.{invoice_type}'
+        DocumentSequence.observe(document_type, [invoice.number for invoice in group if invoice.number])
+        unnumbered = [invoice for invoice in group if not invoice.number]
+        for invoice, number in zip(unnumbered, DocumentSequence.reserve(document_type, len(unnumbered))):
+            invoice.number = number
+
+
+def _post(invoices, items_per_invoice, settings):
+    """إنشاء الحركات والقيود لكل الفواتير دفعة واحدة ثم إعادة حساب الأرصدة المتأثرة مرة واحدة"""
+    from accounting import report_cache
+    from accounting.models import AccountPeriodBalance, AuditLog, JournalEntry, JournalItem
+    from core import search
+    from core.models import Contact, Safe, SearchDocument
+    from finances import balances
+    from finances.models import (BalanceCheckpoint, ContactTransaction, ProductStoreBalance, ProductTransaction,
+                                 SafeTransaction)
+    from products import catalog
+    from products.models import Product, ProductUnit
+
+    contact_transactions, safe_transactions, product_transactions = [], [], []
+    entries, lines_by_entry = [], []
+    for invoice, items in zip(invoices, items_per_invoice):
+        contacts, safes, products = invoice.related_transactions(items)
+        contact_transactions += contacts
+        safe_transactions += safes
+        product_transactions += products
+
+        lines = invoice.journal_items(settings, items)
+        total_debit = sum(line.debit for line in lines)
+        total_credit = sum(line.credit for line in lines)
+        entries.append(JournalEntry(
+            entry_number=f"INV-{invoice.pk}-{invoice.number}"[:50],
+            date=invoice.date,
+            description=f"قيد تلقائي للفاتورة رقم {invoice.number} - {invoice.get_invoice_type_display()}",
+            reference=invoice.number,
+            # القيود الفارغة أو غير المتوازنة تبقى غير مرحلة للمراجعة كما في الترحيل الفردي
+            is_posted=bool(lines) and total_debit == total_credit,
+        ))
+        lines_by_entry.append(lines)
+
+    ContactTransaction.objects.bulk_create(contact_transactions)
+    SafeTransaction.objects.bulk_create(safe_transactions)
+    ProductTransaction.objects.bulk_create(product_transactions)
+
+    JournalEntry.objects.bulk_create(entries)
+    search.index_many(SearchDocument.JOURNAL_ENTRY, entries)
+    posted_lines, lines_by_month = [], defaultdict(list)
+    for entry, lines in zip(entries, lines_by_entry):
+        for line in lines:
+            line.journal_entry = entry
+        if entry.is_posted:
+            posted_lines += lines
+            lines_by_month[AccountPeriodBalance.month_of(entry.date)] += lines
+    JournalItem.objects.bulk_create([line for lines in lines_by_entry for line in lines])
+
+    # أثر القيود المرحلة على أرصدة الحسابات وأرصدة الفترات
+    JournalEntry._apply_balances(posted_lines)
+    for month, lines in lines_by_month.items():
+        AccountPeriodBalance.apply_items(month, lines)
+    if posted_lines:
+        report_cache.bump_ledger_version()
+    AuditLog.objects.bulk_create([
+        AuditLog(action='POST', model_name='JournalEntry', object_id=entry.id, object_repr=str(entry),
+                 changes={'status': 'posted', 'debit_total': str(sum(line.debit for line in lines))})
+        for entry, lines in zip(entries, lines_by_entry) if entry.is_posted
+    ])
+
+    # تحديث أسعار المنتجات حسب إعدادات النظام (آخر سعر في الدفعة لكل وحدة)
+    prices = {'purchase_price': {}, 'selling_price': {}}
+    for invoice, items in zip(invoices, items_per_invoice):
+        if invoice.invoice_type == Invoice.PURCHASE and settings.update_purchase_price:
+            field = 'purchase_price'
+        elif invoice.invoice_type == Invoice.SALE and settings.update_sale_price:
+            field = 'selling_price'
+        else:
+            continue
+        for item in items:
+            prices[field][item.product_unit_id] = item.unit_price
+    for field, unit_prices in prices.items():
+        units = ProductUnit.objects.in_bulk(unit_prices)
+        for unit_id, unit in units.items():
+            setattr(unit, field, unit_prices[unit_id])
+        ProductUnit.objects.bulk_update(units.values(), [field])
+        catalog.stamp(ProductUnit, units)
+
+    # إعادة حساب رصيد كل كائن متأثر مرة واحدة (كل الخزن المتأثرة باستعلام تراكمي واحد)
+    safe_ids = {trans.safe_id for trans in safe_transactions}
+    contact_ids = {trans.contact_id for trans in contact_transactions}
+    product_ids = {trans.product_id for trans in product_transactions}
+    store_ids = {trans.store_id for trans in product_transactions}
+    balances.rebuild(Safe, safe_ids)
+    balances.rebuild(Contact, contact_ids)
+    balances.rebuild(Product, product_ids)
+    if product_ids:
+        ProductStoreBalance.rebuild(products=product_ids, stores=store_ids)
+    for kind, ids in (('safe', safe_ids), ('contact', contact_ids), ('product', product_ids)):
+        if ids:
+            BalanceCheckpoint.rebuild(kind, ids)
+
+
+def import_invoices(rows, post=True, atomic=False):
+    """
+    التحقق من دفعة فواتير وإنشاؤها (وترحيلها عند post=True).
+    rows: قائمة قواميس بصيغة BulkInvoiceSerializer.
+    atomic: إلغاء الدفعة كاملة إذا فشل التحقق من أي صف.
+    """
+    from core import search
+    from core.models import SearchDocument, SystemSettings
+
+    errors, valid = [], []
+    for index, row in enumerate(rows):
+        serializer = BulkInvoiceSerializer(data=row)
+        if serializer.is_valid():
+            valid.append((index, dict(serializer.validated_data)))
+        else:
+            errors.append({'row': index, 'errors': serializer.errors})
+
+    refs = _load_references(valid)
+    closed_periods = _closed_periods()
+    rows_ok = []
+    for index, data in valid:
+        row_errors = _reference_errors(data, refs, closed_periods)
+        if row_errors:
+            errors.append({'row': index, 'errors': row_errors})
+        else:
+            rows_ok.append((index, data))
+    errors.sort(key=lambda error: error['row'])
+
+    result = {'created': 0, 'failed': len(errors), 'invoices': [], 'errors': errors}
+    if not rows_ok or (atomic and errors):
+        return result
+
+    settings = SystemSettings.get_settings()
+    built = [(index, *_build_invoice(data, refs, settings)) for index, data in rows_ok]
+    invoices = [invoice for _index, invoice, _items in built]
+    items_per_invoice = [items for _index, _invoice, items in built]
+
+    with transaction.atomic():
+        _assign_numbers(invoices)
+        for invoice in invoices:
+            invoice.is_posted = post
+        # bulk_create لا يستدعي Invoice.save، فلا تُنشأ معاملات لكل فاتورة على حدة
+        Invoice.objects.bulk_create(invoices)
+        InvoiceItem.objects.bulk_create([item for items in items_per_invoice for item in items])
+        search.index_many(SearchDocument.INVOICE, invoices)
+        if post:
+            _post(invoices, items_per_invoice, settings)
+
+    result['created'] = len(invoices)
+    result['invoices'] = [{'row': index, 'id': invoice.pk, 'number': invoice.number} for index, invoice, _items in built]
+    return result
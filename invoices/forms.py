@@ -27,6 +27,9 @@ class InvoiceForm(forms.ModelForm):
         invoice_type = kwargs.pop('invoice_type', None)
         super().__init__(*args, **kwargs)
 
+        # الرقم اختياري: يُولد تلقائيًا عند الحفظ إذا تُرك فارغًا
+        self.fields['number'].required = False
+
         # إذا كان نوع الفاتورة محدد مسبقاً
         if invoice_type:
             self.fields['invoice_type'].initial = invoice_type
@@ -140,6 +143,9 @@ class PaymentForm(forms.ModelForm):
         payment_type = kwargs.pop('payment_type', None)
         super().__init__(*args, **kwargs)
 
+        # الرقم اختياري: يُولد تلقائيًا عند الحفظ إذا تُرك فارغًا
+        self.fields['number'].required = False
+
         # إذا كان نوع العملية محدد مسبقاً
         if payment_type:
             self.fields['payment_type'].initial = payment_type
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from invoices.bulk_import import import_invoices, rows_from_csv
+
+class Command(BaseCommand):
+    help = 'Import (and post) invoices in bulk from a JSON or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON file (list of invoices) or CSV file (one line per item)')
+        parser.add_argument('--format', choices=['json', 'csv'], help='File format (default: from extension)')
+        parser.add_argument('--no-post', action='store_true', help='Create invoices without posting them')
+        parser.add_argument('--atomic', action='store_true', help='Abort the whole import if any invoice is invalid')
+        parser.add_argument('--batch-size', type=int, default=500, help='Invoices per batch (default: 500)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'json')
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as file:
+                rows = rows_from_csv(file) if file_format == 'csv' else json.load(file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+        if isinstance(rows, dict):
+            rows = rows.get('invoices', [])
+
+        self.stdout.write(self.style.SUCCESS(f'Starting invoice import at {timezone.now()} ({len(rows)} invoices)'))
+
+        # مع --atomic يتم التحقق من الملف كاملًا في دفعة واحدة
+        batch_size = len(rows) if options['atomic'] else max(options['batch_size'], 1)
+        created = failed = 0
+        for start in range(0, len(rows), batch_size or 1):
+            result = import_invoices(rows[start:start + batch_size], post=not options['no_post'], atomic=options['atomic'])
+            created += result['created']
+            failed += len(result['errors'])
+            for error in result['errors']:
+                self.stdout.write(self.style.ERROR(f"Row {start + error['row']}: {json.dumps(error['errors'], ensure_ascii=False)}"))
+
+        if options['atomic'] and failed:
+            raise CommandError(f'Import aborted: {failed} invalid invoices, nothing was created.')
+        self.stdout.write(self.style.SUCCESS(f'Invoice import completed. {created} invoices created, {failed} failed.'))
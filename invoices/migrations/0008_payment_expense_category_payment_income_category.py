@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("finances", "0020_safetransaction_balance_indexes"),
+        ("invoices", "0007_invoice_discount_type_invoice_discount_value_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="payment",
+            name="expense_category",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="payments",
+                to="finances.expensecategory",
+                verbose_name="قسم المصروفات",
+            ),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="income_category",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="payments",
+                to="finances.incomecategory",
+                verbose_name="قسم الإيرادات",
+            ),
+        ),
+    ]
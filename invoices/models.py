@@ -1,9 +1,11 @@
 from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
-from core.models import Contact, Store, Safe, Representative, Driver
+from decimal import Decimal
+from core.models import Contact, Store, Safe, Representative, Driver, DocumentSequence
 from products.models import Product, ProductUnit
 from finances.models import SafeTransaction, ContactTransaction
+from finances import balances
 
 class Invoice(models.Model):
     SALE = 'sale'
@@ -85,6 +87,12 @@ class Invoice(models.Model):
 
         # التحقق مما إذا كانت الفاتورة جديدة
         is_new = self.pk is None
+        if is_new:
+            # ترقيم تلقائي ذري حسب نوع الفاتورة
+            self.number = DocumentSequence.claim(
+                f'invoice.{self.invoice_type}', self.number,
+                documents=Invoice.objects.filter(invoice_type=self.invoice_type),
+            )
 
         # حفظ الفاتورة
         print(f"حفظ الفاتورة {self.number} - جديدة: {is_new}, مرحلة: {self.is_posted}")
@@ -113,9 +121,13 @@ class Invoice(models.Model):
                 print(f"عدد معاملات الخزنة: {safe_transactions.count()}")
                 print(f"عدد معاملات المخزون: {product_transactions.count()}")
 
-    def calculate_totals(self):
-        """حساب إجماليات الفاتورة من بنودها والخصومات العامة"""
-        items = self.items.all()
+    def calculate_totals(self, items=None):
+        """
+        حساب إجماليات الفاتورة من بنودها والخصومات العامة
+        يمكن تمرير البنود المحسوبة في الذاكرة لتجنب إعادة قراءتها من قاعدة البيانات
+        """
+        if items is None:
+            items = self.items.all()
 
         total_amount = sum(item.quantity * item.unit_price for item in items)
         items_discount = sum(item.discount_amount for item in items)
@@ -148,30 +160,234 @@ class Invoice(models.Model):
         else:
             self.remaining_amount = self.net_amount - self.paid_amount
 
-    @transaction.atomic
-    def create_related_transactions(self):
-        """إنشاء المعاملات المالية والمخزنية المرتبطة بالفاتورة عند ترحيلها"""
-        # استيراد النماذج هنا لتجنب التبعيات الدائرية
-        from finances.models import ContactTransaction, SafeTransaction, ProductTransaction
-        from accounting.models import JournalEntry, JournalItem, Account
-
-        print(f"=== بدء إنشاء المعاملات المالية والمخزنية للفاتورة رقم {self.number} ===")
-        
-        # إنشاء قيد محاسبي تلقائي
-        journal_entry = JournalEntry.objects.create(
-            entry_number=f"INV-{self.number}-{timezone.now().strftime('%Y%m%d%H%M%S')}",
-            date=self.date,
-            description=f"قيد تلقائي للفاتورة رقم {self.number} - {self.get_invoice_type_display()}",
-            reference=self.number
-        )
+    def set_items(self, items_data):
+        """
+        استبدال بنود الفاتورة دفعة واحدة: حساب أسعار البنود في الذاكرة ثم إدراجها بـ bulk_create
+        وحساب الإجماليات وحفظ الفاتورة مرة واحدة بدلاً من إعادة الحفظ بعد كل بند
+        items_data: قائمة قواميس بحقول InvoiceItem (product/product_id, product_unit/product_unit_id, ...)
+        """
+        from core.models import SystemSettings
+        settings = SystemSettings.get_settings()
 
-        # منطق القيود المحاسبية بناءً على نوع الفاتورة
-        # ملاحظة: هذا تبسيط للعملية المحاسبية، يجب تخصيصه حسب شجرة الحسابات الفعلية
-        
-        # 1. حساب المبيعات/المشتريات (استخدام الإعدادات)
+        items = []
+        for item_data in items_data:
+            item = InvoiceItem(invoice=self, **item_data)
+            item.calculate_price(settings)
+            items.append(item)
+
+        with transaction.atomic():
+            self.items.all().delete()
+            InvoiceItem.objects.bulk_create(items)
+            self.calculate_totals(items)
+            self.save()
+        return items
+
+    # حقول البند التي تُقارن عند التعديل (المدخلة والمحسوبة)
+    ITEM_FIELDS = ['product_id', 'product_unit_id', 'quantity', 'unit_price', 'total_price', 'discount_percentage',
+                   'discount_amount', 'tax_percentage', 'tax_amount', 'net_price', 'notes']
+
+    # تغيير أي من هذه الحقول ينقل كل حركات الفاتورة، فيعاد إنشاؤها بدلاً من تعديلها بالفروق
+    LEDGER_KEY_FIELDS = ['number', 'invoice_type', 'date', 'contact_id', 'store_id', 'safe_id']
+
+    def update_items(self, items_data):
+        """
+        تعديل بنود الفاتورة بمقارنة البنود الحالية بالجديدة بدلاً من حذفها وإعادة إنشائها:
+        تُحدَّث البنود المتغيرة فقط وتُحذف البنود الناقصة وتُضاف الجديدة، ثم تُحفظ الفاتورة.
+        البند الجديد يطابق البند القديم بنفس id إن وُجد، وإلا أول بند قديم بنفس المنتج والوحدة.
+        إذا كانت الفاتورة مرحلة تُعدَّل حركاتها بالفروق فقط (انظر post_changes).
+        تُستدعى بعد تعيين حقول رأس الفاتورة الجديدة في الذاكرة وقبل حفظها.
+        """
+        import copy
         from core.models import SystemSettings
         settings = SystemSettings.get_settings()
-        
+
+        with transaction.atomic():
+            previous = Invoice.objects.select_for_update().get(pk=self.pk)
+            old_items = list(self.items.select_related('product_unit'))
+            # نسخة من البنود قبل التعديل لحساب القيد القديم
+            previous_items = [copy.copy(item) for item in old_items]
+            by_id = {item.pk: item for item in old_items}
+
+            items, changed, created = [], [], []
+            for data in items_data:
+                data = dict(data)
+                item_id = data.pop('id', None)
+                new_item = InvoiceItem(invoice=self, **data)
+                new_item.calculate_price(settings)
+
+                old_item = by_id.pop(item_id, None) if item_id else next(
+                    (item for item in by_id.values()
+                     if item.product_id == new_item.product_id and item.product_unit_id == new_item.product_unit_id),
+                    None,
+                )
+                if old_item is None:
+                    created.append(new_item)
+                    items.append(new_item)
+                    continue
+
+                by_id.pop(old_item.pk, None)
+                items.append(old_item)
+                if any(getattr(old_item, field) != getattr(new_item, field) for field in self.ITEM_FIELDS):
+                    for field in self.ITEM_FIELDS:
+                        setattr(old_item, field, getattr(new_item, field))
+                    changed.append(old_item)
+            deleted = list(by_id.values())
+
+            # وحدات المنتجات للبنود المضافة والمعدلة باستعلام واحد (لحساب الكميات الأساسية والتكلفة)
+            units = ProductUnit.objects.in_bulk({item.product_unit_id for item in changed + created})
+            for item in changed + created:
+                item.product_unit = units[item.product_unit_id]
+
+            if changed:
+                InvoiceItem.objects.bulk_update(changed, [InvoiceItem._meta.get_field(field).name
+                                                          for field in self.ITEM_FIELDS])
+            InvoiceItem.objects.bulk_create(created)
+
+            self.calculate_totals(items)
+            self.save()
+
+            if self.is_posted and previous.is_posted:
+                # قبل حذف البنود حتى تبقى حركات المخزون مرتبطة ببنودها المحذوفة فتُحذف معها
+                self.post_changes(previous, previous_items, items, settings)
+                self.update_product_prices(settings, changed + created)
+            if deleted:
+                InvoiceItem.objects.filter(pk__in=[item.pk for item in deleted]).delete()
+            if self.is_posted and not previous.is_posted and not self.post_invoice():
+                raise ValueError(f"تعذر ترحيل الفاتورة {self.number}")
+        return items
+
+    def post_changes(self, previous, previous_items, items, settings):
+        """
+        تعديل حركات فاتورة مرحلة بعد تعديلها بالفروق بدلاً من حذف كل الحركات وإعادة ترحيلها:
+        - حركات المخزون: تعديل حركة كل بند متغير فقط وحذف حركات البنود المحذوفة وإضافة حركات الجديدة
+        - حركات جهة الاتصال والخزنة: تعديل المبلغ إذا تغير فقط
+        - القيد المحاسبي: قيد تسوية بالفرق بين القيد الجديد والقديم لكل حساب
+        previous: الفاتورة كما هي في قاعدة البيانات قبل التعديل، previous_items: بنودها قبل التعديل.
+        """
+        from finances.models import ContactTransaction, SafeTransaction, ProductTransaction
+
+        # القيد أولاً كما في الترحيل العادي: ترحيله يزامن أرصدة الخزن وجهات الاتصال من حساباتها،
+        # ثم يعاد حساب أرصدة الكائنات المتأثرة فقط من حركاتها عند تأكيد المعاملة
+        entries = self.post_journal_adjustment(previous, previous_items, items, settings)
+
+        contact_transactions, safe_transactions, product_transactions = self.related_transactions(items)
+        existing_products = list(ProductTransaction.objects.filter(invoice=self))
+        by_item = {trans.invoice_item_id: trans for trans in existing_products}
+        linked = None not in by_item and set(by_item) == {item.pk for item in previous_items}
+
+        if not linked or any(getattr(previous, field) != getattr(self, field) for field in self.LEDGER_KEY_FIELDS):
+            # تغيرت بيانات تنقل كل الحركات (جهة الاتصال، المخزن، التاريخ...) أو حركات قديمة غير مرتبطة بالبنود
+            with balances.deferred():
+                for model in (ContactTransaction, SafeTransaction, ProductTransaction):
+                    queryset = model.objects.filter(invoice=self)
+                    balances.touch_transactions(queryset)
+                    queryset.delete()
+                for group in (contact_transactions, safe_transactions, product_transactions):
+                    for trans in group:
+                        trans.save()
+        else:
+            with balances.deferred():
+                # ترحيل القيد زامن رصيد الخزنة من حسابها، فتُسجل لإعادة بنائه من حركاتها
+                balances.touch_ids(Safe, {previous.safe_id, self.safe_id})
+                self._sync_transactions(SafeTransaction.objects.filter(invoice=self), safe_transactions)
+                self._sync_transactions(ContactTransaction.objects.filter(invoice=self), contact_transactions)
+                for trans in product_transactions:
+                    old = by_item.pop(trans.invoice_item_id, None)
+                    if old is None:
+                        trans.save()
+                    elif (old.product_id, old.product_unit_id, old.quantity, old.base_quantity) != \
+                            (trans.product_id, trans.product_unit_id, trans.quantity, trans.base_quantity):
+                        old.product_id, old.product_unit, old.quantity = trans.product_id, trans.product_unit, trans.quantity
+                        old.save()
+                for old in by_item.values():
+                    old.delete()
+        return entries
+
+    @staticmethod
+    def _sync_transactions(existing, desired):
+        """مطابقة حركات الفاتورة الحالية بالمطلوبة حسب نوع الحركة: تعديل المبلغ المتغير وحذف الزائد وإضافة الناقص"""
+        remaining = list(existing)
+        for trans in desired:
+            old = next((old for old in remaining if old.transaction_type == trans.transaction_type), None)
+            if old is None:
+                trans.save()
+                continue
+            remaining.remove(old)
+            if old.amount != trans.amount:
+                old.amount = trans.amount
+                old.save()
+        for old in remaining:
+            old.delete()
+
+    def post_journal_adjustment(self, previous, previous_items, items, settings):
+        """
+        ترحيل قيد تسوية بالفرق بين قيد الفاتورة بعد التعديل وقيدها قبل التعديل (لكل حساب ومركز تكلفة).
+        إذا تغير تاريخ الفاتورة يُعكس القيد القديم في تاريخه ويُسجل الجديد في التاريخ الجديد.
+        """
+        from accounting.models import JournalEntry, JournalItem
+
+        totals_by_date = {}
+        for invoice, invoice_items, sign in ((previous, previous_items, -1), (self, items, 1)):
+            totals = totals_by_date.setdefault(invoice.date, {})
+            for line in invoice.journal_items(settings, invoice_items):
+                key = (line.account_id, line.cost_center_id)
+                amount, vat_amount, vat_rate = totals.get(key, (Decimal('0'), Decimal('0'), line.vat_rate))
+                totals[key] = (amount + sign * (line.debit - line.credit), vat_amount + sign * line.vat_amount,
+                               line.vat_rate or vat_rate)
+
+        entries = []
+        for date, totals in totals_by_date.items():
+            lines = [
+                JournalItem(account_id=account_id, cost_center_id=cost_center_id,
+                            debit=max(amount, 0), credit=max(-amount, 0), vat_rate=vat_rate, vat_amount=vat_amount,
+                            memo=f"تسوية تعديل فاتورة {self.number}")
+                for (account_id, cost_center_id), (amount, vat_amount, vat_rate) in totals.items()
+                if amount or vat_amount
+            ]
+            if not lines:
+                continue
+
+            journal_entry = JournalEntry.objects.create(
+                entry_number=DocumentSequence.next_number('journal_entry.invoice_adjustment'),
+                date=date,
+                description=f"قيد تسوية لتعديل الفاتورة رقم {self.number} - {self.get_invoice_type_display()}",
+                reference=self.number,
+            )
+            for line in lines:
+                line.journal_entry = journal_entry
+            JournalItem.objects.bulk_create(lines)
+            # خطأ الترحيل (قيد غير متوازن أو فترة مغلقة) يلغي تعديل الفاتورة بالكامل
+            journal_entry.post()
+            entries.append(journal_entry)
+        return entries
+
+    # نوع حركة جهة الاتصال والخزنة لكل نوع فاتورة (نفس القيم في النموذجين)، ونوع حركة السداد لجهة الاتصال
+    TRANSACTION_TYPES = {
+        SALE: 'sale_invoice',
+        PURCHASE: 'purchase_invoice',
+        SALE_RETURN: 'sale_return_invoice',
+        PURCHASE_RETURN: 'purchase_return_invoice',
+    }
+    SETTLEMENT_TRANSACTION_TYPES = {
+        SALE: 'collection',
+        PURCHASE: 'payment',
+    }
+
+    def journal_items(self, settings, items=None):
+        """
+        بنود القيد المحاسبي للفاتورة (غير محفوظة وبدون قيد) حسب نوعها.
+        items: بنود الفاتورة مع وحدات المنتجات (تُقرأ من قاعدة البيانات إذا لم تُمرر)
+        """
+        from accounting.models import JournalItem
+
+        if items is None:
+            items = self.items.select_related('product_unit')
+
+        lines = []
+
+        def add(account, debit=0, credit=0, memo='', **extra):
+            lines.append(JournalItem(account=account, debit=debit, credit=credit, memo=memo, **extra))
+
         contact_account = self.contact.account if self.contact else None
         safe_account = self.safe.account if self.safe else None
         store_account = self.store.account if self.store else None
@@ -179,153 +395,154 @@ class Invoice(models.Model):
         if self.invoice_type == self.SALE:
             # 1. من حساب العميل (مدين) بكامل قيمة الفاتورة
             if contact_account:
-                JournalItem.objects.create(
-                    journal_entry=journal_entry,
-                    account=contact_account,
-                    debit=self.net_amount,
-                    memo=f"مديونية فاتورة مبيعات {self.number}"
-                )
-            
+                add(contact_account, debit=self.net_amount, memo=f"مديونية فاتورة مبيعات {self.number}")
+
             # 2. إلى حساب المبيعات (دائن) بقيمة الفاتورة قبل الضريبة
             sales_acc = settings.sales_account
             if sales_acc:
-                JournalItem.objects.create(
-                    journal_entry=journal_entry,
-                    account=sales_acc,
-                    credit=self.total_amount - self.discount_amount,
-                    memo=f"مبيعات فاتورة {self.number}"
-                )
+                add(sales_acc, credit=self.total_amount - self.discount_amount, memo=f"مبيعات فاتورة {self.number}")
 
             # 3. إلى حساب ضريبة القيمة المضافة - مخرجات (دائن)
             if self.tax_amount > 0:
                 vat_out_acc = settings.vat_output_account
                 if vat_out_acc:
-                    JournalItem.objects.create(
-                        journal_entry=journal_entry,
-                        account=vat_out_acc,
-                        credit=self.tax_amount,
-                        vat_rate=settings.vat_percentage,
-                        vat_amount=self.tax_amount,
-                        memo=f"ضريبة مخرجات فاتورة {self.number}"
-                    )
+                    add(vat_out_acc, credit=self.tax_amount, vat_rate=settings.vat_percentage,
+                        vat_amount=self.tax_amount, memo=f"ضريبة مخرجات فاتورة {self.number}")
 
             # 4. تكلفة المبيعات والمخزون (الجرد المستمر)
             total_cost = 0
-            for item in self.items.all():
+            for item in items:
                 unit_cost = item.product_unit.purchase_price or 0
                 total_cost += item.quantity * unit_cost
 
             if total_cost > 0:
                 cogs_acc = settings.cogs_account
                 inventory_acc = store_account
-                
+
                 if cogs_acc and inventory_acc:
-                    JournalItem.objects.create(
-                        journal_entry=journal_entry,
-                        account=cogs_acc,
-                        debit=total_cost,
-                        memo=f"تكلفة بضاعة مباعة فاتورة {self.number}"
-                    )
-                    JournalItem.objects.create(
-                        journal_entry=journal_entry,
-                        account=inventory_acc,
-                        credit=total_cost,
-                        memo=f"صرف مخزني فاتورة {self.number}"
-                    )
-            
+                    add(cogs_acc, debit=total_cost, memo=f"تكلفة بضاعة مباعة فاتورة {self.number}")
+                    add(inventory_acc, credit=total_cost, memo=f"صرف مخزني فاتورة {self.number}")
+
             # 5. في حالة الدفع النقدي (قيد التحصيل)
             if self.payment_type == self.CASH and safe_account:
-                JournalItem.objects.create(
-                    journal_entry=journal_entry,
-                    account=safe_account,
-                    debit=self.net_amount,
-                    memo=f"تحصيل نقدي فاتورة {self.number}"
-                )
+                add(safe_account, debit=self.net_amount, memo=f"تحصيل نقدي فاتورة {self.number}")
                 if contact_account:
-                    JournalItem.objects.create(
-                        journal_entry=journal_entry,
-                        account=contact_account,
-                        credit=self.net_amount,
-                        memo=f"سداد نقدي فاتورة {self.number}"
-                    )
-        
+                    add(contact_account, credit=self.net_amount, memo=f"سداد نقدي فاتورة {self.number}")
+
         elif self.invoice_type == self.PURCHASE:
             # 1. من حساب المشتريات (مدين) بقيمة الفاتورة قبل الضريبة
             purch_acc = settings.purchases_account
             if purch_acc:
-                JournalItem.objects.create(
-                    journal_entry=journal_entry,
-                    account=purch_acc,
-                    debit=self.total_amount - self.discount_amount,
-                    memo=f"مشتريات فاتورة {self.number}"
-                )
+                add(purch_acc, debit=self.total_amount - self.discount_amount, memo=f"مشتريات فاتورة {self.number}")
 
             # 2. من حساب ضريبة القيمة المضافة - مدخلات (مدين)
             if self.tax_amount > 0:
                 vat_in_acc = settings.vat_input_account
                 if vat_in_acc:
-                    JournalItem.objects.create(
-                        journal_entry=journal_entry,
-                        account=vat_in_acc,
-                        debit=self.tax_amount,
-                        vat_rate=settings.vat_percentage,
-                        vat_amount=self.tax_amount,
-                        memo=f"ضريبة مدخلات فاتورة {self.number}"
-                    )
+                    add(vat_in_acc, debit=self.tax_amount, vat_rate=settings.vat_percentage,
+                        vat_amount=self.tax_amount, memo=f"ضريبة مدخلات فاتورة {self.number}")
 
             # 3. إلى حساب المورد (دائن) بكامل القيمة
             if contact_account:
-                JournalItem.objects.create(
-                    journal_entry=journal_entry,
-                    account=contact_account,
-                    credit=self.net_amount,
-                    memo=f"التزام فاتورة مشتريات {self.number}"
-                )
-            
+                add(contact_account, credit=self.net_amount, memo=f"التزام فاتورة مشتريات {self.number}")
+
             # 4. تحديث المخزون (الجرد المستمر)
             inventory_acc = store_account
             if inventory_acc:
                 # في حالة الشراء، تزيد قيمة المخزون
-                JournalItem.objects.create(
-                    journal_entry=journal_entry,
-                    account=inventory_acc,
-                    debit=self.total_amount - self.discount_amount,
-                    memo=f"إضافة مخزنية فاتورة {self.number}"
-                )
+                add(inventory_acc, debit=self.total_amount - self.discount_amount,
+                    memo=f"إضافة مخزنية فاتورة {self.number}")
                 # تخفيض حساب المشتريات (لأنه تم تحويله للمخزون)
                 if purch_acc:
-                    JournalItem.objects.create(
-                        journal_entry=journal_entry,
-                        account=purch_acc,
-                        credit=self.total_amount - self.discount_amount,
-                        memo=f"تسوية مشتريات إلى مخزون فاتورة {self.number}"
-                    )
+                    add(purch_acc, credit=self.total_amount - self.discount_amount,
+                        memo=f"تسوية مشتريات إلى مخزون فاتورة {self.number}")
 
             # 5. في حالة الدفع النقدي
             if self.payment_type == self.CASH and safe_account:
                 # من حساب المورد (مدين) إلى حساب الخزنة (دائن)
                 if contact_account:
-                    JournalItem.objects.create(
-                        journal_entry=journal_entry,
-                        account=contact_account,
-                        debit=self.net_amount,
-                        memo=f"سداد نقدي فاتورة {self.number}"
-                    )
-                JournalItem.objects.create(
-                    journal_entry=journal_entry,
-                    account=safe_account,
-                    credit=self.net_amount,
-                    memo=f"دفع نقدي فاتورة {self.number}"
-                )
+                    add(contact_account, debit=self.net_amount, memo=f"سداد نقدي فاتورة {self.number}")
+                add(safe_account, credit=self.net_amount, memo=f"دفع نقدي فاتورة {self.number}")
 
-        # ترحيل القيد إذا كان متوازناً
-        try:
-            journal_entry.post()
-            print(f"تم إنشاء وترحيل القيد المحاسبي رقم {journal_entry.entry_number}")
-        except Exception as e:
-            print(f"فشل ترحيل القيد التلقائي: {str(e)}")
-            # في بيئة الإنتاج قد نرغب في عدم ترحيله وترك المراجعة للمحاسب
+        return lines
+
+    def related_transactions(self, items=None):
+        """
+        حركات جهة الاتصال والخزنة والمخزون للفاتورة (غير محفوظة).
+        الأرصدة قبل/بعد الحركة تُحسب عند الحفظ أو بإعادة بناء الأرصدة بعد الإدراج الجماعي.
+        """
+        from finances.models import ContactTransaction, SafeTransaction, ProductTransaction
+
+        if items is None:
+            items = self.items.select_related('product_unit')
+
+        description = f"{self.get_invoice_type_display()} رقم {self.number}"
+        common = {'date': self.date, 'invoice': self, 'reference_number': self.number,
+                  'description': description, 'balance_before': 0, 'balance_after': 0}
+
+        # حركة جهة الاتصال بقيمة الفاتورة، وحركة السداد بالمبلغ المدفوع للبيع والشراء.
+        # المرتجعات لا يوجد لها نوع حركة رد نقدي، فتُسجل حركة المرتجع بالمبلغ غير المدفوع فقط.
+        settlement_type = self.SETTLEMENT_TRANSACTION_TYPES.get(self.invoice_type)
+        contact_amount = self.net_amount if settlement_type else self.net_amount - self.paid_amount
+        contact_transactions = [ContactTransaction(
+            contact=self.contact, amount=contact_amount,
+            transaction_type=self.TRANSACTION_TYPES[self.invoice_type], **common
+        )]
+        if settlement_type and self.paid_amount > 0:
+            contact_transactions.append(ContactTransaction(
+                contact=self.contact, amount=self.paid_amount, transaction_type=settlement_type, **common
+            ))
+
+        safe_transactions = []
+        if self.safe_id and self.paid_amount > 0:
+            safe_transactions.append(SafeTransaction(
+                safe=self.safe, contact=self.contact, amount=self.paid_amount,
+                transaction_type=self.TRANSACTION_TYPES[self.invoice_type], **common
+            ))
+
+        product_transactions = [
+            ProductTransaction(
+                product_id=item.product_id, product_unit_id=item.product_unit_id, store=self.store,
+                quantity=item.quantity, base_quantity=item.quantity * item.product_unit.conversion_factor,
+                transaction_type=self.invoice_type, invoice_item=item if item.pk else None, **common
+            )
+            for item in items
+        ]
+        return contact_transactions, safe_transactions, product_transactions
+
+    @balances.deferred()
+    def create_related_transactions(self):
+        """إنشاء المعاملات المالية والمخزنية المرتبطة بالفاتورة عند ترحيلها"""
+        # استيراد النماذج هنا لتجنب التبعيات الدائرية
+        from accounting.models import JournalEntry, JournalItem
+        from core.models import SystemSettings
+
+        settings = SystemSettings.get_settings()
+        items = list(self.items.select_related('product_unit'))
 
+        # حركات جهة الاتصال والخزنة والمخزون
+        for group in self.related_transactions(items):
+            for trans in group:
+                trans.save()
+
+        # إنشاء قيد محاسبي تلقائي
+        journal_entry = JournalEntry.objects.create(
+            entry_number=f"INV-{self.number}-{timezone.now().strftime('%Y%m%d%H%M%S')}",
+            date=self.date,
+            description=f"قيد تلقائي للفاتورة رقم {self.number} - {self.get_invoice_type_display()}",
+            reference=self.number
+        )
+
+        # منطق القيود المحاسبية بناءً على نوع الفاتورة
+        # ملاحظة: هذا تبسيط للعملية المحاسبية، يجب تخصيصه حسب شجرة الحسابات الفعلية
+        lines = self.journal_items(settings, items)
+        for line in lines:
+            line.journal_entry = journal_entry
+        JournalItem.objects.bulk_create(lines)
+
+        # خطأ الترحيل (قيد غير متوازن أو فترة مغلقة) يلغي ترحيل الفاتورة بالكامل،
+        # فلا تبقى حركات العملاء والخزنة والمخزون بدون قيد مرحل في دفتر الأستاذ
+        journal_entry.post()
 
     def post_invoice(self):
         """ترحيل الفاتورة وإنشاء المعاملات المالية والمخزنية"""
@@ -350,14 +567,15 @@ class Invoice(models.Model):
         # إذا كانت هناك معاملات موجودة بالفعل، قم بحذفها أولاً
         if contact_transactions.count() > 0 or safe_transactions.count() > 0 or product_transactions.count() > 0:
             print(f"حذف المعاملات الموجودة للفاتورة {self.number} قبل إعادة الترحيل")
-            with db_transaction.atomic():
-                contact_transactions.delete()
-                safe_transactions.delete()
-                product_transactions.delete()
+            with balances.deferred():
+                # الحذف الجماعي لا يمر بدالة delete، لذا نسجل الكائنات المتأثرة لإعادة حسابها
+                for queryset in (contact_transactions, safe_transactions, product_transactions):
+                    balances.touch_transactions(queryset)
+                    queryset.delete()
 
         # إنشاء المعاملات المالية والمخزنية
         try:
-            with db_transaction.atomic():
+            with balances.deferred():
                 # إنشاء المعاملات المالية والمخزنية
                 self.create_related_transactions()
 
@@ -409,42 +627,30 @@ class Invoice(models.Model):
 
             return False
 
-    def update_product_prices(self, settings):
-        """تحديث أسعار المنتجات بناءً على إعدادات النظام"""
-        print(f"=== تحديث أسعار المنتجات للفاتورة {self.number} ===")
-
+    def update_product_prices(self, settings, items=None):
+        """تحديث أسعار المنتجات بناءً على إعدادات النظام (لبنود معينة أو لكل بنود الفاتورة)"""
         # التحقق من إعدادات تحديث الأسعار
         update_purchase_price = settings.update_purchase_price
         update_sale_price = settings.update_sale_price
 
         # لا نقوم بتحديث الأسعار إذا كانت الإعدادات معطلة
         if not update_purchase_price and not update_sale_price:
-            print("تحديث الأسعار معطل في إعدادات النظام")
             return
 
         # تحديث أسعار المنتجات بناءً على نوع الفاتورة
-        for item in self.items.all():
-            product = item.product
+        for item in (self.items.all() if items is None else items):
             product_unit = item.product_unit
             unit_price = item.unit_price
 
-            print(f"معالجة المنتج: {product.name}, الوحدة: {product_unit.unit.name}, السعر: {unit_price}")
-
             # تحديث سعر الشراء للمنتج في فواتير الشراء
             if self.invoice_type == self.PURCHASE and update_purchase_price:
-                print(f"تحديث سعر الشراء للمنتج {product.name} من {product_unit.purchase_price} إلى {unit_price}")
                 product_unit.purchase_price = unit_price
                 product_unit.save(update_fields=['purchase_price'])
-                print(f"تم تحديث سعر الشراء للمنتج {product.name} إلى {product_unit.purchase_price}")
 
             # تحديث سعر البيع للمنتج في فواتير البيع
             elif self.invoice_type == self.SALE and update_sale_price:
-                print(f"تحديث سعر البيع للمنتج {product.name} من {product_unit.sale_price} إلى {unit_price}")
-                product_unit.sale_price = unit_price
-                product_unit.save(update_fields=['sale_price'])
-                print(f"تم تحديث سعر البيع للمنتج {product.name} إلى {product_unit.sale_price}")
-
-        print(f"=== تم تحديث أسعار المنتجات للفاتورة {self.number} ===")
+                product_unit.selling_price = unit_price
+                product_unit.save(update_fields=['selling_price'])
 
     def unpost_invoice(self):
         """إلغاء ترحيل الفاتورة (يتطلب إلغاء المعاملات المالية والمخزنية المرتبطة)"""
@@ -455,15 +661,12 @@ class Invoice(models.Model):
             # حذف المعاملات المالية والمخزنية المرتبطة
             from finances.models import ContactTransaction, SafeTransaction, ProductTransaction
 
-            with transaction.atomic():
-                # حذف حركات المنتجات
-                ProductTransaction.objects.filter(invoice=self).delete()
-
-                # حذف حركات الحسابات
-                ContactTransaction.objects.filter(invoice=self).delete()
-
-                # حذف حركات الخزنة
-                SafeTransaction.objects.filter(invoice=self).delete()
+            with balances.deferred():
+                # حذف حركات المنتجات والحسابات والخزنة مع تسجيل الكائنات المتأثرة لإعادة حسابها مرة واحدة
+                for model in (ProductTransaction, ContactTransaction, SafeTransaction):
+                    queryset = model.objects.filter(invoice=self)
+                    balances.touch_transactions(queryset)
+                    queryset.delete()
 
                 # تحديث حالة الفاتورة
                 self.is_posted = False
@@ -493,24 +696,38 @@ class InvoiceItem(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.invoice.number}"
 
-    def save(self, *args, **kwargs):
-        # جلب إعدادات النظام للحصول على نسبة الضريبة الافتراضية
-        from core.models import SystemSettings
-        settings = SystemSettings.get_settings()
-        
+    def calculate_price(self, settings=None):
+        """حساب مبالغ البند في الذاكرة (بدون حفظ)"""
+        if settings is None:
+            # جلب إعدادات النظام للحصول على نسبة الضريبة الافتراضية
+            from core.models import SystemSettings
+            settings = SystemSettings.get_settings()
+
         # إذا كانت نسبة الضريبة 0، نستخدم النسبة من إعدادات النظام
-        if self.tax_percentage == 0 and settings.vat_percentage > 0:
+        if not self.tax_percentage and settings.vat_percentage > 0:
             self.tax_percentage = settings.vat_percentage
 
+        # توحيد القيم القادمة من JSON أو الإعدادات (نصوص/أرقام عشرية) إلى Decimal
+        for field_name in ('quantity', 'unit_price', 'discount_percentage', 'tax_percentage'):
+            field = self._meta.get_field(field_name)
+            setattr(self, field_name, field.to_python(getattr(self, field_name)))
+
         self.total_price = self.quantity * self.unit_price
         self.discount_amount = self.total_price * (self.discount_percentage / 100)
         self.tax_amount = (self.total_price - self.discount_amount) * (self.tax_percentage / 100)
         self.net_price = self.total_price - self.discount_amount + self.tax_amount
-        
+
+        # تقريب المبالغ كما تُخزن في قاعدة البيانات حتى تطابق الإجماليات المحسوبة من الذاكرة
+        for field_name in ('total_price', 'discount_amount', 'tax_amount', 'net_price'):
+            places = self._meta.get_field(field_name).decimal_places
+            setattr(self, field_name, getattr(self, field_name).quantize(Decimal(1).scaleb(-places)))
+
+    def save(self, *args, update_invoice=True, **kwargs):
+        self.calculate_price()
         super().save(*args, **kwargs)
-        
-        # تحديث إجماليات الفاتورة بعد حفظ البند
-        if self.invoice:
+
+        # تحديث إجماليات الفاتورة بعد حفظ البند (يُعطل عند حفظ عدة بنود ثم حساب الإجماليات مرة واحدة)
+        if update_invoice and self.invoice:
             self.invoice.calculate_totals()
             self.invoice.save()
 
@@ -564,6 +781,12 @@ class Payment(models.Model):
     def save(self, *args, **kwargs):
         # حفظ النموذج أولاً
         is_new = self.pk is None
+        if is_new:
+            # ترقيم تلقائي ذري حسب نوع العملية
+            self.number = DocumentSequence.claim(
+                f'payment.{self.payment_type}', self.number,
+                documents=Payment.objects.filter(payment_type=self.payment_type),
+            )
         super().save(*args, **kwargs)
 
         # إذا كان جديدًا وليس له معاملة مرتبطة، قم بعملية الترحيل تلقائيًا
@@ -14,32 +14,6 @@ class PaymentSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['number', 'is_posted', 'created_transaction', 'contact_transaction']
 
-    def create(self, validated_data):
-        # Generate number if not provided
-        if not validated_data.get('number'):
-            import re
-            from django.utils import timezone
-            
-            payment_type = validated_data.get('payment_type')
-            prefix = 'PAY-' if payment_type == 'payment' else 'REC-'
-            
-            all_payments = Payment.objects.filter(payment_type=payment_type)
-            max_num = 0
-            for p in all_payments:
-                nums = re.findall(r'\d+', p.number)
-                if nums:
-                    try:
-                        current_num = int(nums[-1])
-                        if current_num < 1000000000:
-                            if current_num > max_num:
-                                max_num = current_num
-                    except ValueError:
-                        continue
-            
-            validated_data['number'] = f"{prefix}{max_num + 1}"
-            
-        return super().create(validated_data)
-
 class InvoiceItemSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     unit_name = serializers.CharField(source='product_unit.unit.name', read_only=True)
@@ -73,12 +47,8 @@ class InvoiceSerializer(serializers.ModelSerializer):
         validated_data.setdefault('tax_value', 0)
         
         invoice = Invoice.objects.create(**validated_data)
-        for item_data in items_data:
-            InvoiceItem.objects.create(invoice=invoice, **item_data)
-        
-        # إعادة حساب الإجماليات بعد إضافة البنود
-        invoice.calculate_totals()
-        invoice.save()
+        # إضافة البنود دفعة واحدة وإعادة حساب الإجماليات مرة واحدة
+        invoice.set_items(items_data)
         return invoice
 
     def update(self, instance, validated_data):
@@ -87,16 +57,51 @@ class InvoiceSerializer(serializers.ModelSerializer):
         # تحديث حقول الفاتورة
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
-        instance.save()
 
         if items_data is not None:
-            # حذف البنود القديمة وإضافة الجديدة
-            instance.items.all().delete()
-            for item_data in items_data:
-                InvoiceItem.objects.create(invoice=instance, **item_data)
-            
-            # إعادة حساب الإجماليات
-            instance.calculate_totals()
+            # تعديل البنود المتغيرة فقط وتعديل حركات الفاتورة المرحلة بالفروق مع حفظ الفاتورة
+            try:
+                instance.update_items(items_data)
+            except ValueError as e:
+                # تعذر ترحيل قيد تسوية التعديل، فأُلغي التعديل بالكامل
+                raise serializers.ValidationError(str(e))
+        else:
             instance.save()
         
         return instance
+
+
+class BulkInvoiceItemSerializer(serializers.Serializer):
+    """بند فاتورة في الاستيراد الجماعي (المعرفات فقط؛ التحقق من وجودها يتم دفعة واحدة)"""
+    product = serializers.IntegerField()
+    product_unit = serializers.IntegerField()
+    quantity = serializers.DecimalField(max_digits=15, decimal_places=3, min_value=0)
+    unit_price = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=0)
+    discount_percentage = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=100, default=0)
+    tax_percentage = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=100, default=0)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class BulkInvoiceSerializer(serializers.Serializer):
+    """فاتورة في الاستيراد الجماعي (InvoiceViewSet.bulk وأمر import_invoices)"""
+    number = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    date = serializers.DateTimeField(required=False)
+    invoice_type = serializers.ChoiceField(choices=Invoice.INVOICE_TYPE_CHOICES)
+    payment_type = serializers.ChoiceField(choices=Invoice.PAYMENT_TYPE_CHOICES)
+    contact = serializers.IntegerField()
+    store = serializers.IntegerField()
+    safe = serializers.IntegerField(required=False, allow_null=True)
+    representative = serializers.IntegerField(required=False, allow_null=True)
+    driver = serializers.IntegerField(required=False, allow_null=True)
+    discount_type = serializers.ChoiceField(choices=Invoice.DISCOUNT_TYPE_CHOICES, default='value')
+    discount_value = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=0, default=0)
+    tax_type = serializers.ChoiceField(choices=Invoice.TAX_TYPE_CHOICES, default='value')
+    tax_value = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=0, default=0)
+    paid_amount = serializers.DecimalField(max_digits=15, decimal_places=2, min_value=0, default=0)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    items = BulkInvoiceItemSerializer(many=True, allow_empty=False)
+
+    def validate(self, attrs):
+        if attrs['payment_type'] == Invoice.CASH and not attrs.get('safe'):
+            raise serializers.ValidationError({'safe': 'الخزنة مطلوبة للفواتير النقدية'})
+        return attrs
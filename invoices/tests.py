@@ -1,3 +1,104 @@
+import datetime
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+
+from accounting.models import Account, FinancialPeriod, JournalEntry
+from core.models import Branch, Company, Contact, Safe, Store, SystemSettings
+from finances.models import ContactTransaction, ProductStoreBalance, ProductTransaction, SafeTransaction
+from products.models import Product, ProductUnit, Unit
+
+from .bulk_import import import_invoices
+from .models import Invoice
+
+
+class BulkImportTests(TestCase):
+    """الصفوف غير الصالحة في الاستيراد الجماعي لا توقف الدفعة وتظهر أخطاؤها برقم الصف"""
+
+    @classmethod
+    def setUpTestData(cls):
+        company = Company.objects.create(name='C')
+        branch = Branch.objects.create(company=company, name='B')
+        cls.safe = Safe.objects.create(branch=branch, name='S', initial_balance=100, current_balance=100)
+        cls.store = Store.objects.create(branch=branch, name='ST')
+        cls.customer = Contact.objects.create(name='cust', contact_type='customer')
+
+        settings = SystemSettings.get_settings()
+        for index, field in enumerate(['sales_account', 'purchases_account', 'vat_output_account',
+                                       'vat_input_account', 'cogs_account']):
+            setattr(settings, field, Account.objects.create(name=field, code=f'9{index}', account_type='expense'))
+        settings.save()
+        for index, owner in enumerate([cls.customer, cls.store, cls.safe]):
+            owner.account = Account.objects.create(name=f'a{index}', code=f'8{index}', account_type='asset')
+            owner.save()
+
+        unit = Unit.objects.create(name='u', symbol='u')
+        cls.products = [Product.objects.create(name=f'p{index}') for index in range(2)]
+        cls.units = [ProductUnit.objects.create(product=product, unit=unit) for product in cls.products]
+
+    def row(self, **overrides):
+        row = {
+            'invoice_type': 'sale', 'payment_type': 'cash', 'contact': self.customer.pk, 'store': self.store.pk,
+            'safe': self.safe.pk,
+            'items': [{'product': unit.product_id, 'product_unit': unit.pk, 'quantity': '2', 'unit_price': '10'}
+                      for unit in self.units],
+        }
+        row.update(overrides)
+        return row
+
+    def test_invalid_rows_are_reported_and_valid_rows_posted(self):
+        mismatched = self.row()
+        mismatched['items'][0]['product_unit'] = self.units[1].pk
+        rows = [
+            self.row(),
+            {'invoice_type': 'sale'},
+            self.row(contact=999999),
+            mismatched,
+            self.row(),
+        ]
+
+        result = import_invoices(rows)
+
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(result['failed'], 3)
+        self.assertEqual([invoice['row'] for invoice in result['invoices']], [0, 4])
+        errors = {error['row']: error['errors'] for error in result['errors']}
+        self.assertEqual(sorted(errors), [1, 2, 3])
+        self.assertIn('items', errors[1])
+        self.assertEqual(errors[2], {'contact': ['جهة الاتصال غير موجودة']})
+        self.assertEqual(errors[3]['items'][0], {'product_unit': ['وحدة المنتج لا تخص هذا المنتج']})
+        self.assertEqual(errors[3]['items'][1], {})
+
+        # الفواتير الصالحة مرحلة بكل حركاتها وقيودها
+        invoices = Invoice.objects.filter(pk__in=[invoice['id'] for invoice in result['invoices']])
+        self.assertEqual(invoices.filter(is_posted=True).count(), 2)
+        # الفاتورة النقدية: حركة بالفاتورة وحركة بالتحصيل على حساب العميل
+        self.assertEqual(ContactTransaction.objects.filter(invoice__in=invoices).count(), 4)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_balance, self.customer.initial_balance)
+        self.assertEqual(SafeTransaction.objects.filter(invoice__in=invoices).count(), 2)
+        self.assertEqual(ProductTransaction.objects.filter(invoice__in=invoices).count(), 4)
+        self.assertEqual(JournalEntry.objects.filter(is_posted=True).count(), 2)
+        self.safe.refresh_from_db()
+        self.assertEqual(self.safe.current_balance, Decimal('100') + sum(invoice.net_amount for invoice in invoices))
+        self.assertEqual(ProductStoreBalance.get_quantity(self.products[0], self.store), Decimal('-4'))
+
+    def test_closed_period_is_a_row_error(self):
+        today = timezone.localdate()
+        FinancialPeriod.objects.create(name='closed', start_date=today - datetime.timedelta(days=40),
+                                       end_date=today - datetime.timedelta(days=20), is_closed=True)
+        closed_date = timezone.now() - datetime.timedelta(days=30)
+
+        result = import_invoices([self.row(), self.row(date=closed_date.isoformat())])
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(result['errors'], [{'row': 1, 'errors': {'date': ['لا يمكن إضافة فواتير في فترة مالية مغلقة']}}])
+
+    def test_atomic_batch_creates_nothing_on_error(self):
+        result = import_invoices([self.row(), self.row(store=999999)], atomic=True)
 
-# Create your tests here.
+        self.assertEqual(result['created'], 0)
+        self.assertEqual([error['row'] for error in result['errors']], [1])
+        self.assertFalse(Invoice.objects.exists())
+        self.assertFalse(ContactTransaction.objects.exists())
@@ -8,11 +8,12 @@ from django.db import transaction
 from django.utils import timezone
 from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
 from django.template.loader import render_to_string
-from django.db.models import Q, Sum
+from django.db.models import Sum
 
 from .models import Invoice, InvoiceItem, Payment
 from .forms import InvoiceForm, InvoiceItemFormSet, PaymentForm
-from core.models import Contact, Store, Safe, Representative, Driver, SystemSettings
+from core import search
+from core.models import Contact, Store, Safe, Representative, Driver, SystemSettings, DocumentSequence
 from products.models import Product, ProductUnit
 
 @login_required
@@ -27,11 +28,8 @@ def invoice_list(request):
 
     # تطبيق البحث
     if query:
-        invoices = invoices.filter(
-            Q(number__icontains=query) |
-            Q(contact__name__icontains=query) |
-            Q(notes__icontains=query)
-        )
+        # فهرس البحث بدلاً من icontains عبر جدول جهات الاتصال
+        invoices = invoices.filter(search.q('invoice', query) | search.q('contact', query, 'contact_id'))
 
     # تصفية حسب النوع
     if invoice_type:
@@ -61,11 +59,8 @@ def sale_invoice_list(request):
 
     # تطبيق البحث
     if query:
-        invoices = invoices.filter(
-            Q(number__icontains=query) |
-            Q(contact__name__icontains=query) |
-            Q(notes__icontains=query)
-        )
+        # فهرس البحث بدلاً من icontains عبر جدول جهات الاتصال
+        invoices = invoices.filter(search.q('invoice', query) | search.q('contact', query, 'contact_id'))
 
     # تصفية حسب حالة الترحيل
     if is_posted:
@@ -92,11 +87,8 @@ def purchase_invoice_list(request):
 
     # تطبيق البحث
     if query:
-        invoices = invoices.filter(
-            Q(number__icontains=query) |
-            Q(contact__name__icontains=query) |
-            Q(notes__icontains=query)
-        )
+        # فهرس البحث بدلاً من icontains عبر جدول جهات الاتصال
+        invoices = invoices.filter(search.q('invoice', query) | search.q('contact', query, 'contact_id'))
 
     # تصفية حسب حالة الترحيل
     if is_posted:
@@ -123,11 +115,8 @@ def sale_return_invoice_list(request):
 
     # تطبيق البحث
     if query:
-        invoices = invoices.filter(
-            Q(number__icontains=query) |
-            Q(contact__name__icontains=query) |
-            Q(notes__icontains=query)
-        )
+        # فهرس البحث بدلاً من icontains عبر جدول جهات الاتصال
+        invoices = invoices.filter(search.q('invoice', query) | search.q('contact', query, 'contact_id'))
 
     # تصفية حسب حالة الترحيل
     if is_posted:
@@ -154,11 +143,8 @@ def purchase_return_invoice_list(request):
 
     # تطبيق البحث
     if query:
-        invoices = invoices.filter(
-            Q(number__icontains=query) |
-            Q(contact__name__icontains=query) |
-            Q(notes__icontains=query)
-        )
+        # فهرس البحث بدلاً من icontains عبر جدول جهات الاتصال
+        invoices = invoices.filter(search.q('invoice', query) | search.q('contact', query, 'contact_id'))
 
     # تصفية حسب حالة الترحيل
     if is_posted:
@@ -201,24 +187,26 @@ def invoice_detail(request, pk):
         'product_transactions': product_transactions
     })
 
+def _invoice_items_data(items):
+    """تحويل بنود الفاتورة القادمة من النموذج (items_data) إلى حقول InvoiceItem"""
+    return [
+        {
+            'product_id': item['product'],
+            'product_unit_id': item['product_unit'],
+            'quantity': item['quantity'],
+            'unit_price': item['unit_price'],
+            **({'id': item['id']} if item.get('id') else {}),
+        }
+        for item in items
+    ]
+
 @login_required
 def invoice_create(request):
     """إنشاء فاتورة جديدة"""
-    # إنشاء رقم فاتورة جديد
-    last_invoice = Invoice.objects.order_by('-id').first()
-    if not last_invoice:
-        new_number = "1"  # أول فاتورة في النظام
-    else:
-        # استخراج الرقم من آخر فاتورة
-        try:
-            if '-' in last_invoice.number:
-                last_number = int(last_invoice.number.split('-')[1])
-            else:
-                last_number = int(last_invoice.number)
-            new_number = str(last_number + 1)  # زيادة الرقم بمقدار 1
-        except (ValueError, IndexError):
-            # في حالة حدوث خطأ في تحليل الرقم، استخدم الرقم 1
-            new_number = "1"
+    # رقم الفاتورة المقترح للعرض؛ الرقم النهائي يُحجز ذريًا عند حفظ الفاتورة
+    new_number = DocumentSequence.peek(
+        f"invoice.{request.POST.get('invoice_type') or request.GET.get('type', 'sale')}"
+    )
 
     if request.method == 'POST':
         print("\n\n=== بدء معالجة طلب POST ===")
@@ -252,7 +240,7 @@ def invoice_create(request):
             })
 
         # التحقق من وجود حقول مطلوبة
-        required_fields = ['invoice_type', 'payment_type', 'contact', 'store', 'safe', 'number']
+        required_fields = ['invoice_type', 'payment_type', 'contact', 'store', 'safe']
         missing_fields = [field for field in required_fields if not request.POST.get(field)]
 
         # طباعة قيم الحقول المطلوبة
@@ -288,8 +276,6 @@ def invoice_create(request):
                 with transaction.atomic():
                     print("بدء المعاملة")
                     invoice = form.save(commit=False)
-                    if not invoice.number:
-                        invoice.number = new_number
 
                     print("بيانات الفاتورة قبل الحفظ:", {
                         'id': invoice.id,
@@ -304,55 +290,13 @@ def invoice_create(request):
                     invoice.save()
                     print("تم حفظ الفاتورة:", invoice.id)
 
-                    # حذف البنود القديمة في حالة التعديل
-                    if invoice.id:
-                        deleted_count = InvoiceItem.objects.filter(invoice=invoice).delete()
-                        print("تم حذف البنود القديمة:", deleted_count)
-
-                    # إضافة البنود الجديدة
-                    for i, item in enumerate(items):
-                        print(f"إضافة بند #{i+1}:", item)
-                        try:
-                            InvoiceItem.objects.create(
-                                invoice=invoice,
-                                product_id=item['product'],
-                                product_unit_id=item['product_unit'],
-                                quantity=item['quantity'],
-                                unit_price=item['unit_price'],
-                                discount_amount=item['discount_amount'],
-                                tax_amount=item['tax_amount'],
-                                net_price=item['net_price']
-                            )
-                            print(f"تم إضافة البند #{i+1} بنجاح")
-                        except Exception as item_error:
-                            print(f"خطأ في إضافة البند #{i+1}:", str(item_error))
-                            raise Exception(f"خطأ في إضافة البند #{i+1}: {str(item_error)}")
-
-                    # تحديث إجماليات الفاتورة
-                    print("حساب إجماليات الفاتورة")
-                    if hasattr(invoice, 'calculate_totals') and callable(getattr(invoice, 'calculate_totals')):
-                        invoice.calculate_totals()
-                        print("تم استدعاء دالة calculate_totals بنجاح")
-                    else:
-                        print("تحذير: دالة calculate_totals غير موجودة، حساب الإجماليات يدوياً")
-                        # حساب الإجماليات يدوياً
-                        items = invoice.items.all()
-                        total_amount = sum(item.quantity * item.unit_price for item in items)
-                        discount_amount = sum(item.discount_amount for item in items)
-                        tax_amount = sum(item.tax_amount for item in items)
-
-                        invoice.total_amount = total_amount
-                        invoice.discount_amount = discount_amount
-                        invoice.tax_amount = tax_amount
-                        invoice.net_amount = total_amount - discount_amount + tax_amount
-
-                        if invoice.payment_type == 'cash':
-                            invoice.paid_amount = invoice.net_amount
-                            invoice.remaining_amount = 0
-                        else:
-                            invoice.remaining_amount = invoice.net_amount - invoice.paid_amount
-
-                    invoice.save()
+                    # إضافة البنود دفعة واحدة وحساب الإجماليات وحفظ الفاتورة مرة واحدة
+                    try:
+                        invoice.set_items(_invoice_items_data(items))
+                        print(f"تم إضافة {len(items)} بند بنجاح")
+                    except Exception as item_error:
+                        print("خطأ في إضافة البنود:", str(item_error))
+                        raise Exception(f"خطأ في إضافة البنود: {str(item_error)}")
                     print("تم حفظ الفاتورة بعد حساب الإجماليات")
                     print("بيانات الفاتورة النهائية:", {
                         'id': invoice.id,
@@ -581,154 +525,50 @@ def invoice_edit(request, pk):
     invoice = get_object_or_404(Invoice, pk=pk)
 
     # يمكن تعديل الفاتورة حتى لو كانت مرحلة
-    # سيتم إلغاء الترحيل وإعادة الترحيل تلقائياً
+    # سيتم تعديل حركاتها وقيدها بفروق التعديل تلقائياً
 
     if request.method == 'POST':
         form = InvoiceForm(request.POST, instance=invoice)
         if form.is_valid():
-            with transaction.atomic():
-                invoice = form.save()
-
-                # معالجة بنود الفاتورة
-                items_data = request.POST.get('items_data', '[]')
-                import json
-                items = json.loads(items_data)
-
-                # حذف البنود القديمة
-                InvoiceItem.objects.filter(invoice=invoice).delete()
-
-                # إضافة البنود الجديدة
-                for item in items:
-                    InvoiceItem.objects.create(
-                        invoice=invoice,
-                        product_id=item['product'],
-                        product_unit_id=item['product_unit'],
-                        quantity=item['quantity'],
-                        unit_price=item['unit_price'],
-                        discount_amount=item['discount_amount'],
-                        tax_amount=item['tax_amount'],
-                        net_price=item['net_price']
-                    )
-
-                # تحديث إجماليات الفاتورة
-                invoice.calculate_totals()
-                invoice.save()
+            try:
+                with transaction.atomic():
+                    # حفظ رأس الفاتورة يتم مع البنود حتى تُقارن الفاتورة الجديدة بالقديمة
+                    invoice = form.save(commit=False)
 
-                # إعادة ترحيل الفاتورة بعد التعديل
-                try:
-                    # إلغاء الترحيل أولاً إذا كانت الفاتورة مرحلة
-                    if invoice.is_posted and hasattr(invoice, 'unpost_invoice') and callable(getattr(invoice, 'unpost_invoice')):
-                        invoice.unpost_invoice()
-                        print("تم إلغاء ترحيل الفاتورة بنجاح")
-                    else:
-                        # إلغاء الترحيل يدويًا إذا لم تكن دالة unpost_invoice متاحة
-                        from finances.models import ContactTransaction, SafeTransaction, ProductTransaction
-                        with transaction.atomic():
-                            ContactTransaction.objects.filter(invoice=invoice).delete()
-                            SafeTransaction.objects.filter(invoice=invoice).delete()
-                            ProductTransaction.objects.filter(invoice=invoice).delete()
-                            invoice.is_posted = False
-                            invoice.save(update_fields=['is_posted'])
-                            print("تم إلغاء ترحيل الفاتورة يدويًا")
-
-                    # إعادة ترحيل الفاتورة
-                    print("=== بدء إعادة ترحيل الفاتورة ===")
-                    if hasattr(invoice, 'post_invoice') and callable(getattr(invoice, 'post_invoice')):
-                        # تأكد من أن الفاتورة غير مرحلة أولاً
-                        invoice.is_posted = False
-                        invoice.save(update_fields=['is_posted'])
-
-                        # ثم قم بترحيلها
-                        result = invoice.post_invoice()
-                        print(f"نتيجة استدعاء post_invoice: {result}")
-                        print(f"حالة الترحيل بعد الاستدعاء: {invoice.is_posted}")
-
-                        # التحقق من نجاح إنشاء المعاملات
-                        from finances.models import ContactTransaction, SafeTransaction, ProductTransaction
-                        contact_transactions = ContactTransaction.objects.filter(invoice=invoice)
-                        safe_transactions = SafeTransaction.objects.filter(invoice=invoice)
-                        product_transactions = ProductTransaction.objects.filter(invoice=invoice)
-
-                        print(f"عدد معاملات العملاء/الموردين بعد الترحيل: {contact_transactions.count()}")
-                        print(f"عدد معاملات الخزنة بعد الترحيل: {safe_transactions.count()}")
-                        print(f"عدد معاملات المخزون بعد الترحيل: {product_transactions.count()}")
-
-                        # التحقق من إنشاء جميع المعاملات المطلوبة
-                        items_count = invoice.items.count()
-                        expected_product_transactions = items_count
-                        has_error = False
-                        error_message = ""
-
-                        if contact_transactions.count() == 0:
-                            print("تحذير: لم يتم إنشاء معاملات العملاء/الموردين")
-                            # محاولة إعادة الترحيل
-                            invoice.is_posted = False
-                            invoice.save(update_fields=['is_posted'])
-                            result = invoice.post_invoice()
-                            print(f"نتيجة إعادة الترحيل: {result}")
+                    # معالجة بنود الفاتورة
+                    items_data = request.POST.get('items_data', '[]')
+                    import json
+                    items = json.loads(items_data)
 
-                            # التحقق مرة أخرى
-                            contact_transactions = ContactTransaction.objects.filter(invoice=invoice)
-                            safe_transactions = SafeTransaction.objects.filter(invoice=invoice)
-                            product_transactions = ProductTransaction.objects.filter(invoice=invoice)
+                    # تعديل البنود المتغيرة فقط، والفاتورة المرحلة تُعدل حركاتها وقيدها بالفروق بدلاً من إعادة ترحيلها
+                    invoice.update_items(_invoice_items_data(items))
 
-                            print(f"عدد معاملات العملاء/الموردين بعد إعادة الترحيل: {contact_transactions.count()}")
-                            print(f"عدد معاملات الخزنة بعد إعادة الترحيل: {safe_transactions.count()}")
-                            print(f"عدد معاملات المخزون بعد إعادة الترحيل: {product_transactions.count()}")
+                    messages.success(request, 'تم تعديل الفاتورة وترحيلها بنجاح')
+                    # طباعة معلومات التوجيه
+                    print(f"=== معلومات التوجيه ===")
+                    print(f"معرف الفاتورة: {invoice.id}")
+                    print(f"رقم الفاتورة: {invoice.number}")
+                    print(f"URL التوجيه: {reverse('invoice_detail', kwargs={'pk': invoice.id})}")
 
-                            # التحقق مرة أخرى بعد إعادة الترحيل
-                            if contact_transactions.count() == 0:
-                                has_error = True
-                                error_message += "لم يتم إنشاء معاملات العملاء/الموردين. "
-
-                        if (invoice.payment_type == 'cash' or invoice.paid_amount > 0) and safe_transactions.count() == 0:
-                            print("تحذير: لم يتم إنشاء معاملات الخزنة للفاتورة النقدية أو الفاتورة الآجلة مع دفعة جزئية")
-                            has_error = True
-                            error_message += "لم يتم إنشاء معاملات الخزنة للفاتورة النقدية أو الفاتورة الآجلة مع دفعة جزئية. "
-
-                        if product_transactions.count() != expected_product_transactions:
-                            print(f"تحذير: عدد معاملات المخزون ({product_transactions.count()}) لا يتطابق مع عدد بنود الفاتورة ({expected_product_transactions})")
-                            has_error = True
-                            error_message += f"عدد معاملات المخزون ({product_transactions.count()}) لا يتطابق مع عدد بنود الفاتورة ({expected_product_transactions}). "
-
-                        # إذا كان هناك خطأ، قم بالتراجع عن تعديل الفاتورة
-                        if has_error:
-                            print("خطأ في ترحيل الفاتورة:", error_message)
-                            # إلغاء المعاملة بإثارة استثناء
-                            raise Exception(f"فشل في ترحيل الفاتورة: {error_message}")
+                    # التحقق مما إذا كان الطلب يتوقع استجابة JSON
+                    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                        return JsonResponse({
+                            'success': True,
+                            'message': 'تم تعديل الفاتورة وترحيلها بنجاح',
+                            'redirect_url': reverse('invoice_detail', kwargs={'pk': invoice.id})
+                        })
                     else:
-                        print("تحذير: دالة post_invoice غير موجودة، استخدام create_related_transactions كبديل")
-                        # استخدام create_related_transactions كبديل
-                        if hasattr(invoice, 'create_related_transactions') and callable(getattr(invoice, 'create_related_transactions')):
-                            invoice.create_related_transactions()
-                            invoice.is_posted = True
-                            invoice.save(update_fields=['is_posted'])
-                            print("تم إنشاء المعاملات المالية والمخزنية بنجاح")
-                        else:
-                            print("تحذير: دالة create_related_transactions غير موجودة أيضًا")
-                except Exception as e:
-                    print("خطأ في إعادة ترحيل الفاتورة:", str(e))
-                    import traceback
-                    print("تتبع الخطأ:", traceback.format_exc())
-                    # لا نريد إيقاف العملية إذا فشلت عملية الترحيل
-
-                messages.success(request, 'تم تعديل الفاتورة وترحيلها بنجاح')
-                # طباعة معلومات التوجيه
-                print(f"=== معلومات التوجيه ===")
-                print(f"معرف الفاتورة: {invoice.id}")
-                print(f"رقم الفاتورة: {invoice.number}")
-                print(f"URL التوجيه: {reverse('invoice_detail', kwargs={'pk': invoice.id})}")
-
-                # التحقق مما إذا كان الطلب يتوقع استجابة JSON
+                        # استخدام HttpResponseRedirect بدلاً من redirect للتأكد من التوجيه الصحيح
+                        return HttpResponseRedirect(reverse('invoice_detail', kwargs={'pk': invoice.id}))
+            except ValueError as e:
+                # تعذر ترحيل قيد تسوية التعديل (فترة مغلقة أو قيد غير متوازن) فأُلغي التعديل بالكامل
+                messages.error(request, f'حدث خطأ أثناء تعديل الفاتورة: {str(e)}')
                 if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                     return JsonResponse({
-                        'success': True,
-                        'message': 'تم تعديل الفاتورة وترحيلها بنجاح',
-                        'redirect_url': reverse('invoice_detail', kwargs={'pk': invoice.id})
-                    })
-                else:
-                    # استخدام HttpResponseRedirect بدلاً من redirect للتأكد من التوجيه الصحيح
-                    return HttpResponseRedirect(reverse('invoice_detail', kwargs={'pk': invoice.id}))
+                        'success': False,
+                        'message': f'حدث خطأ أثناء تعديل الفاتورة: {str(e)}',
+                        'error': str(e),
+                    }, status=400)
     else:
         form = InvoiceForm(instance=invoice)
 
@@ -984,34 +824,17 @@ def payment_to_supplier_list(request):
 @login_required
 def payment_add(request):
     """إضافة دفعة جديدة"""
-    # إنشاء رقم دفعة جديد
-    last_payment = Payment.objects.order_by('-id').first()
-    if not last_payment:
-        new_number = "1"  # أول مستند في النظام
-    else:
-        # استخراج الرقم من آخر مستند
-        try:
-            if '-' in last_payment.number:
-                last_number = int(last_payment.number.split('-')[1])
-            else:
-                last_number = int(last_payment.number)
-            new_number = str(last_number + 1)  # زيادة الرقم بمقدار 1
-        except (ValueError, IndexError):
-            # في حالة حدوث خطأ في تحليل الرقم، استخدم الرقم 1
-            new_number = "1"
-
     if request.method == 'POST':
         form = PaymentForm(request.POST)
         if form.is_valid():
             with transaction.atomic():
+                # يُولد رقم المستند تلقائيًا عند الحفظ إذا تُرك فارغًا
                 payment = form.save(commit=False)
-                if not payment.number:
-                    payment.number = new_number
                 payment.save()
                 messages.success(request, 'تم إضافة الدفعة بنجاح')
                 return redirect('payment_detail', pk=payment.id)
     else:
-        form = PaymentForm(initial={'number': new_number, 'date': timezone.now().date()})
+        form = PaymentForm(initial={'date': timezone.now().date()})
 
         # تعديل قائمة جهات الاتصال لإضافة نوع جهة الاتصال إلى الاسم
         contact_choices = []
@@ -1,4 +1,8 @@
-from rest_framework import viewsets
+from django.db.models import Prefetch
+from django.utils.http import parse_etags
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .models import Category, Unit, Product, ProductUnit
 from .serializers import (
@@ -9,21 +13,99 @@ from .serializers import (
 )
 
 class CategoryViewSet(viewsets.ModelViewSet):
-    queryset = Category.objects.all()
+    queryset = Category.objects.select_related('parent').order_by('id')
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['parent']
+    search_fields = ['name']
 
 class UnitViewSet(viewsets.ModelViewSet):
-    queryset = Unit.objects.all()
+    queryset = Unit.objects.order_by('id')
     serializer_class = UnitSerializer
     permission_classes = [IsAuthenticated]
+    search_fields = ['name', 'symbol']
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('category', 'default_store').prefetch_related(
+        Prefetch('units', queryset=ProductUnit.objects.select_related('unit'))
+    ).order_by('id')
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['category', 'default_store', 'is_active']
+    search_fields = ['name', 'code', 'barcode']
+    search_index = [('product', 'pk')]
+    ordering_fields = ['name', 'code', 'current_balance']
+
+    @action(detail=False, methods=['get'])
+    def catalog(self, request):
+        """
+        كتالوج مضغوط (منتجات + وحدات + أسعار) للنسخة المحلية في الواجهات.
+        يدعم If-None-Match (304 بدون تغيير) و ?since=<version> لإرجاع التغييرات فقط.
+        """
+        from . import catalog
+
+        since = request.query_params.get('since')
+        if since not in (None, ''):
+            try:
+                since = int(since)
+            except ValueError:
+                return Response({'error': 'since must be an integer version'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            since = None
+
+        version = catalog.current_version()
+        etag = catalog.etag(version)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')) or (since is not None and since >= version):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = catalog.build(since)
+            etag = catalog.etag(data['version'])
+            response = Response(data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def _lookup_contact(self, contact_id):
+        """جهة الاتصال لتحديد نظام التسعير؛ المعرف غير الرقمي يُرجع 400 بدلاً من خطأ في الاستعلام"""
+        from rest_framework.exceptions import ValidationError
+        from core.models import Contact
+        if contact_id in (None, ''):
+            return None
+        try:
+            contact_id = int(contact_id)
+        except (TypeError, ValueError):
+            raise ValidationError({'error': 'contact must be an integer id'})
+        return Contact.objects.filter(pk=contact_id).only('id', 'pricing_system').first()
+
+    @action(detail=False, methods=['get'])
+    def lookup(self, request):
+        """حل باركود أو كود صنف إلى وحدة منتج وسعرها: ?code=<code>&contact=<id>"""
+        from . import lookup
+
+        code = request.query_params.get('code')
+        if not code:
+            return Response({'error': 'code is required'}, status=status.HTTP_400_BAD_REQUEST)
+        entry = lookup.lookup(code, self._lookup_contact(request.query_params.get('contact')))
+        if entry is None:
+            return Response({'error': 'product not found', 'code': code}, status=status.HTTP_404_NOT_FOUND)
+        return Response(entry)
+
+    @action(detail=False, methods=['post'], url_path='lookup/batch')
+    def lookup_batch(self, request):
+        """حل سلة أكواد ممسوحة دفعة واحدة: {'codes': [...], 'contact': <id>}"""
+        from . import lookup
+
+        codes = request.data.get('codes')
+        if not isinstance(codes, list):
+            return Response({'error': 'codes must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        results = lookup.lookup_many(codes, self._lookup_contact(request.data.get('contact')))
+        return Response({
+            'results': [results.get(str(code).strip()) if code is not None else None for code in codes],
+            'not_found': [code for code, entry in results.items() if entry is None],
+        })
 
 class ProductUnitViewSet(viewsets.ModelViewSet):
-    queryset = ProductUnit.objects.all()
+    queryset = ProductUnit.objects.select_related('unit').order_by('id')
     serializer_class = ProductUnitSerializer
     permission_classes = [IsAuthenticated]
+    filterset_fields = ['product', 'unit']
@@ -0,0 +1,92 @@
+"""
+كتالوج المنتجات المضغوط للمزامنة مع الواجهات (ProductViewSet.catalog).
+
+كل منتج ووحدة منتج يحمل catalog_version = إصدار آخر تغيير عليه، من عداد ذري في DocumentSequence
+('products.catalog') يزيد مع كل تعديل في بيانات المنتج أو وحداته أو أسعارها، ومع كل حذف.
+العميل يحتفظ بنسخة محلية ثم:
+- يرسل If-None-Match بالـ ETag السابق فيستلم 304 إذا لم يتغير شيء
+- يرسل ?since=<version> فيستلم الصفوف المتغيرة فقط مع معرفات الصفوف الحالية (لحذف ما اختفى)
+
+الصيغة عمودية: {'columns': [...], 'rows': [[...], ...]} بدلاً من تكرار أسماء الحقول في كل صف.
+"""
+
+SEQUENCE = 'products.catalog'
+
+PRODUCT_COLUMNS = ['id', 'name', 'code', 'barcode', 'category', 'default_store', 'tax_rate', 'is_active']
+PRODUCT_UNIT_COLUMNS = ['id', 'product', 'unit', 'conversion_factor', 'purchase_price', 'selling_price', 'barcode',
+                        'is_default_purchase', 'is_default_sale']
+UNIT_COLUMNS = ['id', 'name', 'symbol']
+
+
+def current_version():
+    """إصدار الكتالوج الحالي (0 إذا لم يتغير شيء بعد)"""
+    from core.models import DocumentSequence
+    return DocumentSequence.objects.filter(document_type=SEQUENCE, branch__isnull=True, year=0) \
+        .values_list('last_number', flat=True).first() or 0
+
+
+def next_version():
+    """حجز إصدار جديد (يُلغى مع المعاملة إذا تراجعت)"""
+    from core.models import DocumentSequence
+    return int(DocumentSequence.next_number(SEQUENCE))
+
+
+def stamp_instance(instance, update_fields=None):
+    """
+    تعيين إصدار جديد لمنتج أو وحدة منتج قبل حفظه إذا تغيرت حقول الكتالوج.
+    تعيد update_fields بعد إضافة catalog_version إليها عند الحاجة.
+    """
+    if update_fields is not None:
+        update_fields = set(update_fields)
+        if not update_fields & instance.CATALOG_FIELDS:
+            return update_fields
+        update_fields.add('catalog_version')
+    instance.catalog_version = next_version()
+    return update_fields
+
+
+def stamp(model, pks):
+    """تعيين إصدار جديد لصفوف عُدلت بتحديث جماعي (bulk_update / update) لا يمر على save()"""
+    pks = list(pks)
+    if not pks:
+        return None
+    version = next_version()
+    model.objects.filter(pk__in=pks).update(catalog_version=version)
+    return version
+
+
+def etag(version):
+    return f'"catalog-{version}"'
+
+
+def _table(columns, queryset):
+    return {'columns': columns, 'rows': [list(row) for row in queryset.values_list(*columns)]}
+
+
+def build(since=None):
+    """
+    بيانات الكتالوج كاملة، أو الصفوف المتغيرة بعد الإصدار since فقط.
+    جدول الوحدات صغير فيُرسل كاملاً دائمًا.
+    """
+    from .models import Product, ProductUnit, Unit
+
+    # الإصدار يُقرأ قبل البيانات: أي تغيير لاحق سيظهر في المزامنة التالية
+    version = current_version()
+    products = Product.objects.order_by('id')
+    product_units = ProductUnit.objects.order_by('id')
+    if since is not None:
+        products = products.filter(catalog_version__gt=since)
+        product_units = product_units.filter(catalog_version__gt=since)
+
+    data = {
+        'version': version,
+        'since': since,
+        'products': _table(PRODUCT_COLUMNS, products),
+        'product_units': _table(PRODUCT_UNIT_COLUMNS, product_units),
+        'units': _table(UNIT_COLUMNS, Unit.objects.order_by('id')),
+    }
+    if since is not None:
+        # الحذف لا يترك صفًا متغيرًا؛ معرفات الصفوف الحالية تكفي العميل لحذف ما اختفى
+        data['product_ids'] = list(Product.objects.order_by('id').values_list('id', flat=True))
+        data['product_unit_ids'] = list(ProductUnit.objects.order_by('id').values_list('id', flat=True))
+    return data
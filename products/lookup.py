@@ -0,0 +1,160 @@
+"""
+البحث عن صنف بالباركود أو الكود (شاشات البيع والماسح الضوئي).
+
+أي كود يُحل إلى وحدة منتج بالترتيب التالي:
+1. باركود وحدة المنتج (ProductUnit.barcode) -> الوحدة نفسها
+2. باركود المنتج أو كوده (Product.barcode / Product.code) -> وحدة البيع الافتراضية للمنتج
+
+النتائج تُحفظ في ذاكرة العملية (LRU) بمفتاح (إصدار الكتالوج، الكود)، فأي حفظ لمنتج أو وحدة
+يزيد إصدار الكتالوج (products/catalog.py) ويجعل النتائج السابقة غير مستخدمة في كل العمليات،
+كما تُفرغ الذاكرة محليًا فورًا من products/signals.py.
+إصدار الكتالوج نفسه يُقرأ من قاعدة البيانات مرة كل PRODUCT_LOOKUP_VERSION_TTL ثانية على الأكثر
+حتى لا تحتاج القراءة من الذاكرة لأي استعلام.
+
+الإعدادات (acc/settings.py):
+    PRODUCT_LOOKUP_CACHE_SIZE: أقصى عدد أكواد محفوظة (الافتراضي 4096)
+    PRODUCT_LOOKUP_VERSION_TTL: أقصى تأخير بالثواني لرؤية تعديلات العمليات الأخرى (الافتراضي 1)
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import catalog
+
+UNIT_BARCODE = 'unit_barcode'
+PRODUCT_BARCODE = 'product_barcode'
+PRODUCT_CODE = 'product_code'
+
+_MISSING = object()
+_cache = OrderedDict()
+_lock = threading.Lock()
+_version = {'value': None, 'checked_at': 0.0}
+
+
+def _cache_size():
+    return getattr(settings, 'PRODUCT_LOOKUP_CACHE_SIZE', 4096)
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        _version['value'] = None
+
+
+def _catalog_version():
+    now = time.monotonic()
+    with _lock:
+        if _version['value'] is not None and now - _version['checked_at'] < getattr(settings, 'PRODUCT_LOOKUP_VERSION_TTL', 1):
+            return _version['value']
+    version = catalog.current_version()
+    with _lock:
+        _version['value'], _version['checked_at'] = version, now
+    return version
+
+
+def _cache_get(key):
+    with _lock:
+        value = _cache.get(key, _MISSING)
+        if value is not _MISSING:
+            _cache.move_to_end(key)
+        return value
+
+
+def _cache_set(key, value):
+    with _lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > _cache_size():
+            _cache.popitem(last=False)
+
+
+def _entry(product_unit, matched):
+    product = product_unit.product
+    return {
+        'matched': matched,
+        'product': product.id,
+        'product_name': product.name,
+        'product_code': product.code,
+        'tax_rate': product.tax_rate,
+        'product_unit': product_unit.id,
+        'unit': product_unit.unit_id,
+        'unit_name': product_unit.unit.name,
+        'conversion_factor': product_unit.conversion_factor,
+        'purchase_price': product_unit.purchase_price,
+        'selling_price': product_unit.selling_price,
+    }
+
+
+def _resolve(codes):
+    """حل مجموعة أكواد من قاعدة البيانات باستعلامين (باركود الوحدات ثم المنتجات)"""
+    from django.db.models import Q
+    from .models import ProductUnit
+
+    units = ProductUnit.objects.select_related('product', 'unit').filter(product__is_active=True)
+    found = {}
+    for product_unit in units.filter(barcode__in=codes).order_by('id'):
+        found.setdefault(product_unit.barcode, _entry(product_unit, UNIT_BARCODE))
+
+    remaining = [code for code in codes if code not in found]
+    if remaining:
+        # كل وحدات المنتجات المطابقة؛ وحدة البيع الافتراضية أولاً ثم الأقدم
+        by_product = units.filter(Q(product__barcode__in=remaining) | Q(product__code__in=remaining)) \
+            .order_by('product_id', '-is_default_sale', 'id')
+        for product_unit in by_product:
+            product = product_unit.product
+            if product.barcode in remaining:
+                found.setdefault(product.barcode, _entry(product_unit, PRODUCT_BARCODE))
+            if product.code in remaining:
+                found.setdefault(product.code, _entry(product_unit, PRODUCT_CODE))
+    return found
+
+
+def price_for(entry, pricing_system=None):
+    """
+    السعر حسب نظام تسعير جهة الاتصال: نظام "سعر المورد" يستخدم سعر الشراء،
+    وباقي الأنظمة تستخدم سعر البيع (لا توجد أسعار منفصلة لكل شريحة في وحدات المنتجات)
+    """
+    from core.models import Contact
+    if pricing_system == Contact.SUPPLIER_PRICE:
+        return entry['purchase_price']
+    return entry['selling_price']
+
+
+def lookup_many(codes, contact=None):
+    """
+    حل قائمة أكواد (سلة مسح كاملة) وإرجاع {code: entry أو None}.
+    الأكواد غير المحفوظة تُحل معًا باستعلامين فقط.
+    """
+    codes = [str(code).strip() for code in codes if code is not None and str(code).strip()]
+    version = _catalog_version()
+    results = {}
+    missing = []
+    for code in dict.fromkeys(codes):
+        cached = _cache_get((version, code))
+        if cached is _MISSING:
+            missing.append(code)
+        else:
+            results[code] = cached
+
+    if missing:
+        found = _resolve(missing)
+        for code in missing:
+            results[code] = found.get(code)
+            # الأكواد غير الموجودة تُحفظ أيضًا حتى لا يتكرر البحث عنها
+            _cache_set((version, code), results[code])
+
+    pricing_system = contact.pricing_system if contact is not None else None
+    return {
+        code: dict(entry, code=code, price=price_for(entry, pricing_system)) if entry else None
+        for code, entry in results.items()
+    }
+
+
+def lookup(code, contact=None):
+    """حل كود واحد إلى وحدة منتج وسعرها، أو None"""
+    code = str(code or '').strip()
+    if not code:
+        return None
+    return lookup_many([code], contact).get(code)
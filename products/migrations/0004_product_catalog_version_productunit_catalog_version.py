@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_product_tax_rate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="catalog_version",
+            field=models.PositiveBigIntegerField(
+                db_index=True, default=0, editable=False, verbose_name="إصدار الكتالوج"
+            ),
+        ),
+        migrations.AddField(
+            model_name="productunit",
+            name="catalog_version",
+            field=models.PositiveBigIntegerField(
+                db_index=True, default=0, editable=False, verbose_name="إصدار الكتالوج"
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_contact_contact_type_name_idx"),
+        ("products", "0004_product_catalog_version_productunit_catalog_version"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["barcode"], name="product_barcode_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["code"], name="product_code_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="productunit",
+            index=models.Index(fields=["barcode"], name="product_unit_barcode_idx"),
+        ),
+    ]
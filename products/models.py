@@ -46,17 +46,28 @@ class Product(models.Model):
     description = models.TextField(_("الوصف"), blank=True, null=True)
     tax_rate = models.DecimalField(_("نسبة الضريبة"), max_digits=5, decimal_places=2, default=0)
     is_active = models.BooleanField(_("نشط"), default=True)
+    # إصدار آخر تغيير في بيانات الكتالوج (انظر products/catalog.py)
+    catalog_version = models.PositiveBigIntegerField(_("إصدار الكتالوج"), default=0, db_index=True, editable=False)
+
+    # الحقول التي يعرضها الكتالوج؛ تعديل غيرها (مثل الرصيد الحالي) لا يغير إصدار الكتالوج
+    CATALOG_FIELDS = {'name', 'code', 'barcode', 'category', 'default_store', 'tax_rate', 'is_active'}
 
     class Meta:
         verbose_name = _("منتج")
         verbose_name_plural = _("المنتجات")
+        indexes = [
+            models.Index(fields=['barcode'], name='product_barcode_idx'),
+            models.Index(fields=['code'], name='product_code_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
     def save(self, *args, **kwargs):
+        from .catalog import stamp_instance
         if not self.pk:  # On creation
             self.current_balance = self.initial_balance
+        kwargs['update_fields'] = stamp_instance(self, kwargs.get('update_fields'))
         super().save(*args, **kwargs)
 
 class ProductUnit(models.Model):
@@ -68,18 +79,27 @@ class ProductUnit(models.Model):
     barcode = models.CharField(_("باركود الوحدة"), max_length=50, blank=True, null=True)
     is_default_purchase = models.BooleanField(_("وحدة الشراء الافتراضية"), default=False)
     is_default_sale = models.BooleanField(_("وحدة البيع الافتراضية"), default=False)
+    catalog_version = models.PositiveBigIntegerField(_("إصدار الكتالوج"), default=0, db_index=True, editable=False)
+
+    CATALOG_FIELDS = {'product', 'unit', 'conversion_factor', 'purchase_price', 'selling_price', 'barcode',
+                      'is_default_purchase', 'is_default_sale'}
 
     class Meta:
         verbose_name = _("وحدة المنتج")
         verbose_name_plural = _("وحدات المنتجات")
         unique_together = [['product', 'unit']]
+        indexes = [
+            models.Index(fields=['barcode'], name='product_unit_barcode_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.unit.name}"
 
     def save(self, *args, **kwargs):
+        from .catalog import stamp_instance
         # تخزين حالة الوحدة قبل الحفظ
         is_new = self.pk is None
+        kwargs['update_fields'] = stamp_instance(self, kwargs.get('update_fields'))
         print(f"🔍 حفظ وحدة المنتج: {self.unit.name if hasattr(self, 'unit') and self.unit else 'وحدة جديدة'} للمنتج {self.product.name if hasattr(self, 'product') and self.product else 'منتج جديد'}")
         print(f"📊 حالة الوحدة - جديدة: {is_new}, وحدة شراء افتراضية: {self.is_default_purchase}, وحدة بيع افتراضية: {self.is_default_sale}")
 
@@ -93,7 +113,7 @@ class ProductUnit(models.Model):
                 updated = ProductUnit.objects.filter(
                     product=self.product,
                     is_default_purchase=True
-                ).exclude(pk=self.pk).update(is_default_purchase=False)
+                ).exclude(pk=self.pk).update(is_default_purchase=False, catalog_version=self.catalog_version)
                 print(f"📊 تم إلغاء تعيين {updated} وحدة أخرى كوحدة شراء افتراضية")
 
             # إذا تم تعيين هذه الوحدة كوحدة بيع افتراضية، قم بإلغاء تعيين الوحدات الأخرى
@@ -101,7 +121,7 @@ class ProductUnit(models.Model):
                 updated = ProductUnit.objects.filter(
                     product=self.product,
                     is_default_sale=True
-                ).exclude(pk=self.pk).update(is_default_sale=False)
+                ).exclude(pk=self.pk).update(is_default_sale=False, catalog_version=self.catalog_version)
                 print(f"📊 تم إلغاء تعيين {updated} وحدة أخرى كوحدة بيع افتراضية")
 
             # إذا لم يتم تعيين أي وحدة كوحدة افتراضية للشراء أو البيع، قم بتعيين هذه الوحدة كافتراضية
@@ -0,0 +1,26 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from . import catalog, lookup
+from .models import Product, ProductUnit, Unit
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductUnit)
+def catalog_row_changed(sender, instance, **kwargs):
+    """نتائج البحث بالباركود في هذه العملية لم تعد صالحة (باقي العمليات تعتمد على إصدار الكتالوج)"""
+    lookup.clear_cache()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductUnit)
+def catalog_row_deleted(sender, instance, **kwargs):
+    """الحذف لا يترك صفًا بإصدار جديد، فيُزاد إصدار الكتالوج حتى يتغير الـ ETag"""
+    catalog.next_version()
+
+
+@receiver([post_save, post_delete], sender=Unit)
+def unit_changed(sender, instance, **kwargs):
+    """أسماء الوحدات جزء من الكتالوج"""
+    catalog.next_version()
+    lookup.clear_cache()
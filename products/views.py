@@ -350,15 +350,11 @@ def product_delete(request, pk):
 def product_units_api(request, product_id):
     """API to get product units"""
     try:
-        print(f"🔍 تم استلام طلب API لوحدات المنتج رقم: {product_id}")
-
         # التحقق من وجود المنتج
         product = get_object_or_404(Product, pk=product_id)
-        print(f"✅ تم العثور على المنتج: {product.name} (#{product.id})")
 
-        # جلب وحدات المنتج
-        units = product.units.all()
-        print(f"📊 عدد وحدات المنتج: {units.count()}")
+        # جلب وحدات المنتج مع أسماء الوحدات في استعلام واحد
+        units = product.units.select_related('unit').order_by('id')
 
         units_data = []
 
@@ -377,10 +373,8 @@ def product_units_api(request, product_id):
                 'barcode': unit.barcode
             }
             units_data.append(unit_data)
-            print(f"🏷️ إضافة وحدة: {unit.unit.name} - سعر البيع: {unit.selling_price}, سعر الشراء: {unit.purchase_price}")
 
         # إعادة البيانات كـ JSON
-        print(f"✅ إرسال استجابة كاملة بـ {len(units_data)} وحدة للمنتج {product.name}")
         return JsonResponse(units_data, safe=False)
 
     except Exception as e:
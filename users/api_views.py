@@ -7,7 +7,7 @@ from .serializers import UserSerializer, ProfileSerializer, CustomRoleSerializer
 from rolepermissions.roles import get_user_roles, assign_role, remove_role
 
 class CustomRoleViewSet(viewsets.ModelViewSet):
-    queryset = CustomRole.objects.all()
+    queryset = CustomRole.objects.order_by('id')
     serializer_class = CustomRoleSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -17,9 +17,12 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all().select_related('profile').order_by('-date_joined')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filterset_fields = ['is_active']
+    search_fields = ['username', 'first_name', 'last_name', 'email']
 
     def get_queryset(self):
         queryset = super().get_queryset()
+        # ?role= اسم مختصر مستخدم في الواجهة
         role = self.request.query_params.get('role')
         if role:
             queryset = queryset.filter(profile__role=role)